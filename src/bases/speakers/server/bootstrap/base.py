@@ -1,26 +1,32 @@
-from collections import deque
-from typing import Dict, List
-from speakers.server.model.flow_data import BaseFlowData
+import asyncio
+from typing import Optional, Set
+
+from speakers.server.bootstrap.result_cache import ResultCache
+from speakers.server.bootstrap.task_store import TaskStore, MemoryTaskStore
+from speakers.server.runner_pool import WorkerPoolConfig
+
+
+def _wake(waiter: asyncio.Future):
+    if not waiter.done():
+        waiter.set_result(None)
 
 
 class Bootstrap:
 
     """Used by web module to decide which secret for securing"""
     _NONCE: str = ''
-    """最大的任务队列"""
-    _MAX_ONGOING_TASKS: int = 1
-
-    """任务队列"""
-    _QUEUE: deque = deque()
-    """进行的任务数据"""
-    _TASK_DATA: Dict[str, BaseFlowData] = {}
-    """进行的任务状态"""
-    _TASK_STATES = {}
-    """正在进行的任务"""
-    _ONGOING_TASKS: List[str] = []
-
-    def __init__(self):
+
+    def __init__(self, task_store: TaskStore = None, workers: WorkerPoolConfig = None,
+                 result_cache: ResultCache = None):
         self._version = "v0.0.1"
+        """web_runner 进程池、租约与重试配置"""
+        self._workers = workers if workers is not None else WorkerPoolConfig()
+        """任务队列、任务数据与任务状态"""
+        self._task_store = task_store if task_store is not None else MemoryTaskStore()
+        """已完成任务的结果缓存，为 None 时不缓存"""
+        self._result_cache = result_cache
+        """等待任务的 long-poll 请求"""
+        self._task_waiters: Set[asyncio.Future] = set()
 
     @classmethod
     def from_config(cls, cfg=None):
@@ -32,23 +38,20 @@ class Bootstrap:
 
     @property
     def max_ongoing_tasks(self) -> int:
-        return self._MAX_ONGOING_TASKS
+        """最大的执行中任务数，每个 web_runner 同时执行一个任务"""
+        return self._workers.num_workers
 
     @property
-    def ongoing_tasks(self) -> List[str]:
-        return self._ONGOING_TASKS
+    def workers(self) -> WorkerPoolConfig:
+        return self._workers
 
     @property
-    def queue(self) -> deque:
-        return self._QUEUE
+    def task_store(self) -> TaskStore:
+        return self._task_store
 
     @property
-    def task_data(self) -> Dict[str, BaseFlowData]:
-        return self._TASK_DATA
-
-    @property
-    def task_states(self) -> dict:
-        return self._TASK_STATES
+    def result_cache(self) -> Optional[ResultCache]:
+        return self._result_cache
 
     @property
     def nonce(self) -> str:
@@ -57,6 +60,29 @@ class Bootstrap:
     def set_nonce(self, nonce: str):
         self._NONCE = nonce
 
+    async def wait_task(self, timeout: float) -> bool:
+        """
+        等待新任务入队或执行槽位空出
+        :param timeout: 最长等待秒数
+        :return: 被唤醒时返回 True，超时返回 False
+        """
+        waiter = asyncio.get_running_loop().create_future()
+        self._task_waiters.add(waiter)
+        try:
+            await asyncio.wait_for(waiter, timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+        finally:
+            self._task_waiters.discard(waiter)
+
+    def notify_task(self):
+        """
+        唤醒所有等待中的 long-poll 请求，可以在其他线程中调用
+        """
+        for waiter in list(self._task_waiters):
+            waiter.get_loop().call_soon_threadsafe(_wake, waiter)
+
     @classmethod
     async def run(cls):
         raise NotImplementedError
@@ -0,0 +1,188 @@
+"""
+结果缓存
+
+task_id 是全部合成参数的内容哈希(见 speakers.tasks.content_task_id)，参数相同的提交合成出相同的音频。
+任务完成后，结果状态与结果文件按 task_id 记录在 SQLite 中，submit 命中时直接返回已完成的状态，不再排队，
+服务重启后仍然有效；任务存储中的已完成任务过期后，结果同样由缓存提供。
+
+tmp/result 下的结果文件由缓存管理：总大小超过 max_bytes 时按最近访问时间(LRU)删除最久未使用的结果及其文件
+"""
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import List, Optional
+
+from speakers.common.utils import get_tmp_path
+
+logger = logging.getLogger('server_runner')
+
+
+def set_result_cache_logger(l):
+    global logger
+    logger = l
+
+
+def result_files(state: dict) -> List[str]:
+    """
+    任务状态中的结果文件：单个音频为 filename，多音色任务另有打包前的 filenames
+    """
+    result = state.get('result') or {}
+    files = [result['filename']] if result.get('filename') else []
+    files.extend(filename for filename in result.get('filenames', []) if filename not in files)
+    return files
+
+
+class ResultCache:
+    """
+    按 task_id 缓存已完成任务的结果，所有方法线程安全
+    :param path: 数据库文件，相对路径位于临时目录下
+    :param max_bytes: 结果文件总大小上限，超过时按 LRU 删除
+    :param synchronous: 同 SqliteTaskStore
+    """
+
+    def __init__(self, path: str = "speakers_results.db", max_bytes: int = 1 << 30, synchronous: str = "NORMAL"):
+        self.path = path if path == ":memory:" or os.path.isabs(path) else get_tmp_path(path)
+        if self.path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        self.max_bytes = int(max_bytes)
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(f"PRAGMA synchronous={synchronous}")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS results (
+                task_id TEXT PRIMARY KEY,
+                state TEXT NOT NULL,
+                files TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                last_access REAL NOT NULL
+            )""")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS results_last_access ON results (last_access)")
+        self._bytes = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM results").fetchone()[0]
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+        logger.info(f'Result cache {self.path}: {len(self)} results, {self._bytes} bytes')
+
+    @classmethod
+    def from_config(cls, cfg=None):
+        if cfg is None:
+            return cls()
+        return cls(path=cfg.get("path", "speakers_results.db"),
+                   max_bytes=cfg.get("max_bytes", 1 << 30),
+                   synchronous=cfg.get("synchronous", "NORMAL"))
+
+    def get(self, task_id: str, now: float = None) -> Optional[dict]:
+        """
+        查询缓存，命中时更新访问时间；结果文件已被删除的记录视为未命中并移除
+        :return: 已完成的任务状态
+        """
+        now = time.time() if now is None else now
+        with self._lock:
+            row = self._conn.execute("SELECT state, files FROM results WHERE task_id = ?", (task_id,)).fetchone()
+            if row is not None and all(os.path.exists(filename) for filename in json.loads(row[1])):
+                self._conn.execute("UPDATE results SET last_access = ? WHERE task_id = ?", (now, task_id))
+                self._hits += 1
+                return json.loads(row[0])
+            if row is not None:
+                logger.warning(f'Result files of {task_id} are missing, dropping it from the cache')
+                self._delete(task_id)
+            self._misses += 1
+            return None
+
+    def put(self, task_id: str, state: dict, now: float = None) -> bool:
+        """
+        记录已完成任务的结果，之后按 LRU 淘汰到 max_bytes 以内(不淘汰刚记录的结果)
+        :return: 是否记录，没有结果文件(如失败的任务)时不记录
+        """
+        files = result_files(state)
+        if not files or not all(os.path.exists(filename) for filename in files):
+            return False
+        now = time.time() if now is None else now
+        size = sum(os.path.getsize(filename) for filename in files)
+        with self._lock:
+            self._delete(task_id, remove_files=False)
+            self._conn.execute(
+                "INSERT INTO results (task_id, state, files, size, last_access) VALUES (?, ?, ?, ?, ?)",
+                (task_id, json.dumps(state), json.dumps(files), size, now))
+            self._bytes += size
+            self._evict(keep=task_id)
+        return True
+
+    def remove(self, task_id: str):
+        with self._lock:
+            self._delete(task_id)
+
+    def _delete(self, task_id: str, remove_files: bool = True):
+        row = self._conn.execute("SELECT files, size FROM results WHERE task_id = ?", (task_id,)).fetchone()
+        if row is None:
+            return
+        self._conn.execute("DELETE FROM results WHERE task_id = ?", (task_id,))
+        self._bytes -= row[1]
+        if remove_files:
+            for filename in json.loads(row[0]):
+                try:
+                    os.remove(filename)
+                except FileNotFoundError:
+                    pass
+
+    def _evict(self, keep: str):
+        evicted = 0
+        while self._bytes > self.max_bytes:
+            rows = self._conn.execute("SELECT task_id FROM results WHERE task_id != ? "
+                                      "ORDER BY last_access LIMIT 64", (keep,)).fetchall()
+            if not rows:
+                break
+            for (task_id,) in rows:
+                self._delete(task_id)
+                evicted += 1
+                if self._bytes <= self.max_bytes:
+                    break
+        if evicted:
+            self._evictions += evicted
+            logger.info(f'Result cache evicted {evicted} results, {self._bytes}/{self.max_bytes} bytes')
+
+    def __contains__(self, task_id: str) -> bool:
+        with self._lock:
+            return self._conn.execute("SELECT 1 FROM results WHERE task_id = ?", (task_id,)).fetchone() is not None
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM results").fetchone()[0]
+
+    @property
+    def total_bytes(self) -> int:
+        return self._bytes
+
+    @property
+    def stats(self) -> dict:
+        """
+        命中统计，计数从服务启动开始
+        """
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                'hits': self._hits,
+                'misses': self._misses,
+                'hit_rate': self._hits / lookups if lookups else 0.0,
+                'evictions': self._evictions,
+                'results': len(self),
+                'bytes': self._bytes,
+                'max_bytes': self.max_bytes,
+            }
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+def load_result_cache(cfg=None) -> Optional[ResultCache]:
+    """
+    按 bootstrap 配置中的 result_cache 创建结果缓存，未配置或 enabled 为 false 时不缓存
+    """
+    if cfg is None or not cfg.get("enabled", True):
+        return None
+    return ResultCache.from_config(cfg)
@@ -0,0 +1,461 @@
+"""
+任务存储
+
+Bootstrap 原先用类属性上的 deque 与 dict 保存任务队列、任务数据与任务状态，服务重启后全部丢失，
+过期清理每秒遍历所有任务。TaskStore 把这些状态收拢到一个接口后面：
+MemoryTaskStore 为进程内实现，SqliteTaskStore 为 SQLite(WAL) 持久化实现，重启后排队与执行中的任务继续调度。
+
+任务的 status 为 queued(排队)、running(已被 web_runner 领取)、finished(完成或失败)，
+两种实现都按 status 与 created_at 建索引，领取任务、统计执行中任务与过期清理都不遍历全部任务。
+
+worker 领取任务时持有租约(lease)，执行期间通过心跳续约；租约到期(worker 卡死或崩溃)的任务在重试次数内重新排队，
+超过次数标记为失败
+"""
+import heapq
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+from speakers.common.utils import get_tmp_path
+from speakers.server.model.flow_data import PayLoad
+
+logger = logging.getLogger('server_runner')
+
+
+def set_task_store_logger(l):
+    global logger
+    logger = l
+
+
+QUEUED = "queued"
+RUNNING = "running"
+FINISHED = "finished"
+
+
+class TaskStore:
+    """
+    任务存储接口，所有方法线程安全(uvicorn 线程与调度循环同时访问)
+    """
+
+    @classmethod
+    def from_config(cls, cfg=None):
+        return cls()
+
+    def add(self, task_id: str, payload: PayLoad, state: dict) -> dict:
+        """
+        提交任务并排队，task_id 已存在时不重复提交
+        :return: 任务状态
+        """
+        raise NotImplementedError
+
+    def get_payload(self, task_id: str) -> Optional[PayLoad]:
+        raise NotImplementedError
+
+    def get_state(self, task_id: str) -> Optional[dict]:
+        raise NotImplementedError
+
+    def __contains__(self, task_id: str) -> bool:
+        return self.get_state(task_id) is not None
+
+    def __len__(self) -> int:
+        raise NotImplementedError
+
+    def count(self, status: str) -> int:
+        raise NotImplementedError
+
+    def pop_queued(self, worker: str = "", lease_seconds: float = 0) -> Optional[Tuple[str, PayLoad]]:
+        """
+        取出最早排队的任务并标记为 running，重试的任务排在最前
+        :param worker: 领取任务的 worker
+        :param lease_seconds: 租约时长，0 表示不过期
+        :return: (task_id, payload)，队列为空时返回 None
+        """
+        raise NotImplementedError
+
+    def running(self) -> List[str]:
+        """
+        执行中的任务，按创建时间排序
+        """
+        raise NotImplementedError
+
+    def owner(self, task_id: str) -> Optional[str]:
+        """
+        持有执行中任务租约的 worker，任务不在执行中时返回 None
+        """
+        raise NotImplementedError
+
+    def renew_lease(self, task_id: str, worker: str, lease_seconds: float) -> bool:
+        """
+        心跳续约
+        :return: 租约已不属于该 worker(过期后被重新排队或任务已结束)时返回 False
+        """
+        raise NotImplementedError
+
+    def expire_leases(self, now: float, max_retries: int, worker: str = None) -> Tuple[List[str], List[str]]:
+        """
+        回收到期的租约；指定 worker 时回收该 worker 持有的全部租约(worker 进程已退出)
+        :param max_retries: 任务最多被重新领取的次数，超过后标记为失败
+        :return: (重新排队的 task_id, 标记为失败的 task_id)
+        """
+        raise NotImplementedError
+
+    def update_state(self, task_id: str, **state) -> Optional[dict]:
+        """
+        更新任务状态，state 中 finished 为 True 时任务进入 finished
+        :return: 更新后的状态，任务不存在时返回 None
+        """
+        raise NotImplementedError
+
+    def remove(self, task_id: str):
+        raise NotImplementedError
+
+    def expire(self, now: float, finished_timeout: float, queued_timeout: float = -1) -> List[str]:
+        """
+        删除创建超过 finished_timeout 秒的已完成任务；queued_timeout >= 0 时同时删除排队超时的任务
+        :return: 删除的 task_id
+        """
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+class MemoryTaskStore(TaskStore):
+    """
+    进程内任务存储：排队任务为按提交顺序的 OrderedDict，已完成任务按 created_at 放入小顶堆，
+    过期清理只弹出堆顶与队首的过期任务
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._payloads: Dict[str, PayLoad] = {}
+        self._states: Dict[str, dict] = {}
+        self._status: Dict[str, str] = {}
+        self._queued: "OrderedDict[str, None]" = OrderedDict()
+        self._running: "OrderedDict[str, None]" = OrderedDict()
+        # (created_at, task_id)，删除任务时不从堆中移除，弹出时再核对
+        self._finished: List[Tuple[float, str]] = []
+        # 执行中任务的 (worker, 租约到期时间)，数量不超过 worker 数，回收时直接遍历
+        self._leases: Dict[str, Tuple[str, Optional[float]]] = {}
+        self._attempts: Dict[str, int] = {}
+
+    def add(self, task_id: str, payload: PayLoad, state: dict) -> dict:
+        with self._lock:
+            if task_id in self._states:
+                return dict(self._states[task_id])
+            self._payloads[task_id] = payload
+            self._states[task_id] = dict(state)
+            self._status[task_id] = QUEUED
+            self._queued[task_id] = None
+            return dict(state)
+
+    def get_payload(self, task_id: str) -> Optional[PayLoad]:
+        with self._lock:
+            return self._payloads.get(task_id)
+
+    def get_state(self, task_id: str) -> Optional[dict]:
+        with self._lock:
+            state = self._states.get(task_id)
+            return dict(state) if state is not None else None
+
+    def __len__(self) -> int:
+        return len(self._states)
+
+    def count(self, status: str) -> int:
+        with self._lock:
+            if status == QUEUED:
+                return len(self._queued)
+            if status == RUNNING:
+                return len(self._running)
+            return len(self._states) - len(self._queued) - len(self._running)
+
+    def pop_queued(self, worker: str = "", lease_seconds: float = 0) -> Optional[Tuple[str, PayLoad]]:
+        with self._lock:
+            if not self._queued:
+                return None
+            task_id, _ = self._queued.popitem(last=False)
+            self._status[task_id] = RUNNING
+            self._running[task_id] = None
+            self._leases[task_id] = (worker, time.time() + lease_seconds if lease_seconds > 0 else None)
+            self._attempts[task_id] = self._attempts.get(task_id, 0) + 1
+            return task_id, self._payloads[task_id]
+
+    def running(self) -> List[str]:
+        with self._lock:
+            return list(self._running)
+
+    def owner(self, task_id: str) -> Optional[str]:
+        with self._lock:
+            lease = self._leases.get(task_id)
+            return lease[0] if lease is not None else None
+
+    def renew_lease(self, task_id: str, worker: str, lease_seconds: float) -> bool:
+        with self._lock:
+            lease = self._leases.get(task_id)
+            if lease is None or lease[0] != worker:
+                return False
+            self._leases[task_id] = (worker, time.time() + lease_seconds if lease_seconds > 0 else None)
+            return True
+
+    def expire_leases(self, now: float, max_retries: int, worker: str = None) -> Tuple[List[str], List[str]]:
+        requeued, failed = [], []
+        with self._lock:
+            for task_id, (owner, expires_at) in list(self._leases.items()):
+                if worker is not None:
+                    if owner != worker:
+                        continue
+                elif expires_at is None or expires_at >= now:
+                    continue
+                del self._leases[task_id]
+                self._running.pop(task_id, None)
+                if self._attempts[task_id] > max_retries:
+                    failed.append(task_id)
+                    self.update_state(task_id, info='error', finished=True)
+                else:
+                    requeued.append(task_id)
+                    self._status[task_id] = QUEUED
+                    self._states[task_id].update(info='pending')
+            # 重新排队的任务领取得比所有排队任务都早，按创建顺序放回队首
+            for task_id in sorted(requeued, key=lambda task_id: self._payloads[task_id].created_at, reverse=True):
+                self._queued[task_id] = None
+                self._queued.move_to_end(task_id, last=False)
+        return requeued, failed
+
+    def update_state(self, task_id: str, **state) -> Optional[dict]:
+        with self._lock:
+            if task_id not in self._states:
+                return None
+            self._states[task_id].update(state)
+            if state.get('finished') and self._status[task_id] != FINISHED:
+                self._queued.pop(task_id, None)
+                self._running.pop(task_id, None)
+                self._leases.pop(task_id, None)
+                self._status[task_id] = FINISHED
+                heapq.heappush(self._finished, (self._payloads[task_id].created_at, task_id))
+            return dict(self._states[task_id])
+
+    def remove(self, task_id: str):
+        with self._lock:
+            if task_id not in self._states:
+                return
+            del self._states[task_id]
+            del self._payloads[task_id]
+            del self._status[task_id]
+            self._queued.pop(task_id, None)
+            self._running.pop(task_id, None)
+            self._leases.pop(task_id, None)
+            self._attempts.pop(task_id, None)
+
+    def expire(self, now: float, finished_timeout: float, queued_timeout: float = -1) -> List[str]:
+        expired = []
+        with self._lock:
+            while self._finished and now - self._finished[0][0] > finished_timeout:
+                created_at, task_id = heapq.heappop(self._finished)
+                # 已删除或重新提交的任务留下的过期堆项
+                if self._status.get(task_id) == FINISHED and self._payloads[task_id].created_at == created_at:
+                    expired.append(task_id)
+            if queued_timeout >= 0:
+                # 排队顺序即提交顺序
+                for task_id in self._queued:
+                    if now - self._payloads[task_id].requested_at <= queued_timeout:
+                        break
+                    expired.append(task_id)
+            for task_id in expired:
+                self.remove(task_id)
+        return expired
+
+
+class SqliteTaskStore(TaskStore):
+    """
+    SQLite(WAL) 任务存储，按 (status, created_at) 建索引；
+    打开时把上次退出前执行中的任务重新排队，它们所在的 web_runner 已随服务一起退出
+    :param path: 数据库文件，相对路径位于临时目录下
+    :param synchronous: WAL 模式下 NORMAL 在进程崩溃时不丢数据，FULL 在断电时也不丢
+    """
+
+    def __init__(self, path: str = "speakers_tasks.db", synchronous: str = "NORMAL"):
+        self.path = path if path == ":memory:" or os.path.isabs(path) else get_tmp_path(path)
+        if self.path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(f"PRAGMA synchronous={synchronous}")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS tasks (
+                seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                task_id TEXT NOT NULL UNIQUE,
+                status TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                requested_at REAL NOT NULL,
+                payload TEXT NOT NULL,
+                state TEXT NOT NULL,
+                worker TEXT,
+                lease_expires_at REAL,
+                attempts INTEGER NOT NULL DEFAULT 0
+            )""")
+        # 没有租约字段的旧数据库
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(tasks)")}
+        for column, definition in (("worker", "TEXT"), ("lease_expires_at", "REAL"),
+                                   ("attempts", "INTEGER NOT NULL DEFAULT 0")):
+            if column not in columns:
+                self._conn.execute(f"ALTER TABLE tasks ADD COLUMN {column} {definition}")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS tasks_status_created_at ON tasks (status, created_at)")
+        recovered = self._conn.execute("UPDATE tasks SET status = ?, worker = NULL, lease_expires_at = NULL "
+                                       "WHERE status = ?", (QUEUED, RUNNING)).rowcount
+        logger.info(f'Task store {self.path}: {len(self)} tasks, {self.count(QUEUED)} queued, '
+                    f'{recovered} requeued after restart')
+
+    @classmethod
+    def from_config(cls, cfg=None):
+        if cfg is None:
+            return cls()
+        return cls(path=cfg.get("path", "speakers_tasks.db"),
+                   synchronous=cfg.get("synchronous", "NORMAL"))
+
+    def add(self, task_id: str, payload: PayLoad, state: dict) -> dict:
+        with self._lock:
+            row = self._conn.execute("SELECT state FROM tasks WHERE task_id = ?", (task_id,)).fetchone()
+            if row is not None:
+                return json.loads(row[0])
+            self._conn.execute(
+                "INSERT INTO tasks (task_id, status, created_at, requested_at, payload, state) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (task_id, QUEUED, payload.created_at, payload.requested_at, payload.json(), json.dumps(state)))
+            return dict(state)
+
+    def get_payload(self, task_id: str) -> Optional[PayLoad]:
+        with self._lock:
+            row = self._conn.execute("SELECT payload FROM tasks WHERE task_id = ?", (task_id,)).fetchone()
+        return PayLoad.parse_raw(row[0]) if row is not None else None
+
+    def get_state(self, task_id: str) -> Optional[dict]:
+        with self._lock:
+            row = self._conn.execute("SELECT state FROM tasks WHERE task_id = ?", (task_id,)).fetchone()
+        return json.loads(row[0]) if row is not None else None
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM tasks").fetchone()[0]
+
+    def count(self, status: str) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM tasks WHERE status = ?", (status,)).fetchone()[0]
+
+    def pop_queued(self, worker: str = "", lease_seconds: float = 0) -> Optional[Tuple[str, PayLoad]]:
+        with self._lock:
+            # 索引内同一 created_at 按 rowid(提交顺序)排列，重新排队的任务 created_at 最早
+            row = self._conn.execute(
+                "SELECT seq, task_id, payload FROM tasks WHERE status = ? ORDER BY created_at, seq LIMIT 1",
+                (QUEUED,)).fetchone()
+            if row is None:
+                return None
+            self._conn.execute(
+                "UPDATE tasks SET status = ?, worker = ?, lease_expires_at = ?, attempts = attempts + 1 WHERE seq = ?",
+                (RUNNING, worker, time.time() + lease_seconds if lease_seconds > 0 else None, row[0]))
+        return row[1], PayLoad.parse_raw(row[2])
+
+    def running(self) -> List[str]:
+        with self._lock:
+            rows = self._conn.execute("SELECT task_id FROM tasks WHERE status = ? ORDER BY created_at, seq",
+                                      (RUNNING,)).fetchall()
+        return [row[0] for row in rows]
+
+    def owner(self, task_id: str) -> Optional[str]:
+        with self._lock:
+            row = self._conn.execute("SELECT worker FROM tasks WHERE task_id = ? AND status = ?",
+                                     (task_id, RUNNING)).fetchone()
+        return row[0] if row is not None else None
+
+    def renew_lease(self, task_id: str, worker: str, lease_seconds: float) -> bool:
+        with self._lock:
+            return self._conn.execute(
+                "UPDATE tasks SET lease_expires_at = ? WHERE task_id = ? AND status = ? AND worker = ?",
+                (time.time() + lease_seconds if lease_seconds > 0 else None, task_id, RUNNING, worker)).rowcount > 0
+
+    def expire_leases(self, now: float, max_retries: int, worker: str = None) -> Tuple[List[str], List[str]]:
+        # 执行中的任务不超过 worker 数，按 status 索引定位
+        if worker is not None:
+            condition, params = "status = ? AND worker = ?", (RUNNING, worker)
+        else:
+            condition, params = "status = ? AND lease_expires_at < ?", (RUNNING, now)
+        requeued, failed = [], []
+        with self._lock:
+            rows = self._conn.execute(f"SELECT task_id, attempts FROM tasks WHERE {condition}", params).fetchall()
+            for task_id, attempts in rows:
+                if attempts > max_retries:
+                    failed.append(task_id)
+                    self.update_state(task_id, info='error', finished=True)
+                else:
+                    requeued.append(task_id)
+                    state = self.get_state(task_id)
+                    state.update(info='pending')
+                    self._conn.execute("UPDATE tasks SET status = ?, worker = NULL, lease_expires_at = NULL, "
+                                       "state = ? WHERE task_id = ?", (QUEUED, json.dumps(state), task_id))
+        return requeued, failed
+
+    def update_state(self, task_id: str, **state) -> Optional[dict]:
+        with self._lock:
+            row = self._conn.execute("SELECT state FROM tasks WHERE task_id = ?", (task_id,)).fetchone()
+            if row is None:
+                return None
+            current = json.loads(row[0])
+            current.update(state)
+            if state.get('finished'):
+                self._conn.execute("UPDATE tasks SET state = ?, status = ?, worker = NULL, lease_expires_at = NULL "
+                                   "WHERE task_id = ?", (json.dumps(current), FINISHED, task_id))
+            else:
+                self._conn.execute("UPDATE tasks SET state = ? WHERE task_id = ?", (json.dumps(current), task_id))
+            return current
+
+    def remove(self, task_id: str):
+        with self._lock:
+            self._conn.execute("DELETE FROM tasks WHERE task_id = ?", (task_id,))
+
+    def expire(self, now: float, finished_timeout: float, queued_timeout: float = -1) -> List[str]:
+        # 两个条件都以 (status, created_at) 索引定位；排队任务的 requested_at 不早于 created_at
+        queries = [("status = ? AND created_at < ?", (FINISHED, now - finished_timeout))]
+        if queued_timeout >= 0:
+            bound = now - queued_timeout
+            queries.append(("status = ? AND created_at < ? AND requested_at < ?", (QUEUED, bound, bound)))
+        expired = []
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                for condition, params in queries:
+                    rows = self._conn.execute(f"SELECT task_id FROM tasks WHERE {condition}", params).fetchall()
+                    expired.extend(row[0] for row in rows)
+                    self._conn.execute(f"DELETE FROM tasks WHERE {condition}", params)
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return expired
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+TASK_STORES = {
+    "memory": MemoryTaskStore,
+    "sqlite": SqliteTaskStore,
+}
+
+
+def load_task_store(cfg=None) -> TaskStore:
+    """
+    按 bootstrap 配置中的 task_store.type 创建任务存储，未配置时使用内存存储
+    """
+    if cfg is None:
+        return MemoryTaskStore()
+    store_type = cfg.get("type", "memory")
+    if store_type not in TASK_STORES:
+        raise ValueError(f'Unknown task store: "{store_type}". '
+                         f'Choose from the following: %s' % ','.join(TASK_STORES))
+    return TASK_STORES[store_type].from_config(cfg)
@@ -79,6 +79,32 @@ class RvcProcessorData(BaseModel):
     )
 
 
+class RvcVoiceTarget(BaseModel):
+    model_index: int = Field(default=0)
+    """ 变调(整数, 半音数量, 升八度12降八度-12)"""
+    f0_up_key: int = Field(default=0)
+    """检索特征占比"""
+    index_rate: float = Field(default=0.9)
+    """输入源音量包络替换输出音量包络融合比例，越靠近1越使用输出包络"""
+    rms_mix_rate: float = Field(default=1)
+    """后处理重采样至最终采样率，0为不进行重采样"""
+    resample_sr: int = Field(default=0)
+    """保护清辅音和呼吸声，防止电音撕裂等artifact，拉满0.5不开启，调低加大保护力度但可能降低索引效果"""
+    protect: float = Field(default=0.33)
+
+
+class RvcMultiVoiceProcessorData(BaseModel):
+    """ F0提取方法，所有目标音色共用"""
+    f0_method: str = Field(default="rmvpe")
+    """ >=3则使用对harvest音高识别的结果使用中值滤波，数值为滤波半径，使用可以削弱哑音"""
+    filter_radius: int = Field(default=1)
+    f0_file: str = Field(
+        default=None
+    )
+    """目标音色列表"""
+    targets: List[RvcVoiceTarget] = Field(default_factory=list)
+
+
 class BaseFlowData(BaseModel):
     """任务创建时间"""
     created_at: float = Field(default=0)
@@ -105,6 +131,11 @@ class EdgeVoiceFlowData(BaseModel):
     rvc: RvcProcessorData
 
 
+class MultiVoiceFlowData(BaseModel):
+    edge: EdgeProcessorData
+    rvc: RvcMultiVoiceProcessorData
+
+
 class PayLoad(BaseFlowData):
     parameter: RunnerParameter
-    payload: Union[Dict, EdgeVoiceFlowData, BarkVoiceFlowData, VitsVoiceFlowData]
+    payload: Union[Dict, EdgeVoiceFlowData, BarkVoiceFlowData, VitsVoiceFlowData, MultiVoiceFlowData]
@@ -46,3 +46,12 @@ class RunnerState(BaseModel):
     state: str
     finished: bool = Field(default=False)
     result: dict = Field(default={})
+    """上报状态的 worker，为空时不校验租约"""
+    worker: str = Field(default="")
+
+
+class RunnerHeartbeat(BaseModel):
+    """RunnerHeartbeat"""
+    task_id: str
+    worker: str
+    nonce: str
@@ -0,0 +1,121 @@
+"""
+web_runner 进程池
+
+server 启动 num_workers 个 web_runner 进程，每个进程同时执行一个任务，通过 long-poll 领取任务并持有租约，
+执行期间按 heartbeat_seconds 发送心跳续约。单个 worker 崩溃时只重启该 worker，它持有的租约立即回收，
+任务在 max_retries 次内重新排队；worker 卡死时租约到期，同样重新排队
+"""
+import logging
+import subprocess
+import time
+from typing import Callable, List, Optional
+
+logger = logging.getLogger('server_runner')
+
+
+def set_runner_pool_logger(l):
+    global logger
+    logger = l
+
+
+# 重启退避：运行不足 STABLE_SECONDS 秒就退出的 worker 按指数退避重启，避免配置错误时反复拉起
+RESTART_DELAY_MIN = 1
+RESTART_DELAY_MAX = 60
+STABLE_SECONDS = 60
+
+
+def worker_name(worker_index: int, pid: int) -> str:
+    """
+    worker 标识，包含进程号，重启后的 worker 不会收到旧进程的租约
+    """
+    return f'worker-{worker_index}-{pid}'
+
+
+class WorkerPoolConfig:
+    """
+    :param num_workers: web_runner 进程数，也是同时执行的任务数
+    :param devices: 每个 worker 的 CUDA_VISIBLE_DEVICES，按 worker 序号循环，"" 表示只使用 CPU，为空不设置
+    :param lease_seconds: 租约时长，超过该时间没有心跳的任务重新排队
+    :param heartbeat_seconds: worker 心跳间隔，应明显小于 lease_seconds
+    :param max_retries: 任务租约过期或 worker 崩溃后最多重新排队的次数
+    """
+
+    def __init__(self, num_workers: int = 1, devices: List[str] = None, lease_seconds: float = 60,
+                 heartbeat_seconds: float = 10, max_retries: int = 2):
+        self.num_workers = max(1, int(num_workers))
+        self.devices = [str(device) for device in devices or []]
+        self.lease_seconds = float(lease_seconds)
+        self.heartbeat_seconds = float(heartbeat_seconds)
+        self.max_retries = int(max_retries)
+
+    @classmethod
+    def from_config(cls, cfg=None):
+        if cfg is None:
+            return cls()
+        devices = cfg.get("devices")
+        return cls(num_workers=cfg.get("num_workers", 1),
+                   devices=list(devices) if devices is not None else None,
+                   lease_seconds=cfg.get("lease_seconds", 60),
+                   heartbeat_seconds=cfg.get("heartbeat_seconds", 10),
+                   max_retries=cfg.get("max_retries", 2))
+
+    def device(self, worker_index: int) -> Optional[str]:
+        if not self.devices:
+            return None
+        return self.devices[worker_index % len(self.devices)]
+
+
+class RunnerPool:
+    """
+    :param start_proc: 启动第 worker_index 个 web_runner 的函数
+    :param num_workers: 进程数
+    """
+
+    def __init__(self, start_proc: Callable[[int], subprocess.Popen], num_workers: int):
+        self.start_proc = start_proc
+        self.num_workers = num_workers
+        self.procs: List[Optional[subprocess.Popen]] = [None] * num_workers
+        self._started_at = [0.0] * num_workers
+        self._restart_at = [0.0] * num_workers
+        self._restart_delay = [float(RESTART_DELAY_MIN)] * num_workers
+
+    def _start(self, worker_index: int, now: float):
+        self.procs[worker_index] = self.start_proc(worker_index)
+        self._started_at[worker_index] = now
+
+    def start(self):
+        now = time.time()
+        for worker_index in range(self.num_workers):
+            self._start(worker_index, now)
+
+    def workers(self) -> List[str]:
+        return [worker_name(worker_index, proc.pid) for worker_index, proc in enumerate(self.procs)
+                if proc is not None]
+
+    def poll(self, now: float = None) -> List[str]:
+        """
+        检查各 worker，重启已退出的 worker
+        :return: 本次检查发现已退出的 worker
+        """
+        now = time.time() if now is None else now
+        exited = []
+        for worker_index, proc in enumerate(self.procs):
+            if proc is not None and proc.poll() is not None:
+                exited.append(worker_name(worker_index, proc.pid))
+                if now - self._started_at[worker_index] < STABLE_SECONDS:
+                    self._restart_at[worker_index] = now + self._restart_delay[worker_index]
+                    self._restart_delay[worker_index] = min(self._restart_delay[worker_index] * 2, RESTART_DELAY_MAX)
+                else:
+                    self._restart_at[worker_index] = now
+                    self._restart_delay[worker_index] = RESTART_DELAY_MIN
+                logger.warning(f'Runner {exited[-1]} exited with code {proc.returncode}, '
+                               f'restarting in {self._restart_at[worker_index] - now:.0f}s')
+                self.procs[worker_index] = None
+            if self.procs[worker_index] is None and now >= self._restart_at[worker_index]:
+                self._start(worker_index, now)
+        return exited
+
+    def kill(self):
+        for proc in self.procs:
+            if proc is not None and proc.poll() is None:
+                proc.kill()
@@ -4,6 +4,8 @@ from speakers.server.bootstrap.bootstrap_register import load_bootstrap, get_boo
 from omegaconf import OmegaConf
 
 from speakers.common.utils import get_abs_path
+from speakers.common.threads import WORKER_INDEX_ENV
+from speakers.server.runner_pool import RunnerPool
 from oscrypto import util as crypto_utils
 
 import asyncio
@@ -27,7 +29,8 @@ def generate_nonce():
     return crypto_utils.rand_bytes(16).hex()
 
 
-def start_translator_client_proc(speakers_config_file: str, nonce: str = None):
+def start_translator_client_proc(speakers_config_file: str, nonce: str = None, worker_index: int = 0,
+                                 device: str = None):
     cmds = [
         sys.executable,
         '-m', 'speakers.start.start',
@@ -37,7 +40,12 @@ def start_translator_client_proc(speakers_config_file: str, nonce: str = None):
         '--verbose'
     ]
 
-    proc = subprocess.Popen(cmds, cwd=f"{registry.get_path('library_root')}/../")
+    # worker 序号，speakers.yaml 中 threads.affinity 为 auto 时据此分配核
+    env = dict(os.environ, **{WORKER_INDEX_ENV: str(worker_index)})
+    if device is not None:
+        # 每个 worker 只看到分配给它的 GPU，"" 表示只使用 CPU
+        env['CUDA_VISIBLE_DEVICES'] = device
+    proc = subprocess.Popen(cmds, cwd=f"{registry.get_path('library_root')}/../", env=env)
     return proc
 
 
@@ -58,52 +66,46 @@ async def dispatch(speakers_config_file: str, nonce: str = None):
         nonce = os.getenv('MT_WEB_NONCE', generate_nonce())
 
     runner = await start_async_app(speakers_config_file=speakers_config_file, nonce=nonce)
-    # Create client process
-    client_process = start_translator_client_proc(speakers_config_file, nonce=nonce)
+    workers = runner.workers
+    # Create client processes
+    pool = RunnerPool(lambda worker_index: start_translator_client_proc(speakers_config_file,
+                                                                        nonce=nonce,
+                                                                        worker_index=worker_index,
+                                                                        device=workers.device(worker_index)),
+                      num_workers=workers.num_workers)
+    pool.start()
 
     try:
         while True:
             """任务队列状态维护"""
             await asyncio.sleep(1)
-
-            # Restart client if OOM or similar errors occured
-            if client_process.poll() is not None:
-                print('Restarting translator process')
-                if len(runner.ongoing_tasks) > 0:
-                    task_id = runner.ongoing_tasks.pop(0)
-                    state = runner.task_states[task_id]
-                    state['info'] = 'error'
-                    state['finished'] = True
-                client_process = start_translator_client_proc(speakers_config_file=speakers_config_file, nonce=nonce)
-
-            # Filter queued and finished tasks
             now = time.time()
-            to_del_task_ids = set()
-            for tid, s in runner.task_states.items():
-                payload = runner.task_data[tid]
-                # Remove finished tasks after 30 minutes
-                if s['finished'] and now - payload.created_at > FINISHED_TASK_REMOVE_TIMEOUT:
-                    to_del_task_ids.add(tid)
-
-                # Remove queued tasks without web client
-                elif WEB_CLIENT_TIMEOUT >= 0:
-                    if tid not in runner.ongoing_tasks and not s['finished'] \
-                            and now - payload.requested_at > WEB_CLIENT_TIMEOUT:
-                        print('REMOVING TASK', tid)
-                        to_del_task_ids.add(tid)
-                        try:
-                            runner.queue.remove(tid)
-                        except Exception:
-                            pass
-
-            for tid in to_del_task_ids:
-                del runner.task_states[tid]
-                del runner.task_data[tid]
+
+            # Restart each client independently if OOM or similar errors occured,
+            # its leased tasks are re-queued within the retry budget
+            requeued, failed = [], []
+            for worker in pool.poll(now):
+                print(f'Restarting translator process {worker}')
+                worker_requeued, worker_failed = runner.task_store.expire_leases(now, workers.max_retries,
+                                                                                 worker=worker)
+                requeued.extend(worker_requeued)
+                failed.extend(worker_failed)
+
+            # Re-queue tasks whose worker stopped sending heartbeats
+            expired_requeued, expired_failed = runner.task_store.expire_leases(now, workers.max_retries)
+            requeued.extend(expired_requeued)
+            failed.extend(expired_failed)
+            if requeued or failed:
+                print(f'Lease expired, requeued: {requeued}, failed: {failed}')
+                runner.notify_task()
+
+            # Remove finished tasks after 30 minutes, and queued tasks without web client
+            expired = runner.task_store.expire(now, FINISHED_TASK_REMOVE_TIMEOUT, WEB_CLIENT_TIMEOUT)
+            if expired:
+                print(f'REMOVING {len(expired)} TASKS')
 
     except:
-        if client_process.poll() is None:
-            # client_process.terminate()
-            client_process.kill()
+        pool.kill()
         await runner.destroy()
         traceback.print_exc()
         raise
@@ -1,4 +1,4 @@
-from fastapi import FastAPI, Request
+from fastapi import FastAPI
 from starlette.responses import HTMLResponse
 from fastapi.middleware.cors import CORSMiddleware
 from speakers.server.utils import MakeFastAPIOffline
@@ -7,10 +7,16 @@ from speakers.server.servlet.document import page_index, document
 from speakers.server.servlet.runner import (submit_async,
                                             get_task_async,
                                             post_task_update_async,
+                                            post_heartbeat_async,
                                             result_async,
-                                            result_source_async)
+                                            result_source_async,
+                                            result_stream_async,
+                                            result_cache_stats_async)
 from speakers.server.bootstrap.bootstrap_register import bootstrap_register
 from speakers.server.bootstrap.base import Bootstrap
+from speakers.server.bootstrap.task_store import TaskStore, load_task_store
+from speakers.server.bootstrap.result_cache import ResultCache, load_result_cache
+from speakers.server.runner_pool import WorkerPoolConfig
 from speakers.common.registry import registry
 from fastapi.staticfiles import StaticFiles
 import uvicorn
@@ -26,8 +32,9 @@ class RunnerBootstrapBaseWeb(Bootstrap):
     app: FastAPI
     server_thread: threading
 
-    def __init__(self, host: str, port: int):
-        super().__init__()
+    def __init__(self, host: str, port: int, task_store: TaskStore = None, workers: WorkerPoolConfig = None,
+                 result_cache: ResultCache = None):
+        super().__init__(task_store=task_store, workers=workers, result_cache=result_cache)
 
         self.host = host
         self.port = port
@@ -36,7 +43,10 @@ class RunnerBootstrapBaseWeb(Bootstrap):
     def from_config(cls, cfg=None):
         host = cfg.get("host")
         port = cfg.get("port")
-        return cls(host=host, port=port)
+        task_store = load_task_store(cfg.get("task_store"))
+        workers = WorkerPoolConfig.from_config(cfg.get("workers"))
+        result_cache = load_result_cache(cfg.get("result_cache"))
+        return cls(host=host, port=port, task_store=task_store, workers=workers, result_cache=result_cache)
 
     async def run(self):
         self.app = FastAPI(
@@ -73,30 +83,46 @@ class RunnerBootstrapBaseWeb(Bootstrap):
         self.app.post("/runner/task-update-internal",
                       tags=["Runner"],
                       summary="内部同步调度RunnerStat")(post_task_update_async)
+        self.app.post("/runner/heartbeat-internal",
+                      tags=["Runner"],
+                      summary="内部续约Runner任务租约")(post_heartbeat_async)
         self.app.get("/runner/result_source",
                      tags=["Runner"],
                      summary="获取任务资源结果")(result_source_async)
+        self.app.get("/runner/result_stream",
+                     tags=["Runner"],
+                     summary="流式获取任务结果")(result_stream_async)
         self.app.get("/runner/result",
                      tags=["Runner"],
                      summary="获取任务结果")(result_async)
+        self.app.get("/runner/result-cache",
+                     tags=["Runner"],
+                     summary="结果缓存命中统计")(result_cache_stats_async)
         app = self.app
 
-        # 中间件函数，用于设置特定路径的日志级别
-        async def set_logging_level(request: Request, call_next):
-            # 获取请求路径
-            path = request.url.path
+        # 中间件，用于设置特定路径的日志级别
+        # 直接包装 ASGI 调用而不使用 app.middleware("http")：BaseHTTPMiddleware 替换了 receive，
+        # long-poll 中的 request.is_disconnected() 收不到客户端断开，已退出的 runner 仍会领走任务
+        class LoggingLevelMiddleware:
+            def __init__(self, app):
+                self.app = app
+
+            async def __call__(self, scope, receive, send):
+                if scope["type"] == "http":
+                    # 获取请求路径
+                    path = scope["path"]
 
-            # 如果是指定路径，则设置日志级别为 WARNING
-            if path.startswith("/runner/task-internal"):
-                logging.getLogger("uvicorn.access").setLevel(logging.WARNING)
-            else:
-                # 其他路径则保持默认级别
-                logging.getLogger("uvicorn.access").setLevel(logging.INFO)
+                    # 如果是指定路径，则设置日志级别为 WARNING
+                    if path.startswith("/runner/task-internal") or path.startswith("/runner/heartbeat-internal"):
+                        logging.getLogger("uvicorn.access").setLevel(logging.WARNING)
+                    else:
+                        # 其他路径则保持默认级别
+                        logging.getLogger("uvicorn.access").setLevel(logging.INFO)
 
-            return await call_next(request)
+                await self.app(scope, receive, send)
 
         # 将中间件添加到应用中
-        app.middleware("http")(set_logging_level)
+        app.add_middleware(LoggingLevelMiddleware)
 
         def run_server():
             uvicorn.run(app, host=self.host, port=self.port)
@@ -111,3 +137,6 @@ class RunnerBootstrapBaseWeb(Bootstrap):
         @app.on_event("shutdown")
         def shutdown_event():
             server_thread.join()  # 等待服务器线程结束
+            self.task_store.close()
+            if self.result_cache is not None:
+                self.result_cache.close()
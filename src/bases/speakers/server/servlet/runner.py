@@ -3,18 +3,28 @@ from speakers.server.model.result import (BaseResponse,
                                           TaskInfoResponse,
                                           TaskVoiceFlowInfo,
                                           RunnerState,
+                                          RunnerHeartbeat,
                                           TaskRunnerResponse)
 from speakers.server.bootstrap.bootstrap_register import get_bootstrap
+from speakers.server.bootstrap.task_store import RUNNING
 from speakers.common.utils import get_tmp_path
-from fastapi import File, Form, Body, Query
-from fastapi.responses import FileResponse
+from speakers.common.audio_stream import stream_result_filename
+from fastapi import File, Form, Body, Query, Request
+from fastapi.responses import FileResponse, StreamingResponse
 from speakers.common.registry import registry
+import asyncio
 import os
 import time
 import logging
 
 logger = logging.getLogger('server_runner')
 
+# long-poll 领取任务的最长挂起秒数，runner 请求的 wait 超过时按此截断
+LONG_POLL_TIMEOUT = 30
+# 流式结果检查新数据的间隔与每次发送的字节数
+STREAM_POLL_INTERVAL = 0.05
+STREAM_CHUNK_BYTES = 64 * 1024
+
 
 def set_server_runner_logger(l):
     global logger
@@ -52,8 +62,15 @@ async def submit_async(payload: PayLoad):
     payload.created_at = now
     payload.requested_at = now
 
-    task_state = {}
-    if task_id not in runner_bootstrap_web.task_data or task_id not in runner_bootstrap_web.task_states:
+    task_store = runner_bootstrap_web.task_store
+    task_state = task_store.get_state(task_id)
+    if task_state is None and runner_bootstrap_web.result_cache is not None:
+        # 相同参数已合成过，直接返回结果，不再排队
+        task_state = runner_bootstrap_web.result_cache.get(task_id)
+        if task_state is not None:
+            logger.info(f'Result cache hit for `submit` task {task_id}')
+            return TaskRunnerResponse(code=200, msg="提交任务成功", data=task_state)
+    if task_state is None:
         os.makedirs(get_tmp_path('result'), exist_ok=True)
         task_state = {
             'task_id': task_id,
@@ -62,37 +79,46 @@ async def submit_async(payload: PayLoad):
         }
 
         logger.info(f'New `submit` task {task_id}')
-        runner_bootstrap_web.task_data[task_id] = payload
-        runner_bootstrap_web.queue.append(task_id)
-
-        runner_bootstrap_web.task_states[task_id] = task_state
-    else:
-        task_state = runner_bootstrap_web.task_states[task_id]
+        task_state = task_store.add(task_id, payload, task_state)
+        runner_bootstrap_web.notify_task()
 
     return TaskRunnerResponse(code=200, msg="提交任务成功", data=task_state)
 
 
-async def get_task_async(nonce: str = Query(..., examples=["samples"])):
+async def get_task_async(request: Request,
+                         nonce: str = Query(..., examples=["samples"]),
+                         wait: float = Query(0, examples=[20]),
+                         worker: str = Query("", examples=["worker-0-1234"])):
     """
     Called by the translator to get a translation task.
+    wait > 0 时为 long-poll：没有可领取的任务时挂起，submit 入队或执行槽位空出时立即返回，最长等待 wait 秒；
+    领取的任务由 worker 持有 lease_seconds 的租约，需要通过心跳续约
     """
 
     runner_bootstrap_web = get_bootstrap("runner_bootstrap_web")
 
     if constant_compare(nonce, runner_bootstrap_web.nonce):
-        if len(runner_bootstrap_web.ongoing_tasks) < runner_bootstrap_web.max_ongoing_tasks:
-            if len(runner_bootstrap_web.queue) > 0:
-                task_id = runner_bootstrap_web.queue.popleft()
-                if task_id in runner_bootstrap_web.task_data:
-                    data = runner_bootstrap_web.task_data[task_id]
-                    runner_bootstrap_web.ongoing_tasks.append(task_id)
+        task_store = runner_bootstrap_web.task_store
+        deadline = time.monotonic() + max(0.0, min(wait, LONG_POLL_TIMEOUT))
+        while True:
+            if task_store.count(RUNNING) < runner_bootstrap_web.max_ongoing_tasks:
+                queued = task_store.pop_queued(worker=worker,
+                                               lease_seconds=runner_bootstrap_web.workers.lease_seconds)
+                if queued is not None:
+                    task_id, data = queued
                     info = TaskVoiceFlowInfo(task_id=task_id, data=data)
                     return TaskInfoResponse(code=200, msg="成功", data=info)
-
-            return BaseResponse(code=200, msg="成功")
-
-        else:
-            return BaseResponse(code=200, msg="max_ongoing_tasks")
+                msg = "成功"
+            else:
+                msg = "max_ongoing_tasks"
+
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return BaseResponse(code=200, msg=msg)
+            await runner_bootstrap_web.wait_task(remaining)
+            # runner 已断开(重启或超时重连)，不再为它领取任务
+            if await request.is_disconnected():
+                return BaseResponse(code=200, msg=msg)
     return BaseResponse(code=401, msg="无法获取任务")
 
 
@@ -105,30 +131,57 @@ async def post_task_update_async(runner_state: RunnerState):
 
     if constant_compare(runner_state.nonce, runner_bootstrap_web.nonce):
         task_id = runner_state.task_id
-        if task_id in runner_bootstrap_web.task_states and task_id in runner_bootstrap_web.task_data:
+        task_store = runner_bootstrap_web.task_store
+        if runner_state.worker:
+            owner = task_store.owner(task_id)
+            if owner is not None and owner != runner_state.worker:
+                # 租约过期后任务已被其他 worker 领取，忽略原 worker 的上报
+                logger.warning(f'Ignoring state of task {task_id} from {runner_state.worker}, leased by {owner}')
+                return BaseResponse(code=409, msg="租约已失效")
+            # 进度上报同时续约
+            task_store.renew_lease(task_id, runner_state.worker, runner_bootstrap_web.workers.lease_seconds)
+        state = {
+            'info': runner_state.state,
+            'finished': runner_state.finished,
+        }
+        if runner_state.result:
+            state['result'] = runner_state.result
+        task_state = task_store.update_state(task_id, **state)
+        if task_state is not None:
+            logger.info(f'Task state {task_id} to {task_state}')
+            result_cache = runner_bootstrap_web.result_cache
+            if runner_state.finished and runner_state.state != 'error' and result_cache is not None:
+                result_cache.put(task_id, task_state)
+            if runner_state.finished:
+                # 执行槽位空出
+                runner_bootstrap_web.notify_task()
 
-            if runner_state.result:
+    return BaseResponse(code=200, msg="成功")
 
-                runner_bootstrap_web.task_states[task_id].update({
-                    'info': runner_state.state,
-                    'finished': runner_state.finished,
-                    'result': runner_state.result,
-                })
-            else:
-                runner_bootstrap_web.task_states[task_id].update({
-                    'info': runner_state.state,
-                    'finished': runner_state.finished,
-                })
-            if runner_state.finished:
-                try:
-                    i = runner_bootstrap_web.ongoing_tasks.index(task_id)
-                    runner_bootstrap_web.ongoing_tasks.pop(i)
-                except ValueError:
-                    pass
 
-            logger.info(f'Task state {task_id} to {runner_bootstrap_web.task_states[task_id]}')
+async def post_heartbeat_async(heartbeat: RunnerHeartbeat):
+    """
+    worker 执行任务期间的心跳，续约任务租约
+    """
 
-    return BaseResponse(code=200, msg="成功")
+    runner_bootstrap_web = get_bootstrap("runner_bootstrap_web")
+
+    if constant_compare(heartbeat.nonce, runner_bootstrap_web.nonce):
+        if runner_bootstrap_web.task_store.renew_lease(heartbeat.task_id, heartbeat.worker,
+                                                       runner_bootstrap_web.workers.lease_seconds):
+            return BaseResponse(code=200, msg="成功")
+        return BaseResponse(code=409, msg="租约已失效")
+    return BaseResponse(code=401, msg="无法续约")
+
+
+def get_task_state(runner_bootstrap_web, task_id: str):
+    """
+    任务状态，任务存储中已过期或服务重启前完成的任务从结果缓存中获取
+    """
+    task_state = runner_bootstrap_web.task_store.get_state(task_id)
+    if task_state is None and runner_bootstrap_web.result_cache is not None:
+        task_state = runner_bootstrap_web.result_cache.get(task_id)
+    return task_state
 
 
 async def result_source_async(task_id: str = Query(..., examples=["task_id"])):
@@ -140,10 +193,10 @@ async def result_source_async(task_id: str = Query(..., examples=["task_id"])):
     try:
         runner_bootstrap_web = get_bootstrap("runner_bootstrap_web")
 
-        if task_id not in runner_bootstrap_web.task_states or task_id not in runner_bootstrap_web.task_data:
+        task_state = get_task_state(runner_bootstrap_web, task_id)
+        if task_state is None:
             return BaseResponse(code=500, msg=f"{task_id}: 任务不存在")
 
-        task_state = runner_bootstrap_web.task_states[task_id]
         result = task_state.get("result")
         filepath = get_tmp_path(f'{result.get("filename")}')
         logger.info(f'Task  {task_id} result_async {filepath}')
@@ -161,6 +214,68 @@ async def result_source_async(task_id: str = Query(..., examples=["task_id"])):
         return BaseResponse(code=500, msg=f"{task_id}: 任务结果获取失败")
 
 
+def _read_chunks(f):
+    while True:
+        chunk = f.read(STREAM_CHUNK_BYTES)
+        if not chunk:
+            return
+        yield chunk
+
+
+async def _stream_result(runner_bootstrap_web, task_id: str):
+    """
+    跟随 web_runner 写入的 {task_id}.stream.wav 发送新写入的数据，任务完成后结束；
+    没有流式文件(任务已完成或命中结果缓存)时发送最终结果文件
+    """
+    stream_path = get_tmp_path(f'result/{stream_result_filename(task_id)}')
+    f = None
+    try:
+        while True:
+            task_state = runner_bootstrap_web.task_store.get_state(task_id)
+            # 先读取状态再读取数据，完成前写入的数据都能在本轮读到
+            finished = task_state is None or task_state['finished']
+            if f is None:
+                try:
+                    f = open(stream_path, 'rb')
+                except FileNotFoundError:
+                    pass
+            if f is not None:
+                for chunk in _read_chunks(f):
+                    yield chunk
+            if finished:
+                break
+            await asyncio.sleep(STREAM_POLL_INTERVAL)
+
+        if f is None:
+            task_state = task_state or get_task_state(runner_bootstrap_web, task_id) or {}
+            filename = (task_state.get('result') or {}).get('filename')
+            if filename and filename.endswith('.wav') and os.path.exists(filename):
+                with open(filename, 'rb') as result_file:
+                    for chunk in _read_chunks(result_file):
+                        yield chunk
+    finally:
+        if f is not None:
+            f.close()
+
+
+async def result_stream_async(task_id: str = Query(..., examples=["task_id"])):
+    """
+    流式获取任务结果：按句合成的任务每完成一句即发送该句的音频(WAV，流式文件头)，
+    任务完成后结束；已完成的任务直接发送结果文件
+    :param task_id:
+    :return:
+    """
+    runner_bootstrap_web = get_bootstrap("runner_bootstrap_web")
+
+    task_state = get_task_state(runner_bootstrap_web, task_id)
+    if task_state is None:
+        return BaseResponse(code=500, msg=f"{task_id}: 任务不存在")
+    if task_state['finished'] and task_state.get('info') == 'error':
+        return BaseResponse(code=500, msg=f"{task_id}: 任务执行失败")
+
+    return StreamingResponse(_stream_result(runner_bootstrap_web, task_id), media_type="audio/wav")
+
+
 async def result_async(task_id: str = Query(..., examples=["task_id"])):
     """
     获取任务结果
@@ -170,13 +285,24 @@ async def result_async(task_id: str = Query(..., examples=["task_id"])):
     try:
         runner_bootstrap_web = get_bootstrap("runner_bootstrap_web")
 
-        if task_id not in runner_bootstrap_web.task_states or task_id not in runner_bootstrap_web.task_data:
+        task_state = get_task_state(runner_bootstrap_web, task_id)
+        if task_state is None:
             return BaseResponse(code=500, msg=f"{task_id}: 任务不存在")
 
-        task_state = runner_bootstrap_web.task_states[task_id]
         return TaskRunnerResponse(code=200, msg="获取任务成功", data=task_state)
 
     except Exception as e:
         logger.error(f'{e.__class__.__name__}: {e}',
                      exc_info=e)
         return BaseResponse(code=500, msg=f"{task_id}: 任务结果获取失败")
+
+
+async def result_cache_stats_async():
+    """
+    结果缓存命中统计
+    :return:
+    """
+    runner_bootstrap_web = get_bootstrap("runner_bootstrap_web")
+    if runner_bootstrap_web.result_cache is None:
+        return BaseResponse(code=404, msg="结果缓存未启用")
+    return TaskRunnerResponse(code=200, msg="成功", data=runner_bootstrap_web.result_cache.stats)
@@ -1,21 +1,31 @@
 import asyncio
 import logging
 import os
+import threading
 import traceback
+from contextlib import contextmanager
 
 import requests
 from omegaconf import OmegaConf
 
 from speakers.common.log import add_file_logger, remove_file_logger
 from speakers.common.registry import registry
+from speakers.common.threads import WORKER_INDEX_ENV, ThreadBudget, set_thread_budget
 from speakers.common.utils import get_abs_path, get_tmp_path
 from speakers.processors import (load_preprocess
                                  )
 from speakers.server.model.flow_data import PayLoad
+from speakers.server.runner_pool import WorkerPoolConfig, worker_name
 from speakers.tasks import get_task, load_task, tasks_cache
 
 logger = logging.getLogger('speaker_runner')
 
+# long-poll 每次请求的最长挂起秒数，server 端最多挂起 LONG_POLL_TIMEOUT(30) 秒
+LONG_POLL_WAIT = 20
+# 连接 server 失败后的重连间隔，指数退避
+RECONNECT_DELAY_MIN = 0.5
+RECONNECT_DELAY_MAX = 10
+
 
 def set_main_logger(l):
     global logger
@@ -53,6 +63,10 @@ class Speaker:
         self.verbose = verbose
 
         config = OmegaConf.load(get_abs_path(speakers_config_file))
+        # 线程预算与 CPU 亲和性，在加载模型之前设置
+        thread_budget = ThreadBudget.from_config(config.get('threads'))
+        thread_budget.apply()
+        set_thread_budget(thread_budget)
         load_preprocess(config=config.get('preprocess'))
         load_task(config.get("tasks"))
 
@@ -88,12 +102,49 @@ class WebSpeaker(Speaker):
 
                 remote_infos[bootstrap_cfg.name] = {
                     'host': bootstrap_cfg.host,
-                    'port': bootstrap_cfg.port
+                    'port': bootstrap_cfg.port,
+                    # long-poll 每次最长挂起秒数
+                    'long_poll_wait': bootstrap_cfg.get('long_poll_wait', LONG_POLL_WAIT),
+                    'workers': WorkerPoolConfig.from_config(bootstrap_cfg.get('workers'))
                 }
 
         self.remote_infos = remote_infos
         self.nonce = nonce
+        # 进程池中的 worker 标识，server 据此分配租约
+        self.worker = worker_name(int(os.getenv(WORKER_INDEX_ENV, "0") or 0), os.getpid())
         self._task_results = {}
+        # 复用连接，long-poll 返回后立即重新发起
+        self._session = requests.Session()
+
+    @contextmanager
+    def _heartbeat(self, remote_info: dict, task_id: str):
+        """
+        执行任务期间在后台线程中定期续约，推理阻塞事件循环时心跳照常发送
+        """
+        stop = threading.Event()
+        host = '127.0.0.1'
+        if not '0.0.0.0' in remote_info.get("host"):
+            host = remote_info.get("host")
+        url = f'http://{host}:{remote_info["port"]}/runner/heartbeat-internal'
+        interval = remote_info['workers'].heartbeat_seconds
+
+        def beat():
+            while not stop.wait(interval):
+                try:
+                    response = requests.post(url, json={'task_id': task_id, 'worker': self.worker,
+                                                        'nonce': self.nonce}, timeout=interval)
+                    if response.json().get("code") == 409:
+                        logger.warning(f'Lease of task {task_id} was lost, it has been requeued')
+                except Exception:
+                    logger.warning(f'Heartbeat of task {task_id} failed: {traceback.format_exc()}')
+
+        thread = threading.Thread(target=beat, name=f'heartbeat-{task_id}', daemon=True)
+        thread.start()
+        try:
+            yield
+        finally:
+            stop.set()
+            thread.join()
 
     async def listen(self):
         """
@@ -112,7 +163,8 @@ class WebSpeaker(Speaker):
                         'nonce': self.nonce,
                         'state': state,
                         'finished': finished,
-                        'result': result
+                        'result': result,
+                        'worker': self.worker
                     }
                     # 处理每个runner的调度
                     for _key, _remote_info in self.remote_infos.items():
@@ -139,29 +191,27 @@ class WebSpeaker(Speaker):
         for key, task in tasks_cache.items():
             task.add_progress_hook(sync_state)
 
+        retry_delay = RECONNECT_DELAY_MIN
         while True:
+            # server 端挂起到有任务入队或 long_poll_wait 超时才返回，不再固定间隔轮询
             self._task_results = self._get_task()
 
-            wait_flag = False
-
-            if not self._task_results:
-                wait_flag = True
-
-            if wait_flag:
-                await asyncio.sleep(1)
+            if self._task_results is None:
+                # 连接失败，退避后重连
+                await asyncio.sleep(retry_delay)
+                retry_delay = min(retry_delay * 2, RECONNECT_DELAY_MAX)
                 continue
+            retry_delay = RECONNECT_DELAY_MIN
 
             # 处理每个runner的调度,如果有任何一个返回了任务，则执行调度
+            wait_flag = True
             for key, remote_info in self.remote_infos.items():
                 # TODO 此处需要分布式调度，需要考虑重复调度的问题
-                if self._task_results.get(key) is None or self._task_results.get(key).get("task_id") is None:
-                    wait_flag = True
-                else:
+                if self._task_results.get(key) is not None and self._task_results.get(key).get("task_id") is not None:
                     wait_flag = False
                     break
 
             if wait_flag:
-                await asyncio.sleep(1)
                 continue
 
             # if self.verbose:
@@ -172,10 +222,14 @@ class WebSpeaker(Speaker):
             # TODO 调度任务应当从队列中获取，而不是从runner_bootstrap_web中获取
             # 处理每个runner的调度
             for key, remote_info in self.remote_infos.items():
-                logger.info(f'Processing task {self._task_results.get(key).get("task_id")}')
+                if self._task_results.get(key) is None or self._task_results.get(key).get("task_id") is None:
+                    continue
+                task_id = self._task_results.get(key).get("task_id")
+                logger.info(f'Processing task {task_id}')
 
-                await self.preparation_runner(task_id=self._task_results.get(key).get("task_id"),
-                                              payload=PayLoad.parse_obj(self._task_results.get(key).get("data")))
+                with self._heartbeat(remote_info, task_id):
+                    await self.preparation_runner(task_id=task_id,
+                                                  payload=PayLoad.parse_obj(self._task_results.get(key).get("data")))
 
             # if self.verbose:
             #     # Write log file
@@ -191,12 +245,16 @@ class WebSpeaker(Speaker):
                 if not '0.0.0.0' in _remote_info.get("host"):
                     host = _remote_info.get("host")
 
-                response = requests.get(
-                    f'http://{host}:{_remote_info["port"]}/runner/task-internal?nonce={self.nonce}',
-                    timeout=3600)
+                wait = _remote_info["long_poll_wait"]
+                response = self._session.get(
+                    f'http://{host}:{_remote_info["port"]}/runner/task-internal',
+                    params={'nonce': self.nonce, 'wait': wait, 'worker': self.worker},
+                    timeout=wait + 10)
                 # 检查响应状态码
-                if response.status_code == 200:
-                    task_results[key] = response.json().get("data")
+                if response.status_code != 200 or response.json().get("code") != 200:
+                    logger.error(f'runner_bootstrap_web rejected task request: {response.text}')
+                    return None
+                task_results[key] = response.json().get("data")
             return task_results
         except Exception:
             logger.error(f'runner_bootstrap_web connection error: {traceback.format_exc()}')
@@ -5,12 +5,15 @@ from argparse import Namespace
 
 from speakers.bark.mode_load import set_bark_model_load_logger
 from speakers.common.log import get_logger, set_log_level
+from speakers.common.threads import set_threads_logger
 from speakers.start import set_main_logger, Speaker, WebSpeaker
 from speakers.processors.bark_to_voice import set_bark_to_voice_logger
 from speakers.processors.rvc_speakers_processor import set_rvc_speakers_logger
 from speakers.processors.vits_to_voice import set_vits_to_voice_logger
 from speakers.processors.edge_to_voice import set_edge_to_voice_logger
 from speakers.server.servlet.runner import set_server_runner_logger
+from speakers.server.runner_pool import set_runner_pool_logger
+from speakers.server.bootstrap.result_cache import set_result_cache_logger
 from speakers.server.model.flow_data import PayLoad
 from speakers.server.server_init import dispatch as dispatch_web
 import argparse
@@ -65,7 +68,10 @@ def main():
         set_vits_to_voice_logger(logger)
         set_bark_to_voice_logger(logger)
         set_server_runner_logger(logger)
+        set_runner_pool_logger(logger)
+        set_result_cache_logger(logger)
         set_edge_to_voice_logger(logger)
+        set_threads_logger(logger)
 
         loop = asyncio.new_event_loop()
         asyncio.set_event_loop(loop)
@@ -0,0 +1,121 @@
+import base64
+from multiprocessing import shared_memory
+from typing import Any, Dict, List, Optional, Union
+
+import numpy as np
+
+
+class AudioBuffer:
+    """
+    处理器之间传递音频采样的容器，直接持有 numpy 缓冲区，进程内传递不做任何拷贝与逐元素校验，
+    只有在需要跨进程时才通过 share() 放入共享内存，或通过 to_payload() 序列化
+    作为 pydantic 字段使用时，可以接收 AudioBuffer、np.ndarray、List[float] 以及 to_payload() 的输出
+    """
+
+    __slots__ = ('_array', '_shm')
+
+    DTYPE = np.float32
+
+    def __init__(self, array: Optional[np.ndarray] = None, shm: shared_memory.SharedMemory = None):
+        if array is None:
+            array = np.zeros(0, dtype=self.DTYPE)
+        self._array = array
+        self._shm = shm
+
+    @classmethod
+    def from_numpy(cls, array: np.ndarray) -> "AudioBuffer":
+        """
+        包装 numpy 数组，已经是 float32 时不拷贝
+        """
+        return cls(np.asarray(array, dtype=cls.DTYPE))
+
+    @classmethod
+    def from_shared_memory(cls, shm_name: str, shape: List[int], dtype: str = 'float32') -> "AudioBuffer":
+        """
+        按句柄挂载其他进程创建的共享内存
+        """
+        shm = shared_memory.SharedMemory(name=shm_name)
+        array = np.ndarray(tuple(shape), dtype=np.dtype(dtype), buffer=shm.buf)
+        return cls(array, shm=shm)
+
+    @property
+    def array(self) -> np.ndarray:
+        return self._array
+
+    @property
+    def shared(self) -> bool:
+        return self._shm is not None
+
+    @property
+    def nbytes(self) -> int:
+        return int(self._array.nbytes)
+
+    def __len__(self) -> int:
+        return int(self._array.shape[0])
+
+    def __repr__(self) -> str:
+        return f'AudioBuffer(shape={self._array.shape}, dtype={self._array.dtype}, shared={self.shared})'
+
+    def share(self) -> "AudioBuffer":
+        """
+        拷贝一次到共享内存，返回共享内存上的 AudioBuffer，用于跨进程传递句柄
+        """
+        if self.shared:
+            return self
+        shm = shared_memory.SharedMemory(create=True, size=max(self.nbytes, 1))
+        array = np.ndarray(self._array.shape, dtype=self._array.dtype, buffer=shm.buf)
+        array[...] = self._array
+        return AudioBuffer(array, shm=shm)
+
+    def close(self, unlink: bool = False):
+        """
+        释放共享内存映射，unlink 为 True 时同时销毁共享内存段（由创建方调用）
+        """
+        if self._shm is None:
+            return
+        self._array = np.array(self._array)
+        self._shm.close()
+        if unlink:
+            self._shm.unlink()
+        self._shm = None
+
+    def to_payload(self) -> Dict[str, Any]:
+        """
+        跨进程序列化，共享内存上的缓冲区只传递句柄，否则以 base64 编码原始字节
+        """
+        payload = {
+            'shape': list(self._array.shape),
+            'dtype': str(self._array.dtype),
+        }
+        if self.shared:
+            payload['shm_name'] = self._shm.name
+        else:
+            payload['data'] = base64.b64encode(np.ascontiguousarray(self._array).tobytes()).decode('ascii')
+        return payload
+
+    @classmethod
+    def from_payload(cls, payload: Dict[str, Any]) -> "AudioBuffer":
+        if payload.get('shm_name'):
+            return cls.from_shared_memory(payload['shm_name'], payload['shape'], payload.get('dtype', 'float32'))
+        array = np.frombuffer(base64.b64decode(payload['data']), dtype=np.dtype(payload.get('dtype', 'float32')))
+        return cls(array.reshape(payload['shape']))
+
+    @classmethod
+    def __get_validators__(cls):
+        yield cls.validate
+
+    @classmethod
+    def __modify_schema__(cls, field_schema: dict):
+        field_schema.update(type='object', description='audio samples, see AudioBuffer.to_payload')
+
+    @classmethod
+    def validate(cls, value: Union["AudioBuffer", np.ndarray, list, dict]) -> "AudioBuffer":
+        if isinstance(value, AudioBuffer):
+            return value
+        if isinstance(value, np.ndarray):
+            return cls.from_numpy(value)
+        if isinstance(value, (list, tuple)):
+            return cls(np.array(value, dtype=cls.DTYPE))
+        if isinstance(value, dict):
+            return cls.from_payload(value)
+        raise TypeError(f'Unsupported audio samples type: {type(value)}')
@@ -0,0 +1,104 @@
+"""
+流式结果
+
+任务按句合成，每句完成后追加到 {task_id}.stream.wav，server 的 /runner/result_stream 边写边发送，
+客户端在第一句完成后即可开始播放。文件头的 RIFF 与 data 长度写为 0xFFFFFFFF(流式 WAV 的惯例，长度未知)，
+全部写完后回填实际长度，再重命名为最终结果 {task_id}.wav
+"""
+import os
+import re
+import struct
+from typing import List
+
+import numpy as np
+
+# 长度未知的 WAV 头
+STREAMING_SIZE = 0xFFFFFFFF
+WAV_HEADER_BYTES = 44
+
+# 句末标点之后、英文句点/分号后的空白、换行处断句
+_SENTENCE_END = re.compile(r'(?<=[。！？!?…])|(?<=[.;；])\s+|\n+')
+_WORD = re.compile(r'\w')
+
+
+def stream_result_filename(task_id: str) -> str:
+    return f'{task_id}.stream.wav'
+
+
+def split_sentences(text: str) -> List[str]:
+    """
+    按句切分待合成的文本，只有标点的片段并入前一句
+    :param text:
+    :return: 非空的句子列表，无法切分时为 [text]
+    """
+    sentences = []
+    for sentence in _SENTENCE_END.split(text or ''):
+        sentence = sentence.strip()
+        if not sentence:
+            continue
+        if sentences and not _WORD.search(sentence):
+            sentences[-1] += sentence
+        else:
+            sentences.append(sentence)
+    return sentences or [text]
+
+
+def wav_header(sample_rate: int, data_bytes: int = STREAMING_SIZE, channels: int = 1) -> bytes:
+    """
+    16 bit PCM 的 WAV 头，data_bytes 为 STREAMING_SIZE 时为流式头
+    """
+    riff_bytes = STREAMING_SIZE if data_bytes == STREAMING_SIZE else 36 + data_bytes
+    return struct.pack('<4sI4s4sIHHIIHH4sI', b'RIFF', riff_bytes, b'WAVE', b'fmt ', 16, 1, channels,
+                       sample_rate, sample_rate * channels * 2, channels * 2, 16, b'data', data_bytes)
+
+
+def to_int16(audio: np.ndarray) -> np.ndarray:
+    if audio.dtype == np.int16:
+        return audio
+    return (np.clip(audio, -1.0, 1.0) * 32767).astype(np.int16)
+
+
+class StreamingWavWriter:
+    """
+    逐段追加 16 bit 单声道 PCM，每段写入后 flush，读取方可以立即读到
+    :param path: 文件路径
+    :param sample_rate: 采样率，所有段相同
+    """
+
+    def __init__(self, path: str, sample_rate: int):
+        self.path = path
+        self.sample_rate = int(sample_rate)
+        self.data_bytes = 0
+        self.segments = 0
+        # 重试的任务重新创建文件而不是截断，正在读取上一次结果的客户端不会读到错位的数据
+        if os.path.exists(path):
+            os.remove(path)
+        self._file = open(path, 'wb')
+        self._file.write(wav_header(self.sample_rate))
+        self._file.flush()
+
+    def write(self, sample_rate: int, audio: np.ndarray):
+        if int(sample_rate) != self.sample_rate:
+            raise ValueError(f'Segment sample rate {sample_rate} does not match the stream ({self.sample_rate})')
+        data = to_int16(np.asarray(audio).reshape(-1)).tobytes()
+        self._file.write(data)
+        self._file.flush()
+        self.data_bytes += len(data)
+        self.segments += 1
+
+    def close(self):
+        """
+        回填实际长度，之后文件是普通的 WAV
+        """
+        if self._file.closed:
+            return
+        self._file.seek(0)
+        self._file.write(wav_header(self.sample_rate, self.data_bytes))
+        self._file.close()
+
+    def discard(self):
+        self._file.close()
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
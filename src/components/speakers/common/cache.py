@@ -0,0 +1,186 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, Optional
+
+import numpy as np
+
+
+def sizeof(value: Any) -> int:
+    """
+    估算缓存值占用的字节数，支持 numpy 数组、torch 张量以及它们组成的 tuple/list/dict
+    :param value:
+    :return:
+    """
+    if value is None:
+        return 0
+    if isinstance(value, np.ndarray):
+        return int(value.nbytes)
+    if hasattr(value, "element_size") and hasattr(value, "nelement"):
+        return int(value.element_size() * value.nelement())
+    if isinstance(value, (tuple, list)):
+        return sum(sizeof(v) for v in value)
+    if isinstance(value, dict):
+        return sum(sizeof(v) for v in value.values())
+    if hasattr(value, "nbytes"):
+        return int(value.nbytes)
+    return 0
+
+
+class LRUCache:
+    """
+    线程安全的 LRU 缓存，可以按条目数 max_items 或按字节数 max_bytes 限制容量，
+    超出容量时淘汰最久未使用的条目，0 或 None 表示不限制
+    ttl 为条目存活秒数，过期条目在读取或写入时清理，0 或 None 表示不过期
+    """
+
+    def __init__(self,
+                 max_items: Optional[int] = None,
+                 max_bytes: Optional[int] = None,
+                 sizeof_fn: Callable[[Any], int] = sizeof,
+                 on_evict: Callable[[Hashable, Any], None] = None,
+                 ttl: Optional[float] = None):
+        self.max_items = max_items or 0
+        self.max_bytes = max_bytes or 0
+        self.ttl = ttl or 0
+        self._sizeof = sizeof_fn
+        self._on_evict = on_evict
+        self._data: "OrderedDict[Hashable, Any]" = OrderedDict()
+        self._sizes = {}
+        self._expires = {}
+        self._bytes = 0
+        self._lock = threading.RLock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key: Hashable, default=None):
+        with self._lock:
+            if key not in self._data or self._expire(key):
+                self.misses += 1
+                return default
+            self.hits += 1
+            self._data.move_to_end(key)
+            return self._data[key]
+
+    def peek(self, key: Hashable, default=None):
+        """
+        读取缓存但不更新 LRU 顺序与命中统计
+        """
+        with self._lock:
+            if key not in self._data or self._expire(key):
+                return default
+            return self._data[key]
+
+    def put(self, key: Hashable, value: Any, nbytes: int = None):
+        """
+        写入缓存，nbytes 为空时使用 sizeof_fn 估算
+        单个条目超过 max_bytes 时依然写入，但会淘汰其余所有条目
+        """
+        if nbytes is None:
+            nbytes = self._sizeof(value)
+        with self._lock:
+            if key in self._data:
+                self._remove(key)
+            self._data[key] = value
+            self._sizes[key] = nbytes
+            self._bytes += nbytes
+            if self.ttl:
+                self._expires[key] = time.monotonic() + self.ttl
+                self.purge_expired()
+            self._shrink(keep=key)
+
+    def pop(self, key: Hashable, default=None):
+        with self._lock:
+            if key not in self._data:
+                return default
+            return self._remove(key)
+
+    def purge_expired(self) -> int:
+        """
+        清理所有过期条目，返回清理数量
+        """
+        if not self.ttl:
+            return 0
+        with self._lock:
+            now = time.monotonic()
+            expired = [key for key, expires in self._expires.items() if expires <= now]
+            for key in expired:
+                self._expire(key, now=now)
+            return len(expired)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self._sizes.clear()
+            self._expires.clear()
+            self._bytes = 0
+
+    def keys(self):
+        with self._lock:
+            return list(self._data.keys())
+
+    def __contains__(self, key: Hashable) -> bool:
+        with self._lock:
+            return key in self._data
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._data)
+
+    @property
+    def nbytes(self) -> int:
+        return self._bytes
+
+    @property
+    def stats(self) -> dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'items': len(self._data),
+                'bytes': self._bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+                'hit_rate': self.hits / total if total else 0.0,
+            }
+
+    def _remove(self, key: Hashable):
+        self._bytes -= self._sizes.pop(key)
+        self._expires.pop(key, None)
+        return self._data.pop(key)
+
+    def _expire(self, key: Hashable, now: float = None) -> bool:
+        """
+        条目已过期时移除并返回 True
+        """
+        expires = self._expires.get(key)
+        if expires is None or expires > (time.monotonic() if now is None else now):
+            return False
+        value = self._remove(key)
+        self.expirations += 1
+        if self._on_evict is not None:
+            self._on_evict(key, value)
+        return True
+
+    def _over_capacity(self) -> bool:
+        if self.max_items and len(self._data) > self.max_items:
+            return True
+        if self.max_bytes and self._bytes > self.max_bytes:
+            return True
+        return False
+
+    def _shrink(self, keep: Hashable = None):
+        while self._over_capacity() and len(self._data) > 0:
+            key = next(iter(self._data))
+            if key == keep:
+                if len(self._data) == 1:
+                    break
+                self._data.move_to_end(key)
+                continue
+            value = self._remove(key)
+            self.evictions += 1
+            if self._on_evict is not None:
+                self._on_evict(key, value)
@@ -0,0 +1,143 @@
+import copy
+import logging
+from typing import Callable, Iterable, Optional
+
+import torch
+from torch import nn
+from torch.nn.utils import parametrize
+from torch.nn.utils.weight_norm import WeightNorm
+
+logger = logging.getLogger('speaker_runner')
+
+
+def set_inference_optimizer_logger(l):
+    global logger
+    logger = l
+
+
+def fold_weight_norm(module: nn.Module) -> int:
+    """
+    把 weight_norm 折叠进卷积权重，推理时不再每次由 weight_g、weight_v 重新计算权重
+    同时支持 torch.nn.utils.weight_norm 与 parametrizations.weight_norm
+    :return: 折叠的层数
+    """
+    folded = 0
+    for submodule in module.modules():
+        if parametrize.is_parametrized(submodule, "weight"):
+            parametrize.remove_parametrizations(submodule, "weight", leave_parametrized=True)
+            folded += 1
+            continue
+        for hook in list(submodule._forward_pre_hooks.values()):
+            if isinstance(hook, WeightNorm) and hook.name == "weight":
+                torch.nn.utils.remove_weight_norm(submodule, "weight")
+                folded += 1
+                break
+    return folded
+
+
+def copy_module(module: nn.Module) -> nn.Module:
+    """
+    deepcopy 模型；torch.nn.utils.weight_norm 在有梯度时计算出的 weight 不是叶子节点，无法 deepcopy，
+    先在 no_grad 下重新计算一次
+    """
+    with torch.no_grad():
+        for submodule in module.modules():
+            for hook in submodule._forward_pre_hooks.values():
+                if isinstance(hook, WeightNorm):
+                    setattr(submodule, hook.name, hook.compute_weight(submodule))
+    return copy.deepcopy(module)
+
+
+def drop_modules(module: nn.Module, names: Iterable[str]) -> list:
+    """
+    删除只在训练时使用的子模块，如 enc_q
+    :return: 实际删除的子模块名称
+    """
+    dropped = []
+    for name in names:
+        if hasattr(module, name):
+            delattr(module, name)
+            dropped.append(name)
+    return dropped
+
+
+def max_abs_diff(reference, test) -> float:
+    if isinstance(reference, (tuple, list)):
+        return max(max_abs_diff(r, t) for r, t in zip(reference, test) if isinstance(r, torch.Tensor))
+    return float((reference.float() - test.float()).abs().max())
+
+
+class InferenceOptimizer:
+    """
+    模型加载阶段的推理优化：折叠 weight_norm、删除训练用子模块，可选 torch.compile，
+    并在固定输入上校验优化前后的输出一致
+    :param fold_weight_norm: 是否折叠 weight_norm
+    :param drop: 删除的训练用子模块名称
+    :param compile: 是否对 infer 使用 torch.compile，失败时保持 eager
+    :param verify: 是否校验优化前后输出一致，需要临时保留一份原模型
+    :param atol: 校验的最大绝对误差
+    """
+
+    def __init__(self, fold_weight_norm: bool = True, drop: Iterable[str] = (), compile: bool = False,
+                 verify: bool = False, atol: float = 1e-4):
+        self.fold_weight_norm = fold_weight_norm
+        self.drop = tuple(drop)
+        self.compile = compile
+        self.verify = verify
+        self.atol = atol
+
+    @classmethod
+    def from_config(cls, cfg=None, drop: Iterable[str] = ()):
+        if cfg is None:
+            return cls(drop=drop)
+        return cls(fold_weight_norm=bool(cfg.get("fold_weight_norm", True)),
+                   drop=drop,
+                   compile=bool(cfg.get("compile", False)),
+                   verify=bool(cfg.get("verify", False)),
+                   atol=float(cfg.get("atol", 1e-4)))
+
+    def __call__(self, module: nn.Module, example_fn: Optional[Callable[[nn.Module], object]] = None) -> nn.Module:
+        """
+        :param module: 已加载权重并 eval 的模型，原地修改
+        :param example_fn: callable(module) -> 输出，verify 为 True 时在优化前后各调用一次，随机数种子相同
+        :return: 优化后的模型
+        """
+        reference, original = None, None
+        if self.verify and example_fn is not None:
+            reference = self._run(example_fn, module)
+            original = copy_module(module)
+
+        dropped = drop_modules(module, self.drop)
+        folded = fold_weight_norm(module) if self.fold_weight_norm else 0
+        if self.compile:
+            self._compile(module)
+        logger.info(f'Inference optimized {module.__class__.__name__}, dropped:{dropped}, '
+                     f'folded weight_norm:{folded}, compile:{self.compile}')
+
+        if reference is not None:
+            diff = max_abs_diff(reference, self._run(example_fn, module))
+            if diff > self.atol:
+                logger.warning(f'Inference optimization changed outputs of {module.__class__.__name__}, '
+                               f'max abs diff:{diff} > {self.atol}, keep the original model')
+                return original
+            logger.info(f'Inference optimization verified, max abs diff:{diff}')
+        return module
+
+    @staticmethod
+    def _run(example_fn: Callable[[nn.Module], object], module: nn.Module):
+        with torch.random.fork_rng(), torch.no_grad():
+            torch.manual_seed(0)
+            return copy.deepcopy(example_fn(module))
+
+    @staticmethod
+    def _compile(module: nn.Module):
+        """
+        合成器通过 infer 而不是 forward 推理，这里编译 infer；时间维度是动态的，使用 dynamic=True
+        """
+        if not hasattr(torch, "compile"):
+            logger.warning('torch.compile is not available, keep eager')
+            return
+        try:
+            module.infer = torch.compile(module.infer, dynamic=True)
+        except Exception as e:
+            logger.warning(f'torch.compile failed, keep eager, {e.__class__.__name__}: {e}')
@@ -0,0 +1,152 @@
+"""
+采样率转换，所有重采样都走这里
+
+按 (orig_sr, target_sr, quality) 缓存多相 FIR 滤波器，整段与批量音频使用 scipy 的 upfirdn 实现，
+流式输入使用同一个滤波器逐块计算，输出与整段重采样一致
+"""
+import logging
+from functools import lru_cache
+from math import gcd
+
+import numpy as np
+from scipy import signal
+
+logger = logging.getLogger('speaker_runner')
+
+
+def set_resample_logger(l):
+    global logger
+    logger = l
+
+
+# 质量档位：(每侧过零点数, 截止频率相对奈奎斯特频率的比例, kaiser 窗 beta)
+QUALITY = {
+    "fast": (8, 0.90, 6.0),
+    "default": (16, 0.94, 8.6),
+    "best": (32, 0.95, 12.0),
+}
+
+
+class ResampleKernel:
+    """
+    up/down 多相重采样滤波器
+    :param orig_sr:
+    :param target_sr:
+    :param quality: fast、default、best
+    """
+
+    def __init__(self, orig_sr: int, target_sr: int, quality: str = "default"):
+        if quality not in QUALITY:
+            raise ValueError(f'Unknown resample quality: {quality}, expected one of {list(QUALITY)}')
+        zero_crossings, rolloff, beta = QUALITY[quality]
+        g = gcd(int(orig_sr), int(target_sr))
+        self.orig_sr = int(orig_sr)
+        self.target_sr = int(target_sr)
+        self.quality = quality
+        self.up = self.target_sr // g
+        self.down = self.orig_sr // g
+        max_rate = max(self.up, self.down)
+        self.half_len = zero_crossings * max_rate
+        self.h = signal.firwin(2 * self.half_len + 1, rolloff / max_rate, window=("kaiser", beta))
+        # float32 输入使用 float32 滤波器，upfirdn 直接以 float32 计算，不产生 float64 的整段中间结果
+        self.h32 = self.h.astype(np.float32)
+        # 多相分解，polyphase[p, j] = h[p + j * up] * up，输出第 m 个点使用
+        # 相位 p = (m * down + half_len) % up 与输入 x[i0 - j]，i0 = (m * down + half_len) // up
+        self.taps = -(-self.h.shape[0] // self.up)
+        h = np.zeros(self.taps * self.up)
+        h[:self.h.shape[0]] = self.h * self.up
+        self.polyphase = h.reshape(self.taps, self.up).T.astype(np.float32)
+
+    def output_length(self, n: int) -> int:
+        return -(-n * self.up // self.down)
+
+    def __repr__(self) -> str:
+        return (f'ResampleKernel({self.orig_sr}->{self.target_sr}, quality={self.quality}, '
+                f'up={self.up}, down={self.down}, taps={self.taps})')
+
+
+@lru_cache(maxsize=64)
+def get_kernel(orig_sr: int, target_sr: int, quality: str = "default") -> ResampleKernel:
+    kernel = ResampleKernel(orig_sr, target_sr, quality)
+    logger.debug(f'Designed {kernel}')
+    return kernel
+
+
+def resample(audio: np.ndarray, orig_sr: int, target_sr: int, quality: str = "default",
+             axis: int = -1) -> np.ndarray:
+    """
+    整段或批量重采样，批量时各条音频沿 axis 长度相同
+    :param audio: 浮点音频，(samples,) 或 (batch, samples)
+    :param orig_sr:
+    :param target_sr:
+    :param quality: fast、default、best
+    :param axis: 采样点所在的维度
+    :return: 与输入 dtype 相同的音频
+    """
+    audio = np.asarray(audio)
+    if int(orig_sr) == int(target_sr):
+        return audio
+    kernel = get_kernel(int(orig_sr), int(target_sr), quality)
+    dtype = audio.dtype if np.issubdtype(audio.dtype, np.floating) else np.float32
+    window = kernel.h32 if audio.dtype == np.float32 else kernel.h
+    return signal.resample_poly(audio, kernel.up, kernel.down, axis=axis, window=window).astype(dtype, copy=False)
+
+
+class StreamResampler:
+    """
+    流式重采样，push 的各块输出拼接后与整段 resample 的结果一致，输入结束后调用 flush 取出末尾
+    :param orig_sr:
+    :param target_sr:
+    :param quality: fast、default、best
+    """
+
+    def __init__(self, orig_sr: int, target_sr: int, quality: str = "default"):
+        self.kernel = get_kernel(int(orig_sr), int(target_sr), quality)
+        self.reset()
+
+    def reset(self):
+        self._buffer = np.zeros(0, dtype=np.float32)
+        self._offset = 0  # _buffer[0] 在输入中的位置
+        self._received = 0
+        self._emitted = 0
+
+    def push(self, audio: np.ndarray) -> np.ndarray:
+        """
+        :param audio: 单声道浮点音频块
+        :return: 已经可以计算的输出，可能为空
+        """
+        audio = np.asarray(audio, dtype=np.float32)
+        self._buffer = np.concatenate([self._buffer, audio])
+        self._received += audio.shape[0]
+        kernel = self.kernel
+        # 第 m 个输出需要的最后一个输入为 (m * down + half_len) // up
+        ready = (self._received * kernel.up - kernel.half_len - 1) // kernel.down + 1
+        return self._emit(max(ready, self._emitted))
+
+    def flush(self) -> np.ndarray:
+        """
+        输入结束，之后的输入按 0 处理，输出剩余的点并重置
+        """
+        output = self._emit(self.kernel.output_length(self._received))
+        self.reset()
+        return output
+
+    def _emit(self, end: int) -> np.ndarray:
+        kernel = self.kernel
+        m = np.arange(self._emitted, end)
+        if m.shape[0] == 0:
+            return np.zeros(0, dtype=np.float32)
+        t = m * kernel.down + kernel.half_len
+        phase, i0 = t % kernel.up, t // kernel.up
+        index = i0[:, None] - np.arange(kernel.taps)[None, :] - self._offset
+        valid = (index >= 0) & (index < self._buffer.shape[0])
+        x = np.where(valid, self._buffer[np.clip(index, 0, max(self._buffer.shape[0] - 1, 0))]
+                     if self._buffer.shape[0] > 0 else 0, 0)
+        output = np.einsum("ij,ij->i", kernel.polyphase[phase], x).astype(np.float32)
+        self._emitted = end
+        # 丢弃之后的输出不再需要的输入
+        keep_from = (end * kernel.down + kernel.half_len) // kernel.up - kernel.taps + 1
+        drop = min(max(0, keep_from - self._offset), self._buffer.shape[0])
+        self._buffer = self._buffer[drop:]
+        self._offset += drop
+        return output
@@ -0,0 +1,252 @@
+"""
+推理线程预算与 CPU 亲和性
+
+hubert、faiss 检索、pyworld/rmvpe 与合成器默认都会占满所有核，同一台机器上运行多个 web_runner 进程时严重超额订阅。
+ThreadBudget 为进程设置默认线程数(torch、faiss、OpenMP/BLAS)，并可以按阶段单独设置；
+affinity 把进程绑定到一组核上，多个 worker 按 SPEAKERS_WORKER_INDEX 依次分配不重叠的核。
+每个阶段统计调用次数、墙钟时间与进程 CPU 时间，CPU 时间 / 墙钟时间 即该阶段实际使用的核数
+"""
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Tuple, Union
+
+import torch
+
+logger = logging.getLogger('speaker_runner')
+
+
+def set_threads_logger(l):
+    global logger
+    logger = l
+
+
+# worker 进程序号的环境变量，affinity 为 auto 时据此分配核
+WORKER_INDEX_ENV = "SPEAKERS_WORKER_INDEX"
+# 进程线程数同时写入这些环境变量，之后启动的子进程与延迟加载的库使用同样的预算
+THREAD_ENV_VARS = ("OMP_NUM_THREADS", "MKL_NUM_THREADS", "OPENBLAS_NUM_THREADS", "NUMEXPR_NUM_THREADS",
+                   "VECLIB_MAXIMUM_THREADS")
+
+
+def parse_cpus(cpus: Union[str, List[int]]) -> List[int]:
+    """
+    "0-3,8,10-11" 或 [0, 1, 2] 形式的核列表
+    """
+    if isinstance(cpus, str):
+        result = []
+        for part in cpus.split(","):
+            part = part.strip()
+            if not part:
+                continue
+            if "-" in part:
+                start, end = part.split("-")
+                result.extend(range(int(start), int(end) + 1))
+            else:
+                result.append(int(part))
+        return result
+    return [int(cpu) for cpu in cpus]
+
+
+def available_cpus() -> List[int]:
+    if hasattr(os, "sched_getaffinity"):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count() or 1))
+
+
+def worker_cpus(worker_index: int, num_threads: int, cpus: List[int] = None) -> List[int]:
+    """
+    第 worker_index 个 worker 的核，每个 worker num_threads 个，超出核数时从头循环
+    """
+    cpus = cpus or available_cpus()
+    num_threads = max(1, min(num_threads, len(cpus)))
+    start = (worker_index * num_threads) % len(cpus)
+    return [cpus[(start + i) % len(cpus)] for i in range(num_threads)]
+
+
+class StageStats:
+    """
+    单个阶段的累计耗时
+    """
+
+    def __init__(self):
+        self.calls = 0
+        self.wall_seconds = 0.0
+        self.cpu_seconds = 0.0
+
+    def to_dict(self, threads: int) -> dict:
+        cores = self.cpu_seconds / self.wall_seconds if self.wall_seconds > 0 else 0.0
+        return {
+            'calls': self.calls,
+            'threads': threads,
+            'wall_seconds': self.wall_seconds,
+            'cpu_seconds': self.cpu_seconds,
+            # 平均使用的核数，与线程预算之比为利用率
+            'cores': cores,
+            'utilisation': cores / threads if threads > 0 else 0.0,
+        }
+
+
+class ThreadBudget:
+    """
+    :param num_threads: 进程默认线程数，0 表示不设置(库的默认值，通常为所有核)
+    :param interop_threads: torch 算子间线程数，0 表示不设置
+    :param stages: 阶段线程数，如 {"hubert": 4, "synthesizer": 8}，0 或未配置的阶段使用 num_threads
+    :param affinity: 绑定的核，"auto" 按 worker 序号分配 num_threads 个核，也可以是 "0-7" 或核列表，为空不绑定
+    :param worker_index: worker 序号，为空时读取环境变量 SPEAKERS_WORKER_INDEX
+    """
+
+    def __init__(self,
+                 num_threads: int = 0,
+                 interop_threads: int = 0,
+                 stages: Dict[str, int] = None,
+                 affinity: Union[str, List[int], None] = None,
+                 worker_index: Optional[int] = None):
+        self.num_threads = int(num_threads or 0)
+        self.interop_threads = int(interop_threads or 0)
+        self.stages = {name: int(threads or 0) for name, threads in (stages or {}).items()}
+        self.affinity = affinity
+        if worker_index is None:
+            worker_index = int(os.getenv(WORKER_INDEX_ENV, "0") or 0)
+        self.worker_index = worker_index
+        self.cpus: Optional[List[int]] = None
+        self._stats: Dict[str, StageStats] = {}
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    @classmethod
+    def from_config(cls, cfg=None):
+        if cfg is None:
+            return cls()
+        stages = cfg.get("stages")
+        return cls(num_threads=cfg.get("num_threads", 0),
+                   interop_threads=cfg.get("interop_threads", 0),
+                   stages=dict(stages) if stages is not None else None,
+                   affinity=cfg.get("affinity", None) or None)
+
+    def apply(self):
+        """
+        在模型加载之前调用：绑定核，设置进程默认线程数与环境变量
+        """
+        if self.affinity:
+            if self.affinity == "auto":
+                self.cpus = worker_cpus(self.worker_index, self.num_threads or 1)
+            else:
+                self.cpus = parse_cpus(self.affinity)
+            if hasattr(os, "sched_setaffinity"):
+                os.sched_setaffinity(0, self.cpus)
+            else:
+                logger.warning('CPU affinity is not supported on this platform')
+        if self.num_threads > 0:
+            for name in THREAD_ENV_VARS:
+                os.environ[name] = str(self.num_threads)
+            try:
+                from threadpoolctl import threadpool_limits
+                threadpool_limits(limits=self.num_threads)
+            except ImportError:
+                pass
+        if self.interop_threads > 0:
+            try:
+                torch.set_num_interop_threads(self.interop_threads)
+            except RuntimeError as e:
+                # 已经执行过并行算子后不能再修改
+                logger.warning(f'torch.set_num_interop_threads: {e}')
+        self._set_threads(self.num_threads)
+        logger.info(f'Thread budget: worker:{self.worker_index}, threads:{self.num_threads or "default"}, '
+                    f'interop:{self.interop_threads or "default"}, stages:{self.stages}, cpus:{self.cpus}')
+
+    def threads_for(self, name: str) -> int:
+        return self.stages.get(name) or self.num_threads
+
+    @staticmethod
+    def _set_threads(threads: int):
+        if threads <= 0:
+            return
+        if torch.get_num_threads() != threads:
+            torch.set_num_threads(threads)
+        try:
+            import faiss
+            faiss.omp_set_num_threads(threads)
+        except ImportError:
+            pass
+
+    @staticmethod
+    def _get_threads() -> Tuple[int, Optional[int]]:
+        """
+        当前的 torch 与 faiss 线程数，faiss 未安装时为 None
+        """
+        try:
+            import faiss
+            faiss_threads = faiss.omp_get_max_threads()
+        except ImportError:
+            faiss_threads = None
+        return torch.get_num_threads(), faiss_threads
+
+    @staticmethod
+    def _restore_threads(saved: Tuple[int, Optional[int]]):
+        torch_threads, faiss_threads = saved
+        if torch.get_num_threads() != torch_threads:
+            torch.set_num_threads(torch_threads)
+        if faiss_threads is not None:
+            import faiss
+            faiss.omp_set_num_threads(faiss_threads)
+
+    @contextmanager
+    def stage(self, name: str):
+        """
+        在阶段的线程预算下执行，累计耗时；嵌套的阶段只按最外层统计
+        """
+        depth = getattr(self._local, "depth", 0)
+        if depth > 0:
+            yield
+            return
+        threads = self.threads_for(name)
+        self._local.depth = 1
+        # 阶段结束后恢复进入前的实际线程数：num_threads 为 0 时进程没有可恢复的预算值
+        saved = None
+        if threads > 0 and threads != self.num_threads:
+            saved = self._get_threads()
+            self._set_threads(threads)
+        wall, cpu = time.perf_counter(), time.process_time()
+        try:
+            yield
+        finally:
+            wall, cpu = time.perf_counter() - wall, time.process_time() - cpu
+            if saved is not None:
+                self._restore_threads(saved)
+            self._local.depth = 0
+            with self._lock:
+                stats = self._stats.setdefault(name, StageStats())
+                stats.calls += 1
+                stats.wall_seconds += wall
+                stats.cpu_seconds += cpu
+
+    @property
+    def stats(self) -> dict:
+        with self._lock:
+            return {name: stats.to_dict(self.threads_for(name) or torch.get_num_threads())
+                    for name, stats in self._stats.items()}
+
+    def reset_stats(self):
+        with self._lock:
+            self._stats.clear()
+
+
+thread_budget = ThreadBudget()
+
+
+def set_thread_budget(budget: ThreadBudget):
+    global thread_budget
+    thread_budget = budget
+
+
+def get_thread_budget() -> ThreadBudget:
+    return thread_budget
+
+
+def stage(name: str):
+    """
+    thread_budget.stage 的简写，模块加载后替换的预算同样生效
+    """
+    return thread_budget.stage(name)
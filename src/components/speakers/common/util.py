@@ -79,7 +79,8 @@ async def call_edge_tts(speaker_name: str, text: str):
     )
     (tts_wav, _) = await ffmpeg_proc.communicate(tts_raw)
 
-    return librosa.load(BytesIO(tts_wav))
+    # 保留 edge-tts 的原始采样率，重采样在变声阶段一次完成
+    return librosa.load(BytesIO(tts_wav), sr=None)
 
 
 async def call_edge_tts_config(speaker_name: str, text: str, rate: str, volume: str):
@@ -104,4 +105,5 @@ async def call_edge_tts_config(speaker_name: str, text: str, rate: str, volume:
     )
     (tts_wav, _) = await ffmpeg_proc.communicate(tts_raw)
 
-    return librosa.load(BytesIO(tts_wav))
+    # 保留 edge-tts 的原始采样率，重采样在变声阶段一次完成
+    return librosa.load(BytesIO(tts_wav), sr=None)
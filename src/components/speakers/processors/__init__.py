@@ -9,7 +9,7 @@ from typing import List
 from speakers.common.registry import registry
 from speakers.processors.base_processor import BaseProcessor
 from speakers.processors.base_processor import ProcessorData
-from speakers.processors.rvc_speakers_processor import RvcProcessorData
+from speakers.processors.rvc_speakers_processor import RvcProcessorData, RvcMultiVoiceProcessorData, RvcVoiceTarget
 from speakers.processors.vits_to_voice import VitsProcessorData
 from speakers.processors.bark_to_voice import BarkProcessorData
 from speakers.processors.edge_to_voice import EdgeProcessorData
@@ -18,6 +18,8 @@ __all__ = [
     "BaseProcessor",
     "ProcessorData",
     "RvcProcessorData",
+    "RvcMultiVoiceProcessorData",
+    "RvcVoiceTarget",
     "VitsProcessorData",
     "BarkProcessorData",
     "EdgeProcessorData",
@@ -19,7 +19,7 @@ def set_bark_to_voice_logger(l):
     logger = l
 
 
-silence = np.zeros(int(0.25 * SAMPLE_RATE))  # quarter second of silence
+silence = np.zeros(int(0.25 * SAMPLE_RATE), dtype=np.float32)  # quarter second of silence
 
 
 def get_text(text, hps):
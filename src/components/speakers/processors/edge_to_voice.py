@@ -110,4 +110,5 @@ class EdgeToVoice(BaseProcessor):
         )
         (tts_wav, _) = await ffmpeg_proc.communicate(tts_raw)
 
-        return librosa.load(BytesIO(tts_wav))
+        # 保留 edge-tts 的原始采样率，重采样在变声阶段一次完成
+        return librosa.load(BytesIO(tts_wav), sr=None)
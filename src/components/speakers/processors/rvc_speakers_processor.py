@@ -6,6 +6,7 @@ import json
 import os
 import torch
 import logging
+from time import time as ttime
 from speakers.rvc.infer_pack.models import (
     SynthesizerTrnMs768NSFsid,
     SynthesizerTrnMs768NSFsid_nono,
@@ -15,11 +16,24 @@ from speakers.rvc.infer_pack.models import (
 from os import getenv
 from typing import Union, Tuple, List
 from speakers.rvc.vc_infer_pipeline import VC
+from speakers.rvc.streaming import StreamingVC
+from speakers.rvc.index_cache import FeatureIndexCache
+from speakers.rvc.feature_cache import HubertFeatureCache, hubert_identity
+from speakers.rvc.f0_cache import F0Cache
+from speakers.rvc.parallel_f0 import ParallelF0Extractor
+from speakers.rvc.pitch_estimators import pitch_estimators
+from speakers.rvc.model_manager import VoiceModel, VoiceModelManager
+from speakers.rvc.onnx_backend import OnnxSynthesizer, export_onnx
+from speakers.rvc.quantization import QuantizedModelCache, mel_distance, reference_clip, relative_error
 from speakers.processors import BaseProcessor, ProcessorData
 from speakers.common.utils import get_abs_path
 from omegaconf import OmegaConf
 from speakers.common.registry import registry
-from pydantic import Field
+from speakers.common.resample import resample
+from speakers.common.inference_optimizer import InferenceOptimizer
+from speakers.common.threads import get_thread_budget
+from speakers.common.audio import AudioBuffer
+from pydantic import BaseModel, Field
 
 logger = logging.getLogger('speaker_runner')
 
@@ -47,8 +61,9 @@ class RvcProcessorData(ProcessorData):
     sample_rate: int = Field(
         default=0
     )
-    audio_samples: List[float] = Field(
-        default=[]
+    """音频采样，进程内直接传递 numpy 缓冲区，不做列表转换"""
+    audio_samples: AudioBuffer = Field(
+        default_factory=AudioBuffer
     )
 
     model_index: int
@@ -75,6 +90,62 @@ class RvcProcessorData(ProcessorData):
         default=None
     )
 
+    class Config:
+        json_encoders = {
+            AudioBuffer: AudioBuffer.to_payload
+        }
+
+    @property
+    def type(self) -> str:
+        """Type of the Message, used for serialization."""
+        return "RVC"
+
+
+class RvcVoiceTarget(BaseModel):
+    """
+    多音色转换中的一个目标音色，参数含义与 RvcProcessorData 相同
+    """
+    model_index: int
+    """ 变调(整数, 半音数量, 升八度12降八度-12)"""
+    f0_up_key: int = 0
+    """检索特征占比"""
+    index_rate: float = 0
+    """输入源音量包络替换输出音量包络融合比例，越靠近1越使用输出包络"""
+    rms_mix_rate: float = 1
+    """后处理重采样至最终采样率，0为不进行重采样"""
+    resample_sr: int = 0
+    """保护清辅音和呼吸声，防止电音撕裂等artifact，拉满0.5不开启，调低加大保护力度但可能降低索引效果"""
+    protect: float = 0.33
+
+
+class RvcMultiVoiceProcessorData(ProcessorData):
+    """
+    同一段输入转换为多个音色，高通滤波、切分、F0 与 hubert 特征只计算一次
+    :param f0_method: 所有目标共用的 F0 提取方法
+    :param filter_radius: 所有目标共用
+    :param f0_file: 所有目标共用
+    :param targets: 目标音色列表
+    """
+    sample_rate: int = Field(
+        default=0
+    )
+    """音频采样，进程内直接传递 numpy 缓冲区，不做列表转换"""
+    audio_samples: AudioBuffer = Field(
+        default_factory=AudioBuffer
+    )
+    f0_method: str
+    """ >=3则使用对harvest音高识别的结果使用中值滤波，数值为滤波半径，使用可以削弱哑音"""
+    filter_radius: int
+    f0_file: str = Field(
+        default=None
+    )
+    targets: List[RvcVoiceTarget]
+
+    class Config:
+        json_encoders = {
+            AudioBuffer: AudioBuffer.to_payload
+        }
+
     @property
     def type(self) -> str:
         """Type of the Message, used for serialization."""
@@ -91,17 +162,20 @@ class RVCSpeakers(BaseProcessor):
     def __init__(self, hubert_model_path: str, rvc_config_file: str):
         # Reference: https://huggingface.co/spaces/zomehwh/rvc-models/blob/main/app.py#L21  # noqa
         self.in_hf_space = getenv('SYSTEM') == 'spaces'
-        self._loaded_models = []
         self._load_hubert(hubert_model_path=hubert_model_path)
         self._load_rvc_mode(rvc_config_file=rvc_config_file)
 
     def __call__(
             self,
-            data: RvcProcessorData
+            data: Union[RvcProcessorData, RvcMultiVoiceProcessorData]
     ):
-        # 将 Python 列表转换为 NumPy 数组
-        audio_samples_np = np.array(data.audio_samples, dtype=np.float32)
-        input_audio = (data.sample_rate, audio_samples_np)
+        input_audio = (data.sample_rate, data.audio_samples.array)
+        if isinstance(data, RvcMultiVoiceProcessorData):
+            return self.vc_multi(input_audio=input_audio,
+                                 targets=data.targets,
+                                 f0_method=data.f0_method,
+                                 filter_radius=data.filter_radius,
+                                 f0_file=data.f0_file)
 
         return self.vc_func(input_audio=input_audio,
                             model_index=data.model_index,
@@ -132,12 +206,13 @@ class RVCSpeakers(BaseProcessor):
 
     @property
     def loaded_models(self):
-        return self._loaded_models
+        return self.model_manager.voices
 
     def _load_hubert(self, hubert_model_path: str):
 
         # Load hubert model
         logger.info(f'Load hubert model{hubert_model_path}')
+        self.hubert_model_path = hubert_model_path
         self.hubert_model = util.load_hubert_model(registry.get("device"), model_path=hubert_model_path)
         self.hubert_model.eval()
         logger.info('Loaded hubert model')
@@ -154,10 +229,59 @@ class RVCSpeakers(BaseProcessor):
         multi_cfg = OmegaConf.load(get_abs_path(rvc_config_file))
         rmvpe_path = os.path.join(registry.get_path("rvc_library_root"), multi_cfg.get("rmvpe_path"))
         logger.info(f'rmvpe_path:{rmvpe_path}')
+        # cpu 上的动态 int8 量化，hubert 与各音色的合成器共用同一个量化缓存目录
+        self.quantization_cfg = multi_cfg.get("quantization")
+        self.quantized_cache = None
+        if self.quantization_cfg is not None and self.quantization_cfg.get("enabled", False):
+            if registry.get("device") != "cpu":
+                logger.warning(f'quantization only supports cpu, device:{registry.get("device")}')
+            else:
+                self.quantized_cache = QuantizedModelCache(
+                    os.path.join(registry.get_path("rvc_library_root"),
+                                 self.quantization_cfg.get("cache_dir", "cache/quantized")))
+                if self.quantization_cfg.get("hubert", True):
+                    self._quantize_hubert()
+        # 合成器加载阶段的推理优化，折叠 weight_norm 并删除训练用的 enc_q
+        self.inference_optimizer = InferenceOptimizer.from_config(multi_cfg.get("inference_optimization"),
+                                                                  drop=("enc_q",))
+        # 检索索引缓存，所有音色共享同一个内存上限
+        index_cache_cfg = multi_cfg.get("index_cache")
+        self.index_cache = FeatureIndexCache.from_config(index_cache_cfg)
+        index_preload = index_cache_cfg is not None and index_cache_cfg.get("preload", False)
+        # hubert 特征缓存，所有音色共享，同一段音频换音色或调参时跳过 hubert 推理；
+        # 键包含量化之后的 hubert 标识，换 checkpoint、精度或量化配置后不会读到旧的特征
+        self.feature_cache = HubertFeatureCache.from_config(multi_cfg.get("feature_cache"),
+                                                            spill_root=registry.get_path("rvc_library_root"),
+                                                            model_id=hubert_identity(self.hubert_model,
+                                                                                     self.hubert_model_path))
+        # F0 缓存，所有音色共享，缓存变调前的原始 F0
+        self.f0_cache = F0Cache.from_config(multi_cfg.get("f0_cache"))
+        # harvest、pm 分块并行提取，进程池所有音色共享
+        self.parallel_f0 = ParallelF0Extractor.from_config(multi_cfg.get("parallel_f0"))
+        # 长音频分段后每批推理的段数
+        segment_batch_size = int(multi_cfg.get("segment_batch_size", 1) or 1)
+        # 长音频切点策略
+        cut_strategy = multi_cfg.get("cut_strategy", "sum") or "sum"
+        # 流式变声的默认分块参数
+        streaming = multi_cfg.get("streaming")
+        self._rvc_options = dict(rmvpe_path=rmvpe_path,
+                                 index_preload=index_preload,
+                                 segment_batch_size=segment_batch_size,
+                                 cut_strategy=cut_strategy,
+                                 resample_quality=multi_cfg.get("resample_quality", "default") or "default",
+                                 sweep_batch_size=int(multi_cfg.get("sweep_batch_size", 0) or 0),
+                                 streaming=dict(streaming) if streaming is not None else {})
+        # 合成器推理后端，torch 或 onnxruntime，可以在每个音色的配置中单独指定
+        backend = multi_cfg.get("backend", "torch") or "torch"
+        # 音色模型只登记元数据，合成器在首次请求时加载，按 LRU 控制常驻数量
+        model_cache_cfg = multi_cfg.get("model_cache")
+        self.model_manager = VoiceModelManager.from_config(self._load_voice_model,
+                                                           cfg=model_cache_cfg,
+                                                           on_evict=self._evict_voice_model)
         for item in multi_cfg.get('models'):
             for key, model_info in item.items():  # 使用 .items() 方法获取键值对
 
-                logger.info(f'Loading model: {key}')
+                logger.info(f'Register model: {key}')
                 model_name = model_info.get("model_name")
                 # Load model info
                 model_info_config_file = os.path.join(registry.get_path("rvc_library_root"),
@@ -171,89 +295,198 @@ class RVCSpeakers(BaseProcessor):
                     model_info_config['feat_index'] = os.path.join(registry.get_path("rvc_library_root"),
                                                                    model_info.get("path"),
                                                                    model_info_config['feat_index'])
-                # Load RVC checkpoint
                 torch_file = os.path.join(registry.get_path("rvc_library_root"),
                                           model_info.get("path"),
                                           model_info_config['model'])
-                cpt = torch.load(
-                    torch_file,
-                    map_location='cpu'
-                )
-                tgt_sr = cpt['config'][-1]
-                cpt['config'][-3] = cpt['weight']['emb_g.weight'].shape[0]  # n_spk
-
-                if_f0 = cpt.get('f0', 1)
-                version = cpt.get("version", "v1")
-
-                logger.info(f'Loading model: {key},if_f0:{if_f0},version:{version}')
-                synthesizer_class = {
-                    ("v1", 1): SynthesizerTrnMs256NSFsid,
-                    ("v1", 0): SynthesizerTrnMs256NSFsid_nono,
-                    ("v2", 1): SynthesizerTrnMs768NSFsid,
-                    ("v2", 0): SynthesizerTrnMs768NSFsid_nono,
-                }
-
-                net_g = synthesizer_class.get(
-                    (version, if_f0), SynthesizerTrnMs256NSFsid
-                )(*cpt["config"], is_half=util.is_half(registry.get("device")))
-
-                del net_g.enc_q
-
-                # According to original code, this thing seems necessary.
-                logger.info(net_g.load_state_dict(cpt['weight'], strict=False))
-
-                net_g.eval().to(registry.get("device"))
-                net_g = net_g.half() if util.is_half(registry.get("device")) else net_g.float()
-
-                vc = VC(tgt_sr,
-                        registry.get("x_pad"),
-                        registry.get("x_query"),
-                        registry.get("x_center"),
-                        registry.get("x_max"),
-                        registry.get("is_half"),
-                        registry.get("device"),
-                        rmvpe_path=rmvpe_path
-                        )
-
-                self._loaded_models.append(dict(
-                    name=model_name,
-                    metadata=model_info_config,
-                    vc=vc,
-                    net_g=net_g,
-                    if_f0=if_f0,
-                    target_sr=tgt_sr,
-                    version=version
-                ))
-
-        logger.info(f'Models loaded:rvc_speakers, len:{len(self._loaded_models)}')
-
-    def vc_func(
-            self,
-            input_audio: Tuple[int, np.ndarray], model_index, f0_up_key, f0_method: str, index_rate,
-            filter_radius, rms_mix_rate, resample_sr, protect: float = 0.33, f0_file: str = None
-    ) -> Tuple[int, np.ndarray]:
+                onnx_file = model_info.get("onnx_path")
+                if onnx_file:
+                    onnx_file = os.path.join(registry.get_path("rvc_library_root"), onnx_file)
+                self.model_manager.register(VoiceModel(name=model_name,
+                                                       path=model_info.get("path"),
+                                                       torch_file=torch_file,
+                                                       metadata=model_info_config,
+                                                       backend=model_info.get("backend", backend),
+                                                       onnx_file=onnx_file))
+
+        logger.info(f'Models registered:rvc_speakers, len:{len(self.model_manager)}')
+        prefetch = model_cache_cfg.get("prefetch") if model_cache_cfg is not None else None
+        if prefetch:
+            self.model_manager.prefetch(list(prefetch))
+            logger.info(f'Models prefetched:rvc_speakers, {self.model_manager.stats}')
+
+        # 音高估计模型进程内共享，按配置在启动阶段预加载
+        f0_preload = multi_cfg.get("f0_preload") or []
+        if len(f0_preload) > 0:
+            pitch_estimators.preload(list(f0_preload),
+                                     model_paths={"rmvpe": rmvpe_path, "crepe": "full"},
+                                     is_half=registry.get("is_half"),
+                                     device=registry.get("device"))
+            logger.info(f'Pitch estimators loaded: {pitch_estimators.memory_footprint()}')
+
+    def _load_voice_model(self, voice: VoiceModel) -> dict:
         """
-            # https://github.com/fumiama/Retrieval-based-Voice-Conversion-WebUI/blob/main/infer-web.py#L118  # noqa
-        :param f0_up_key:  变调(整数, 半音数量, 升八度12降八度-12)
-        :param input_audio:
-        :param f0_file:  F0曲线文件, 可选, 一行一个音高, 代替默认F0及升降调
-        :param protect: 保护清辅音和呼吸声，防止电音撕裂等artifact，拉满0.5不开启，调低加大保护力度但可能降低索引效果
-        :param model_index:
-        :param f0_method:
-        :param index_rate: 检索特征占比
-        :param filter_radius: >=3则使用对harvest音高识别的结果使用中值滤波，数值为滤波半径，使用可以削弱哑音
-        :param rms_mix_rate: 输入源音量包络替换输出音量包络融合比例，越靠近1越使用输出包络
-        :param resample_sr: 后处理重采样至最终采样率，0为不进行重采样
+        加载音色 checkpoint 并构建合成器
+        :param voice:
         :return:
         """
-        if input_audio is None:
-            raise RuntimeError("Please provide input audio.")
+        # Load RVC checkpoint
+        cpt = torch.load(
+            voice.torch_file,
+            map_location='cpu'
+        )
+        tgt_sr = cpt['config'][-1]
+        cpt['config'][-3] = cpt['weight']['emb_g.weight'].shape[0]  # n_spk
+
+        if_f0 = cpt.get('f0', 1)
+        version = cpt.get("version", "v1")
+
+        logger.info(f'Loading model: {voice.name},if_f0:{if_f0},version:{version},backend:{voice.backend}')
+        if voice.backend == "onnxruntime" and if_f0 == 1:
+            net_g = self._load_onnx_synthesizer(voice)
+        else:
+            if voice.backend == "onnxruntime":
+                logger.warning(f'onnxruntime backend only supports f0 models, fallback to torch: {voice.name}')
+            net_g = self._load_torch_synthesizer(cpt, if_f0, version, voice.torch_file)
+        del cpt
+
+        vc = VC(tgt_sr,
+                registry.get("x_pad"),
+                registry.get("x_query"),
+                registry.get("x_center"),
+                registry.get("x_max"),
+                registry.get("is_half"),
+                registry.get("device"),
+                rmvpe_path=self._rvc_options['rmvpe_path'],
+                index_cache=self.index_cache,
+                batch_size=self._rvc_options['segment_batch_size'],
+                cut_strategy=self._rvc_options['cut_strategy'],
+                feature_cache=self.feature_cache,
+                f0_cache=self.f0_cache,
+                parallel_f0=self.parallel_f0,
+                resample_quality=self._rvc_options['resample_quality'],
+                sweep_batch_size=self._rvc_options['sweep_batch_size']
+                )
+        if self._rvc_options['index_preload'] and voice.metadata.get('feat_index'):
+            self.index_cache.preload(voice.metadata['feat_index'])
+
+        return dict(
+            name=voice.name,
+            metadata=voice.metadata,
+            vc=vc,
+            net_g=net_g,
+            if_f0=if_f0,
+            target_sr=tgt_sr,
+            version=version
+        )
 
-        if model_index is None:
-            raise RuntimeError("Please select a model.")
+    def _load_torch_synthesizer(self, cpt: dict, if_f0: int, version: str, torch_file: str):
+        synthesizer_class = {
+            ("v1", 1): SynthesizerTrnMs256NSFsid,
+            ("v1", 0): SynthesizerTrnMs256NSFsid_nono,
+            ("v2", 1): SynthesizerTrnMs768NSFsid,
+            ("v2", 0): SynthesizerTrnMs768NSFsid_nono,
+        }
+
+        net_g = synthesizer_class.get(
+            (version, if_f0), SynthesizerTrnMs256NSFsid
+        )(*cpt["config"], is_half=util.is_half(registry.get("device")))
 
-        model = self._loaded_models[model_index]
+        # According to original code, this thing seems necessary.
+        logger.info(net_g.load_state_dict(cpt['weight'], strict=False))
+
+        # 在 fp32 权重上折叠 weight_norm、删除 enc_q，之后再转换精度
+        net_g = self.inference_optimizer(net_g.eval(), example_fn=self._synthesizer_probe(net_g, if_f0))
+
+        net_g.eval().to(registry.get("device"))
+        net_g = net_g.half() if util.is_half(registry.get("device")) else net_g.float()
+        if self.quantized_cache is not None and self.quantization_cfg.get("synthesizer", True):
+            net_g = self._quantize_synthesizer(net_g, torch_file, if_f0, cpt['config'][-1])
+        return net_g
+
+    @staticmethod
+    def _synthesizer_probe(net_g, if_f0: int):
+        """
+        合成器在固定输入上的推理，用于推理优化与量化的精度校验
+        :return: callable(model) -> 输出音频 tensor
+        """
+        generator = torch.Generator().manual_seed(0)
+        frames = 100
+        phone = torch.rand(1, frames, net_g.enc_p.emb_phone.in_features, generator=generator)
+        phone_lengths = torch.LongTensor([frames])
+        pitchf = torch.from_numpy(np.full((1, frames), 180.0, dtype=np.float32))
+        pitch = torch.full((1, frames), 60, dtype=torch.long)
+        sid = torch.LongTensor([0])
+
+        def infer(model):
+            if if_f0 == 1:
+                return model.infer(phone, phone_lengths, pitch, pitchf, sid)[0][0, 0]
+            return model.infer(phone, phone_lengths, sid)[0][0, 0]
+
+        return infer
+
+    def _quantize_hubert(self):
+        """
+        hubert 量化，以固定音频上的特征相对误差做精度校验
+        """
+        source = torch.from_numpy(reference_clip()).view(1, -1)
+
+        def feature_error(model, quantized):
+            inputs = {"source": source, "padding_mask": torch.zeros_like(source, dtype=torch.bool),
+                      "output_layer": 12}
+            with torch.no_grad():
+                return relative_error(model.extract_features(**inputs)[0], quantized.extract_features(**inputs)[0])
+
+        quantized = self.quantized_cache.quantize(self.hubert_model,
+                                                  self.hubert_model_path,
+                                                  "hubert",
+                                                  feature_error,
+                                                  float(self.quantization_cfg.get("max_feature_error", 0.1)))
+        if quantized is not None:
+            self.hubert_model = quantized.eval()
+
+    def _quantize_synthesizer(self, net_g, torch_file: str, if_f0: int, tgt_sr: int):
+        """
+        合成器量化，以固定输入下输出音频的梅尔谱距离做精度校验，未通过时返回 fp32 模型
+        """
+        probe = self._synthesizer_probe(net_g, if_f0)
+
+        def infer(model):
+            # 两次推理使用相同的随机数序列
+            with torch.random.fork_rng(), torch.no_grad():
+                torch.manual_seed(0)
+                return probe(model).numpy()
+
+        def synthesizer_error(model, quantized):
+            return mel_distance(infer(model), infer(quantized), sr=tgt_sr)
+
+        quantized = self.quantized_cache.quantize(net_g,
+                                                  torch_file,
+                                                  "net_g.folded" if self.inference_optimizer.fold_weight_norm
+                                                  else "net_g",
+                                                  synthesizer_error,
+                                                  float(self.quantization_cfg.get("max_mel_distance", 0.5)))
+        return net_g if quantized is None else quantized.eval()
+
+    def _load_onnx_synthesizer(self, voice: VoiceModel) -> OnnxSynthesizer:
+        """
+        onnx 文件不存在时先从 checkpoint 导出
+        """
+        onnx_file = voice.onnx_file or os.path.splitext(voice.torch_file)[0] + '.onnx'
+        if not os.path.exists(onnx_file):
+            export_onnx(voice.torch_file, onnx_file)
+        return OnnxSynthesizer(onnx_file)
 
+    def _evict_voice_model(self, voice: VoiceModel, model: dict):
+        """
+        音色被淘汰时一并释放其检索索引
+        """
+        if voice.metadata.get('feat_index'):
+            self.index_cache.evict(voice.metadata['feat_index'])
+
+    def _load_input_audio(self, input_audio: Tuple[int, np.ndarray]) -> np.ndarray:
+        """
+        输入音频转换为 16k 单声道 float32
+        """
         # Reference: so-vits
         (audio_samp, audio_npy) = input_audio
 
@@ -272,18 +505,10 @@ class RVCSpeakers(BaseProcessor):
             audio_npy = librosa.to_mono(audio_npy.transpose(1, 0))
 
         if audio_samp != 16000:
-            audio_npy = librosa.resample(
-                audio_npy,
-                orig_sr=audio_samp,
-                target_sr=16000
-            )
+            audio_npy = resample(audio_npy, audio_samp, 16000, self._rvc_options['resample_quality'])
+        return audio_npy
 
-        f0_up_key = int(f0_up_key)
-        times = [0, 0, 0]
-
-        checksum = hashlib.sha512()
-        checksum.update(audio_npy.tobytes())
-        feat_file_index = ''
+    def _feat_file_index(self, model: dict, index_rate) -> str:
         if (
                 model['metadata']['feat_index'] != ""
                 # and file_big_npy != ""
@@ -291,7 +516,48 @@ class RVCSpeakers(BaseProcessor):
                 and os.path.exists(model['metadata']['feat_index']) == True
                 and index_rate != 0
         ):
-            feat_file_index = model['metadata']['feat_index']
+            return model['metadata']['feat_index']
+        return ''
+
+    def vc_func(
+            self,
+            input_audio: Tuple[int, np.ndarray], model_index, f0_up_key, f0_method: str, index_rate,
+            filter_radius, rms_mix_rate, resample_sr, protect: float = 0.33, f0_file: str = None
+    ) -> Union[Tuple[int, np.ndarray], List[Tuple[int, np.ndarray]]]:
+        """
+            # https://github.com/fumiama/Retrieval-based-Voice-Conversion-WebUI/blob/main/infer-web.py#L118  # noqa
+        :param f0_up_key:  变调(整数, 半音数量, 升八度12降八度-12)，为列表时进入变调扫描模式，
+                           F0 与 hubert 特征只计算一次，返回与列表顺序一致的 [(采样率, 音频)]
+        :param input_audio:
+        :param f0_file:  F0曲线文件, 可选, 一行一个音高, 代替默认F0及升降调
+        :param protect: 保护清辅音和呼吸声，防止电音撕裂等artifact，拉满0.5不开启，调低加大保护力度但可能降低索引效果
+        :param model_index:
+        :param f0_method:
+        :param index_rate: 检索特征占比
+        :param filter_radius: >=3则使用对harvest音高识别的结果使用中值滤波，数值为滤波半径，使用可以削弱哑音
+        :param rms_mix_rate: 输入源音量包络替换输出音量包络融合比例，越靠近1越使用输出包络
+        :param resample_sr: 后处理重采样至最终采样率，0为不进行重采样
+        :return:
+        """
+        if input_audio is None:
+            raise RuntimeError("Please provide input audio.")
+
+        if model_index is None:
+            raise RuntimeError("Please select a model.")
+
+        if isinstance(f0_up_key, (list, tuple)):
+            return self._vc_sweep(input_audio, model_index, [int(key) for key in f0_up_key], f0_method,
+                                  index_rate, filter_radius, rms_mix_rate, resample_sr, protect, f0_file)
+
+        model = self.model_manager.get(model_index)
+        audio_npy = self._load_input_audio(input_audio)
+
+        f0_up_key = int(f0_up_key)
+        times = [0, 0, 0]
+
+        checksum = hashlib.sha512()
+        checksum.update(audio_npy.tobytes())
+        feat_file_index = self._feat_file_index(model, index_rate)
 
         output_audio = model['vc'].pipeline(
             self.hubert_model,
@@ -320,4 +586,190 @@ class RVCSpeakers(BaseProcessor):
         )
 
         logger.info(f'npy: {times[0]}s, f0: {times[1]}s, infer: {times[2]}s')
+        if self.feature_cache is not None:
+            logger.info(f'hubert feature cache: {self.feature_cache.stats}')
+        if self.f0_cache is not None:
+            logger.info(f'f0 cache: {self.f0_cache.stats}')
+        logger.info(f'stages: {get_thread_budget().stats}')
         return out_sr, output_audio
+
+    def _vc_sweep(
+            self,
+            input_audio: Tuple[int, np.ndarray], model_index, f0_up_keys: List[int], f0_method: str, index_rate,
+            filter_radius, rms_mix_rate, resample_sr, protect: float = 0.33, f0_file: str = None
+    ) -> List[Tuple[int, np.ndarray]]:
+        """
+        变调扫描，前处理只执行一次，每段的合成器推理按变调合并批次，
+        日志中给出总耗时与未开启缓存时逐个变调独立调用的估计耗时(不是实测值)
+        """
+        if not f0_up_keys:
+            raise RuntimeError("Please provide at least one f0_up_key.")
+        model = self.model_manager.get(model_index)
+        audio_npy = self._load_input_audio(input_audio)
+        times = [0, 0, 0]
+        checksum = hashlib.sha512()
+        checksum.update(audio_npy.tobytes())
+
+        start = ttime()
+        frontend = model['vc'].frontend(
+            self.hubert_model,
+            audio_npy,
+            checksum.hexdigest(),
+            times,
+            f0_method,
+            filter_radius,
+            versions=[model['version']],
+            if_f0=model['if_f0'],
+            f0_file=f0_file
+        )
+        frontend_seconds = ttime() - start
+        output_audios = model['vc'].sweep(
+            frontend,
+            model['net_g'],
+            model['metadata'].get('speaker_id', 0),
+            times,
+            f0_up_keys,
+            self._feat_file_index(model, index_rate),
+            index_rate,
+            model['if_f0'],
+            model['target_sr'],
+            resample_sr,
+            rms_mix_rate,
+            model['version'],
+            protect
+        )
+        total_seconds = ttime() - start
+
+        out_sr = (
+            resample_sr if 16000 <= resample_sr != model['target_sr']
+            else model['target_sr']
+        )
+        # 未开启 F0、hubert 特征缓存时，独立调用的每个变调都要重新执行前处理，这里按前处理耗时 × 变调数估计；
+        # 开启缓存(默认)时之后的独立调用命中缓存，实际收益小于此估计，实测见 development/bench_pitch_sweep.py
+        uncached_seconds = frontend_seconds * len(f0_up_keys) + (total_seconds - frontend_seconds)
+        caches_enabled = self.f0_cache is not None or self.feature_cache is not None
+        logger.info(f'sweep keys: {len(f0_up_keys)}, total: {total_seconds:.3f}s '
+                    f'(frontend: {frontend_seconds:.3f}s, render: {total_seconds - frontend_seconds:.3f}s), '
+                    f'uncached independent calls estimate: {uncached_seconds:.3f}s, '
+                    f'estimated speedup without caches: {uncached_seconds / max(total_seconds, 1e-9):.2f}x'
+                    f'{" (caches enabled, actual speedup is smaller)" if caches_enabled else ""}')
+        logger.info(f'npy: {times[0]}s, f0: {times[1]}s, infer: {times[2]}s')
+        logger.info(f'stages: {get_thread_budget().stats}')
+        return [(out_sr, output_audio) for output_audio in output_audios]
+
+    def vc_multi(
+            self,
+            input_audio: Tuple[int, np.ndarray], targets: List[RvcVoiceTarget], f0_method: str, filter_radius,
+            f0_file: str = None
+    ) -> List[Tuple[int, np.ndarray]]:
+        """
+        同一段输入转换为多个音色，高通滤波、切分、F0 提取与 hubert 特征只执行一次，
+        每个目标只执行检索与合成器
+        :param input_audio:
+        :param targets: 目标音色，可以是同一音色的不同变调
+        :param f0_method: 所有目标共用
+        :param filter_radius: 所有目标共用
+        :param f0_file: 所有目标共用
+        :return: 与 targets 顺序一致的 [(采样率, 音频)]
+        """
+        if input_audio is None:
+            raise RuntimeError("Please provide input audio.")
+        if not targets:
+            raise RuntimeError("Please select at least one model.")
+
+        audio_npy = self._load_input_audio(input_audio)
+        models = [self.model_manager.get(target.model_index) for target in targets]
+        times = [0, 0, 0]
+        checksum = hashlib.sha512()
+        checksum.update(audio_npy.tobytes())
+
+        # 切分与 t_pad 只与 x_pad 等全局配置有关，所有音色相同，使用第一个目标的 VC 做前处理
+        frontend = models[0]['vc'].frontend(
+            self.hubert_model,
+            audio_npy,
+            checksum.hexdigest(),
+            times,
+            f0_method,
+            filter_radius,
+            versions=[model['version'] for model in models],
+            if_f0=int(any(model['if_f0'] == 1 for model in models)),
+            f0_file=f0_file
+        )
+        outputs = []
+        for target, model in zip(targets, models):
+            output_audio = model['vc'].render(
+                frontend,
+                model['net_g'],
+                model['metadata'].get('speaker_id', 0),
+                times,
+                int(target.f0_up_key),
+                self._feat_file_index(model, target.index_rate),
+                target.index_rate,
+                model['if_f0'],
+                model['target_sr'],
+                target.resample_sr,
+                target.rms_mix_rate,
+                model['version'],
+                target.protect
+            )
+            out_sr = (
+                target.resample_sr if 16000 <= target.resample_sr != model['target_sr']
+                else model['target_sr']
+            )
+            outputs.append((out_sr, output_audio))
+
+        logger.info(f'targets: {len(targets)}, npy: {times[0]}s, f0: {times[1]}s, infer: {times[2]}s')
+        logger.info(f'stages: {get_thread_budget().stats}')
+        return outputs
+
+    def create_stream(
+            self, model_index, f0_up_key, f0_method: str, index_rate, filter_radius, protect: float = 0.33,
+            block_seconds: float = None, context_seconds: float = None, crossfade_seconds: float = None,
+            input_sr: int = 16000, rms_mix_rate: float = 1.0, resample_sr: int = 0
+    ) -> Tuple[int, StreamingVC]:
+        """
+        创建流式变声会话，push input_sr 的单声道 float32 音频块，返回已转换的音频块，输入结束后调用 flush
+        分块参数未指定时使用 rvc.yaml 中 streaming 的配置
+        :param model_index:
+        :param f0_up_key: 变调(整数, 半音数量, 升八度12降八度-12)
+        :param f0_method:
+        :param index_rate: 检索特征占比
+        :param filter_radius:
+        :param protect:
+        :param block_seconds: 每次推理的块长
+        :param context_seconds: 块前的上下文时长
+        :param crossfade_seconds: 块间交叉淡化时长，同时是输出的前瞻延迟
+        :param input_sr: 输入采样率，不是 16k 时流式重采样
+        :param rms_mix_rate: 输入源音量包络替换输出音量包络融合比例，越靠近1越使用输出包络
+        :param resample_sr: 输出重采样至该采样率，0为不进行重采样
+        :return: (输出采样率, 会话)
+        """
+        if model_index is None:
+            raise RuntimeError("Please select a model.")
+
+        model = self.model_manager.get(model_index)
+        streaming = self._rvc_options['streaming']
+        feat_file_index = self._feat_file_index(model, index_rate)
+
+        stream = StreamingVC(model['vc'],
+                             self.hubert_model,
+                             model['net_g'],
+                             model['metadata'].get('speaker_id', 0),
+                             model['if_f0'],
+                             model['version'],
+                             f0_up_key=int(f0_up_key),
+                             f0_method=f0_method,
+                             filter_radius=filter_radius,
+                             file_index=feat_file_index,
+                             index_rate=index_rate,
+                             protect=protect,
+                             block_seconds=block_seconds or streaming.get('block_seconds', 0.5),
+                             context_seconds=context_seconds or streaming.get('context_seconds') or None,
+                             crossfade_seconds=crossfade_seconds or streaming.get('crossfade_seconds') or None,
+                             input_sr=input_sr,
+                             resample_quality=self._rvc_options['resample_quality'],
+                             rms_mix_rate=rms_mix_rate,
+                             resample_sr=resample_sr)
+        logger.info(f'Created stream: {model["name"]}, block:{stream.block}, context:{stream.context}, '
+                    f'crossfade:{stream.crossfade}, latency:{stream.latency_seconds}s')
+        return stream.out_sr, stream
@@ -6,6 +6,7 @@ from torch import no_grad, LongTensor
 import torch
 import os
 from speakers.common.registry import registry
+from speakers.common.inference_optimizer import InferenceOptimizer
 from speakers.processors import BaseProcessor, ProcessorData
 import logging
 
@@ -57,8 +58,10 @@ class VitsProcessorData(ProcessorData):
 @registry.register_processor("vits_to_voice")
 class VitsToVoice(BaseProcessor):
 
-    def __init__(self, vits_model_path: str, voice_config_file: str):
+    def __init__(self, vits_model_path: str, voice_config_file: str, inference_optimization=None):
         super().__init__()
+        # enc_q 在 voice_conversion 中使用，不删除
+        self.inference_optimizer = InferenceOptimizer.from_config(inference_optimization)
         import nest_asyncio
         nest_asyncio.apply()
         self.limitation = os.getenv("SYSTEM") == "spaces"  # limit text and audio length in huggingface spaces
@@ -94,11 +97,13 @@ class VitsToVoice(BaseProcessor):
 
         vits_model_path = cfg.get("vits_model_path", "")
         voice_config_file = cfg.get("voice_config_file", "")
+        inference_optimization = cfg.get("inference_optimization", None)
 
         return cls(vits_model_path=os.path.join(registry.get_path("vits_library_root"),
                                                 vits_model_path),
                    voice_config_file=os.path.join(registry.get_path("vits_library_root"),
-                                                  voice_config_file))
+                                                  voice_config_file),
+                   inference_optimization=inference_optimization)
 
     def match(self, data: ProcessorData):
         return "VITS" in data.type
@@ -131,8 +136,27 @@ class VitsToVoice(BaseProcessor):
         self._speakers = self.hps_ms.speakers
         self.model, self.optimizer, self.learning_rate, self.epochs = utils.load_checkpoint(vits_model, self.net_g_ms,
                                                                                             None)
+        # checkpoint 中是 weight_g、weight_v，加载之后再折叠 weight_norm
+        self.model = self.inference_optimizer(self.model, example_fn=self._synthesizer_probe())
+        self.net_g_ms = self.model
         logger.info(f'Models loaded vits_to_voice')
 
+    def _synthesizer_probe(self):
+        """
+        合成器在固定文本序列上的推理，用于推理优化的精度校验
+        :return: callable(model) -> 输出音频 tensor
+        """
+        device = torch.device(registry.get("device"))
+        generator = torch.Generator().manual_seed(0)
+        x = torch.randint(1, len(self.hps_ms.symbols), (1, 50), generator=generator).to(device)
+        x_lengths = LongTensor([50]).to(device)
+        sid = LongTensor([0]).to(device) if self.hps_ms.data.n_speakers > 0 else None
+
+        def infer(model):
+            return model.infer(x, x_lengths, sid=sid, noise_scale=.667, noise_scale_w=0.8, length_scale=1)[0][0, 0]
+
+        return infer
+
     def search_speaker(self, search_value):
         """
         检索讲话人
@@ -0,0 +1,240 @@
+"""
+压缩检索索引
+
+训练得到的 feat_index 为 IVF*_Flat，推理时还需要 reconstruct_n 出完整的 float32 特征矩阵 big_npy 用于 top-8 加权融合。
+这里提供 IVF-PQ、IVF-SQfp16、HNSW-SQfp16 三种压缩索引：融合时只按 top-k 的 id 从索引中取回向量，
+不再常驻 big_npy；离线工具负责把已有的 .index 转换为压缩索引，并报告内存、查询耗时与检索质量
+
+    cd src
+    PYTHONPATH=bases:components python -m speakers.rvc.compact_index --index added_IVF256_Flat_nprobe_1_v2.index \
+        --kind ivfpq hnsw ivf_fp16
+"""
+import argparse
+import logging
+import os
+import time
+from typing import Dict, List
+
+import faiss
+import numpy as np
+
+logger = logging.getLogger('speaker_runner')
+
+
+def set_compact_index_logger(l):
+    global logger
+    logger = l
+
+
+# 转换目标：ivfpq(乘积量化，内存最小)、ivf_fp16(float16 标量量化)、hnsw(HNSW 图 + float16 存储)
+KINDS = ("ivfpq", "ivf_fp16", "hnsw")
+
+
+def is_compact(index) -> bool:
+    """
+    索引不能廉价地整体还原为 float32 矩阵时返回 True，Flat 与 IVF*_Flat 之外的索引都按压缩索引处理
+    """
+    index = faiss.downcast_index(index)
+    return not isinstance(index, (faiss.IndexFlat, faiss.IndexIVFFlat))
+
+
+def index_nbytes(index) -> int:
+    """
+    索引常驻内存估算：编码、倒排 id、粗量化中心与 HNSW 邻接表
+    """
+    index = faiss.downcast_index(index)
+    if isinstance(index, faiss.IndexHNSW):
+        storage = faiss.downcast_index(index.storage)
+        return index_nbytes(storage) + int(index.hnsw.neighbors.size()) * 4 + int(index.hnsw.offsets.size()) * 8
+    if isinstance(index, faiss.IndexIVF):
+        quantizer = faiss.downcast_index(index.quantizer)
+        return int(index.code_size * index.ntotal) + int(index.ntotal) * 8 + index_nbytes(quantizer)
+    code_size = getattr(index, 'code_size', index.d * 4)
+    return int(code_size * index.ntotal)
+
+
+class IndexVectors:
+    """
+    按 id 从压缩索引中取回向量，代替 big_npy 参与 big_npy[ix] 形式的索引，
+    只还原 top-k 命中的行，不常驻完整的特征矩阵
+    :param index: 支持 reconstruct_batch 的 faiss 索引，IVF 索引会建立 direct map
+    """
+
+    def __init__(self, index):
+        ivf = faiss.try_extract_index_ivf(index)
+        if ivf is not None and ivf.direct_map.type == faiss.DirectMap.NoMap:
+            ivf.make_direct_map()
+        self.index = index
+        self.shape = (index.ntotal, index.d)
+        self.dtype = np.dtype(np.float32)
+        self.ndim = 2
+
+    @property
+    def nbytes(self) -> int:
+        # 向量由索引承载，计入 FeatureIndex 的索引部分
+        return 0
+
+    def __len__(self) -> int:
+        return self.shape[0]
+
+    def __getitem__(self, ix) -> np.ndarray:
+        ix = np.asarray(ix, dtype=np.int64)
+        # 检索结果不足 k 个时 id 为 -1，距离为最大值，融合权重为 0，取任意一行即可
+        ids = np.where(ix < 0, 0, ix).ravel()
+        return self.index.reconstruct_batch(ids).reshape(ix.shape + (self.shape[1],))
+
+
+def load_vectors(index):
+    """
+    返回参与融合的特征，IVF*_Flat 还原为 float32 矩阵(与原实现一致)，压缩索引返回 IndexVectors
+    """
+    if is_compact(index):
+        return IndexVectors(index)
+    return index.reconstruct_n(0, index.ntotal)
+
+
+def blend(index, big_npy, npy: np.ndarray, k: int = 8) -> np.ndarray:
+    """
+    检索 top-k 近邻，按距离平方的倒数加权平均
+    :param npy: float32 查询特征 [帧数, 特征维度]
+    :return: float32 [帧数, 特征维度]
+    """
+    score, ix = index.search(npy, k=k)
+    weight = np.square(1 / score)
+    weight /= weight.sum(axis=1, keepdims=True)
+    return np.sum(big_npy[ix] * np.expand_dims(weight, axis=2), axis=1)
+
+
+def build_compact_index(vectors: np.ndarray, kind: str, metric: int = faiss.METRIC_L2, nlist: int = 0,
+                        nprobe: int = 1, pq_m: int = 0, pq_nbits: int = 8, hnsw_m: int = 32,
+                        ef_search: int = 64):
+    """
+    由特征矩阵构建压缩索引
+    :param vectors: float32 [条数, 特征维度]
+    :param kind: ivfpq、ivf_fp16、hnsw
+    :param metric: 与原索引一致
+    :param nlist: IVF 聚类中心数，0 时取 min(4 * sqrt(条数), 条数 / 39)
+    :param nprobe: IVF 查询的聚类数
+    :param pq_m: PQ 子空间数，0 时每 8 维一个子空间
+    :param pq_nbits: 每个子空间的编码位数
+    :param hnsw_m: HNSW 每个节点的邻居数
+    :param ef_search: HNSW 查询时的候选队列长度
+    """
+    if kind not in KINDS:
+        raise ValueError(f'Unknown compact index kind: {kind}, expected one of {list(KINDS)}')
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+    n, d = vectors.shape
+    if kind == "hnsw":
+        index = faiss.IndexHNSWSQ(d, faiss.ScalarQuantizer.QT_fp16, hnsw_m, metric)
+        index.hnsw.efSearch = ef_search
+    else:
+        nlist = nlist or max(1, min(int(4 * np.sqrt(n)), n // 39))
+        quantizer = faiss.IndexFlat(d, metric)
+        if kind == "ivfpq":
+            pq_m = pq_m or d // 8
+            index = faiss.IndexIVFPQ(quantizer, d, nlist, pq_m, pq_nbits, metric)
+        else:
+            index = faiss.IndexIVFScalarQuantizer(quantizer, d, nlist, faiss.ScalarQuantizer.QT_fp16, metric)
+        index.nprobe = nprobe
+    index.train(vectors)
+    index.add(vectors)
+    return index
+
+
+def evaluate(reference, reference_vectors: np.ndarray, index, queries: np.ndarray, k: int = 8) -> Dict:
+    """
+    以原索引为基准评估压缩索引
+    :return: 内存、单帧查询耗时、top-k 召回率与融合结果的相对误差
+    """
+    vectors = load_vectors(index)
+    start = time.perf_counter()
+    expected = blend(reference, reference_vectors, queries, k)
+    reference_seconds = time.perf_counter() - start
+    start = time.perf_counter()
+    actual = blend(index, vectors, queries, k)
+    seconds = time.perf_counter() - start
+    _, expected_ix = reference.search(queries, k)
+    _, actual_ix = index.search(queries, k)
+    recall = np.mean([len(set(a) & set(e)) / k for a, e in zip(actual_ix, expected_ix)])
+    error = np.linalg.norm(actual - expected, axis=1) / (np.linalg.norm(expected, axis=1) + 1e-12)
+    return dict(
+        reference_bytes=index_nbytes(reference) + int(np.asarray(reference_vectors).nbytes),
+        bytes=index_nbytes(index) + int(getattr(vectors, 'nbytes', 0)),
+        reference_query_ms=reference_seconds * 1000 / queries.shape[0],
+        query_ms=seconds * 1000 / queries.shape[0],
+        recall=float(recall),
+        blend_error=float(np.mean(error)),
+    )
+
+
+def sample_queries(vectors: np.ndarray, n: int, noise: float = 0.1, seed: int = 0) -> np.ndarray:
+    """
+    从索引中抽样并加噪声作为查询，噪声幅度相对特征的标准差
+    """
+    rng = np.random.default_rng(seed)
+    rows = vectors[rng.choice(vectors.shape[0], size=min(n, vectors.shape[0]), replace=False)]
+    return (rows + noise * vectors.std() * rng.standard_normal(rows.shape)).astype(np.float32)
+
+
+def convert_index(file_index: str, kinds: List[str], output_dir: str = None, queries: np.ndarray = None,
+                  n_queries: int = 2000, **kwargs) -> List[Dict]:
+    """
+    把 IVF*_Flat 索引转换为压缩索引，输出到 <索引名>.<kind>.index
+    :param queries: 评估用的查询特征，为空时从索引中抽样加噪声
+    :return: 每个 kind 的评估结果
+    """
+    reference = faiss.read_index(file_index)
+    ivf = faiss.try_extract_index_ivf(reference)
+    reference_vectors = reference.reconstruct_n(0, reference.ntotal)
+    if ivf is not None:
+        kwargs.setdefault('nlist', ivf.nlist)
+        kwargs.setdefault('nprobe', ivf.nprobe)
+    if queries is None:
+        queries = sample_queries(reference_vectors, n_queries)
+    output_dir = output_dir or os.path.dirname(os.path.abspath(file_index))
+    name = os.path.splitext(os.path.basename(file_index))[0]
+    reports = []
+    for kind in kinds:
+        start = time.perf_counter()
+        index = build_compact_index(reference_vectors, kind, metric=reference.metric_type, **kwargs)
+        build_seconds = time.perf_counter() - start
+        output = os.path.join(output_dir, f'{name}.{kind}.index')
+        faiss.write_index(index, output)
+        report = dict(kind=kind, output=output, build_seconds=build_seconds,
+                      file_bytes=os.path.getsize(output), reference_file_bytes=os.path.getsize(file_index))
+        report.update(evaluate(reference, reference_vectors, index, queries))
+        logger.info(f'Converted feat_index: {file_index} -> {output}, {report}')
+        reports.append(report)
+    return reports
+
+
+def main():
+    parser = argparse.ArgumentParser(description="convert rvc IVF*_Flat feat_index to compact indexes")
+    parser.add_argument("--index", required=True, help="IVF*_Flat .index")
+    parser.add_argument("--kind", nargs="+", default=list(KINDS), choices=KINDS)
+    parser.add_argument("--output_dir", default=None, help="defaults to the directory of --index")
+    parser.add_argument("--queries", default=None, help=".npy hubert features used for evaluation")
+    parser.add_argument("--n_queries", type=int, default=2000)
+    parser.add_argument("--pq_m", type=int, default=0)
+    parser.add_argument("--pq_nbits", type=int, default=8)
+    parser.add_argument("--hnsw_m", type=int, default=32)
+    parser.add_argument("--ef_search", type=int, default=64)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    queries = np.load(args.queries).astype(np.float32) if args.queries else None
+    reports = convert_index(args.index, args.kind, output_dir=args.output_dir, queries=queries,
+                            n_queries=args.n_queries, pq_m=args.pq_m, pq_nbits=args.pq_nbits,
+                            hnsw_m=args.hnsw_m, ef_search=args.ef_search)
+    print(f"{'kind':10s} {'memory MB':>10s} {'file MB':>9s} {'query us':>9s} {'recall@8':>9s} {'blend err':>10s}")
+    first = reports[0]
+    print(f"{'flat':10s} {first['reference_bytes'] / 2 ** 20:10.1f} {first['reference_file_bytes'] / 2 ** 20:9.1f} "
+          f"{first['reference_query_ms'] * 1000:9.1f} {1:9.3f} {0:10.4f}")
+    for report in reports:
+        print(f"{report['kind']:10s} {report['bytes'] / 2 ** 20:10.1f} {report['file_bytes'] / 2 ** 20:9.1f} "
+              f"{report['query_ms'] * 1000:9.1f} {report['recall']:9.3f} {report['blend_error']:10.4f}  "
+              f"-> {report['output']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+import logging
+from typing import Hashable, Optional, Tuple
+
+import numpy as np
+
+from speakers.common.cache import LRUCache
+
+logger = logging.getLogger('speaker_runner')
+
+
+def set_f0_cache_logger(l):
+    global logger
+    logger = l
+
+
+class F0Cache:
+    """
+    音高曲线缓存，适用于 harvest、pm、crepe、rmvpe 所有提取方法，
+    缓存的是变调前的原始 F0，不同 f0_up_key 复用同一次提取结果，不保留输入音频
+    :param max_bytes: 内存上限，0 表示不限制
+    :param ttl: 条目存活秒数，0 表示不过期
+    """
+
+    def __init__(self, max_bytes: int = 0, ttl: float = 0):
+        self._cache = LRUCache(max_bytes=max_bytes, ttl=ttl)
+
+    @classmethod
+    def from_config(cls, cfg=None) -> Optional["F0Cache"]:
+        """
+        未配置或 enabled 为 false 时返回 None，不启用缓存
+        """
+        if cfg is None or not cfg.get("enabled", False):
+            return None
+        return cls(max_bytes=int(cfg.get("max_bytes", 0) or 0),
+                   ttl=float(cfg.get("ttl", 0) or 0))
+
+    @staticmethod
+    def key(checksum: str, f0_method: str, n_samples: int, *params) -> Tuple:
+        """
+        :param checksum: 16k 输入音频的 checksum
+        :param f0_method: 提取方法
+        :param n_samples: 补齐后的音频长度
+        :param params: 影响提取结果的其他参数，如 filter_radius、模型路径
+        """
+        return (checksum, f0_method, int(n_samples)) + tuple(params)
+
+    def get(self, key: Hashable) -> Optional[np.ndarray]:
+        """
+        返回只读数组，与缓存共享内存
+        """
+        return self._cache.get(key)
+
+    def put(self, key: Hashable, f0: np.ndarray):
+        f0 = np.array(f0)
+        f0.flags.writeable = False
+        self._cache.put(key, f0)
+
+    def clear(self):
+        self._cache.clear()
+
+    @property
+    def stats(self) -> dict:
+        return self._cache.stats
@@ -0,0 +1,181 @@
+import hashlib
+import logging
+import os
+import threading
+from typing import Hashable, Optional, Tuple
+
+import numpy as np
+import torch
+
+from speakers.common.cache import LRUCache
+
+logger = logging.getLogger('speaker_runner')
+
+
+def set_feature_cache_logger(l):
+    global logger
+    logger = l
+
+
+def hubert_identity(model: torch.nn.Module, checkpoint: str = None) -> Tuple[str, str, bool]:
+    """
+    hubert 模型的标识：checkpoint(路径、修改时间与大小)、参数精度与是否量化，
+    替换 checkpoint、切换 is_half 或开启量化后特征不同，缓存(包括落盘的特征)不再命中
+    """
+    checkpoint_id = ""
+    if checkpoint:
+        checkpoint_id = os.path.abspath(checkpoint)
+        if os.path.exists(checkpoint):
+            stat = os.stat(checkpoint)
+            checkpoint_id = f'{checkpoint_id}:{stat.st_mtime_ns}:{stat.st_size}'
+    dtype = next((str(p.dtype) for p in model.parameters() if p.is_floating_point()), "")
+    quantized = any('quantized' in type(module).__module__ for module in model.modules())
+    return checkpoint_id, dtype, quantized
+
+
+class HubertFeatureCache:
+    """
+    hubert 特征缓存，特征只与输入音频和 hubert 模型有关，与音色、变调、检索占比等参数无关，
+    以 (hubert 模型标识, 音频 checksum, 输出层, 分段位置) 为键缓存每段的特征，同一段音频换音色或调参时跳过 hubert 推理
+    :param max_bytes: 内存上限，0 表示不限制
+    :param spill_dir: 不为空时，内存淘汰的特征落盘为 .npy，之后命中时从磁盘读回并删除文件
+    :param spill_max_bytes: 落盘目录的大小上限，超出时按修改时间删除最旧的文件，0 表示不限制
+    :param model_id: hubert_identity 的返回值，作为所有键的前缀
+    """
+
+    def __init__(self, max_bytes: int = 0, spill_dir: str = None, spill_max_bytes: int = 0,
+                 model_id: Tuple = ()):
+        self.spill_dir = spill_dir
+        self.spill_max_bytes = int(spill_max_bytes or 0)
+        self.model_id = tuple(model_id)
+        self._spill_lock = threading.Lock()
+        self._spill_bytes = 0
+        self._cache = LRUCache(max_bytes=max_bytes, on_evict=self._on_evict)
+        self.disk_hits = 0
+        self.spills = 0
+        self.spill_evictions = 0
+        if spill_dir:
+            os.makedirs(spill_dir, exist_ok=True)
+            # 之前进程留下的文件计入上限
+            self._spill_bytes = sum(size for _, size, _ in self._spill_files())
+            self._trim_spill_dir()
+
+    @classmethod
+    def from_config(cls, cfg=None, spill_root: str = None, model_id: Tuple = ()) -> Optional["HubertFeatureCache"]:
+        """
+        未配置或 enabled 为 false 时返回 None，不启用缓存
+        """
+        if cfg is None or not cfg.get("enabled", False):
+            return None
+        spill_dir = None
+        if cfg.get("spill", False):
+            spill_dir = cfg.get("spill_dir", "cache/hubert_features")
+            if spill_root is not None:
+                spill_dir = os.path.join(spill_root, spill_dir)
+        return cls(max_bytes=int(cfg.get("max_bytes", 0) or 0),
+                   spill_dir=spill_dir,
+                   spill_max_bytes=int(cfg.get("spill_max_bytes", 0) or 0),
+                   model_id=model_id)
+
+    def key(self, checksum: str, version: str, start: int, length: int) -> Tuple:
+        """
+        :param checksum: 16k 输入音频的 checksum
+        :param version: 模型版本，v1 输出第 9 层经过 final_proj 的特征，v2 输出第 12 层特征
+        :param start: 分段在补齐后音频中的起始采样点
+        :param length: 分段采样点数
+        """
+        return self.model_id + (checksum, version, int(start), int(length))
+
+    def get(self, key: Hashable) -> Optional[np.ndarray]:
+        """
+        :return: [帧数, 特征维度]，未命中返回 None
+        """
+        feats = self._cache.get(key)
+        if feats is not None or not self.spill_dir:
+            return feats
+        path = self._spill_path(key)
+        if not os.path.exists(path):
+            return None
+        try:
+            feats = np.load(path)
+        except Exception as e:
+            logger.warning(f'Load hubert features error {path}, {e.__class__.__name__}: {e}')
+            self._remove_spill(path)
+            return None
+        # 读回内存后删除文件，再次被淘汰时重新落盘
+        self._remove_spill(path)
+        self.disk_hits += 1
+        self._cache.put(key, feats)
+        return feats
+
+    def put(self, key: Hashable, feats: np.ndarray):
+        self._cache.put(key, feats)
+
+    def clear(self):
+        self._cache.clear()
+
+    @property
+    def stats(self) -> dict:
+        stats = self._cache.stats
+        total = stats['hits'] + stats['misses']
+        hits = stats['hits'] + self.disk_hits
+        stats.update(disk_hits=self.disk_hits,
+                     spills=self.spills,
+                     spill_bytes=self._spill_bytes,
+                     spill_evictions=self.spill_evictions,
+                     hit_rate=hits / total if total else 0.0)
+        return stats
+
+    def _spill_path(self, key: Hashable) -> str:
+        digest = hashlib.sha1(repr(key).encode('utf-8')).hexdigest()
+        return os.path.join(self.spill_dir, f'{digest}.npy')
+
+    def _on_evict(self, key: Hashable, feats: np.ndarray):
+        if not self.spill_dir:
+            return
+        path = self._spill_path(key)
+        if os.path.exists(path):
+            return
+        tmp_path = f'{path}.{os.getpid()}.tmp'
+        with open(tmp_path, 'wb') as f:
+            np.save(f, feats)
+        os.replace(tmp_path, path)
+        with self._spill_lock:
+            self._spill_bytes += os.path.getsize(path)
+        self.spills += 1
+        self._trim_spill_dir()
+
+    def _spill_files(self):
+        """
+        落盘目录中的特征文件 [(路径, 大小, 修改时间)]
+        """
+        files = []
+        for entry in os.scandir(self.spill_dir):
+            if entry.name.endswith('.npy'):
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                files.append((entry.path, stat.st_size, stat.st_mtime_ns))
+        return files
+
+    def _remove_spill(self, path: str):
+        try:
+            size = os.path.getsize(path)
+            os.remove(path)
+        except FileNotFoundError:
+            return
+        with self._spill_lock:
+            self._spill_bytes -= size
+
+    def _trim_spill_dir(self):
+        """
+        超出 spill_max_bytes 时按修改时间删除最旧的文件
+        """
+        if not self.spill_max_bytes or self._spill_bytes <= self.spill_max_bytes:
+            return
+        for path, _, _ in sorted(self._spill_files(), key=lambda file: file[2]):
+            if self._spill_bytes <= self.spill_max_bytes:
+                break
+            self._remove_spill(path)
+            self.spill_evictions += 1
@@ -0,0 +1,166 @@
+import hashlib
+import logging
+import os
+import threading
+from typing import Optional, Tuple
+
+import faiss
+import numpy as np
+
+from speakers.common.cache import LRUCache
+from speakers.rvc.compact_index import index_nbytes, is_compact, load_vectors
+
+logger = logging.getLogger('speaker_runner')
+
+
+def set_index_cache_logger(l):
+    global logger
+    logger = l
+
+
+class FeatureIndex:
+    """
+    常驻内存的检索索引，以及由索引重建出的特征矩阵 big_npy，
+    压缩索引的 big_npy 为按 id 取回向量的 IndexVectors
+    """
+
+    def __init__(self, file_index: str, index, big_npy: np.ndarray, mmap: bool = False):
+        self.file_index = file_index
+        self.index = index
+        self.big_npy = big_npy
+        self.mmap = mmap
+
+    @property
+    def nbytes(self) -> int:
+        """
+        常驻内存估算，mmap 模式下 big_npy 由文件页缓存承载，不计入
+        """
+        index_bytes = index_nbytes(self.index)
+        if self.mmap:
+            return index_bytes
+        return index_bytes + int(self.big_npy.nbytes)
+
+    def release(self):
+        """
+        淘汰后释放索引与 big_npy 的引用，正在使用它们的推理调用持有自己的引用，不受影响
+        """
+        self.index = None
+        self.big_npy = None
+
+
+class FeatureIndexCache:
+    """
+    按音色模型缓存 faiss 检索索引，避免每次推理都重新 read_index 与 reconstruct_n，
+    多个音色共享同一个内存上限 max_bytes，超出时按 LRU 淘汰
+    :param max_bytes: 常驻内存上限，0 表示不限制
+    :param mmap: 以内存映射方式读取索引，big_npy 落盘为 .npy 后同样以 mmap 方式打开
+    :param mmap_dir: mmap 模式下 big_npy 的落盘目录，默认与索引文件同目录
+    """
+
+    def __init__(self, max_bytes: int = 0, mmap: bool = False, mmap_dir: str = None):
+        self.mmap = mmap
+        self.mmap_dir = mmap_dir
+        self._cache = LRUCache(max_bytes=max_bytes,
+                               sizeof_fn=lambda feature_index: feature_index.nbytes,
+                               on_evict=self._on_evict)
+        self._load_lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, cfg=None, mmap_dir: str = None):
+        if cfg is None:
+            return cls(mmap_dir=mmap_dir)
+        return cls(max_bytes=int(cfg.get("max_bytes", 0) or 0),
+                   mmap=bool(cfg.get("mmap", False)),
+                   mmap_dir=cfg.get("mmap_dir", None) or mmap_dir)
+
+    @property
+    def stats(self) -> dict:
+        return self._cache.stats
+
+    def get(self, file_index: str) -> Tuple[Optional[object], Optional[np.ndarray]]:
+        """
+        获取索引与特征矩阵，未命中时加载，加载失败返回 (None, None)
+        :param file_index: 索引文件路径
+        :return: (index, big_npy)
+        """
+        if file_index is None or file_index == "":
+            return None, None
+
+        # 先取出引用再使用：条目可能在返回后被其他线程淘汰并 release，已释放的条目按未命中处理
+        index, big_npy = self._snapshot(self._cache.get(file_index))
+        if index is not None:
+            return index, big_npy
+        with self._load_lock:
+            # 其他线程可能已经完成了加载
+            index, big_npy = self._snapshot(self._cache.peek(file_index))
+            if index is None:
+                feature_index = self._load(file_index)
+                if feature_index is None:
+                    return None, None
+                index, big_npy = feature_index.index, feature_index.big_npy
+                self._cache.put(file_index, feature_index)
+        return index, big_npy
+
+    @staticmethod
+    def _snapshot(feature_index: Optional[FeatureIndex]) -> Tuple[Optional[object], Optional[np.ndarray]]:
+        if feature_index is None:
+            return None, None
+        index, big_npy = feature_index.index, feature_index.big_npy
+        if index is None or big_npy is None:
+            return None, None
+        return index, big_npy
+
+    def preload(self, file_index: str):
+        """
+        模型加载阶段预热索引
+        """
+        self.get(file_index)
+
+    def evict(self, file_index: str):
+        feature_index = self._cache.pop(file_index)
+        if feature_index is not None:
+            self._on_evict(file_index, feature_index)
+
+    def clear(self):
+        for file_index in self._cache.keys():
+            self.evict(file_index)
+
+    def _load(self, file_index: str) -> Optional[FeatureIndex]:
+        if not os.path.exists(file_index):
+            logger.warning(f'feat_index not found: {file_index}')
+            return None
+        try:
+            if self.mmap:
+                index = faiss.read_index(file_index, faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY)
+                big_npy = load_vectors(index) if is_compact(index) else self._load_big_npy_mmap(file_index, index)
+            else:
+                index = faiss.read_index(file_index)
+                big_npy = load_vectors(index)
+        except Exception as e:
+            logger.error(f'Load feat_index error {file_index}, {e.__class__.__name__}: {e}',
+                         exc_info=e)
+            return None
+
+        feature_index = FeatureIndex(file_index=file_index, index=index, big_npy=big_npy, mmap=self.mmap)
+        logger.info(f'Loaded feat_index: {file_index}, ntotal:{index.ntotal}, bytes:{feature_index.nbytes}')
+        return feature_index
+
+    def _load_big_npy_mmap(self, file_index: str, index) -> np.ndarray:
+        """
+        big_npy 以索引文件路径与修改时间为键落盘，之后的加载直接 mmap 打开
+        """
+        stat = os.stat(file_index)
+        digest = hashlib.sha1(f'{os.path.abspath(file_index)}:{stat.st_mtime_ns}'.encode('utf-8')).hexdigest()
+        mmap_dir = self.mmap_dir or os.path.dirname(file_index)
+        os.makedirs(mmap_dir, exist_ok=True)
+        npy_path = os.path.join(mmap_dir, f'{os.path.basename(file_index)}.{digest[:16]}.npy')
+        if not os.path.exists(npy_path):
+            tmp_path = f'{npy_path}.{os.getpid()}.tmp'
+            with open(tmp_path, 'wb') as f:
+                np.save(f, index.reconstruct_n(0, index.ntotal))
+            os.replace(tmp_path, npy_path)
+        return np.load(npy_path, mmap_mode='r')
+
+    def _on_evict(self, file_index: str, feature_index: FeatureIndex):
+        logger.info(f'Evict feat_index: {file_index}, bytes:{feature_index.nbytes}')
+        feature_index.release()
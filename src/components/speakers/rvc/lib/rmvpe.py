@@ -327,7 +327,7 @@ class MelSpectrogram(torch.nn.Module):
 
 
 class RMVPE:
-    def __init__(self, model_path, is_half, device=None):
+    def __init__(self, model_path, is_half, device=None, decode_on_device=False):
         self.resample_kernel = {}
         model = E2E(4, 1, (2, 2))
         ckpt = torch.load(model_path, map_location="cpu")
@@ -347,6 +347,9 @@ class RMVPE:
         self.model = self.model.to(device)
         cents_mapping = 20 * np.arange(360) + 1997.3794084376191
         self.cents_mapping = np.pad(cents_mapping, (4, 4))  # 368
+        # 为 True 时解码在模型所在设备上用 torch 完成
+        self.decode_on_device = decode_on_device
+        self.cents_mapping_torch = torch.from_numpy(self.cents_mapping).float().to(device)
 
     def mel2hidden(self, mel):
         with torch.no_grad():
@@ -364,6 +367,15 @@ class RMVPE:
         # f0 = np.array([10 * (2 ** (cent_pred / 1200)) if cent_pred else 0 for cent_pred in cents_pred])
         return f0
 
+    def decode_torch(self, hidden, thred=0.03):
+        """
+        decode 的 torch 实现，在模型所在设备上完成解码，只把最终的 f0 拷回 cpu
+        """
+        cents_pred = self.to_local_average_cents_torch(hidden, thred=thred)
+        f0 = 10 * (2 ** (cents_pred / 1200))
+        f0[f0 == 10] = 0
+        return f0.cpu().numpy()
+
     def infer_from_audio(self, audio, thred=0.03):
         audio = torch.from_numpy(audio).float().to(self.device).unsqueeze(0)
         # torch.cuda.synchronize()
@@ -374,6 +386,8 @@ class RMVPE:
         hidden = self.mel2hidden(mel)
         # torch.cuda.synchronize()
         # t2=ttime()
+        if self.decode_on_device:
+            return self.decode_torch(hidden.squeeze(0).float(), thred=thred)
         hidden = hidden.squeeze(0).cpu().numpy()
         if self.is_half == True:
             hidden = hidden.astype("float32")
@@ -384,29 +398,38 @@ class RMVPE:
         return f0
 
     def to_local_average_cents(self, salience, thred=0.05):
-        # t0 = ttime()
+        """
+        以每帧 salience 最大值为中心取 9 个 bin 做加权平均，得到每帧的音分
+        :param salience: (帧长, 360)
+        """
         center = np.argmax(salience, axis=1)  # 帧长#index
         salience = np.pad(salience, ((0, 0), (4, 4)))  # 帧长,368
-        # t1 = ttime()
-        center += 4
-        todo_salience = []
-        todo_cents_mapping = []
-        starts = center - 4
-        ends = center + 5
-        for idx in range(salience.shape[0]):
-            todo_salience.append(salience[:, starts[idx] : ends[idx]][idx])
-            todo_cents_mapping.append(self.cents_mapping[starts[idx] : ends[idx]])
-        # t2 = ttime()
-        todo_salience = np.array(todo_salience)  # 帧长，9
-        todo_cents_mapping = np.array(todo_cents_mapping)  # 帧长，9
+        # 每帧中心前后各 4 个 bin 的下标，帧长，9
+        idx = center[:, None] + np.arange(9)
+        todo_salience = np.take_along_axis(salience, idx, axis=1)  # 帧长，9
+        todo_cents_mapping = self.cents_mapping[idx]  # 帧长，9
         product_sum = np.sum(todo_salience * todo_cents_mapping, 1)
         weight_sum = np.sum(todo_salience, 1)  # 帧长
         devided = product_sum / weight_sum  # 帧长
-        # t3 = ttime()
         maxx = np.max(salience, axis=1)  # 帧长
         devided[maxx <= thred] = 0
-        # t4 = ttime()
-        # print("decode:%s\t%s\t%s\t%s" % (t1 - t0, t2 - t1, t3 - t2, t4 - t3))
+        return devided
+
+    def to_local_average_cents_torch(self, salience, thred=0.05):
+        """
+        to_local_average_cents 的 torch 实现
+        :param salience: (帧长, 360) 的张量
+        """
+        center = torch.argmax(salience, dim=1)  # 帧长#index
+        salience = F.pad(salience, (4, 4))  # 帧长,368
+        idx = center[:, None] + torch.arange(9, device=salience.device)
+        todo_salience = torch.gather(salience, 1, idx)  # 帧长，9
+        todo_cents_mapping = self.cents_mapping_torch[idx]  # 帧长，9
+        product_sum = torch.sum(todo_salience * todo_cents_mapping, 1)
+        weight_sum = torch.sum(todo_salience, 1)  # 帧长
+        devided = product_sum / weight_sum  # 帧长
+        maxx = torch.max(salience, dim=1).values  # 帧长
+        devided[maxx <= thred] = 0
         return devided
 
 
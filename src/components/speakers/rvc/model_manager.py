@@ -0,0 +1,185 @@
+import logging
+import threading
+import time
+from typing import Any, Callable, Dict, List, Union
+
+import torch
+
+from speakers.common.cache import LRUCache
+from speakers.rvc.pitch_estimators import module_nbytes
+
+logger = logging.getLogger('speaker_runner')
+
+
+def set_model_manager_logger(l):
+    global logger
+    logger = l
+
+
+class VoiceModel:
+    """
+    音色模型的元数据，登记时只读取 config.json，不加载 checkpoint
+    :param name: 音色名称
+    :param path: 模型目录
+    :param torch_file: checkpoint 路径
+    :param metadata: config.json 内容
+    :param backend: 合成器推理后端，torch 或 onnxruntime
+    :param onnx_file: onnxruntime 后端使用的模型路径，为空时使用 checkpoint 同名的 .onnx
+    """
+
+    def __init__(self, name: str, path: str, torch_file: str, metadata: Dict[str, Any],
+                 backend: str = "torch", onnx_file: str = None):
+        self.name = name
+        self.path = path
+        self.torch_file = torch_file
+        self.metadata = metadata
+        self.backend = backend
+        self.onnx_file = onnx_file
+
+    def __repr__(self) -> str:
+        return f'VoiceModel(name={self.name}, torch_file={self.torch_file}, backend={self.backend})'
+
+
+def model_nbytes(model: Dict[str, Any]) -> int:
+    """
+    已加载模型的字节数，onnxruntime 会话以模型文件大小计
+    """
+    net_g = model.get('net_g')
+    if hasattr(net_g, 'nbytes'):
+        return int(net_g.nbytes)
+    return module_nbytes(net_g)
+
+
+class VoiceModelManager:
+    """
+    音色模型管理，启动阶段只登记元数据，合成器 net_g 在首次请求时由 loader 加载，
+    常驻的模型数量 max_models 或字节数 max_bytes 超出时按 LRU 淘汰
+    :param loader: callable(VoiceModel) -> dict，返回包含 net_g 的模型字典
+    :param max_models: 常驻模型数上限，0 表示不限制
+    :param max_bytes: 常驻模型字节数上限，0 表示不限制
+    :param on_evict: callable(VoiceModel, dict)，模型被淘汰时回调
+    """
+
+    def __init__(self,
+                 loader: Callable[[VoiceModel], Dict[str, Any]],
+                 max_models: int = 0,
+                 max_bytes: int = 0,
+                 on_evict: Callable[[VoiceModel, Dict[str, Any]], None] = None):
+        self._loader = loader
+        self._on_evict_callback = on_evict
+        self._voices: List[VoiceModel] = []
+        self._cache = LRUCache(max_items=max_models,
+                               max_bytes=max_bytes,
+                               sizeof_fn=model_nbytes,
+                               on_evict=self._on_evict)
+        self._locks: Dict[int, threading.Lock] = {}
+        self._lock = threading.Lock()
+        self.loads = 0
+        self.load_seconds = 0.0
+
+    @classmethod
+    def from_config(cls, loader: Callable[[VoiceModel], Dict[str, Any]], cfg=None,
+                    on_evict: Callable[[VoiceModel, Dict[str, Any]], None] = None):
+        if cfg is None:
+            return cls(loader=loader, on_evict=on_evict)
+        return cls(loader=loader,
+                   max_models=int(cfg.get("max_models", 0) or 0),
+                   max_bytes=int(cfg.get("max_bytes", 0) or 0),
+                   on_evict=on_evict)
+
+    @property
+    def voices(self) -> List[VoiceModel]:
+        return list(self._voices)
+
+    def __len__(self) -> int:
+        return len(self._voices)
+
+    def register(self, voice: VoiceModel) -> int:
+        """
+        登记音色，返回 model_index
+        """
+        with self._lock:
+            self._voices.append(voice)
+            return len(self._voices) - 1
+
+    def index_of(self, name: str) -> int:
+        for model_index, voice in enumerate(self._voices):
+            if voice.name == name:
+                return model_index
+        raise KeyError(f'Could not find voice model: "{name}"')
+
+    def is_resident(self, model_index: int) -> bool:
+        return model_index in self._cache
+
+    def get(self, model_index: int) -> Dict[str, Any]:
+        """
+        获取已加载的模型，未加载时同步加载
+        :param model_index: 登记顺序
+        :return: dict(name, metadata, net_g, ...)
+        """
+        if model_index < 0 or model_index >= len(self._voices):
+            raise IndexError(f'model_index out of range: {model_index}, voices:{len(self._voices)}')
+
+        model = self._cache.get(model_index)
+        if model is not None:
+            return model
+
+        with self._lock:
+            key_lock = self._locks.setdefault(model_index, threading.Lock())
+        # 不同音色可以并行加载，同一个音色只加载一次
+        with key_lock:
+            model = self._cache.peek(model_index)
+            if model is None:
+                model = self._load(model_index)
+                self._cache.put(model_index, model)
+        return model
+
+    def prefetch(self, models: List[Union[int, str]]):
+        """
+        预加载热点音色，可以传入 model_index 或音色名称
+        """
+        for model in models:
+            model_index = self.index_of(model) if isinstance(model, str) else int(model)
+            self.get(model_index)
+
+    def evict(self, model_index: int):
+        model = self._cache.pop(model_index)
+        if model is not None:
+            self._on_evict(model_index, model)
+
+    def clear(self):
+        for model_index in self._cache.keys():
+            self.evict(model_index)
+
+    @property
+    def stats(self) -> dict:
+        stats = self._cache.stats
+        return {
+            'registered': len(self._voices),
+            'resident': stats['items'],
+            'bytes': stats['bytes'],
+            'loads': self.loads,
+            'hits': stats['hits'],
+            'evictions': stats['evictions'],
+            'load_seconds': self.load_seconds,
+        }
+
+    def _load(self, model_index: int) -> Dict[str, Any]:
+        voice = self._voices[model_index]
+        logger.info(f'Loading voice model: {voice.name}')
+        start = time.perf_counter()
+        model = self._loader(voice)
+        elapsed = time.perf_counter() - start
+        self.loads += 1
+        self.load_seconds += elapsed
+        logger.info(f'Loaded voice model: {voice.name}, bytes:{model_nbytes(model)}, '
+                    f'{elapsed:.2f}s')
+        return model
+
+    def _on_evict(self, model_index: int, model: Dict[str, Any]):
+        voice = self._voices[model_index]
+        logger.info(f'Evict voice model: {voice.name}')
+        if self._on_evict_callback is not None:
+            self._on_evict_callback(voice, model)
+        if torch.cuda.is_available():
+            torch.cuda.empty_cache()
@@ -0,0 +1,152 @@
+"""
+RVC 合成器的 onnxruntime 推理后端
+
+导出命令：
+    python -m speakers.rvc.onnx_backend --checkpoint model/yiqing/yiqing.pth --output model/yiqing/yiqing.onnx
+"""
+import argparse
+import inspect
+import logging
+import os
+from typing import List
+
+import numpy as np
+import torch
+
+from speakers.common.inference_optimizer import fold_weight_norm
+from speakers.rvc.infer_pack.models_onnx import SynthesizerTrnMs256NSFsidO
+
+logger = logging.getLogger('speaker_runner')
+
+
+def set_onnx_backend_logger(l):
+    global logger
+    logger = l
+
+
+BACKENDS = ("torch", "onnxruntime")
+
+INPUT_NAMES = ["phone", "phone_lengths", "pitch", "pitchf", "sid", "rnd"]
+OUTPUT_NAMES = ["audio"]
+
+
+def _torchscript_export_kwargs() -> dict:
+    """
+    较新的 torch 默认使用 dynamo 导出，这里仍使用 TorchScript 导出；
+    项目固定的 torch 2.0.1 没有 dynamo 参数，传入会报 TypeError
+    """
+    if "dynamo" in inspect.signature(torch.onnx.export).parameters:
+        return {"dynamo": False}
+    return {}
+
+
+def export_onnx(torch_file: str, onnx_file: str, opset_version: int = 16, frames: int = 200) -> str:
+    """
+    把 .pth checkpoint 导出为 onnx，批大小与帧数均为动态维度，只支持带 f0 的模型
+    :param torch_file: checkpoint 路径
+    :param onnx_file: 导出路径
+    :param opset_version:
+    :param frames: 导出时示例输入的帧数
+    :return: onnx_file
+    """
+    cpt = torch.load(torch_file, map_location="cpu")
+    cpt["config"][-3] = cpt["weight"]["emb_g.weight"].shape[0]  # n_spk
+    if cpt.get("f0", 1) != 1:
+        raise ValueError(f'onnx export only supports f0 models: {torch_file}')
+    version = cpt.get("version", "v1")
+
+    net_g = SynthesizerTrnMs256NSFsidO(*cpt["config"], is_half=False, version=version)
+    logger.info(net_g.load_state_dict(cpt["weight"], strict=False))
+    del net_g.enc_q
+    # 导出前折叠 weight_norm，图中不再保留由 weight_g、weight_v 计算权重的算子
+    fold_weight_norm(net_g)
+    net_g.eval()
+
+    feats_dim = 768 if version == "v2" else 256
+    inputs = (
+        torch.rand(1, frames, feats_dim),
+        torch.LongTensor([frames]),
+        torch.randint(1, 255, (1, frames)),
+        torch.rand(1, frames) * 400 + 100,
+        torch.LongTensor([0]),
+        torch.randn(1, net_g.inter_channels, frames),
+    )
+    dynamic_axes = {
+        "phone": {0: "batch", 1: "frames"},
+        "phone_lengths": {0: "batch"},
+        "pitch": {0: "batch", 1: "frames"},
+        "pitchf": {0: "batch", 1: "frames"},
+        "sid": {0: "batch"},
+        "rnd": {0: "batch", 2: "frames"},
+        "audio": {0: "batch", 2: "samples"},
+    }
+    os.makedirs(os.path.dirname(os.path.abspath(onnx_file)), exist_ok=True)
+    with torch.no_grad():
+        torch.onnx.export(
+            net_g,
+            inputs,
+            onnx_file,
+            input_names=INPUT_NAMES,
+            output_names=OUTPUT_NAMES,
+            dynamic_axes=dynamic_axes,
+            opset_version=opset_version,
+            do_constant_folding=False,
+            **_torchscript_export_kwargs(),
+        )
+    logger.info(f'Exported onnx: {torch_file} -> {onnx_file}, version:{version}')
+    return onnx_file
+
+
+class OnnxSynthesizer:
+    """
+    onnxruntime 推理会话，infer 的参数与返回值与 SynthesizerTrnMs*NSFsid.infer 一致，可以直接替换 net_g
+    :param onnx_file: export_onnx 导出的模型
+    :param providers: onnxruntime 执行器，默认 CPUExecutionProvider
+    :param intra_op_num_threads: 算子内线程数，0 表示由 onnxruntime 决定
+    """
+
+    def __init__(self, onnx_file: str, providers: List[str] = None, intra_op_num_threads: int = 0):
+        import onnxruntime
+
+        sess_options = onnxruntime.SessionOptions()
+        sess_options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+        sess_options.intra_op_num_threads = intra_op_num_threads
+        self.onnx_file = onnx_file
+        self.session = onnxruntime.InferenceSession(onnx_file,
+                                                    sess_options,
+                                                    providers=providers or ["CPUExecutionProvider"])
+        rnd = [i for i in self.session.get_inputs() if i.name == "rnd"][0]
+        self.inter_channels = rnd.shape[1]
+
+    @property
+    def nbytes(self) -> int:
+        return os.path.getsize(self.onnx_file)
+
+    def infer(self, phone, phone_lengths, pitch, nsff0, sid, max_len=None):
+        batch, frames = phone.shape[0], phone.shape[1]
+        feeds = {
+            "phone": phone.float().cpu().numpy(),
+            "phone_lengths": phone_lengths.long().cpu().numpy(),
+            "pitch": pitch.long().cpu().numpy(),
+            "pitchf": nsff0.float().cpu().numpy(),
+            "sid": sid.long().cpu().numpy(),
+            "rnd": np.random.randn(batch, self.inter_channels, frames).astype(np.float32),
+        }
+        audio = self.session.run(OUTPUT_NAMES, feeds)[0]
+        return torch.from_numpy(audio), None, None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="export rvc checkpoint to onnx")
+    parser.add_argument("--checkpoint", required=True, help=".pth checkpoint")
+    parser.add_argument("--output", default=None, help="onnx path, defaults to <checkpoint>.onnx")
+    parser.add_argument("--opset", type=int, default=16)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    output = args.output or os.path.splitext(args.checkpoint)[0] + ".onnx"
+    export_onnx(args.checkpoint, output, opset_version=args.opset)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+import logging
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterator, Tuple
+
+import numpy as np
+import parselmouth
+import pyworld
+
+logger = logging.getLogger('speaker_runner')
+
+
+def set_parallel_f0_logger(l):
+    global logger
+    logger = l
+
+
+def harvest_f0(audio, fs, f0max, f0min, frame_period):
+    f0, t = pyworld.harvest(
+        audio,
+        fs=fs,
+        f0_ceil=f0max,
+        f0_floor=f0min,
+        frame_period=frame_period,
+    )
+    f0 = pyworld.stonemask(audio, f0, t, fs)
+    return f0
+
+
+def pm_f0(audio, sr, time_step, f0_min, f0_max):
+    """
+    parselmouth 自相关基频，未补齐到 p_len
+    """
+    return (
+        parselmouth.Sound(audio, sr)
+        .to_pitch_ac(
+            time_step=time_step,
+            voicing_threshold=0.6,
+            pitch_floor=f0_min,
+            pitch_ceiling=f0_max,
+        )
+        .selected_array["frequency"]
+    )
+
+
+def chunk_frames(n_frames: int, chunk: int, overlap: int) -> Iterator[Tuple[int, int, int, int]]:
+    """
+    按帧切分，每块前后各带 overlap 帧的上下文
+    :return: (start, end, lo, hi)，块内输出 [start, end)，计算范围 [lo, hi)
+    """
+    for start in range(0, n_frames, chunk):
+        end = min(start + chunk, n_frames)
+        yield start, end, max(start - overlap, 0), min(end + overlap, n_frames)
+
+
+class ParallelF0Extractor:
+    """
+    harvest、pm 的分块并行提取，音频按帧对齐切分为带重叠的块，在进程池中提取后裁掉重叠部分拼接，
+    块内帧与整段提取的帧时间一一对应，除块边界附近外结果与整段提取一致
+    :param workers: 进程数
+    :param chunk_seconds: 每块输出时长
+    :param overlap_seconds: 每块前后的上下文时长
+    """
+
+    def __init__(self, workers: int, chunk_seconds: float = 10, overlap_seconds: float = 1):
+        self.workers = workers
+        self.chunk_seconds = chunk_seconds
+        self.overlap_seconds = overlap_seconds
+        self._executor = None
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, cfg=None):
+        """
+        未配置或 workers 小于 2 时返回 None，使用整段提取
+        """
+        if cfg is None or int(cfg.get("workers", 0) or 0) < 2:
+            return None
+        return cls(workers=int(cfg.get("workers")),
+                   chunk_seconds=float(cfg.get("chunk_seconds", 10)),
+                   overlap_seconds=float(cfg.get("overlap_seconds", 1)))
+
+    @property
+    def executor(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                # spawn 避免 fork 继承 torch 的线程状态
+                self._executor = ProcessPoolExecutor(max_workers=self.workers,
+                                                     mp_context=multiprocessing.get_context("spawn"))
+            return self._executor
+
+    def shutdown(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown()
+                self._executor = None
+
+    def harvest(self, x: np.ndarray, fs: int, f0max: float, f0min: float, frame_period: float) -> np.ndarray:
+        """
+        与 harvest_f0 的输出等长，第 i 帧位于 i * frame_period 毫秒处
+        """
+        hop = int(fs * frame_period / 1000)
+        n_frames = int(1000 * x.shape[0] / fs / frame_period) + 1
+        chunk = max(int(self.chunk_seconds * 1000 / frame_period), 1)
+        overlap = int(self.overlap_seconds * 1000 / frame_period)
+        if n_frames <= chunk:
+            return harvest_f0(x, fs, f0max, f0min, frame_period)
+
+        futures = []
+        for start, end, lo, hi in chunk_frames(n_frames, chunk, overlap):
+            # 块内 hi - lo 帧，最后一块保留到音频末尾
+            audio = x[lo * hop:] if hi == n_frames else x[lo * hop: (hi - 1) * hop + 1]
+            futures.append((start - lo, end - lo,
+                            self.executor.submit(harvest_f0, audio, fs, f0max, f0min, frame_period)))
+        return np.concatenate([future.result()[a:b] for a, b, future in futures])
+
+    def pm(self, x: np.ndarray, sr: int, time_step: float, f0_min: float, f0_max: float) -> np.ndarray:
+        """
+        与 pm_f0 的输出等长，块长度选取为与整段相同的首帧偏移，使块内帧时间与整段对齐
+        """
+        hop = int(round(sr * time_step))
+        window = int(round(sr * 3 / f0_min))  # to_pitch_ac 的分析窗长，3 个周期
+        if x.shape[0] < window:
+            return pm_f0(x, sr, time_step, f0_min, f0_max)
+        n_frames = (x.shape[0] - window) // hop + 1
+        # 首帧之前与末帧之后的剩余采样点数，与块长度无关时块内帧与整段帧对齐
+        residual = x.shape[0] - (n_frames - 1) * hop
+        chunk = max(int(self.chunk_seconds / time_step), 1)
+        overlap = int(self.overlap_seconds / time_step)
+        if n_frames <= chunk:
+            return pm_f0(x, sr, time_step, f0_min, f0_max)
+
+        futures = []
+        for start, end, lo, hi in chunk_frames(n_frames, chunk, overlap):
+            audio = x[lo * hop: lo * hop + (hi - lo - 1) * hop + residual]
+            futures.append((start - lo, end - lo,
+                            self.executor.submit(pm_f0, audio, sr, time_step, f0_min, f0_max)))
+        return np.concatenate([future.result()[a:b] for a, b, future in futures])
@@ -0,0 +1,166 @@
+import logging
+import threading
+from typing import Callable, Dict, Hashable, List, Tuple
+
+import numpy as np
+import torch
+
+logger = logging.getLogger('speaker_runner')
+
+
+def set_pitch_estimators_logger(l):
+    global logger
+    logger = l
+
+
+def module_nbytes(*modules: torch.nn.Module) -> int:
+    """
+    统计模型参数与 buffer 占用的字节数
+    """
+    total = 0
+    for module in modules:
+        if module is None:
+            continue
+        for tensor in list(module.parameters()) + list(module.buffers()):
+            total += tensor.element_size() * tensor.nelement()
+    return int(total)
+
+
+class CrepeEstimator:
+    """
+    torchcrepe 的模型保存在模块级全局变量中，这里负责一次性加载，并串行化推理调用
+    """
+
+    def __init__(self, device: str, capacity: str = "full"):
+        import torchcrepe
+
+        self._torchcrepe = torchcrepe
+        self.device = device
+        self.capacity = capacity
+        self._lock = threading.Lock()
+        torchcrepe.load.model(device, capacity)
+
+    @property
+    def nbytes(self) -> int:
+        return module_nbytes(getattr(self._torchcrepe.infer, 'model', None))
+
+    def infer_from_audio(self, x: np.ndarray, sr: int, hop_length: int, f0_min: float, f0_max: float,
+                         batch_size: int = 512) -> np.ndarray:
+        torchcrepe = self._torchcrepe
+        audio = torch.tensor(np.copy(x))[None].float()
+        with self._lock:
+            f0, pd = torchcrepe.predict(
+                audio,
+                sr,
+                hop_length,
+                f0_min,
+                f0_max,
+                self.capacity,
+                batch_size=batch_size,
+                device=self.device,
+                return_periodicity=True,
+            )
+        pd = torchcrepe.filter.median(pd, 3)
+        f0 = torchcrepe.filter.mean(f0, 3)
+        f0[pd < 0.1] = 0
+        return f0[0].cpu().numpy()
+
+
+def _load_rmvpe(model_path: str, is_half: bool, device: str):
+    from speakers.rvc.lib.rmvpe import RMVPE
+
+    # 非 cpu 设备上解码直接在设备上完成，避免把 salience 拷回 cpu
+    return RMVPE(model_path, is_half=is_half, device=device, decode_on_device=not str(device).startswith("cpu"))
+
+
+def _load_crepe(model_path: str, is_half: bool, device: str):
+    return CrepeEstimator(device=device, capacity=model_path or "full")
+
+
+class PitchEstimatorRegistry:
+    """
+    进程级的音高估计模型注册表，rmvpe、crepe 等模型在进程内只加载一次，被所有 VC 实例共享
+    以 (name, model_path, is_half, device) 为键，加载过程线程安全；不使用 is_half 的模型(crepe)键中不含 is_half，
+    预加载与推理时传入的 is_half 不同也得到同一个实例
+    """
+
+    def __init__(self):
+        self._loaders: Dict[str, Callable] = {}
+        self._uses_half: Dict[str, bool] = {}
+        self._estimators: Dict[Hashable, object] = {}
+        self._locks: Dict[Hashable, threading.Lock] = {}
+        self._lock = threading.Lock()
+
+    def register_loader(self, name: str, loader: Callable, uses_half: bool = True):
+        r"""Register a pitch estimator loader with key 'name'
+
+        Args:
+            name: f0_method name, such as rmvpe / crepe
+            loader: callable(model_path, is_half, device) -> estimator
+            uses_half: whether the loader depends on is_half, otherwise is_half is left out of the key
+        """
+        if name in self._loaders:
+            raise KeyError("Name '{}' already registered for {}.".format(name, self._loaders[name]))
+        self._loaders[name] = loader
+        self._uses_half[name] = uses_half
+
+    def key(self, name: str, model_path: str = None, is_half: bool = False, device: str = "cpu") -> Tuple:
+        return name, model_path, bool(is_half) if self._uses_half.get(name, True) else None, str(device)
+
+    def list_loaders(self) -> List[str]:
+        return sorted(self._loaders.keys())
+
+    def get(self, name: str, model_path: str = None, is_half: bool = False, device: str = "cpu"):
+        """
+        获取音高估计模型，首次调用时加载
+        """
+        if name not in self._loaders:
+            raise ValueError(f'Could not find pitch estimator for: "{name}". '
+                             f'Choose from the following: %s' % ','.join(self.list_loaders()))
+        key = self.key(name, model_path, is_half, device)
+        estimator = self._estimators.get(key)
+        if estimator is not None:
+            return estimator
+
+        with self._lock:
+            key_lock = self._locks.setdefault(key, threading.Lock())
+        # 不同模型可以并行加载，同一个模型只加载一次
+        with key_lock:
+            estimator = self._estimators.get(key)
+            if estimator is None:
+                logger.info(f'loading pitch estimator {name}: {model_path}, device:{device}, is_half:{is_half}')
+                estimator = self._loaders[name](model_path, is_half, device)
+                self._estimators[key] = estimator
+                logger.info(f'loaded pitch estimator {name}, bytes:{self._estimator_nbytes(estimator)}')
+        return estimator
+
+    def preload(self, names: List[str], model_paths: Dict[str, str] = None, is_half: bool = False,
+                device: str = "cpu"):
+        """
+        启动阶段预加载
+        """
+        model_paths = model_paths or {}
+        for name in names:
+            self.get(name, model_path=model_paths.get(name), is_half=is_half, device=device)
+
+    def memory_footprint(self) -> Dict[Tuple, int]:
+        """
+        已加载模型的内存占用（字节）
+        """
+        return {key: self._estimator_nbytes(estimator) for key, estimator in list(self._estimators.items())}
+
+    def clear(self):
+        with self._lock:
+            self._estimators.clear()
+            self._locks.clear()
+
+    @staticmethod
+    def _estimator_nbytes(estimator) -> int:
+        if hasattr(estimator, 'nbytes'):
+            return estimator.nbytes
+        return module_nbytes(getattr(estimator, 'model', None), getattr(estimator, 'mel_extractor', None))
+
+
+pitch_estimators = PitchEstimatorRegistry()
+pitch_estimators.register_loader("rmvpe", _load_rmvpe)
+pitch_estimators.register_loader("crepe", _load_crepe, uses_half=False)
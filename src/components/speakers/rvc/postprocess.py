@@ -0,0 +1,172 @@
+"""
+合成器输出的后处理：音量包络融合(rms_mix_rate)、重采样(resample_sr)与 int16 转换
+
+整段输出时在同一个 float32 缓冲区上原地分块处理，包络按帧(半秒一帧)计算，逐块插值得到增益后一次乘上；
+峰值在写回时顺带统计，int16 直接写入输出数组，不再为每一步分配整段副本。流式输出使用 push/flush
+"""
+import logging
+
+import numpy as np
+
+from speakers.common.resample import StreamResampler, resample
+
+logger = logging.getLogger('speaker_runner')
+
+
+def set_postprocess_logger(l):
+    global logger
+    logger = l
+
+
+def frame_rms(y: np.ndarray, frame_length: int, hop_length: int) -> np.ndarray:
+    """
+    与 librosa.feature.rms(center=True) 相同的帧 RMS，逐帧点积，不分帧复制
+    :return: float32 [帧数]
+    """
+    half = frame_length // 2
+    n_frames = 1 + (y.shape[0] + 2 * half - frame_length) // hop_length
+    rms = np.empty(n_frames, dtype=np.float32)
+    for i in range(n_frames):
+        segment = y[max(0, i * hop_length - half): max(0, i * hop_length - half + frame_length)]
+        rms[i] = np.sqrt(np.dot(segment, segment) / frame_length)
+    return rms
+
+
+def interpolate_frames(frames: np.ndarray, n: int, start: int, end: int) -> np.ndarray:
+    """
+    帧序列线性插值到 n 个采样点后的 [start, end) 部分，与 F.interpolate(mode="linear") 一致：
+    第 k 帧位于采样点 (k + 0.5) * n / 帧数 - 0.5，两端之外取端点的值；相邻两帧之间是一段直线，逐段计算
+    """
+    n_frames = frames.shape[0]
+    scale = n_frames / n
+    output = np.empty(end - start, dtype=np.float32)
+    # 第 k 帧之后的第一个采样点
+    bounds = np.clip(np.ceil((np.arange(n_frames) + 0.5) / scale - 0.5).astype(np.int64), start, end) - start
+    output[:bounds[0]] = frames[0]
+    output[bounds[-1]:] = frames[-1]
+    steps = np.arange(max(np.diff(bounds).max(initial=0), 0), dtype=np.float32)
+    for k in np.flatnonzero(np.diff(bounds)):
+        lo, hi = bounds[k], bounds[k + 1]
+        delta = float(frames[k + 1]) - float(frames[k])
+        weight = (start + lo + 0.5) * scale - 0.5 - k
+        segment = output[lo:hi]
+        np.multiply(steps[:hi - lo], delta * scale, out=segment)
+        segment += frames[k] + delta * weight
+    return output
+
+
+def envelope_gain(rms1: np.ndarray, rms2: np.ndarray, rate: float) -> np.ndarray:
+    """
+    rms1^(1-rate) * max(rms2, 1e-6)^(rate-1)，rms1 为输入包络，rms2 为输出包络
+    """
+    with np.errstate(divide="ignore"):
+        return np.exp((1 - rate) * np.log(rms1) + (rate - 1) * np.log(np.maximum(rms2, 1e-6)))
+
+
+def peak(audio: np.ndarray, chunk_size: int) -> float:
+    value = 0.0
+    for start in range(0, audio.shape[0], chunk_size):
+        chunk = audio[start: start + chunk_size]
+        value = max(value, float(chunk.max()), -float(chunk.min()))
+    return value
+
+
+class PostProcess:
+    """
+    :param tgt_sr: 合成器输出采样率
+    :param resample_sr: 后处理重采样至最终采样率，小于 16000 或等于 tgt_sr 时不重采样
+    :param rms_mix_rate: 输入源音量包络替换输出音量包络融合比例，越靠近1越使用输出包络
+    :param resample_quality: 重采样质量档位
+    :param input_sr: 输入源(hubert 输入)采样率
+    :param chunk_size: 分块处理的采样点数
+    """
+
+    def __init__(self, tgt_sr: int, resample_sr: int = 0, rms_mix_rate: float = 1.0,
+                 resample_quality: str = "default", input_sr: int = 16000, chunk_size: int = 1 << 16):
+        self.tgt_sr = tgt_sr
+        self.resample = 16000 <= resample_sr != tgt_sr
+        self.out_sr = resample_sr if self.resample else tgt_sr
+        self.rms_mix_rate = rms_mix_rate
+        self.resample_quality = resample_quality
+        self.input_sr = input_sr
+        self.chunk_size = chunk_size
+        self.reset()
+
+    def __call__(self, audio_opt: np.ndarray, audio: np.ndarray) -> np.ndarray:
+        """
+        整段后处理，audio_opt 会被原地修改
+        :param audio_opt: 合成器输出，tgt_sr
+        :param audio: 输入源，input_sr
+        :return: out_sr 的 int16 音频，峰值超过 0.99 时整体缩放
+        """
+        audio_opt = np.asarray(audio_opt)
+        if audio_opt.dtype != np.float32 or not audio_opt.flags.writeable or not audio_opt.flags.c_contiguous:
+            audio_opt = np.ascontiguousarray(audio_opt, dtype=np.float32).copy()
+        if self.rms_mix_rate != 1:
+            self._mix_rms(audio_opt, audio)
+        if self.resample:
+            audio_opt = resample(audio_opt, self.tgt_sr, self.out_sr, self.resample_quality)
+        return self._to_int16(audio_opt, peak(audio_opt, self.chunk_size))
+
+    def _mix_rms(self, audio_opt: np.ndarray, audio: np.ndarray):
+        # 与 change_rms 相同：每半秒一帧，帧长一秒
+        rms1 = frame_rms(audio, self.input_sr // 2 * 2, self.input_sr // 2)
+        rms2 = frame_rms(audio_opt, self.tgt_sr // 2 * 2, self.tgt_sr // 2)
+        n = audio_opt.shape[0]
+        for start in range(0, n, self.chunk_size):
+            end = min(n, start + self.chunk_size)
+            audio_opt[start:end] *= envelope_gain(interpolate_frames(rms1, n, start, end),
+                                                  interpolate_frames(rms2, n, start, end),
+                                                  self.rms_mix_rate)
+
+    def _to_int16(self, audio_opt: np.ndarray, audio_peak: float) -> np.ndarray:
+        scale = 32768 / max(audio_peak / 0.99, 1)
+        output = np.empty(audio_opt.shape[0], dtype=np.int16)
+        for start in range(0, audio_opt.shape[0], self.chunk_size):
+            chunk = audio_opt[start: start + self.chunk_size]
+            chunk *= scale
+            # 与 astype(np.int16) 一样向零截断
+            output[start: start + chunk.shape[0]] = chunk
+        return output
+
+    def reset(self):
+        """
+        重置流式状态
+        """
+        self._resampler = (StreamResampler(self.tgt_sr, self.out_sr, self.resample_quality)
+                           if self.resample else None)
+        self._input_tail = np.zeros(0, dtype=np.float32)
+        self._output_tail = np.zeros(0, dtype=np.float32)
+        self._gain = None
+
+    def push(self, audio_opt: np.ndarray, audio: np.ndarray) -> np.ndarray:
+        """
+        流式后处理，audio_opt 与 audio 为同一时间段的输出与输入；
+        包络取每块末尾一帧(一秒)窗口的 RMS，增益在块内从上一块的值线性过渡，不做整体峰值归一化
+        :param audio_opt: 合成器输出块，tgt_sr
+        :param audio: 对应的输入块，input_sr
+        :return: out_sr 的 float32 音频块
+        """
+        audio_opt = np.asarray(audio_opt, dtype=np.float32)
+        if self.rms_mix_rate != 1 and audio_opt.shape[0] > 0:
+            input_frame, output_frame = self.input_sr // 2 * 2, self.tgt_sr // 2 * 2
+            self._input_tail = np.concatenate([self._input_tail, np.asarray(audio, dtype=np.float32)])[-input_frame:]
+            self._output_tail = np.concatenate([self._output_tail, audio_opt])[-output_frame:]
+            gain = float(envelope_gain(np.sqrt(np.dot(self._input_tail, self._input_tail) / input_frame),
+                                       np.sqrt(np.dot(self._output_tail, self._output_tail) / output_frame),
+                                       self.rms_mix_rate))
+            previous = gain if self._gain is None else self._gain
+            ramp = np.arange(1, audio_opt.shape[0] + 1, dtype=np.float32) / audio_opt.shape[0]
+            audio_opt = audio_opt * (previous + (gain - previous) * ramp)
+            self._gain = gain
+        if self._resampler is not None:
+            audio_opt = self._resampler.push(audio_opt)
+        return audio_opt
+
+    def flush(self) -> np.ndarray:
+        """
+        输入结束，取出重采样的剩余部分并重置
+        """
+        output = self._resampler.flush() if self._resampler is not None else np.zeros(0, dtype=np.float32)
+        self.reset()
+        return output
@@ -0,0 +1,153 @@
+import copy
+import hashlib
+import logging
+import os
+from typing import Callable, List, Optional
+
+import librosa
+import numpy as np
+import torch
+from torch import nn
+
+logger = logging.getLogger('speaker_runner')
+
+
+def set_quantization_logger(l):
+    global logger
+    logger = l
+
+
+# 量化层的选择规则变化时修改，旧规则下落盘的量化 state_dict 不再命中
+QUANTIZATION_SCHEME = "linear-no-attention"
+
+
+def _is_attention(module: nn.Module) -> bool:
+    """
+    多头注意力层：nn.MultiheadAttention 与 fairseq 的 MultiheadAttention(带 q_proj、k_proj、v_proj)
+    """
+    return isinstance(module, nn.MultiheadAttention) or all(
+        isinstance(getattr(module, name, None), nn.Linear) for name in ("q_proj", "k_proj", "v_proj"))
+
+
+def quantizable_linears(module: nn.Module, prefix: str = "") -> List[str]:
+    """
+    可以量化的 nn.Linear 的名称，跳过注意力层内的投影：
+    fairseq 0.12.2 的 MultiheadAttention 在 eager 模式下走 F.multi_head_attention_forward，
+    直接读取 q_proj.weight、q_proj.bias 张量，动态量化的 Linear 上它们是方法，推理时报 TypeError
+    """
+    names = []
+    for name, child in module.named_children():
+        full_name = f'{prefix}.{name}' if prefix else name
+        if type(child) is nn.Linear:
+            names.append(full_name)
+        elif not _is_attention(child):
+            names.extend(quantizable_linears(child, full_name))
+    return names
+
+
+def quantize_module(module: nn.Module) -> nn.Module:
+    """
+    对 nn.Linear 做动态 int8 量化（权重 int8，激活在推理时按批量化），只能在 cpu 上推理
+    卷积层的动态量化在 cpu 上比 fp32 更慢且误差较大，不做量化；注意力层的投影见 quantizable_linears
+    """
+    return torch.ao.quantization.quantize_dynamic(module, set(quantizable_linears(module)), dtype=torch.qint8,
+                                                  inplace=True)
+
+
+def _swap_quantized_linear(module: nn.Module) -> nn.Module:
+    """
+    按 quantize_module 的结果替换出空的量化 Linear，用于加载已缓存的量化 state_dict，不重新量化
+    """
+    for name in quantizable_linears(module):
+        parent_name, _, child_name = name.rpartition('.')
+        parent = module.get_submodule(parent_name) if parent_name else module
+        child = getattr(parent, child_name)
+        setattr(parent, child_name, torch.ao.nn.quantized.dynamic.Linear(
+            child.in_features, child.out_features, bias_=child.bias is not None, dtype=torch.qint8))
+    return module
+
+
+def reference_clip(sr: int = 16000, seconds: float = 1.0) -> np.ndarray:
+    """
+    精度校验使用的固定音频，带颤音的谐波信号
+    """
+    t = np.arange(int(sr * seconds)) / sr
+    f0 = 180 + 20 * np.sin(2 * np.pi * 5 * t)
+    phase = 2 * np.pi * np.cumsum(f0) / sr
+    audio = sum(np.sin(k * phase) / k for k in range(1, 6))
+    return (0.3 * audio / np.abs(audio).max()).astype(np.float32)
+
+
+def mel_distance(reference: np.ndarray, test: np.ndarray, sr: int, n_mels: int = 80) -> float:
+    """
+    对数梅尔谱的平均绝对差
+    """
+    n = min(reference.shape[-1], test.shape[-1])
+    mel_ref = np.log(librosa.feature.melspectrogram(y=reference[..., :n], sr=sr, n_mels=n_mels) + 1e-5)
+    mel_test = np.log(librosa.feature.melspectrogram(y=test[..., :n], sr=sr, n_mels=n_mels) + 1e-5)
+    return float(np.abs(mel_ref - mel_test).mean())
+
+
+def relative_error(reference: torch.Tensor, test: torch.Tensor) -> float:
+    return float((reference - test).norm() / reference.norm().clamp_min(1e-12))
+
+
+class QuantizedModelCache:
+    """
+    量化模型缓存，量化后的 state_dict 以源文件路径、修改时间与 torch 版本为键落盘，
+    之后启动直接加载，不再重新量化；只有通过精度校验的模型才会落盘
+    :param cache_dir: 落盘目录
+    """
+
+    def __init__(self, cache_dir: str):
+        self.cache_dir = cache_dir
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def cache_file(self, source_file: str, name: str) -> str:
+        stat = os.stat(source_file)
+        digest = hashlib.sha1(
+            f'{os.path.abspath(source_file)}:{stat.st_mtime_ns}:{torch.__version__}:{name}:{QUANTIZATION_SCHEME}'.encode('utf-8')
+        ).hexdigest()
+        return os.path.join(self.cache_dir, f'{os.path.basename(source_file)}.{name}.{digest[:16]}.int8.pt')
+
+    def quantize(self,
+                 module: nn.Module,
+                 source_file: str,
+                 name: str,
+                 error_fn: Callable[[nn.Module, nn.Module], float],
+                 max_error: float) -> Optional[nn.Module]:
+        """
+        量化 module，命中缓存时直接加载
+        :param module: fp32 模型
+        :param source_file: 模型源文件，用于计算缓存键
+        :param name: 模型内的子模块名称，区分同一文件的不同部分
+        :param error_fn: callable(fp32 模型, 量化模型) -> 误差
+        :param max_error: 误差上限，超出时返回 None，由调用方继续使用 fp32 模型
+        """
+        cache_file = self.cache_file(source_file, name)
+        if os.path.exists(cache_file):
+            try:
+                # 在副本上替换，加载失败时调用方的 fp32 模型不受影响
+                quantized = _swap_quantized_linear(copy.deepcopy(module))
+                quantized.load_state_dict(torch.load(cache_file, map_location="cpu"))
+                logger.info(f'Loaded quantized {name}: {cache_file}')
+                return quantized
+            except Exception as e:
+                logger.warning(f'Load quantized {name} error {cache_file}, {e.__class__.__name__}: {e}, '
+                               f'quantize again')
+
+        try:
+            quantized = quantize_module(copy.deepcopy(module))
+            error = error_fn(module, quantized)
+        except Exception as e:
+            logger.error(f'Quantize {name} error, {e.__class__.__name__}: {e}, keep fp32: {source_file}',
+                         exc_info=e)
+            return None
+        if error > max_error:
+            logger.warning(f'Quantized {name} rejected, error:{error:.4f} > {max_error}, keep fp32: {source_file}')
+            return None
+        tmp_file = f'{cache_file}.{os.getpid()}.tmp'
+        torch.save(quantized.state_dict(), tmp_file)
+        os.replace(tmp_file, cache_file)
+        logger.info(f'Quantized {name}, error:{error:.4f}: {cache_file}')
+        return quantized
@@ -0,0 +1,121 @@
+from typing import Callable, Dict, List
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+# 切点代价函数，输入 16k 音频与帧长 window，输出与音频等长的代价序列，
+# 分段时在每个查询窗口内选择代价最小的位置作为切点
+cut_strategies: Dict[str, Callable[[np.ndarray, int], np.ndarray]] = {}
+
+
+def register_cut_strategy(name: str):
+    r"""Register a cut point strategy with key 'name'
+
+    Args:
+        name: Key with which the strategy will be registered.
+    """
+
+    def wrap(strategy):
+        if name in cut_strategies:
+            raise KeyError("Name '{}' already registered for {}.".format(name, cut_strategies[name]))
+        cut_strategies[name] = strategy
+        return strategy
+
+    return wrap
+
+
+def moving_sum(x: np.ndarray, window: int) -> np.ndarray:
+    """
+    以 window 为窗长的滑动求和，输入先按 window // 2 反射补齐，输出与输入等长，
+    等价于 sum(x_pad[i: i - window] for i in range(window))
+    """
+    x_pad = np.pad(x, (window // 2, window // 2), mode="reflect")
+    cumsum = np.empty(x_pad.shape[0] + 1, dtype=np.float64)
+    cumsum[0] = 0
+    np.cumsum(x_pad, out=cumsum[1:])
+    return cumsum[window: window + x.shape[0]] - cumsum[: x.shape[0]]
+
+
+@register_cut_strategy("sum")
+def sum_cost(audio: np.ndarray, window: int) -> np.ndarray:
+    """
+    原始实现：滑动窗口内采样值之和的绝对值
+    """
+    return np.abs(moving_sum(audio, window))
+
+
+@register_cut_strategy("energy")
+def energy_cost(audio: np.ndarray, window: int) -> np.ndarray:
+    """
+    滑动窗口内的能量
+    """
+    return moving_sum(np.square(audio, dtype=np.float64), window)
+
+
+@register_cut_strategy("vad")
+def vad_cost(audio: np.ndarray, window: int, threshold_db: float = -40.0) -> np.ndarray:
+    """
+    基于能量阈值的静音检测，代价为到最近有声帧距离的相反数，切点落在最长静音段的中间，
+    没有静音帧时退化为能量最小处
+    """
+    energy = energy_cost(audio, window)
+    frame_energy = energy[:: window]
+    n_frames = frame_energy.shape[0]
+    frame_db = 10 * np.log10(frame_energy / max(frame_energy.max(), 1e-12) + 1e-12)
+    voiced = frame_db > threshold_db
+
+    idx = np.arange(n_frames)
+    # 向前、向后最近的有声帧位置
+    last_voiced = np.maximum.accumulate(np.where(voiced, idx, -n_frames))
+    next_voiced = np.minimum.accumulate(np.where(voiced, idx, 2 * n_frames)[::-1])[::-1]
+    distance = np.minimum(idx - last_voiced, next_voiced - idx).astype(np.float64)
+
+    cost = -np.repeat(distance, window)[: audio.shape[0]]
+    # 同等距离时选择能量更小的位置
+    return cost + energy / (energy.max() + 1e-12)
+
+
+class Segmenter:
+    """
+    长音频分段，在每个 t_center 附近 ±t_query 的查询窗口内选择代价最小的位置作为切点
+    :param window: 帧长
+    :param t_query: 切点前后查询长度
+    :param t_center: 切点间隔
+    :param t_max: 小于该长度的音频不切分
+    :param strategy: 切点代价函数名称，见 cut_strategies
+    """
+
+    def __init__(self, window: int, t_query: int, t_center: int, t_max: int, strategy: str = "sum"):
+        if strategy not in cut_strategies:
+            raise ValueError(f'Could not find cut strategy for: "{strategy}". '
+                             f'Choose from the following: %s' % ','.join(cut_strategies))
+        self.window = window
+        self.t_query = t_query
+        self.t_center = t_center
+        self.t_max = t_max
+        self.strategy = strategy
+
+    def __call__(self, audio: np.ndarray) -> List[int]:
+        """
+        :param audio: 16k 音频
+        :return: 切点位置 opt_ts
+        """
+        if audio.shape[0] + self.window // 2 * 2 <= self.t_max:
+            return []
+        centers = np.arange(self.t_center, audio.shape[0], self.t_center)
+        if centers.shape[0] == 0:
+            return []
+
+        cost = cut_strategies[self.strategy](audio, self.window)
+        starts = centers - self.t_query
+        query_len = self.t_query * 2
+        # 完整落在音频内的查询窗口一次性计算 argmin
+        full = starts + query_len <= cost.shape[0]
+        opt_ts = np.empty(centers.shape[0], dtype=np.int64)
+        if full.any():
+            windows = sliding_window_view(cost, query_len)
+            opt_ts[full] = starts[full] + np.argmin(windows[starts[full]], axis=1)
+        # 末尾被截断的查询窗口
+        for i in np.nonzero(~full)[0]:
+            opt_ts[i] = starts[i] + np.argmin(cost[starts[i]:])
+        return opt_ts.tolist()
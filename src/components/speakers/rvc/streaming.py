@@ -0,0 +1,263 @@
+import logging
+import time
+from typing import Optional
+
+import numpy as np
+import torch
+from scipy import signal
+
+from speakers.common.resample import StreamResampler
+from speakers.common.threads import stage
+from speakers.rvc.postprocess import PostProcess
+from speakers.rvc.vc_infer_pipeline import VC, ah, bh, f0_coarse
+
+logger = logging.getLogger('speaker_runner')
+
+
+def set_streaming_logger(l):
+    global logger
+    logger = l
+
+
+def crossfade_curves(n: int):
+    """
+    sin²/cos² 交叉淡化曲线，两者之和恒为 1
+    :return: (fade_in, fade_out)
+    """
+    fade_in = np.sin(0.5 * np.pi * (np.arange(n) + 0.5) / n) ** 2
+    return fade_in.astype(np.float32), (1 - fade_in).astype(np.float32)
+
+
+class StreamingVC:
+    """
+    流式变声会话，按块输入单声道音频，按块输出 tgt_sr 音频；输入不是 16k 时先流式重采样
+
+    每个块与其左侧 context 个采样点一起推理，hubert、F0 都能看到块之前的音频；
+    块末尾的 crossfade 个采样点作为前瞻，输出暂存，与下一个块推理出的同一段音频交叉淡化后再输出，
+    所以输出比输入延迟 crossfade 个采样点；与上一块重叠部分的 F0 沿用上一块的估计，保证块边界的音高连续
+    context 默认为 x_pad，crossfade 默认为 x_pad 的十分之一，均按 160 个采样点的帧对齐
+
+    :param vc: 音色的 VC 实例
+    :param hubert_model:
+    :param net_g: 合成器
+    :param sid: 说话人 id
+    :param if_f0: 合成器是否使用 F0
+    :param version: v1 或 v2
+    :param f0_up_key: 变调，半音数量
+    :param f0_method: pm、harvest、crepe、rmvpe
+    :param filter_radius: harvest 的中值滤波半径
+    :param file_index: 检索索引路径
+    :param index_rate: 检索特征占比
+    :param protect: 清辅音保护
+    :param block_seconds: 每次推理的块长
+    :param context_seconds: 左侧上下文时长，为空时使用 x_pad
+    :param crossfade_seconds: 交叉淡化时长，为空时使用 x_pad / 10
+    :param input_sr: 输入采样率
+    :param resample_quality: 重采样的质量档位
+    :param rms_mix_rate: 输入源音量包络替换输出音量包络融合比例，越靠近1越使用输出包络
+    :param resample_sr: 输出重采样至该采样率，0为不进行重采样
+    """
+
+    def __init__(self,
+                 vc: VC,
+                 hubert_model,
+                 net_g,
+                 sid: int,
+                 if_f0: int,
+                 version: str,
+                 f0_up_key: int = 0,
+                 f0_method: str = "rmvpe",
+                 filter_radius: int = 3,
+                 file_index: str = "",
+                 index_rate: float = 0.0,
+                 protect: float = 0.33,
+                 block_seconds: float = 0.5,
+                 context_seconds: Optional[float] = None,
+                 crossfade_seconds: Optional[float] = None,
+                 input_sr: int = 16000,
+                 resample_quality: str = "default",
+                 rms_mix_rate: float = 1.0,
+                 resample_sr: int = 0):
+        self.vc = vc
+        self.hubert_model = hubert_model
+        self.net_g = net_g
+        self.if_f0 = if_f0
+        self.version = version
+        self.f0_up_key = int(f0_up_key)
+        self.f0_method = f0_method
+        self.filter_radius = filter_radius
+        self.index_rate = index_rate
+        self.protect = protect
+        self.index, self.big_npy = vc.load_index(file_index, index_rate)
+        self.sid = torch.tensor(sid, device=vc.device).unsqueeze(0).long()
+        self.resampler = StreamResampler(input_sr, vc.sr, resample_quality) if input_sr != vc.sr else None
+        self.postprocess = PostProcess(vc.tgt_sr, resample_sr, rms_mix_rate, resample_quality,
+                                       input_sr=vc.sr)
+
+        window = vc.window
+        self.block = self._frames(block_seconds) * window
+        if self.block <= 0:
+            raise ValueError(f'block_seconds too small: {block_seconds}')
+        self.context = vc.t_pad if context_seconds is None else self._frames(context_seconds) * window
+        self.crossfade = (max(1, vc.t_pad // window // 10) * window if crossfade_seconds is None
+                          else self._frames(crossfade_seconds) * window)
+        if self.crossfade > self.block or self.crossfade > self.context:
+            raise ValueError(f'crossfade:{self.crossfade} must not exceed block:{self.block} '
+                             f'and context:{self.context}')
+        # 块右侧的反射填充，弥补 hubert 卷积在末尾少输出的帧
+        self.tail_pad = window * 4
+        self.fade_in, self.fade_out = crossfade_curves(self.tgt_samples(self.crossfade))
+
+        self._history = np.zeros(0, dtype=np.float32)
+        self._pending = np.zeros(0, dtype=np.float32)
+        self._tail: Optional[np.ndarray] = None
+        self._f0 = None  # (起始帧, 上一块可靠区间的原始 F0)
+        self._position = 0  # 下一个块在输入中的起始采样点
+        self.times = [0, 0, 0]
+        self.latencies = []
+
+    def _frames(self, seconds: float) -> int:
+        return int(round(seconds * self.vc.sr / self.vc.window))
+
+    @property
+    def out_sr(self) -> int:
+        """
+        输出采样率，resample_sr 有效时为 resample_sr，否则为合成器采样率
+        """
+        return self.postprocess.out_sr
+
+    def tgt_samples(self, n: int) -> int:
+        """
+        16k 输入的 n 个采样点对应的输出采样点数
+        """
+        return n * self.vc.tgt_window // self.vc.window
+
+    @property
+    def latency_seconds(self) -> float:
+        """
+        算法延迟，不含推理耗时：一个块的缓冲加上交叉淡化的前瞻
+        """
+        return (self.block + self.crossfade) / self.vc.sr
+
+    @property
+    def stats(self) -> dict:
+        latencies = self.latencies or [0.0]
+        return {
+            'blocks': len(self.latencies),
+            'block_seconds': self.block / self.vc.sr,
+            'latency_seconds': self.latency_seconds,
+            'first_block_seconds': latencies[0],
+            'mean_block_seconds': float(np.mean(latencies)),
+            'max_block_seconds': float(np.max(latencies)),
+        }
+
+    def push(self, audio: np.ndarray) -> np.ndarray:
+        """
+        输入一段单声道音频，返回已经可以输出的转换结果，可能为空
+        :param audio: input_sr 的 float32 音频，任意长度
+        :return: out_sr 的 float32 音频
+        """
+        audio = np.asarray(audio, dtype=np.float32)
+        if self.resampler is not None:
+            audio = self.resampler.push(audio)
+        self._pending = np.concatenate([self._pending, audio])
+        return self._drain()
+
+    def _drain(self) -> np.ndarray:
+        outputs = []
+        while self._pending.shape[0] >= self.block:
+            block, self._pending = self._pending[:self.block], self._pending[self.block:]
+            outputs.append(self._process(block, final=False))
+        return np.concatenate(outputs) if outputs else np.zeros(0, dtype=np.float32)
+
+    def flush(self) -> np.ndarray:
+        """
+        输入结束，处理剩余音频并输出暂存的前瞻部分，之后会话可以重新使用
+        """
+        outputs = []
+        if self.resampler is not None:
+            self._pending = np.concatenate([self._pending, self.resampler.flush()])
+            outputs.append(self._drain())
+        if self._pending.shape[0] > 0 or self._tail is not None:
+            outputs.append(self._process(self._pending, final=True))
+        outputs.append(self.postprocess.flush())
+        output = np.concatenate(outputs) if outputs else np.zeros(0, dtype=np.float32)
+        self.reset()
+        return output
+
+    def reset(self):
+        if self.resampler is not None:
+            self.resampler.reset()
+        self.postprocess.reset()
+        self._history = np.zeros(0, dtype=np.float32)
+        self._pending = np.zeros(0, dtype=np.float32)
+        self._tail = None
+        self._f0 = None
+        self._position = 0
+
+    def _process(self, block: np.ndarray, final: bool) -> np.ndarray:
+        start = time.perf_counter()
+        window = self.vc.window
+        if self._history.shape[0] > 0:
+            left = self._history
+        else:
+            # 第一个块，与离线 pipeline 一样用反射填充作为左侧上下文
+            left = np.pad(block, (self.context, 0), mode="reflect")[:self.context]
+        audio = np.concatenate([left, block])
+        n_left = left.shape[0]
+        right = self.vc.t_pad if final else self.tail_pad
+        audio_pad = np.ascontiguousarray(signal.filtfilt(bh, ah, np.pad(audio, (0, right), mode="reflect")))
+        p_len = audio_pad.shape[0] // window
+        # 本块可靠区间的终点，之后的前瞻部分暂存到下一块
+        emit_end = n_left + block.shape[0] - (0 if final else self.crossfade)
+
+        pitch, pitchf = None, None
+        if self.if_f0 == 1:
+            first_frame = (self._position - n_left) // window
+            pitch, pitchf = self._pitch(audio_pad, p_len, first_frame, emit_end // window)
+
+        audio1 = self.vc.vc(self.hubert_model, self.net_g, self.sid, audio_pad, pitch, pitchf, self.times,
+                            self.index, self.big_npy, self.index_rate, self.version, self.protect)
+        end = self.tgt_samples(n_left + block.shape[0])
+        if audio1.shape[0] < end:
+            audio1 = np.pad(audio1, (0, end - audio1.shape[0]))
+
+        emit_start = n_left - self.crossfade if self._tail is not None else n_left
+        output = audio1[self.tgt_samples(emit_start): self.tgt_samples(emit_end)].astype(np.float32)
+        if self._tail is not None:
+            n = self._tail.shape[0]
+            output[:n] = self._tail * self.fade_out + output[:n] * self.fade_in
+        self._tail = None if final else audio1[self.tgt_samples(emit_end): end].astype(np.float32)
+        with stage("postprocess"):
+            output = self.postprocess.push(output, audio[emit_start: emit_end])
+
+        self._history = audio[-self.context:]
+        self._position += block.shape[0]
+        elapsed = time.perf_counter() - start
+        self.latencies.append(elapsed)
+        logger.debug(f'Streaming block: {block.shape[0]} samples, {elapsed * 1000:.1f}ms')
+        return output
+
+    def _pitch(self, audio_pad: np.ndarray, p_len: int, first_frame: int, reliable_frames: int):
+        """
+        提取本块的原始 F0，与上一块可靠区间重叠的帧沿用上一块的结果
+        :param first_frame: 本块第一帧在整段输入中的帧号，第一个块的反射填充部分为负数
+        :param reliable_frames: 本块内可靠区间的帧数
+        """
+        f0 = self.vc.extract_f0(audio_pad, p_len, self.f0_method, self.filter_radius)[:p_len]
+        if f0.shape[0] < p_len:
+            f0 = np.pad(f0, (0, p_len - f0.shape[0]))
+        if self._f0 is not None:
+            prev_first, prev_f0 = self._f0
+            offset = first_frame - prev_first
+            n = max(0, min(prev_f0.shape[0] - offset, p_len))
+            if n > 0:
+                f0[:n] = prev_f0[offset: offset + n]
+        self._f0 = (first_frame, f0[:reliable_frames].copy())
+
+        pitch, pitchf = f0_coarse(f0 * pow(2, self.f0_up_key / 12))
+        if self.vc.device == "mps":
+            pitchf = pitchf.astype(np.float32)
+        pitch = torch.tensor(pitch, device=self.vc.device).unsqueeze(0).long()
+        pitchf = torch.tensor(pitchf, device=self.vc.device).unsqueeze(0).float()
+        return pitch, pitchf
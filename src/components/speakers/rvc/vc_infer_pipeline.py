@@ -1,31 +1,23 @@
-import numpy as np, parselmouth, torch, sys
+import numpy as np, torch, sys
 from time import time as ttime
 import torch.nn.functional as F
-import pyworld, os, traceback, faiss, librosa, torchcrepe
+import os, traceback, faiss, librosa
 from scipy import signal
-from functools import lru_cache
+from speakers.common.threads import stage
+from speakers.rvc.compact_index import blend, load_vectors
+from speakers.rvc.index_cache import FeatureIndexCache
+from speakers.rvc.f0_cache import F0Cache
+from speakers.rvc.parallel_f0 import ParallelF0Extractor, harvest_f0, pm_f0
+from speakers.rvc.feature_cache import HubertFeatureCache
+from speakers.rvc.pitch_estimators import pitch_estimators
+from speakers.rvc.postprocess import PostProcess
+from speakers.rvc.segmenter import Segmenter
 
 now_dir = os.getcwd()
 sys.path.append(now_dir)
 
 bh, ah = signal.butter(N=5, Wn=48, btype="high", fs=16000)
 
-input_audio_path2wav = {}
-
-
-@lru_cache
-def cache_harvest_f0(input_audio_path, fs, f0max, f0min, frame_period):
-    audio = input_audio_path2wav[input_audio_path]
-    f0, t = pyworld.harvest(
-        audio,
-        fs=fs,
-        f0_ceil=f0max,
-        f0_floor=f0min,
-        frame_period=frame_period,
-    )
-    f0 = pyworld.stonemask(audio, f0, t, fs)
-    return f0
-
 
 def change_rms(data1, sr1, data2, sr2, rate):  # 1是输入音频，2是输出音频,rate是2的占比
     # print(data1.max(),data2.max())
@@ -49,9 +41,30 @@ def change_rms(data1, sr1, data2, sr2, rate):  # 1是输入音频，2是输出
     return data2
 
 
+def f0_coarse(f0, f0_min=50, f0_max=1100):
+    """
+    把 F0 量化为合成器 pitch embedding 使用的 1-255 区间
+    :return: (f0_coarse, f0)
+    """
+    f0_mel_min = 1127 * np.log(1 + f0_min / 700)
+    f0_mel_max = 1127 * np.log(1 + f0_max / 700)
+    f0bak = f0.copy()
+    f0_mel = 1127 * np.log(1 + f0 / 700)
+    f0_mel[f0_mel > 0] = (f0_mel[f0_mel > 0] - f0_mel_min) * 254 / (
+            f0_mel_max - f0_mel_min
+    ) + 1
+    f0_mel[f0_mel <= 1] = 1
+    f0_mel[f0_mel > 255] = 255
+    f0_coarse = np.rint(f0_mel).astype(np.int64)
+    return f0_coarse, f0bak  # 1-0
+
+
 class VC(object):
     def __init__(self, tgt_sr, x_pad, x_query, x_center, x_max, is_half, device,
-                 rmvpe_path: str = None):
+                 rmvpe_path: str = None, index_cache: FeatureIndexCache = None,
+                 batch_size: int = 1, cut_strategy: str = "sum", feature_cache: HubertFeatureCache = None,
+                 f0_cache: F0Cache = None, parallel_f0: ParallelF0Extractor = None,
+                 resample_quality: str = "default", sweep_batch_size: int = 0):
         self.x_pad, self.x_query, self.x_center, self.x_max, self.is_half = (
             x_pad,
             x_query,
@@ -62,13 +75,24 @@ class VC(object):
         self.sr = 16000  # hubert输入采样率
         self.window = 160  # 每帧点数
         self.t_pad = self.sr * self.x_pad  # 每条前后pad时间
+        self.tgt_sr = tgt_sr
         self.t_pad_tgt = tgt_sr * self.x_pad
+        self.tgt_window = tgt_sr // 100  # 合成器每帧输出点数
         self.t_pad2 = self.t_pad * 2
         self.t_query = self.sr * self.x_query  # 查询切点前后查询时间
         self.t_center = self.sr * self.x_center  # 查询切点位置
         self.t_max = self.sr * self.x_max  # 免查询时长阈值
         self.device = device
         self.rmvpe_path = rmvpe_path
+        self.index_cache = index_cache
+        self.batch_size = batch_size  # 长音频分段后每批推理的段数，1 为逐段推理
+        self.segmenter = Segmenter(self.window, self.t_query, self.t_center, self.t_max, strategy=cut_strategy)
+        self.feature_cache = feature_cache
+        self.f0_cache = f0_cache
+        self.parallel_f0 = parallel_f0  # harvest、pm 分块并行提取，为空时整段提取
+        self.resample_quality = resample_quality  # 后处理重采样的质量档位
+        # 变调扫描时每次合成器推理合并的变调数，0 为自动：CUDA 上 8，CPU 上合并批次反而更慢，逐个变调推理
+        self.sweep_batch_size = sweep_batch_size or (8 if str(device).startswith("cuda") else 1)
 
     def get_f0(
             self,
@@ -80,65 +104,31 @@ class VC(object):
             filter_radius,
             inp_f0=None,
     ):
-        global input_audio_path2wav
-        time_step = self.window / self.sr * 1000
-        f0_min = 50
-        f0_max = 1100
-        f0_mel_min = 1127 * np.log(1 + f0_min / 700)
-        f0_mel_max = 1127 * np.log(1 + f0_max / 700)
-        if f0_method == "pm":
-            f0 = (
-                parselmouth.Sound(x, self.sr)
-                .to_pitch_ac(
-                    time_step=time_step / 1000,
-                    voicing_threshold=0.6,
-                    pitch_floor=f0_min,
-                    pitch_ceiling=f0_max,
-                )
-                .selected_array["frequency"]
-            )
-            pad_size = (p_len - len(f0) + 1) // 2
-            if pad_size > 0 or p_len - len(f0) - pad_size > 0:
-                f0 = np.pad(
-                    f0, [[pad_size, p_len - len(f0) - pad_size]], mode="constant"
-                )
-        elif f0_method == "harvest":
-            input_audio_path2wav[input_audio_path] = x.astype(np.double)
-            f0 = cache_harvest_f0(input_audio_path, self.sr, f0_max, f0_min, 10)
-            if filter_radius > 2:
-                f0 = signal.medfilt(f0, 3)
-        elif f0_method == "crepe":
-            model = "full"
-            # Pick a batch size that doesn't cause memory errors on your gpu
-            batch_size = 512
-            # Compute pitch using first gpu
-            audio = torch.tensor(np.copy(x))[None].float()
-            f0, pd = torchcrepe.predict(
-                audio,
-                self.sr,
-                self.window,
-                f0_min,
-                f0_max,
-                model,
-                batch_size=batch_size,
-                device=self.device,
-                return_periodicity=True,
-            )
-            pd = torchcrepe.filter.median(pd, 3)
-            f0 = torchcrepe.filter.mean(f0, 3)
-            f0[pd < 0.1] = 0
-            f0 = f0[0].cpu().numpy()
-        elif f0_method == "rmvpe":
-            if hasattr(self, "model_rmvpe") == False and self.rmvpe_path is not None:
-                from speakers.rvc.lib.rmvpe import RMVPE
+        f0 = self.raw_f0(input_audio_path, x, p_len, f0_method, filter_radius)
+        return self.shift_f0(f0, f0_up_key, inp_f0)
 
-                print("loading rmvpe model")
+    def raw_f0(self, input_audio_path, x, p_len, f0_method, filter_radius, f0_min=50, f0_max=1100):
+        """
+        变调前的原始 F0，以音频 checksum 为键缓存，不同 f0_up_key 复用同一次提取
+        """
+        f0_key = None
+        f0 = None
+        if self.f0_cache is not None and input_audio_path:
+            f0_key = F0Cache.key(input_audio_path, f0_method, x.shape[0], p_len,
+                                 filter_radius if f0_method == "harvest" else None,
+                                 self.rmvpe_path if f0_method == "rmvpe" else None)
+            f0 = self.f0_cache.get(f0_key)
+        if f0 is None:
+            f0 = self.extract_f0(x, p_len, f0_method, filter_radius, f0_min, f0_max)
+            if f0_key is not None:
+                self.f0_cache.put(f0_key, f0)
+        return f0
 
-                self.model_rmvpe = RMVPE(
-                    self.rmvpe_path, is_half=self.is_half, device=self.device
-                )
-            f0 = self.model_rmvpe.infer_from_audio(x, thred=0.03)
-        f0 *= pow(2, f0_up_key / 12)
+    def shift_f0(self, f0, f0_up_key, inp_f0=None, f0_min=50, f0_max=1100):
+        """
+        变调并替换 F0 曲线文件指定的部分，返回 (f0_coarse, f0)
+        """
+        f0 = f0 * pow(2, f0_up_key / 12)
         # with open("test.txt","w")as f:f.write("\n".join([str(i)for i in f0.tolist()]))
         tf0 = self.sr // self.window  # 每秒f0点数
         if inp_f0 is not None:
@@ -153,15 +143,69 @@ class VC(object):
                                                                        :shape
                                                                        ]
         # with open("test_opt.txt","w")as f:f.write("\n".join([str(i)for i in f0.tolist()]))
-        f0bak = f0.copy()
-        f0_mel = 1127 * np.log(1 + f0 / 700)
-        f0_mel[f0_mel > 0] = (f0_mel[f0_mel > 0] - f0_mel_min) * 254 / (
-                f0_mel_max - f0_mel_min
-        ) + 1
-        f0_mel[f0_mel <= 1] = 1
-        f0_mel[f0_mel > 255] = 255
-        f0_coarse = np.rint(f0_mel).astype(np.int)
-        return f0_coarse, f0bak  # 1-0
+        return f0_coarse(f0, f0_min, f0_max)
+
+    def load_index(self, file_index, index_rate):
+        """
+        加载检索索引，未配置索引或 index_rate 为 0 时返回 (None, None)
+        :return: (index, big_npy)
+        """
+        if (
+                file_index != ""
+                # and file_big_npy != ""
+                # and os.path.exists(file_big_npy) == True
+                and os.path.exists(file_index) == True
+                and index_rate != 0
+        ):
+            if self.index_cache is not None:
+                return self.index_cache.get(file_index)
+            try:
+                index = faiss.read_index(file_index)
+                # big_npy = np.load(file_big_npy)
+                big_npy = load_vectors(index)
+                return index, big_npy
+            except:
+                traceback.print_exc()
+        return None, None
+
+    def extract_f0(self, x, p_len, f0_method, filter_radius, f0_min=50, f0_max=1100):
+        """
+        提取原始 F0，不做变调
+        """
+        with stage("f0"):
+            return self._extract_f0(x, p_len, f0_method, filter_radius, f0_min, f0_max)
+
+    def _extract_f0(self, x, p_len, f0_method, filter_radius, f0_min=50, f0_max=1100):
+        time_step = self.window / self.sr * 1000
+        if f0_method == "pm":
+            if self.parallel_f0 is not None:
+                f0 = self.parallel_f0.pm(x, self.sr, time_step / 1000, f0_min, f0_max)
+            else:
+                f0 = pm_f0(x, self.sr, time_step / 1000, f0_min, f0_max)
+            pad_size = (p_len - len(f0) + 1) // 2
+            if pad_size > 0 or p_len - len(f0) - pad_size > 0:
+                f0 = np.pad(
+                    f0, [[pad_size, p_len - len(f0) - pad_size]], mode="constant"
+                )
+        elif f0_method == "harvest":
+            if self.parallel_f0 is not None:
+                f0 = self.parallel_f0.harvest(x.astype(np.double), self.sr, f0_max, f0_min, 10)
+            else:
+                f0 = harvest_f0(x.astype(np.double), self.sr, f0_max, f0_min, 10)
+            if filter_radius > 2:
+                f0 = signal.medfilt(f0, 3)
+        elif f0_method == "crepe":
+            # Pick a batch size that doesn't cause memory errors on your gpu
+            crepe = pitch_estimators.get("crepe", model_path="full", is_half=self.is_half,
+                                         device=self.device)
+            f0 = crepe.infer_from_audio(x, self.sr, self.window, f0_min, f0_max, batch_size=512)
+        elif f0_method == "rmvpe":
+            # 进程内共享同一个 rmvpe 模型
+            model_rmvpe = pitch_estimators.get(
+                "rmvpe", model_path=self.rmvpe_path, is_half=self.is_half, device=self.device
+            )
+            f0 = model_rmvpe.infer_from_audio(x, thred=0.03)
+        return f0
 
     def vc(
             self,
@@ -177,7 +221,12 @@ class VC(object):
             index_rate,
             version,
             protect,
+            feature_key=None,
+            precomputed=None,
     ):  # ,file_index,file_big_npy
+        """
+        :param precomputed: 预先提取的 hubert 特征 [帧数, 特征维度]，不为空时跳过 hubert
+        """
         feats = torch.from_numpy(audio0)
         if self.is_half:
             feats = feats.half()
@@ -195,9 +244,19 @@ class VC(object):
             "output_layer": 9 if version == "v1" else 12,
         }
         t0 = ttime()
-        with torch.no_grad():
-            logits = model.extract_features(**inputs)
-            feats = model.final_proj(logits[0]) if version == "v1" else logits[0]
+        cached = None
+        if precomputed is None and self.feature_cache is not None and feature_key is not None:
+            cached = self.feature_cache.get(feature_key)
+        if precomputed is not None:
+            feats = precomputed.to(self.device).unsqueeze(0)
+        elif cached is not None:
+            feats = torch.tensor(cached, device=self.device).unsqueeze(0)
+        else:
+            with torch.no_grad(), stage("hubert"):
+                logits = model.extract_features(**inputs)
+                feats = model.final_proj(logits[0]) if version == "v1" else logits[0]
+            if self.feature_cache is not None and feature_key is not None:
+                self.feature_cache.put(feature_key, feats[0].cpu().numpy())
         if protect < 0.5 and pitch != None and pitchf != None:
             feats0 = feats.clone()
         if (
@@ -212,10 +271,8 @@ class VC(object):
             # _, I = index.search(npy, 1)
             # npy = big_npy[I.squeeze()]
 
-            score, ix = index.search(npy, k=8)
-            weight = np.square(1 / score)
-            weight /= weight.sum(axis=1, keepdims=True)
-            npy = np.sum(big_npy[ix] * np.expand_dims(weight, axis=2), axis=1)
+            with stage("index"):
+                npy = blend(index, big_npy, npy)
 
             if self.is_half:
                 npy = npy.astype("float16")
@@ -245,7 +302,7 @@ class VC(object):
             feats = feats * pitchff + feats0 * (1 - pitchff)
             feats = feats.to(feats0.dtype)
         p_len = torch.tensor([p_len], device=self.device).long()
-        with torch.no_grad():
+        with torch.no_grad(), stage("synthesizer"):
             if pitch != None and pitchf != None:
                 audio1 = (
                     (net_g.infer(feats, p_len, pitch, pitchf, sid)[0][0, 0])
@@ -265,6 +322,150 @@ class VC(object):
         times[2] += t2 - t1
         return audio1
 
+    def vc_batch(
+            self,
+            model,
+            net_g,
+            sid,
+            audios,
+            pitches,
+            pitchfs,
+            times,
+            index,
+            big_npy,
+            index_rate,
+            version,
+            protect,
+            feature_keys=None,
+            precomputed=None,
+    ):
+        """
+        vc 的批量版本，检索对所有有效帧一次完成，合成器对补零对齐后的批次执行，返回每段对应的输出音频（未裁剪 t_pad_tgt）；
+        hubert 只合并长度相同的段(见 extract_features_batch)，特征与逐段调用 vc 相同，写入特征缓存后逐段路径可以直接使用
+        :param precomputed: 每段预先提取的 hubert 特征，不为空时跳过 hubert
+        """
+        batch = len(audios)
+        lengths = [audio0.shape[0] for audio0 in audios]
+        t0 = ttime()
+        # hubert 特征缓存命中的段不再参与 hubert 推理
+        use_cache = self.feature_cache is not None and feature_keys is not None
+        hubert_feats = [None] * batch
+        if precomputed is not None:
+            hubert_feats = [feats.to(self.device) for feats in precomputed]
+        elif use_cache:
+            for i, feature_key in enumerate(feature_keys):
+                cached = self.feature_cache.get(feature_key)
+                if cached is not None:
+                    hubert_feats[i] = torch.from_numpy(cached).to(self.device)
+        missing = [i for i in range(batch) if hubert_feats[i] is None]
+        if len(missing) > 0:
+            extracted = self.extract_features_batch(model, [audios[i] for i in missing], version)
+            for i, feats in zip(missing, extracted):
+                hubert_feats[i] = feats
+                if use_cache:
+                    self.feature_cache.put(feature_keys[i], feats.cpu().numpy())
+        n_frames = [feats.shape[0] for feats in hubert_feats]
+        feats = hubert_feats[0].new_zeros(batch, max(n_frames), hubert_feats[0].shape[1])
+        for i in range(batch):
+            feats[i, : n_frames[i]] = hubert_feats[i]
+        has_f0 = pitches is not None and pitchfs is not None
+        if protect < 0.5 and has_f0:
+            feats0 = feats.clone()
+        if (
+                isinstance(index, type(None)) == False
+                and isinstance(big_npy, type(None)) == False
+                and index_rate != 0
+        ):
+            # 所有段的有效帧合并后一次检索
+            npy = torch.cat([feats[i, : n_frames[i]] for i in range(batch)]).cpu().numpy()
+            if self.is_half:
+                npy = npy.astype("float32")
+            with stage("index"):
+                npy = blend(index, big_npy, npy)
+            if self.is_half:
+                npy = npy.astype("float16")
+            npy = torch.from_numpy(npy).to(self.device)
+            offset = 0
+            for i in range(batch):
+                feats[i, : n_frames[i]] = (
+                        npy[offset: offset + n_frames[i]] * index_rate
+                        + (1 - index_rate) * feats[i, : n_frames[i]]
+                )
+                offset += n_frames[i]
+
+        feats = F.interpolate(feats.permute(0, 2, 1), scale_factor=2).permute(0, 2, 1)
+        if protect < 0.5 and has_f0:
+            feats0 = F.interpolate(feats0.permute(0, 2, 1), scale_factor=2).permute(
+                0, 2, 1
+            )
+        t1 = ttime()
+        p_lens = [min(lengths[i] // self.window, n_frames[i] * 2) for i in range(batch)]
+        max_p_len = max(p_lens)
+        feats = feats[:, :max_p_len]
+        if has_f0:
+            pitch = torch.zeros(batch, max_p_len, dtype=torch.long, device=self.device)
+            pitchf = torch.zeros(batch, max_p_len, dtype=torch.float, device=self.device)
+            for i in range(batch):
+                pitch[i, : p_lens[i]] = pitches[i][0, : p_lens[i]]
+                pitchf[i, : p_lens[i]] = pitchfs[i][0, : p_lens[i]]
+            if protect < 0.5:
+                feats0 = feats0[:, :max_p_len]
+                pitchff = pitchf.clone()
+                pitchff[pitchf > 0] = 1
+                pitchff[pitchf < 1] = protect
+                pitchff = pitchff.unsqueeze(-1)
+                feats = feats * pitchff + feats0 * (1 - pitchff)
+                feats = feats.to(feats0.dtype)
+        p_len = torch.tensor(p_lens, device=self.device).long()
+        sid = sid.expand(batch)
+        with torch.no_grad(), stage("synthesizer"):
+            if has_f0:
+                audio1 = net_g.infer(feats, p_len, pitch, pitchf, sid)[0][:, 0]
+            else:
+                audio1 = net_g.infer(feats, p_len, sid)[0][:, 0]
+            audio1 = audio1.data.cpu().float().numpy()
+        audio_opt = [audio1[i, : p_lens[i] * self.tgt_window] for i in range(batch)]
+        del feats, p_len
+        if torch.cuda.is_available():
+            torch.cuda.empty_cache()
+        t2 = ttime()
+        times[0] += t1 - t0
+        times[2] += t2 - t1
+        return audio_opt
+
+    def extract_features_batch(self, model, audios, version):
+        """
+        多段音频批量执行 hubert，返回每段的特征 [帧数, 特征维度]
+        只有长度相同的段合并为一个批次：hubert 卷积特征提取器的 GroupNorm 对整个时间轴归一化，
+        padding_mask 不作用于这一层，补零会改变较短段的特征。按长度分组后每段的输入与逐段调用 vc 完全相同，
+        特征一致，可以与逐段路径共用 hubert 特征缓存
+        """
+        groups = {}
+        for i, audio0 in enumerate(audios):
+            groups.setdefault(audio0.shape[0], []).append(i)
+        features = [None] * len(audios)
+        for indices in groups.values():
+            sources = []
+            for i in indices:
+                # 与 vc 相同的精度转换与声道合并顺序
+                feats = torch.from_numpy(audios[i])
+                feats = feats.half() if self.is_half else feats.float()
+                if feats.dim() == 2:  # double channels
+                    feats = feats.mean(-1)
+                sources.append(feats)
+            feats = torch.stack(sources)
+            inputs = {
+                "source": feats.to(self.device),
+                "padding_mask": torch.zeros(feats.shape, dtype=torch.bool, device=self.device),
+                "output_layer": 9 if version == "v1" else 12,
+            }
+            with torch.no_grad(), stage("hubert"):
+                logits = model.extract_features(**inputs)
+                feats = model.final_proj(logits[0]) if version == "v1" else logits[0]
+            for row, i in enumerate(indices):
+                features[i] = feats[row]
+        return features
+
     def pipeline(
             self,
             model,
@@ -287,44 +488,222 @@ class VC(object):
             protect,
             f0_file=None,
     ):
+        index, big_npy = self.load_index(file_index, index_rate)
+        t1 = ttime()
+        audio, audio_pad, p_len, segments = self.split(audio)
+        inp_f0 = self.load_f0_file(f0_file)
+        sid = torch.tensor(sid, device=self.device).unsqueeze(0).long()
+        pitch, pitchf = None, None
+        if if_f0 == 1:
+            pitch, pitchf = self.pitch_tensors(*self.get_f0(
+                input_audio_path,
+                audio_pad,
+                p_len,
+                f0_up_key,
+                f0_method,
+                filter_radius,
+                inp_f0,
+            ), p_len)
+        t2 = ttime()
+        times[1] += t2 - t1
+        # hubert 特征只与输入音频有关，以 checksum 与分段位置为键缓存
+        feature_keys = [None] * len(segments)
+        if self.feature_cache is not None and input_audio_path:
+            feature_keys = [
+                self.feature_cache.key(input_audio_path, version, f_start * self.window, seg_audio.shape[0])
+                for seg_audio, f_start, _ in segments
+            ]
+        audio_opt = self.synthesize(model, net_g, sid, segments, pitch, pitchf, times, index, big_npy,
+                                    index_rate, version, protect, feature_keys=feature_keys)
+        audio_opt = self.postprocess(audio_opt, audio, tgt_sr, resample_sr, rms_mix_rate)
+        del pitch, pitchf, sid
+        if torch.cuda.is_available():
+            torch.cuda.empty_cache()
+        return audio_opt
+
+    def frontend(self, model, audio, input_audio_path, times, f0_method, filter_radius, versions,
+                 if_f0=1, f0_file=None):
+        """
+        与音色无关的前处理：高通滤波、切分、变调前的 F0 与各版本的 hubert 特征，
+        同一段输入转换为多个音色时只执行一次，之后对每个音色调用 render
+        :param versions: 需要的 hubert 特征版本，v1、v2
+        :param if_f0: 为 0 时不提取 F0
+        :return: dict，传给 render
+        """
+        t1 = ttime()
+        audio, audio_pad, p_len, segments = self.split(audio)
+        inp_f0 = self.load_f0_file(f0_file)
+        f0 = None
+        if if_f0 == 1:
+            f0 = self.raw_f0(input_audio_path, audio_pad, p_len, f0_method, filter_radius)
+        t2 = ttime()
+        times[1] += t2 - t1
+        features = {}
+        for version in sorted(set(versions)):
+            feature_keys = [None] * len(segments)
+            if self.feature_cache is not None and input_audio_path:
+                feature_keys = [
+                    self.feature_cache.key(input_audio_path, version, f_start * self.window, seg_audio.shape[0])
+                    for seg_audio, f_start, _ in segments
+                ]
+            features[version] = self.segment_features(model, segments, version, feature_keys)
+        times[0] += ttime() - t2
+        return dict(audio=audio, p_len=p_len, segments=segments, f0=f0, inp_f0=inp_f0,
+                    features=features, t_pad=self.t_pad)
+
+    def render(self, frontend, net_g, sid, times, f0_up_key, file_index, index_rate, if_f0, tgt_sr,
+               resample_sr, rms_mix_rate, version, protect):
+        """
+        在 frontend 的结果上执行单个音色的检索与合成器
+        """
+        if frontend['t_pad'] != self.t_pad:
+            raise ValueError(f'frontend t_pad:{frontend["t_pad"]} does not match t_pad:{self.t_pad}')
+        if version not in frontend['features']:
+            raise ValueError(f'frontend has no hubert features for version: {version}')
+        if if_f0 == 1 and frontend['f0'] is None:
+            raise ValueError('frontend has no f0')
+        index, big_npy = self.load_index(file_index, index_rate)
+        sid = torch.tensor(sid, device=self.device).unsqueeze(0).long()
+        pitch, pitchf = None, None
+        if if_f0 == 1:
+            pitch, pitchf = self.pitch_tensors(*self.shift_f0(frontend['f0'], f0_up_key, frontend['inp_f0']),
+                                               frontend['p_len'])
+        audio_opt = self.synthesize(None, net_g, sid, frontend['segments'], pitch, pitchf, times, index, big_npy,
+                                    index_rate, version, protect, precomputed=frontend['features'][version])
+        audio_opt = self.postprocess(audio_opt, frontend['audio'], tgt_sr, resample_sr, rms_mix_rate)
+        del pitch, pitchf, sid
+        if torch.cuda.is_available():
+            torch.cuda.empty_cache()
+        return audio_opt
+
+    def sweep(self, frontend, net_g, sid, times, f0_up_keys, file_index, index_rate, if_f0, tgt_sr,
+              resample_sr, rms_mix_rate, version, protect):
+        """
+        在 frontend 的结果上一次渲染多个变调，检索对每段只执行一次，
+        每段的合成器推理把 sweep_batch_size 个变调合并为一个批次
+        :param f0_up_keys: 变调列表
+        :return: 与 f0_up_keys 顺序一致的音频
+        """
+        if if_f0 != 1:
+            # 无 F0 的模型变调不起作用，只渲染一次
+            audio_opt = self.render(frontend, net_g, sid, times, 0, file_index, index_rate, if_f0, tgt_sr,
+                                    resample_sr, rms_mix_rate, version, protect)
+            return [audio_opt.copy() for _ in f0_up_keys]
+        if frontend['t_pad'] != self.t_pad:
+            raise ValueError(f'frontend t_pad:{frontend["t_pad"]} does not match t_pad:{self.t_pad}')
+        if version not in frontend['features']:
+            raise ValueError(f'frontend has no hubert features for version: {version}')
+        if frontend['f0'] is None:
+            raise ValueError('frontend has no f0')
+        index, big_npy = self.load_index(file_index, index_rate)
+        sid = torch.tensor(sid, device=self.device).unsqueeze(0).long()
+        pitches, pitchfs = [], []
+        for f0_up_key in f0_up_keys:
+            pitch, pitchf = self.pitch_tensors(*self.shift_f0(frontend['f0'], f0_up_key, frontend['inp_f0']),
+                                               frontend['p_len'])
+            pitches.append(pitch)
+            pitchfs.append(pitchf)
+        pitch, pitchf = torch.cat(pitches), torch.cat(pitchfs)
+        batch_size = max(1, int(self.sweep_batch_size))
+        audio_opts = [[] for _ in f0_up_keys]
+        for (seg_audio, f_start, f_end), feats in zip(frontend['segments'], frontend['features'][version]):
+            for start in range(0, len(f0_up_keys), batch_size):
+                outputs = self.vc_keys(net_g, sid, seg_audio, feats,
+                                       pitch[start: start + batch_size, f_start:f_end],
+                                       pitchf[start: start + batch_size, f_start:f_end],
+                                       times, index, big_npy, index_rate, protect)
+                for i, audio1 in enumerate(outputs):
+                    audio_opts[start + i].append(audio1[self.t_pad_tgt: -self.t_pad_tgt])
+        audio_opts = [self.postprocess(np.concatenate(audio_opt), frontend['audio'], tgt_sr, resample_sr,
+                                       rms_mix_rate)
+                      for audio_opt in audio_opts]
+        del pitch, pitchf, sid
+        if torch.cuda.is_available():
+            torch.cuda.empty_cache()
+        return audio_opts
+
+    def vc_keys(self, net_g, sid, audio0, feats, pitch, pitchf, times, index, big_npy, index_rate, protect):
+        """
+        同一段音频的多个变调，检索只执行一次，合成器以变调为批次维度一次推理，
+        每个变调的结果与 vc 一致
+        :param feats: 该段的 hubert 特征 [帧数, 特征维度]
+        :param pitch: [变调数, 帧数]
+        :param pitchf: [变调数, 帧数]
+        :return: 每个变调的输出音频（未裁剪 t_pad_tgt）
+        """
+        batch = pitch.shape[0]
+        t0 = ttime()
+        feats = feats.to(self.device).unsqueeze(0)
+        if protect < 0.5:
+            feats0 = feats.clone()
         if (
-                file_index != ""
-                # and file_big_npy != ""
-                # and os.path.exists(file_big_npy) == True
-                and os.path.exists(file_index) == True
+                isinstance(index, type(None)) == False
+                and isinstance(big_npy, type(None)) == False
                 and index_rate != 0
         ):
-            try:
-                index = faiss.read_index(file_index)
-                # big_npy = np.load(file_big_npy)
-                big_npy = index.reconstruct_n(0, index.ntotal)
-            except:
-                traceback.print_exc()
-                index = big_npy = None
-        else:
-            index = big_npy = None
-        audio = signal.filtfilt(bh, ah, audio)
-        audio_pad = np.pad(audio, (self.window // 2, self.window // 2), mode="reflect")
-        opt_ts = []
-        if audio_pad.shape[0] > self.t_max:
-            audio_sum = np.zeros_like(audio)
-            for i in range(self.window):
-                audio_sum += audio_pad[i: i - self.window]
-            for t in range(self.t_center, audio.shape[0], self.t_center):
-                opt_ts.append(
-                    t
-                    - self.t_query
-                    + np.where(
-                        np.abs(audio_sum[t - self.t_query: t + self.t_query])
-                        == np.abs(audio_sum[t - self.t_query: t + self.t_query]).min()
-                    )[0][0]
-                )
-        s = 0
-        audio_opt = []
-        t = None
+            npy = feats[0].cpu().numpy()
+            if self.is_half:
+                npy = npy.astype("float32")
+            with stage("index"):
+                npy = blend(index, big_npy, npy)
+            if self.is_half:
+                npy = npy.astype("float16")
+            feats = (
+                    torch.from_numpy(npy).unsqueeze(0).to(self.device) * index_rate
+                    + (1 - index_rate) * feats
+            )
+        feats = F.interpolate(feats.permute(0, 2, 1), scale_factor=2).permute(0, 2, 1)
+        if protect < 0.5:
+            feats0 = F.interpolate(feats0.permute(0, 2, 1), scale_factor=2).permute(0, 2, 1)
         t1 = ttime()
+        p_len = audio0.shape[0] // self.window
+        if feats.shape[1] < p_len:
+            p_len = feats.shape[1]
+            pitch = pitch[:, :p_len]
+            pitchf = pitchf[:, :p_len]
+        feats = feats.expand(batch, -1, -1)
+        if protect < 0.5:
+            pitchff = pitchf.clone()
+            pitchff[pitchf > 0] = 1
+            pitchff[pitchf < 1] = protect
+            pitchff = pitchff.unsqueeze(-1)
+            feats = feats * pitchff + feats0 * (1 - pitchff)
+            feats = feats.to(feats0.dtype)
+        p_len = torch.tensor([p_len] * batch, device=self.device).long()
+        with torch.no_grad(), stage("synthesizer"):
+            audio1 = net_g.infer(feats, p_len, pitch, pitchf, sid.expand(batch))[0][:, 0]
+            audio1 = audio1.data.cpu().float().numpy()
+        del feats, p_len
+        t2 = ttime()
+        times[0] += t1 - t0
+        times[2] += t2 - t1
+        return list(audio1)
+
+    def split(self, audio):
+        """
+        高通滤波后按切点切分，每段前后各带 t_pad 的上下文
+        :return: (滤波后的音频, 两端反射填充后的音频, 总帧数, [(音频, 起始帧, 结束帧)])
+        """
+        audio = signal.filtfilt(bh, ah, audio)
+        opt_ts = self.segmenter(audio)
         audio_pad = np.pad(audio, (self.t_pad, self.t_pad), mode="reflect")
         p_len = audio_pad.shape[0] // self.window
+        segments = []
+        s = 0
+        for t in opt_ts:
+            t = t // self.window * self.window
+            segments.append((audio_pad[s: t + self.t_pad2 + self.window],
+                             s // self.window,
+                             (t + self.t_pad2) // self.window))
+            s = t
+        segments.append((audio_pad[s:], s // self.window, None))
+        return audio, audio_pad, p_len, segments
+
+    @staticmethod
+    def load_f0_file(f0_file):
+        """
+        读取 F0 曲线文件，每行 "时间,音高"
+        """
         inp_f0 = None
         if hasattr(f0_file, "name") == True:
             try:
@@ -336,110 +715,96 @@ class VC(object):
                 inp_f0 = np.array(inp_f0, dtype="float32")
             except:
                 traceback.print_exc()
-        sid = torch.tensor(sid, device=self.device).unsqueeze(0).long()
-        pitch, pitchf = None, None
-        if if_f0 == 1:
-            pitch, pitchf = self.get_f0(
-                input_audio_path,
-                audio_pad,
-                p_len,
-                f0_up_key,
-                f0_method,
-                filter_radius,
-                inp_f0,
-            )
-            pitch = pitch[:p_len]
-            pitchf = pitchf[:p_len]
-            if self.device == "mps":
-                pitchf = pitchf.astype(np.float32)
-            pitch = torch.tensor(pitch, device=self.device).unsqueeze(0).long()
-            pitchf = torch.tensor(pitchf, device=self.device).unsqueeze(0).float()
-        t2 = ttime()
-        times[1] += t2 - t1
-        for t in opt_ts:
-            t = t // self.window * self.window
-            if if_f0 == 1:
-                audio_opt.append(
-                    self.vc(
+        return inp_f0
+
+    def pitch_tensors(self, pitch, pitchf, p_len):
+        pitch = pitch[:p_len]
+        pitchf = pitchf[:p_len]
+        if self.device == "mps":
+            pitchf = pitchf.astype(np.float32)
+        pitch = torch.tensor(pitch, device=self.device).unsqueeze(0).long()
+        pitchf = torch.tensor(pitchf, device=self.device).unsqueeze(0).float()
+        return pitch, pitchf
+
+    def segment_features(self, model, segments, version, feature_keys):
+        """
+        各段的 hubert 特征，命中缓存的段跳过推理，其余按 batch_size 分批提取
+        :return: [[帧数, 特征维度]]
+        """
+        features = [None] * len(segments)
+        for i, feature_key in enumerate(feature_keys):
+            if self.feature_cache is not None and feature_key is not None:
+                cached = self.feature_cache.get(feature_key)
+                if cached is not None:
+                    features[i] = torch.tensor(cached, device=self.device)
+        missing = [i for i in range(len(segments)) if features[i] is None]
+        for start in range(0, len(missing), max(1, self.batch_size)):
+            batch = missing[start: start + max(1, self.batch_size)]
+            for i, feats in zip(batch, self.extract_features_batch(model, [segments[i][0] for i in batch], version)):
+                features[i] = feats
+                if self.feature_cache is not None and feature_keys[i] is not None:
+                    self.feature_cache.put(feature_keys[i], feats.cpu().numpy())
+        return features
+
+    def synthesize(self, model, net_g, sid, segments, pitch, pitchf, times, index, big_npy, index_rate, version,
+                   protect, feature_keys=None, precomputed=None):
+        """
+        逐段或分批执行 hubert、检索与合成器，裁掉每段两端的 t_pad_tgt 后拼接
+        :param precomputed: 各段预先提取的 hubert 特征，不为空时不使用 model
+        """
+        if_f0 = pitch is not None and pitchf is not None
+        if feature_keys is None:
+            feature_keys = [None] * len(segments)
+        audio_opt = []
+        if self.batch_size > 1 and len(segments) > 1:
+            # 批量模式，多段音频合并为一个批次执行 hubert、检索与合成
+            for i in range(0, len(segments), self.batch_size):
+                batch = segments[i: i + self.batch_size]
+                audio_opt.extend(
+                    audio1[self.t_pad_tgt: -self.t_pad_tgt]
+                    for audio1 in self.vc_batch(
                         model,
                         net_g,
                         sid,
-                        audio_pad[s: t + self.t_pad2 + self.window],
-                        pitch[:, s // self.window: (t + self.t_pad2) // self.window],
-                        pitchf[:, s // self.window: (t + self.t_pad2) // self.window],
+                        [seg_audio for seg_audio, _, _ in batch],
+                        [pitch[:, f_start:f_end] for _, f_start, f_end in batch] if if_f0 else None,
+                        [pitchf[:, f_start:f_end] for _, f_start, f_end in batch] if if_f0 else None,
                         times,
                         index,
                         big_npy,
                         index_rate,
                         version,
                         protect,
-                    )[self.t_pad_tgt: -self.t_pad_tgt]
+                        feature_keys=feature_keys[i: i + self.batch_size],
+                        precomputed=precomputed[i: i + self.batch_size] if precomputed is not None else None,
+                    )
                 )
-            else:
+        else:
+            for i, ((seg_audio, f_start, f_end), feature_key) in enumerate(zip(segments, feature_keys)):
                 audio_opt.append(
                     self.vc(
                         model,
                         net_g,
                         sid,
-                        audio_pad[s: t + self.t_pad2 + self.window],
-                        None,
-                        None,
+                        seg_audio,
+                        pitch[:, f_start:f_end] if if_f0 else None,
+                        pitchf[:, f_start:f_end] if if_f0 else None,
                         times,
                         index,
                         big_npy,
                         index_rate,
                         version,
                         protect,
+                        feature_key=feature_key,
+                        precomputed=precomputed[i] if precomputed is not None else None,
                     )[self.t_pad_tgt: -self.t_pad_tgt]
                 )
-            s = t
-        if if_f0 == 1:
-            audio_opt.append(
-                self.vc(
-                    model,
-                    net_g,
-                    sid,
-                    audio_pad[t:],
-                    pitch[:, t // self.window:] if t is not None else pitch,
-                    pitchf[:, t // self.window:] if t is not None else pitchf,
-                    times,
-                    index,
-                    big_npy,
-                    index_rate,
-                    version,
-                    protect,
-                )[self.t_pad_tgt: -self.t_pad_tgt]
-            )
-        else:
-            audio_opt.append(
-                self.vc(
-                    model,
-                    net_g,
-                    sid,
-                    audio_pad[t:],
-                    None,
-                    None,
-                    times,
-                    index,
-                    big_npy,
-                    index_rate,
-                    version,
-                    protect,
-                )[self.t_pad_tgt: -self.t_pad_tgt]
-            )
-        audio_opt = np.concatenate(audio_opt)
-        if rms_mix_rate != 1:
-            audio_opt = change_rms(audio, 16000, audio_opt, tgt_sr, rms_mix_rate)
-        if resample_sr >= 16000 and tgt_sr != resample_sr:
-            audio_opt = librosa.resample(
-                audio_opt, orig_sr=tgt_sr, target_sr=resample_sr
-            )
-        audio_max = np.abs(audio_opt).max() / 0.99
-        max_int16 = 32768
-        if audio_max > 1:
-            max_int16 /= audio_max
-        audio_opt = (audio_opt * max_int16).astype(np.int16)
-        del pitch, pitchf, sid
-        if torch.cuda.is_available():
-            torch.cuda.empty_cache()
-        return audio_opt
+        return np.concatenate(audio_opt)
+
+    def postprocess(self, audio_opt, audio, tgt_sr, resample_sr, rms_mix_rate):
+        """
+        音量包络融合、重采样并转换为 int16，在 audio_opt 上原地分块完成
+        """
+        with stage("postprocess"):
+            return PostProcess(tgt_sr, resample_sr, rms_mix_rate, self.resample_quality,
+                               input_sr=self.sr)(audio_opt, audio)
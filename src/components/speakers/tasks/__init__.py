@@ -2,21 +2,24 @@ import numpy as np
 from typing import List
 
 from speakers.common.registry import registry
-from speakers.tasks.base_task import BaseTask, Runner, FlowData, AudioTaskAbstract
+from speakers.tasks.base_task import BaseTask, Runner, FlowData, AudioTaskAbstract, content_task_id
 from speakers.tasks.vits_voice_task import VitsVoiceTask, VitsVoiceFlowData
 from speakers.tasks.bark_voice_task import BarkVoiceTask, BarkVoiceFlowData
 from speakers.tasks.edge_voice_task import EdgeVoiceTask, EdgeVoiceFlowData
+from speakers.tasks.multi_voice_task import MultiVoiceTask, MultiVoiceFlowData
 
 __all__ = [
     "BaseTask",
     "AudioTaskAbstract",
     "Runner",
     "FlowData",
+    "content_task_id",
     "load_task",
     "get_task",
     "VitsVoiceFlowData",
     "BarkVoiceFlowData",
     "EdgeVoiceFlowData",
+    "MultiVoiceFlowData",
     "tasks_cache"
 ]
 
@@ -1,10 +1,11 @@
 from typing import Dict
 from speakers.processors import ProcessorData, BaseProcessor, get_processors, BarkProcessorData, RvcProcessorData
-from speakers.tasks import AudioTaskAbstract, Runner, FlowData
+from speakers.tasks import AudioTaskAbstract, Runner, FlowData, content_task_id
 from speakers.common.registry import registry
+from speakers.common.audio import AudioBuffer
+from speakers.common.audio_stream import split_sentences
 from speakers.server.model.flow_data import PayLoad
 import traceback
-import hashlib
 
 
 class BarkVoiceFlowData(FlowData):
@@ -17,19 +18,15 @@ class BarkVoiceFlowData(FlowData):
         return "bark_voice"
 
 
-def calculate_md5(input_string):
-    md5_hash = hashlib.md5()
-    md5_hash.update(input_string.encode('utf-8'))
-    return md5_hash.hexdigest()
-
-
 @registry.register_task("bark_voice_task")
 class BarkVoiceTask(AudioTaskAbstract):
     SAMPLE_RATE: int = 22050
 
-    def __init__(self, preprocess_dict: Dict[str, BaseProcessor]):
+    def __init__(self, preprocess_dict: Dict[str, BaseProcessor], stream_sentences: bool = True):
         super().__init__(preprocess_dict=preprocess_dict)
         self._preprocess_dict = preprocess_dict
+        # 按句合成并流式保存结果，关闭时整段文本一次合成
+        self.stream_sentences = stream_sentences
 
     @classmethod
     def from_config(cls, cfg=None):
@@ -39,7 +36,7 @@ class BarkVoiceTask(AudioTaskAbstract):
                 preprocess_object = get_processors(preprocess_info.processor)
                 preprocess_dict[preprocess_info.processor_name] = preprocess_object
 
-        return cls(preprocess_dict=preprocess_dict)
+        return cls(preprocess_dict=preprocess_dict, stream_sentences=cfg.get('stream_sentences', True))
 
     @property
     def preprocess_dict(self) -> Dict[str, BaseProcessor]:
@@ -101,9 +98,7 @@ class BarkVoiceTask(AudioTaskAbstract):
                                             rvc=rvc_processor_data)
 
         # 创建 Runner 实例并传递上面创建的 BarkVoiceFlowData 实例作为参数
-        task_id = f'{calculate_md5(text)}-{calculate_md5(speaker_history_prompt)}-{text_temp}' \
-                  f'-{waveform_temp}' \
-                  f'-{model_index}-{f0_up_key}'
+        task_id = content_task_id(voice_flow_data)
         runner = Runner(
             task_id=task_id,
             flow_data=voice_flow_data
@@ -127,26 +122,29 @@ class BarkVoiceTask(AudioTaskAbstract):
                     bark_preprocess_object = self.preprocess_dict.get(data.bark.type)
                     if not bark_preprocess_object.match(data.bark):
                         raise RuntimeError('不支持的process')
-                    audio_np = bark_preprocess_object(data.bark)
-                    if audio_np is not None and 'RVC' in data.rvc.type:
-                        # 将 NumPy 数组转换为 Python 列表
-                        audio_samples_list = audio_np.tolist()
-                        data.rvc.sample_rate = self.SAMPLE_RATE
-                        data.rvc.audio_samples = audio_samples_list
+                    if 'RVC' in data.rvc.type:
                         rvc_preprocess_object = self.preprocess_dict.get(data.rvc.type)
                         if not rvc_preprocess_object.match(data.rvc):
                             raise RuntimeError('不支持的process')
 
-                        write_data = rvc_preprocess_object(data.rvc)
+                        def synthesize(text: str):
+                            audio_np = bark_preprocess_object(data.bark.copy(update={'text': text}))
+                            if audio_np is None:
+                                return None
+                            data.rvc.sample_rate = self.SAMPLE_RATE
+                            # 直接传递 NumPy 缓冲区，不转换为 Python 列表
+                            data.rvc.audio_samples = AudioBuffer.from_numpy(audio_np)
+                            return rvc_preprocess_object(data.rvc)
+
+                        # 按句合成，每句完成后客户端即可通过 /runner/result_stream 开始播放
+                        texts = split_sentences(data.bark.text) if self.stream_sentences else [data.bark.text]
+                        await super().synthesize_segments(runner=runner, texts=texts, synthesize=synthesize)
 
                         # 完成任务，构建响应数据
                         await self.report_progress(task_id=runner.task_id,
                                                    runner_stat='bark_voice_task',
                                                    state='finished',
                                                    finished=True)
-
-                        del audio_np
-                        await super().save_task_write(runner=runner, write_data=write_data)
                         del runner
 
         except Exception as e:
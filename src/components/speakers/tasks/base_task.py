@@ -1,5 +1,5 @@
 from abc import abstractmethod
-from typing import List, Dict
+from typing import Callable, List, Dict, Optional
 
 from speakers.load.serializable import Serializable
 from speakers.processors import ProcessorData, BaseProcessor
@@ -7,8 +7,13 @@ from speakers.server.model.flow_data import PayLoad
 
 from typing import Tuple
 from speakers.common.utils import get_abs_path, get_tmp_path
+from speakers.common.audio_stream import StreamingWavWriter, stream_result_filename
 from scipy.io.wavfile import write as write_wav
+import hashlib
+import json
 import logging
+import os
+import zipfile
 import numpy as np
 
 
@@ -44,6 +49,18 @@ class Runner(Serializable):
         return True
 
 
+def content_task_id(flow_data: FlowData) -> str:
+    """
+    按全部合成参数计算 task_id：参数经 pydantic 校验归一化后按键排序序列化，再取 sha256，
+    参数相同的提交得到相同的 task_id，任一参数(包括 f0_method、index_rate、protect)不同都得到不同的 task_id；
+    server 端的结果缓存以此为键
+    :param flow_data: prepare 构建的任务参数
+    :return: {flow_data.type}-{sha256}
+    """
+    canonical = json.dumps(flow_data.dict(), sort_keys=True, ensure_ascii=False, separators=(',', ':'), default=str)
+    return f'{flow_data.type}-{hashlib.sha256(canonical.encode("utf-8")).hexdigest()}'
+
+
 # Define a base class for tasks
 class BaseTask:
     """
@@ -175,5 +192,79 @@ class AudioTaskAbstract(BaseTask):
                                            'filename': self._result_path(f"{runner.task_id}.wav")
                                        })
 
+    async def save_task_writes(self, runner: Runner, write_datas: List[Tuple[int, np.ndarray]]):
+        """
+        保存一次提交的多个音频，每个音频单独保存为 {task_id}-{i}.wav，并打包为 {task_id}.zip 作为任务结果
+        :param runner:
+        :param write_datas: [(采样率, 音频)]
+        :return:
+        """
+        filenames = []
+        for i, (out_sr, output_audio) in enumerate(write_datas):
+            if output_audio is None:
+                continue
+            filename = self._result_path(f"{runner.task_id}-{i}.wav")
+            write_wav(filename, out_sr, output_audio)
+            filenames.append(filename)
+        if len(filenames) == 0:
+            return
+        archive = self._result_path(f"{runner.task_id}.zip")
+        with zipfile.ZipFile(archive, "w", compression=zipfile.ZIP_STORED) as zf:
+            for filename in filenames:
+                zf.write(filename, arcname=os.path.basename(filename))
+        await self.report_progress(task_id=runner.task_id, runner_stat='save_task_writes',
+                                   state='save_write',
+                                   finished=False,
+                                   result={
+                                       'filename': archive,
+                                       'filenames': filenames
+                                   })
+
+    async def synthesize_segments(self, runner: Runner, texts: List[str],
+                                  synthesize: Callable[[str], Optional[Tuple[int, np.ndarray]]]):
+        """
+        逐段合成并流式保存：每段完成后追加到 {task_id}.stream.wav 并通知监听器(state 为 segment)，
+        /runner/result_stream 的客户端随即收到这一段；全部完成后重命名为 {task_id}.wav 作为任务结果
+        :param runner:
+        :param texts: 按句切分的文本，见 speakers.common.audio_stream.split_sentences
+        :param synthesize: 合成一段文本，返回 (采样率, 音频)，返回 None 时跳过该段
+        :return:
+        """
+        stream_path = self._result_path(stream_result_filename(runner.task_id))
+        writer = None
+        try:
+            for text in texts:
+                write_data = synthesize(text)
+                if write_data is None or write_data[1] is None:
+                    continue
+                out_sr, output_audio = write_data
+                if writer is None:
+                    writer = StreamingWavWriter(stream_path, out_sr)
+                writer.write(out_sr, output_audio)
+                del output_audio
+                await self.report_progress(task_id=runner.task_id, runner_stat='synthesize_segments',
+                                           state='segment',
+                                           finished=False,
+                                           result={
+                                               'stream': stream_path,
+                                               'segments': writer.segments,
+                                               'total_segments': len(texts)
+                                           })
+        except Exception:
+            if writer is not None:
+                writer.discard()
+            raise
+        if writer is None:
+            return
+        writer.close()
+        filename = self._result_path(f"{runner.task_id}.wav")
+        os.replace(stream_path, filename)
+        await self.report_progress(task_id=runner.task_id, runner_stat='synthesize_segments',
+                                   state='save_write',
+                                   finished=False,
+                                   result={
+                                       'filename': filename
+                                   })
+
     def _result_path(self, path: str) -> str:
         return get_tmp_path(f'result/{path}')
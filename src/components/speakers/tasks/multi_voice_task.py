@@ -0,0 +1,141 @@
+from typing import Dict
+from speakers.processors import BaseProcessor, get_processors, EdgeProcessorData, RvcMultiVoiceProcessorData, \
+    RvcVoiceTarget
+from speakers.tasks import AudioTaskAbstract, Runner, FlowData, content_task_id
+from speakers.common.registry import registry
+from speakers.common.audio import AudioBuffer
+from speakers.server.model.flow_data import PayLoad
+import traceback
+
+
+class MultiVoiceFlowData(FlowData):
+    edge: EdgeProcessorData
+    rvc: RvcMultiVoiceProcessorData
+
+    @property
+    def type(self) -> str:
+        """Type of the FlowData Message, used for serialization."""
+        return "multi_voice"
+
+
+@registry.register_task("multi_voice_task")
+class MultiVoiceTask(AudioTaskAbstract):
+    """
+    一次提交把同一句 edge-tts 语音转换为多个 rvc 音色，F0 与 hubert 特征在所有音色间共享，
+    结果为每个音色一个 wav，打包为 zip
+    """
+
+    def __init__(self, preprocess_dict: Dict[str, BaseProcessor]):
+        super().__init__(preprocess_dict=preprocess_dict)
+        self._preprocess_dict = preprocess_dict
+
+    @classmethod
+    def from_config(cls, cfg=None):
+        preprocess_dict = {}
+        for preprocess in cfg.get('preprocess'):
+            for key, preprocess_info in preprocess.items():
+                preprocess_object = get_processors(preprocess_info.processor)
+                preprocess_dict[preprocess_info.processor_name] = preprocess_object
+
+        return cls(preprocess_dict=preprocess_dict)
+
+    @property
+    def preprocess_dict(self) -> Dict[str, BaseProcessor]:
+        return self._preprocess_dict
+
+    @classmethod
+    def prepare(cls, payload: PayLoad) -> Runner:
+        """
+        runner任务构建
+        """
+        params = payload.payload
+        # 获取payload中的edge和rvc的值
+        edge_data = params.get("edge", {})
+        rvc_data = params.get("rvc", {})
+
+        # edge 讲话人
+        tts_speaker = edge_data.get("tts_speaker")
+        text = edge_data.get("text")
+        rate = edge_data.get("rate")
+        volume = edge_data.get("volume")
+
+        edge_processor_data = EdgeProcessorData(text=text,
+                                                tts_speaker=tts_speaker,
+                                                rate=rate,
+                                                volume=volume)
+
+        # 所有目标音色共用的 F0 参数
+        f0_method = rvc_data.get("f0_method")
+        # >=3则使用对harvest音高识别的结果使用中值滤波，数值为滤波半径，使用可以削弱哑音
+        filter_radius = rvc_data.get("filter_radius")
+        rvc_f0_file = rvc_data.get("f0_file")
+        # 目标音色列表，每项包含 model_index、f0_up_key、index_rate、rms_mix_rate、resample_sr、protect
+        targets = [RvcVoiceTarget(**target) for target in rvc_data.get("targets", [])]
+
+        rvc_processor_data = RvcMultiVoiceProcessorData(
+            f0_method=f0_method,
+            filter_radius=filter_radius,
+            f0_file=rvc_f0_file,
+            targets=targets
+        )
+
+        voice_flow_data = MultiVoiceFlowData(edge=edge_processor_data,
+                                             rvc=rvc_processor_data)
+
+        task_id = content_task_id(voice_flow_data)
+        runner = Runner(
+            task_id=task_id,
+            flow_data=voice_flow_data
+        )
+
+        return runner
+
+    async def dispatch(self, runner: Runner):
+
+        try:
+            # 加载task
+            self.logger.info('dispatch')
+
+            await self.report_progress(task_id=runner.task_id, runner_stat='multi_voice_task',
+                                       state='dispatch_multi_voice_task')
+            data = runner.flow_data
+            if 'multi_voice' in data.type:
+                if 'EDGE' in data.edge.type:
+                    edge_preprocess_object = self.preprocess_dict.get(data.edge.type)
+                    if not edge_preprocess_object.match(data.edge):
+                        raise RuntimeError('不支持的process')
+                    tts_np, tts_sr = edge_preprocess_object(data.edge)
+                    if tts_np is not None and 'RVC' in data.rvc.type:
+                        data.rvc.sample_rate = tts_sr
+                        # 直接传递 NumPy 缓冲区，不转换为 Python 列表
+                        data.rvc.audio_samples = AudioBuffer.from_numpy(tts_np)
+                        rvc_preprocess_object = self.preprocess_dict.get(data.rvc.type)
+                        if not rvc_preprocess_object.match(data.rvc):
+                            raise RuntimeError('不支持的process')
+
+                        write_datas = rvc_preprocess_object(data.rvc)
+
+                        # 完成任务，构建响应数据
+                        await self.report_progress(task_id=runner.task_id,
+                                                   runner_stat='multi_voice_task',
+                                                   state='finished',
+                                                   finished=False)
+
+                        del tts_np
+                        del tts_sr
+                        await super().save_task_writes(runner=runner, write_datas=write_datas)
+                        del runner
+
+        except Exception as e:
+            await self.report_progress(task_id=runner.task_id, runner_stat='multi_voice_task',
+                                       state='error', finished=True)
+
+            self.logger.error(f'{e.__class__.__name__}: {e}',
+                              exc_info=e)
+
+            traceback.print_exc()
+
+        return None, None
+
+    def complete(self, runner: Runner):
+        pass
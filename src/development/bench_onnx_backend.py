@@ -0,0 +1,75 @@
+"""
+RVC 合成器 torch 与 onnxruntime 后端的 CPU 延迟与实时率对比，使用随机权重的合成 checkpoint
+
+    cd src
+    PYTHONPATH=bases:components python development/bench_onnx_backend.py --seconds 1 5 10
+"""
+import argparse
+import os
+import tempfile
+import time
+
+import torch
+
+from speakers.rvc.infer_pack.models import SynthesizerTrnMs768NSFsid
+from speakers.rvc.onnx_backend import OnnxSynthesizer, export_onnx
+
+# v2 40k 模型的配置
+CONFIG = [1025, 32, 192, 192, 768, 2, 6, 3, 0, "1", [3, 7, 11], [[1, 3, 5], [1, 3, 5], [1, 3, 5]],
+          [10, 10, 2, 2], 512, [16, 16, 4, 4], 109, 256, 40000]
+
+
+def timeit(fn, repeat: int) -> float:
+    fn()
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - start) / repeat
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--seconds", type=float, nargs="+", default=[1, 5, 10])
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--threads", type=int, default=0)
+    args = parser.parse_args()
+
+    if args.threads:
+        torch.set_num_threads(args.threads)
+    net_g = SynthesizerTrnMs768NSFsid(*CONFIG, is_half=False)
+    del net_g.enc_q
+    net_g.eval()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        torch_file = os.path.join(tmp_dir, "synthetic.pth")
+        torch.save({"weight": net_g.state_dict(), "config": list(CONFIG), "f0": 1, "version": "v2"}, torch_file)
+        start = time.perf_counter()
+        onnx_file = export_onnx(torch_file, os.path.join(tmp_dir, "synthetic.onnx"))
+        print(f"export: {time.perf_counter() - start:.2f}s, onnx bytes:{os.path.getsize(onnx_file)}")
+        ort_net_g = OnnxSynthesizer(onnx_file, intra_op_num_threads=args.threads)
+
+        print(f"cpu: {os.cpu_count()}, torch threads: {torch.get_num_threads()}")
+        for seconds in args.seconds:
+            frames = int(seconds * 100)
+            phone = torch.rand(1, frames, 768)
+            lengths = torch.LongTensor([frames])
+            pitch = torch.randint(1, 255, (1, frames))
+            pitchf = torch.rand(1, frames) * 300 + 100
+            sid = torch.LongTensor([0])
+
+            def run_torch():
+                with torch.no_grad():
+                    net_g.infer(phone, lengths, pitch, pitchf, sid)
+
+            def run_ort():
+                ort_net_g.infer(phone, lengths, pitch, pitchf, sid)
+
+            torch_latency = timeit(run_torch, args.repeat)
+            ort_latency = timeit(run_ort, args.repeat)
+            print(f"{seconds:5.1f}s  torch {torch_latency * 1000:8.1f}ms rtf:{torch_latency / seconds:.3f}  "
+                  f"onnxruntime {ort_latency * 1000:8.1f}ms rtf:{ort_latency / seconds:.3f}  "
+                  f"speedup:{torch_latency / ort_latency:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
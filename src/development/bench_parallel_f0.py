@@ -0,0 +1,69 @@
+"""
+harvest、pm 分块并行提取与整段提取的耗时对比
+
+    cd src
+    PYTHONPATH=bases:components python development/bench_parallel_f0.py --seconds 60 --workers 1 4 16
+"""
+import argparse
+import os
+import time
+
+import numpy as np
+
+from speakers.rvc.parallel_f0 import ParallelF0Extractor, harvest_f0, pm_f0
+
+SR = 16000
+
+
+def make_audio(seconds: float) -> np.ndarray:
+    n = int(SR * seconds)
+    t = np.arange(n) / SR
+    f0 = 200 + 50 * np.sin(2 * np.pi * 0.5 * t)
+    voiced = np.sin(2 * np.pi * 0.3 * t) > -0.5
+    noise = 0.01 * np.random.default_rng(0).standard_normal(n)
+    return 0.3 * np.sin(2 * np.pi * np.cumsum(f0) / SR) * voiced + noise
+
+
+def run(method: str, x: np.ndarray, extractor: ParallelF0Extractor = None) -> np.ndarray:
+    if method == "harvest":
+        if extractor is None:
+            return harvest_f0(x, SR, 1100, 50, 10)
+        return extractor.harvest(x, SR, 1100, 50, 10)
+    if extractor is None:
+        return pm_f0(x, SR, 0.01, 50, 1100)
+    return extractor.pm(x, SR, 0.01, 50, 1100)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--seconds", type=float, default=60)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 4, 16])
+    parser.add_argument("--methods", nargs="+", default=["harvest", "pm"])
+    parser.add_argument("--chunk_seconds", type=float, default=10)
+    parser.add_argument("--overlap_seconds", type=float, default=1)
+    args = parser.parse_args()
+
+    x = make_audio(args.seconds)
+    print(f"audio: {args.seconds}s, cpu: {os.cpu_count()}")
+    for method in args.methods:
+        start = time.perf_counter()
+        expected = run(method, x)
+        serial = time.perf_counter() - start
+        print(f"{method:8s} serial      {serial:8.2f}s  rtf:{serial / args.seconds:.3f}")
+        for workers in args.workers:
+            extractor = ParallelF0Extractor(workers, chunk_seconds=args.chunk_seconds,
+                                            overlap_seconds=args.overlap_seconds)
+            # 预热进程池，不计入耗时
+            run(method, x[: SR * 2], extractor)
+            list(extractor.executor.map(abs, range(workers)))
+            start = time.perf_counter()
+            actual = run(method, x, extractor)
+            elapsed = time.perf_counter() - start
+            extractor.shutdown()
+            agree = np.mean((expected > 0) == (actual > 0))
+            print(f"{method:8s} workers={workers:<3d} {elapsed:8.2f}s  rtf:{elapsed / args.seconds:.3f}  "
+                  f"speedup:{serial / elapsed:.2f}x  voicing agree:{agree:.4f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""
+变调扫描(VC.frontend + VC.sweep)与逐个变调独立调用 VC.pipeline 的耗时对比，使用随机权重的合成器
+
+    cd src
+    PYTHONPATH=bases:components python development/bench_pitch_sweep.py --seconds 5 --keys -12 -6 0 6 12
+
+--hubert 指定 hubert_base.pt 时使用真实 hubert(需要 fairseq)，否则使用帧率相同的卷积网络代替，
+真实 hubert 的前处理更重，扫描的收益更大
+"""
+import argparse
+import time
+
+import torch
+from torch import nn
+
+from speakers.rvc.infer_pack.models import SynthesizerTrnMs768NSFsid
+from speakers.rvc.quantization import reference_clip
+from speakers.rvc.vc_infer_pipeline import VC
+
+# v2 40k 模型的完整配置；测试(test/components/speakers/rvc/conftest.py)使用缩小的配置与 StubHubert，
+# 这里的合成器与卷积网络保持真实模型的大小，耗时才有参考意义
+CONFIG = [1025, 32, 192, 192, 768, 2, 6, 3, 0, "1", [3, 7, 11], [[1, 3, 5], [1, 3, 5], [1, 3, 5]],
+          [10, 10, 2, 2], 512, [16, 16, 4, 4], 109, 256, 40000]
+
+
+class ConvHubert(nn.Module):
+    """
+    与 hubert 卷积特征提取器帧率相同的随机网络
+    """
+
+    def __init__(self):
+        super().__init__()
+        layers, channels = [], 1
+        for kernel_size, stride in ((10, 5), (3, 2), (3, 2), (3, 2), (3, 2), (2, 2), (2, 2)):
+            layers.append(nn.Conv1d(channels, 512, kernel_size, stride))
+            channels = 512
+        self.convs = nn.ModuleList(layers)
+        self.proj = nn.Linear(512, 768)
+
+    def extract_features(self, source, padding_mask=None, output_layer=12):
+        x = source.unsqueeze(1)
+        for conv in self.convs:
+            x = torch.nn.functional.gelu(conv(x))
+        return self.proj(x.transpose(1, 2)), None
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--seconds", type=float, default=5)
+    parser.add_argument("--keys", type=int, nargs="+", default=list(range(-12, 13, 3)))
+    parser.add_argument("--f0_method", default="pm")
+    parser.add_argument("--sweep_batch_size", type=int, default=0, help="0 为自动，CPU 上为 1")
+    parser.add_argument("--hubert", default=None)
+    args = parser.parse_args()
+
+    if args.hubert:
+        from speakers.common.util import load_hubert_model
+        hubert = load_hubert_model("cpu", model_path=args.hubert).eval()
+    else:
+        hubert = ConvHubert().eval()
+    net_g = SynthesizerTrnMs768NSFsid(*CONFIG, is_half=False)
+    del net_g.enc_q
+    net_g.eval()
+    vc = VC(CONFIG[-1], 1, 6, 38, 41, False, "cpu", sweep_batch_size=args.sweep_batch_size)
+    audio = reference_clip(16000, args.seconds)
+    # 预热
+    vc.pipeline(hubert, net_g, 0, audio[:16000], "", [0, 0, 0], 0, args.f0_method, "", 0, 1, 3,
+                CONFIG[-1], 0, 1, "v2", 0.33)
+
+    start = time.perf_counter()
+    for f0_up_key in args.keys:
+        vc.pipeline(hubert, net_g, 0, audio, "", [0, 0, 0], f0_up_key, args.f0_method, "", 0, 1, 3,
+                    CONFIG[-1], 0, 1, "v2", 0.33)
+    independent = time.perf_counter() - start
+
+    times = [0, 0, 0]
+    start = time.perf_counter()
+    frontend = vc.frontend(hubert, audio, "", times, args.f0_method, 3, ["v2"])
+    frontend_seconds = time.perf_counter() - start
+    vc.sweep(frontend, net_g, 0, times, args.keys, "", 0, 1, CONFIG[-1], 0, 1, "v2", 0.33)
+    sweep = time.perf_counter() - start
+
+    n = len(args.keys)
+    print(f"audio: {args.seconds}s, keys: {n}, f0: {args.f0_method}, sweep_batch_size: {vc.sweep_batch_size}")
+    print(f"independent  {independent:8.2f}s  per key {independent / n:6.2f}s")
+    print(f"sweep        {sweep:8.2f}s  per key {sweep / n:6.2f}s  "
+          f"(frontend {frontend_seconds:.2f}s, render {sweep - frontend_seconds:.2f}s)  "
+          f"speedup {independent / sweep:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
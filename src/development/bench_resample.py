@@ -0,0 +1,83 @@
+"""
+speakers.common.resample 与 librosa.resample 的耗时对比，覆盖实际用到的采样率转换
+
+    cd src
+    PYTHONPATH=bases:components python development/bench_resample.py --seconds 10
+
+librosa 0.9(项目锁定的版本)默认 res_type 为 kaiser_best(resampy)，0.10 之后默认 soxr_hq，两者都会测，未安装的跳过
+"""
+import argparse
+import time
+
+import librosa
+import numpy as np
+
+from speakers.common.resample import QUALITY, StreamResampler, get_kernel, resample
+
+CONVERSIONS = [(22050, 16000), (24000, 16000), (40000, 48000)]
+LIBROSA_TYPES = ["kaiser_best", "soxr_hq", "polyphase"]
+
+
+def timeit(fn, repeat: int) -> float:
+    fn()
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - start) / repeat
+
+
+def sine_error(fn, orig_sr: int, target_sr: int) -> float:
+    """
+    1kHz 正弦重采样后相对理想信号的最大误差，去掉两端滤波器长度内的点
+    """
+    audio = np.sin(2 * np.pi * 1000 * np.arange(orig_sr) / orig_sr).astype(np.float32)
+    output = fn(audio)
+    reference = np.sin(2 * np.pi * 1000 * np.arange(output.shape[0]) / target_sr)
+    edge = target_sr // 50
+    return float(np.abs(output - reference)[edge:-edge].max())
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--block", type=int, default=4096, help="流式重采样的输入块大小")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    for orig_sr, target_sr in CONVERSIONS:
+        audio = (0.1 * rng.standard_normal(int(orig_sr * args.seconds))).astype(np.float32)
+        print(f"{orig_sr} -> {target_sr}, {args.seconds}s")
+        for quality in QUALITY:
+            get_kernel.cache_clear()
+            start = time.perf_counter()
+            resample(audio, orig_sr, target_sr, quality)
+            cold = time.perf_counter() - start
+            warm = timeit(lambda: resample(audio, orig_sr, target_sr, quality), args.repeat)
+
+            def stream():
+                resampler = StreamResampler(orig_sr, target_sr, quality)
+                for i in range(0, audio.shape[0], args.block):
+                    resampler.push(audio[i: i + args.block])
+                resampler.flush()
+
+            streaming = timeit(stream, args.repeat)
+            error = sine_error(lambda x: resample(x, orig_sr, target_sr, quality), orig_sr, target_sr)
+            print(f"  resample[{quality:7s}]   cold {cold * 1000:8.2f}ms  warm {warm * 1000:8.2f}ms  "
+                  f"stream {streaming * 1000:8.2f}ms  sine err {error:.1e}")
+        for res_type in LIBROSA_TYPES:
+            def run(x, res_type=res_type):
+                return librosa.resample(x, orig_sr=orig_sr, target_sr=target_sr, res_type=res_type)
+
+            try:
+                latency = timeit(lambda: run(audio), args.repeat)
+            except Exception as e:
+                print(f"  librosa[{res_type}] skipped: {e.__class__.__name__}")
+                continue
+            error = sine_error(run, orig_sr, target_sr)
+            print(f"  librosa[{res_type:11s}]          {latency * 1000:8.2f}ms"
+                  f"                          sine err {error:.1e}")
+
+
+if __name__ == "__main__":
+    main()
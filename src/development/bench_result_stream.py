@@ -0,0 +1,170 @@
+"""
+结果首字节时间(TTFB)：从 /runner/submit 返回到客户端收到第一段可播放音频的时间，
+对比原来的流程(轮询 /runner/result 直到完成，再下载 /runner/result_source)与 /runner/result_stream
+
+    cd src
+    PYTHONPATH=bases:components python development/bench_result_stream.py --sentence_seconds 1.5
+
+启动真实的 RunnerBootstrapBaseWeb，runner 线程按 WebSpeaker 的协议领取任务，按 split_sentences 切分文本，
+每句等待 sentence_seconds 模拟 TTS + RVC，并与 AudioTaskAbstract.synthesize_segments 一样
+用 StreamingWavWriter 逐句写入、上报 segment，完成后重命名为最终结果(不加载模型)
+"""
+import argparse
+import asyncio
+import os
+import socket
+import threading
+import time
+
+import numpy as np
+import requests
+from omegaconf import OmegaConf
+
+from speakers.common.audio_stream import StreamingWavWriter, split_sentences, stream_result_filename
+from speakers.common.registry import registry
+from speakers.common.utils import get_tmp_path
+from speakers.server import servlet
+from speakers.server.bootstrap.bootstrap_register import get_bootstrap, load_bootstrap
+from speakers.server.servlet.boot import runner_bootstrap  # noqa: F401 注册 runner_bootstrap_web
+
+NONCE = "bench"
+SAMPLE_RATE = 40000
+TEXT = ("今天的天气非常好。我们一起去公园散步吧！公园里有很多人在锻炼身体。"
+        "湖边的柳树已经发芽了。孩子们在草地上放风筝。傍晚的时候我们再回家吃饭。")
+
+
+class BenchTask:
+    """
+    只生成 task_id 的任务，不加载模型
+    """
+
+    @classmethod
+    def prepare(cls, payload):
+        return type("Runner", (), {"task_id": payload.payload["task_id"]})
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_server(port: int, tmp_root: str):
+    registry.register_path("tmp_root", tmp_root)
+    # 与 server_init 相同，静态文件目录
+    registry.register_path("server_library_root", os.path.dirname(os.path.dirname(os.path.abspath(servlet.__file__))))
+    # 跳过 register_task 对 BaseTask 的检查，避免加载全部处理器
+    registry.mapping["task_name_mapping"]["bench_task"] = BenchTask
+    load_bootstrap(OmegaConf.create([{"runner_bootstrap_web": {"name": "runner_bootstrap_web",
+                                                               "host": "127.0.0.1", "port": port}}]))
+    bootstrap = get_bootstrap("runner_bootstrap_web")
+    bootstrap.set_nonce(NONCE)
+    asyncio.run(bootstrap.run())
+    base = f"http://127.0.0.1:{port}"
+    for _ in range(100):
+        try:
+            requests.get(f"{base}/runner/task-internal", params={"nonce": NONCE}, timeout=1)
+            return base
+        except requests.ConnectionError:
+            time.sleep(0.1)
+    raise RuntimeError("server did not start")
+
+
+def run_runner(base: str, sentence_seconds: float):
+    session = requests.Session()
+
+    def update(task_id, state, finished=False, result=None):
+        session.post(f"{base}/runner/task-update-internal",
+                     json={"task_id": task_id, "runner_stat": "bench", "nonce": NONCE, "state": state,
+                           "finished": finished, "result": result or {}}, timeout=10)
+
+    while True:
+        data = session.get(f"{base}/runner/task-internal", params={"nonce": NONCE, "wait": 20},
+                           timeout=30).json().get("data")
+        if data is None:
+            continue
+        task_id = data["task_id"]
+        stream_path = get_tmp_path(f"result/{stream_result_filename(task_id)}")
+        writer = None
+        texts = split_sentences(data["data"]["payload"]["text"])
+        for text in texts:
+            time.sleep(sentence_seconds)
+            audio = (np.sin(np.arange(int(SAMPLE_RATE * 0.12 * len(text))) / 20) * 8000).astype(np.int16)
+            if writer is None:
+                writer = StreamingWavWriter(stream_path, SAMPLE_RATE)
+            writer.write(SAMPLE_RATE, audio)
+            update(task_id, "segment", result={"stream": stream_path, "segments": writer.segments,
+                                               "total_segments": len(texts)})
+        writer.close()
+        filename = get_tmp_path(f"result/{task_id}.wav")
+        os.replace(stream_path, filename)
+        update(task_id, "save_write", result={"filename": filename})
+        update(task_id, "end", finished=True)
+
+
+def submit(base: str, task_id: str) -> float:
+    requests.post(f"{base}/runner/submit",
+                  json={"parameter": {"task_name": "bench_task"}, "payload": {"task_id": task_id, "text": TEXT}},
+                  timeout=10)
+    return time.perf_counter()
+
+
+def measure_polling(base: str, task_id: str, interval: float):
+    """
+    原来的流程：轮询任务状态，完成后下载结果文件
+    """
+    start = submit(base, task_id)
+    while not requests.get(f"{base}/runner/result", params={"task_id": task_id}, timeout=10).json()["data"]["finished"]:
+        time.sleep(interval)
+    response = requests.get(f"{base}/runner/result_source", params={"task_id": task_id}, stream=True, timeout=10)
+    ttfb = None
+    total = 0
+    for chunk in response.iter_content(chunk_size=None):
+        total += len(chunk)
+        if ttfb is None and total > 44:
+            ttfb = time.perf_counter() - start
+    return ttfb, time.perf_counter() - start, total
+
+
+def measure_streaming(base: str, task_id: str):
+    start = submit(base, task_id)
+    response = requests.get(f"{base}/runner/result_stream", params={"task_id": task_id}, stream=True, timeout=60)
+    ttfb = None
+    total = 0
+    for chunk in response.iter_content(chunk_size=None):
+        total += len(chunk)
+        # 文件头之后的第一段音频
+        if ttfb is None and total > 44:
+            ttfb = time.perf_counter() - start
+    return ttfb, time.perf_counter() - start, total
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sentence_seconds", type=float, default=1.5)
+    parser.add_argument("--poll_interval", type=float, default=1.0)
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--tmp_root", type=str, default="/tmp/speakers_bench_stream")
+    args = parser.parse_args()
+
+    os.makedirs(os.path.join(args.tmp_root, "result"), exist_ok=True)
+    base = start_server(free_port(), args.tmp_root)
+    threading.Thread(target=run_runner, args=(base, args.sentence_seconds), daemon=True).start()
+
+    sentences = len(split_sentences(TEXT))
+    print(f"sentences: {sentences}, {args.sentence_seconds}s per sentence")
+    print(f"{'mode':10s} {'ttfb s':>8s} {'total s':>8s} {'bytes':>9s}")
+    for i in range(args.repeats):
+        for mode in ("polling", "streaming"):
+            task_id = f"{mode}-{i}-{time.time_ns()}"
+            if mode == "polling":
+                ttfb, total, size = measure_polling(base, task_id, args.poll_interval)
+            else:
+                ttfb, total, size = measure_streaming(base, task_id)
+            print(f"{mode:10s} {ttfb:8.2f} {total:8.2f} {size:9d}")
+    # uvicorn 线程不是守护线程
+    os._exit(0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,159 @@
+"""
+web_runner 进程池吞吐：同一批任务在 1、2、4... 个 worker 下的完成时间
+
+    cd src
+    PYTHONPATH=bases:components python development/bench_runner_pool.py --workers 1 2 4 --work cpu
+
+启动真实的 RunnerBootstrapBaseWeb 与 RunnerPool，worker 进程按 WebSpeaker 的协议(long-poll 领取、带 worker
+标识上报)执行合成的任务：cpu 为单线程的矩阵乘法，sleep 为固定时长等待(只衡量调度开销)。
+CPU 任务的加速比受机器核数限制，worker 数不应超过 os.sched_getaffinity 的核数
+"""
+import argparse
+import asyncio
+import os
+import socket
+import subprocess
+import sys
+import time
+
+import numpy as np
+import requests
+from omegaconf import OmegaConf
+
+NONCE = "bench"
+
+
+def run_worker(port: int, work: str, task_seconds: float):
+    from speakers.common.threads import WORKER_INDEX_ENV
+    from speakers.server.runner_pool import worker_name
+
+    worker = worker_name(int(os.getenv(WORKER_INDEX_ENV, "0")), os.getpid())
+    base = f"http://127.0.0.1:{port}"
+    session = requests.Session()
+    a = np.random.default_rng(0).standard_normal((256, 256)).astype(np.float32)
+    # 单线程下约 task_seconds 秒的矩阵乘法次数
+    start, n = time.perf_counter(), 0
+    while time.perf_counter() - start < 0.2:
+        a @ a
+        n += 1
+    repeats = max(1, int(n * task_seconds / (time.perf_counter() - start)))
+    while True:
+        try:
+            data = session.get(f"{base}/runner/task-internal",
+                               params={"nonce": NONCE, "wait": 20, "worker": worker}, timeout=30).json().get("data")
+        except requests.ConnectionError:
+            return
+        if data is None:
+            continue
+        if work == "cpu":
+            for _ in range(repeats):
+                a @ a
+        else:
+            time.sleep(task_seconds)
+        session.post(f"{base}/runner/task-update-internal",
+                     json={"task_id": data["task_id"], "runner_stat": "bench", "nonce": NONCE, "state": "end",
+                           "finished": True, "worker": worker}, timeout=10)
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_server(port: int, num_workers: int):
+    from speakers.common.registry import registry
+    from speakers.server import servlet
+    from speakers.server.bootstrap.bootstrap_register import get_bootstrap, load_bootstrap
+    from speakers.server.servlet.boot import runner_bootstrap  # noqa: F401 注册 runner_bootstrap_web
+
+    class BenchTask:
+        @classmethod
+        def prepare(cls, payload):
+            return type("Runner", (), {"task_id": payload.payload["task_id"]})
+
+    registry.register_path("tmp_root", "/tmp")
+    registry.register_path("server_library_root", os.path.dirname(os.path.dirname(os.path.abspath(servlet.__file__))))
+    # 跳过 register_task 对 BaseTask 的检查，避免加载全部处理器
+    registry.mapping["task_name_mapping"]["bench_task"] = BenchTask
+    load_bootstrap(OmegaConf.create([{"runner_bootstrap_web": {"name": "runner_bootstrap_web",
+                                                               "host": "127.0.0.1", "port": port,
+                                                               "workers": {"num_workers": num_workers}}}]))
+    bootstrap = get_bootstrap("runner_bootstrap_web")
+    bootstrap.set_nonce(NONCE)
+    asyncio.run(bootstrap.run())
+    for _ in range(100):
+        try:
+            requests.get(f"http://127.0.0.1:{port}/runner/task-internal", params={"nonce": NONCE}, timeout=1)
+            return bootstrap
+        except requests.ConnectionError:
+            time.sleep(0.1)
+    raise RuntimeError("server did not start")
+
+
+def run_batch(bootstrap, port: int, prefix: str, n_tasks: int) -> float:
+    start = time.perf_counter()
+    for i in range(n_tasks):
+        requests.post(f"http://127.0.0.1:{port}/runner/submit",
+                      json={"parameter": {"task_name": "bench_task"}, "payload": {"task_id": f"{prefix}-{i}"}},
+                      timeout=10)
+    task_ids = [f"{prefix}-{i}" for i in range(n_tasks)]
+    while not all(bootstrap.task_store.get_state(task_id)["finished"] for task_id in task_ids):
+        time.sleep(0.01)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--work", choices=["cpu", "sleep"], default="cpu")
+    parser.add_argument("--tasks", type=int, default=16)
+    parser.add_argument("--task_seconds", type=float, default=0.5)
+    parser.add_argument("--worker", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--port", type=int, default=0, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        run_worker(args.port, args.work, args.task_seconds)
+        return
+
+    from speakers.common.threads import WORKER_INDEX_ENV
+    from speakers.server.runner_pool import RunnerPool
+
+    port = free_port()
+    bootstrap = start_server(port, max(args.workers))
+
+    def start_proc(worker_index: int):
+        env = dict(os.environ, OMP_NUM_THREADS="1", OPENBLAS_NUM_THREADS="1", MKL_NUM_THREADS="1",
+                   **{WORKER_INDEX_ENV: str(worker_index)})
+        return subprocess.Popen([sys.executable, os.path.abspath(__file__), "--worker", "--port", str(port),
+                                 "--work", args.work, "--task_seconds", str(args.task_seconds)], env=env)
+
+    cores = len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else os.cpu_count()
+    print(f"cores: {cores}, work: {args.work}, tasks: {args.tasks} x {args.task_seconds}s")
+    print(f"{'workers':>8s} {'seconds':>8s} {'tasks/s':>8s} {'speedup':>8s}")
+    baseline = None
+    for num_workers in args.workers:
+        pool = RunnerPool(start_proc, num_workers)
+        pool.start()
+        try:
+            # 预热：等所有 worker 完成标定并开始领取任务
+            run_batch(bootstrap, port, f"warmup-{num_workers}", num_workers)
+            seconds = run_batch(bootstrap, port, f"run-{num_workers}", args.tasks)
+        finally:
+            workers = pool.workers()
+            pool.kill()
+            for proc in pool.procs:
+                proc.wait()
+            # 与 server_init.dispatch 相同，回收已退出 worker 的租约
+            for worker in workers:
+                bootstrap.task_store.expire_leases(time.time(), max_retries=2, worker=worker)
+        throughput = args.tasks / seconds
+        baseline = baseline or throughput
+        print(f"{num_workers:8d} {seconds:8.2f} {throughput:8.2f} {throughput / baseline:8.2f}")
+    # uvicorn 线程不是守护线程
+    os._exit(0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+"""
+任务领取延迟：从 /runner/submit 返回到 runner 拿到任务的时间，对比 1 秒轮询与 long-poll
+
+    cd src
+    PYTHONPATH=bases:components python development/bench_task_dispatch.py --tasks 50
+
+启动真实的 RunnerBootstrapBaseWeb(内存任务存储)，runner 线程按 WebSpeaker 的两种领取方式循环：
+poll 为原来的 GET /runner/task-internal + 队列为空时 sleep 1 秒，long_poll 为带 wait 参数的挂起请求；
+任务按随机间隔提交，runner 拿到任务后立即上报完成
+"""
+import argparse
+import asyncio
+import os
+import random
+import socket
+import threading
+import time
+
+import numpy as np
+import requests
+from omegaconf import OmegaConf
+
+from speakers.common.registry import registry
+from speakers.server import servlet
+from speakers.server.bootstrap.bootstrap_register import get_bootstrap, load_bootstrap
+from speakers.server.servlet.boot import runner_bootstrap  # noqa: F401 注册 runner_bootstrap_web
+
+NONCE = "bench"
+
+
+class BenchTask:
+    """
+    只生成 task_id 的任务，不加载模型
+    """
+
+    @classmethod
+    def prepare(cls, payload):
+        return type("Runner", (), {"task_id": payload.payload["task_id"]})
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_server(port: int):
+    registry.register_path("tmp_root", "/tmp")
+    # 与 server_init 相同，静态文件目录
+    registry.register_path("server_library_root", os.path.dirname(os.path.dirname(os.path.abspath(servlet.__file__))))
+    # 跳过 register_task 对 BaseTask 的检查，避免加载全部处理器
+    registry.mapping["task_name_mapping"]["bench_task"] = BenchTask
+    load_bootstrap(OmegaConf.create([{"runner_bootstrap_web": {"name": "runner_bootstrap_web",
+                                                               "host": "127.0.0.1", "port": port}}]))
+    bootstrap = get_bootstrap("runner_bootstrap_web")
+    bootstrap.set_nonce(NONCE)
+    asyncio.run(bootstrap.run())
+    base = f"http://127.0.0.1:{port}"
+    for _ in range(100):
+        try:
+            requests.get(f"{base}/runner/task-internal", params={"nonce": NONCE}, timeout=1)
+            return base
+        except requests.ConnectionError:
+            time.sleep(0.1)
+    raise RuntimeError("server did not start")
+
+
+def run_runner(base: str, mode: str, received: dict, stop: threading.Event, wait: float):
+    session = requests.Session()
+    while not stop.is_set():
+        params = {"nonce": NONCE}
+        if mode == "long_poll":
+            params["wait"] = wait
+        data = session.get(f"{base}/runner/task-internal", params=params, timeout=wait + 10).json().get("data")
+        if data is None:
+            if mode == "poll":
+                time.sleep(1)
+            continue
+        received[data["task_id"]] = time.perf_counter()
+        session.post(f"{base}/runner/task-update-internal",
+                     json={"task_id": data["task_id"], "runner_stat": "bench", "nonce": NONCE,
+                           "state": "finished", "finished": True}, timeout=10)
+
+
+def measure(base: str, mode: str, n_tasks: int, wait: float, seed: int):
+    received, submitted = {}, {}
+    stop = threading.Event()
+    runner = threading.Thread(target=run_runner, args=(base, mode, received, stop, wait), daemon=True)
+    runner.start()
+    rng = random.Random(seed)
+    for i in range(n_tasks):
+        time.sleep(rng.uniform(0.2, 1.5))
+        task_id = f"{mode}-{i}"
+        submitted[task_id] = time.perf_counter()
+        requests.post(f"{base}/runner/submit",
+                      json={"parameter": {"task_name": "bench_task"}, "payload": {"task_id": task_id}}, timeout=10)
+    deadline = time.time() + 5
+    while len(received) < n_tasks and time.time() < deadline:
+        time.sleep(0.05)
+    stop.set()
+    runner.join(timeout=wait + 10)
+    latencies = np.array([received[task_id] - submitted[task_id] for task_id in submitted if task_id in received])
+    return latencies * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--tasks", type=int, default=50)
+    parser.add_argument("--wait", type=float, default=20)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    base = start_server(free_port())
+    print(f"{'mode':10s} {'tasks':>6s} {'p50 ms':>8s} {'p99 ms':>8s} {'max ms':>8s}")
+    for mode in ("poll", "long_poll"):
+        latencies = measure(base, mode, args.tasks, args.wait, args.seed)
+        print(f"{mode:10s} {len(latencies):6d} {np.percentile(latencies, 50):8.1f} "
+              f"{np.percentile(latencies, 99):8.1f} {latencies.max():8.1f}")
+    # uvicorn 线程不是守护线程
+    os._exit(0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,210 @@
+import asyncio
+import os
+import time
+
+import numpy as np
+import pytest
+
+from speakers.common.audio_stream import StreamingWavWriter, stream_result_filename
+from speakers.common.registry import registry
+from speakers.server.bootstrap.base import Bootstrap
+from speakers.server.bootstrap.bootstrap_register import bootstrap_cache
+from speakers.server.bootstrap.result_cache import ResultCache
+from speakers.server.bootstrap.task_store import RUNNING
+from speakers.server.model.flow_data import PayLoad
+from speakers.server.model.result import RunnerHeartbeat, RunnerState
+from speakers.server.runner_pool import WorkerPoolConfig
+from speakers.server.servlet.runner import (get_task_async, post_heartbeat_async, post_task_update_async,
+                                            result_stream_async, submit_async)
+
+NONCE = "nonce"
+
+
+class StubTask:
+    @classmethod
+    def prepare(cls, payload):
+        return type("Runner", (), {"task_id": payload.payload["task_id"]})
+
+
+class StubRequest:
+    def __init__(self, disconnected: bool = False):
+        self.disconnected = disconnected
+
+    async def is_disconnected(self) -> bool:
+        return self.disconnected
+
+
+@pytest.fixture
+def bootstrap(monkeypatch, tmp_path):
+    monkeypatch.setitem(registry.mapping["paths"], "tmp_root", str(tmp_path))
+    monkeypatch.setitem(registry.mapping["task_name_mapping"], "stub_task", StubTask)
+    bootstrap = Bootstrap()
+    bootstrap.set_nonce(NONCE)
+    monkeypatch.setitem(bootstrap_cache, "runner_bootstrap_web", bootstrap)
+    return bootstrap
+
+
+def submit(task_id: str):
+    return submit_async(PayLoad(parameter={"task_name": "stub_task"}, payload={"task_id": task_id}))
+
+
+def test_long_poll_wakes_on_submit(bootstrap):
+    async def run():
+        poll = asyncio.ensure_future(get_task_async(StubRequest(), nonce=NONCE, wait=5))
+        await asyncio.sleep(0.05)
+        assert not poll.done()
+        start = time.perf_counter()
+        await submit("task-0")
+        response = await poll
+        return response, time.perf_counter() - start
+
+    response, latency = asyncio.run(run())
+    assert response.data.task_id == "task-0"
+    assert latency < 0.5
+    assert bootstrap.task_store.running() == ["task-0"]
+
+
+def test_long_poll_is_bounded(bootstrap):
+    start = time.perf_counter()
+    response = asyncio.run(get_task_async(StubRequest(), nonce=NONCE, wait=0.2))
+    assert response.msg == "成功" and not hasattr(response, "data")
+    assert 0.2 <= time.perf_counter() - start < 1
+    # 不带 wait 时立即返回，与原来的轮询接口一致
+    start = time.perf_counter()
+    asyncio.run(get_task_async(StubRequest(), nonce=NONCE, wait=0))
+    assert time.perf_counter() - start < 0.1
+
+
+def test_long_poll_wakes_when_slot_frees(bootstrap):
+    async def run():
+        await submit("task-0")
+        await submit("task-1")
+        first = await get_task_async(StubRequest(), nonce=NONCE, wait=0)
+        poll = asyncio.ensure_future(get_task_async(StubRequest(), nonce=NONCE, wait=5))
+        await asyncio.sleep(0.05)
+        # 执行槽位已满，挂起到 task-0 完成
+        assert not poll.done()
+        await post_task_update_async(RunnerState(task_id=first.data.task_id, runner_stat="test", nonce=NONCE,
+                                                 state="finished", finished=True))
+        return await asyncio.wait_for(poll, 1)
+
+    assert asyncio.run(run()).data.task_id == "task-1"
+
+
+def test_disconnected_runner_does_not_take_task(bootstrap):
+    async def run():
+        poll = asyncio.ensure_future(get_task_async(StubRequest(disconnected=True), nonce=NONCE, wait=5))
+        await asyncio.sleep(0.05)
+        await submit("task-0")
+        return await asyncio.wait_for(poll, 1)
+
+    assert not hasattr(asyncio.run(run()), "data")
+    assert bootstrap.task_store.pop_queued()[0] == "task-0"
+
+
+def test_workers_lease_tasks_and_stale_updates_are_ignored(monkeypatch, tmp_path):
+    monkeypatch.setitem(registry.mapping["paths"], "tmp_root", str(tmp_path))
+    monkeypatch.setitem(registry.mapping["task_name_mapping"], "stub_task", StubTask)
+    bootstrap = Bootstrap(workers=WorkerPoolConfig(num_workers=2, lease_seconds=30))
+    bootstrap.set_nonce(NONCE)
+    monkeypatch.setitem(bootstrap_cache, "runner_bootstrap_web", bootstrap)
+
+    def update(task_id, worker, finished=False):
+        return post_task_update_async(RunnerState(task_id=task_id, runner_stat="test", nonce=NONCE,
+                                                  state="dispatch", finished=finished, worker=worker))
+
+    async def run():
+        for i in range(3):
+            await submit(f"task-{i}")
+        # 两个 worker 同时执行
+        first = await get_task_async(StubRequest(), nonce=NONCE, wait=0, worker="w0")
+        second = await get_task_async(StubRequest(), nonce=NONCE, wait=0, worker="w1")
+        third = await get_task_async(StubRequest(), nonce=NONCE, wait=0, worker="w2")
+        assert third.msg == "max_ongoing_tasks"
+
+        heartbeat = await post_heartbeat_async(RunnerHeartbeat(task_id=first.data.task_id, worker="w0", nonce=NONCE))
+        assert heartbeat.code == 200
+        # w0 崩溃，租约回收后 task-0 由 w2 领取，w0 迟到的上报被忽略
+        bootstrap.task_store.expire_leases(time.time(), max_retries=2, worker="w0")
+        retried = await get_task_async(StubRequest(), nonce=NONCE, wait=0, worker="w2")
+        assert retried.data.task_id == first.data.task_id
+        assert (await update(first.data.task_id, "w0", finished=True)).code == 409
+        heartbeat = await post_heartbeat_async(RunnerHeartbeat(task_id=first.data.task_id, worker="w0", nonce=NONCE))
+        assert heartbeat.code == 409
+        assert (await update(first.data.task_id, "w2", finished=True)).code == 200
+        assert (await update(second.data.task_id, "w1", finished=True)).code == 200
+
+    asyncio.run(run())
+    assert bootstrap.task_store.count(RUNNING) == 0
+    assert bootstrap.task_store.get_state("task-0")['finished']
+
+
+def test_cached_result_is_answered_without_queuing(monkeypatch, tmp_path):
+    monkeypatch.setitem(registry.mapping["paths"], "tmp_root", str(tmp_path))
+    monkeypatch.setitem(registry.mapping["task_name_mapping"], "stub_task", StubTask)
+    filename = str(tmp_path / "task-0.wav")
+    with open(filename, "wb") as f:
+        f.write(b"\0" * 16)
+
+    async def run(bootstrap):
+        monkeypatch.setitem(bootstrap_cache, "runner_bootstrap_web", bootstrap)
+        response = await submit("task-0")
+        if not response.data['finished']:
+            task = await get_task_async(StubRequest(), nonce=NONCE, wait=0)
+            await post_task_update_async(RunnerState(task_id=task.data.task_id, runner_stat="test", nonce=NONCE,
+                                                     state="save_write", result={'filename': filename}))
+            await post_task_update_async(RunnerState(task_id=task.data.task_id, runner_stat="test", nonce=NONCE,
+                                                     state="end", finished=True))
+        return response
+
+    for restart in range(2):
+        # 每次重启使用新的内存任务存储，结果缓存保留在同一个数据库
+        bootstrap = Bootstrap(result_cache=ResultCache(str(tmp_path / "results.db")))
+        bootstrap.set_nonce(NONCE)
+        response = asyncio.run(run(bootstrap))
+        assert response.data['finished'] == (restart == 1)
+        bootstrap.result_cache.close()
+
+    assert response.data['result'] == {'filename': filename}
+    assert len(bootstrap.task_store) == 0
+
+
+def test_result_stream_sends_segments_as_they_finish(bootstrap, tmp_path):
+    os.makedirs(tmp_path / "result", exist_ok=True)
+    stream_path = str(tmp_path / "result" / stream_result_filename("task-0"))
+    filename = str(tmp_path / "result" / "task-0.wav")
+    segment = np.ones(1600, dtype=np.int16)
+
+    async def run():
+        await submit("task-0")
+        task = await get_task_async(StubRequest(), nonce=NONCE, wait=0)
+        writer = StreamingWavWriter(stream_path, 16000)
+        writer.write(16000, segment)
+
+        response = await result_stream_async(task_id="task-0")
+        body = response.body_iterator
+        # 第一句完成后即可收到文件头与第一句
+        first = await asyncio.wait_for(body.__anext__(), 1)
+        assert len(first) == 44 + segment.nbytes
+
+        writer.write(16000, segment * 2)
+        writer.close()
+        os.replace(stream_path, filename)
+        await post_task_update_async(RunnerState(task_id=task.data.task_id, runner_stat="test", nonce=NONCE,
+                                                 state="save_write", result={'filename': filename}))
+        await post_task_update_async(RunnerState(task_id=task.data.task_id, runner_stat="test", nonce=NONCE,
+                                                 state="end", finished=True))
+        rest = [chunk async for chunk in body]
+        streamed = first + b"".join(rest)
+
+        # 已完成的任务直接发送结果文件
+        response = await result_stream_async(task_id="task-0")
+        complete = b"".join([chunk async for chunk in response.body_iterator])
+        return streamed, complete
+
+    streamed, complete = asyncio.run(asyncio.wait_for(run(), 5))
+    with open(filename, "rb") as f:
+        final = f.read()
+    assert complete == final
+    # 流式发送的数据与最终文件只有文件头中的长度不同
+    assert streamed[44:] == final[44:] and len(streamed) == len(final)
@@ -0,0 +1,66 @@
+import os
+
+import pytest
+
+from speakers.server.bootstrap.result_cache import ResultCache, load_result_cache, result_files
+
+
+def write_result(tmp_path, task_id: str, size: int) -> dict:
+    filename = str(tmp_path / f"{task_id}.wav")
+    with open(filename, "wb") as f:
+        f.write(b"\0" * size)
+    return {'task_id': task_id, 'info': 'end', 'finished': True, 'result': {'filename': filename}}
+
+
+@pytest.fixture
+def cache(tmp_path):
+    cache = ResultCache(str(tmp_path / "results.db"), max_bytes=1000)
+    yield cache
+    cache.close()
+
+
+def test_hit_miss_and_restart(tmp_path, cache):
+    assert cache.get("task-0") is None
+    state = write_result(tmp_path, "task-0", 100)
+    assert cache.put("task-0", state)
+    assert cache.get("task-0") == state
+    # 失败的任务没有结果文件，不缓存
+    assert not cache.put("task-1", {'task_id': "task-1", 'info': 'error', 'finished': True})
+    assert cache.stats['hits'] == 1 and cache.stats['misses'] == 1 and cache.stats['bytes'] == 100
+    cache.close()
+
+    cache = load_result_cache({"path": str(tmp_path / "results.db"), "max_bytes": 1000})
+    assert cache.get("task-0") == state and cache.total_bytes == 100
+    cache.close()
+
+
+def test_lru_eviction_removes_files(tmp_path, cache):
+    states = [write_result(tmp_path, f"task-{i}", 400) for i in range(3)]
+    cache.put("task-0", states[0], now=1)
+    cache.put("task-1", states[1], now=2)
+    # 访问 task-0 后 task-1 成为最久未使用的结果
+    cache.get("task-0", now=3)
+    cache.put("task-2", states[2], now=4)
+
+    assert "task-1" not in cache and not os.path.exists(states[1]['result']['filename'])
+    assert cache.get("task-0") is not None and cache.get("task-2") is not None
+    assert cache.total_bytes == 800 and cache.stats['evictions'] == 1
+
+    # 超过上限的单个结果仍然保留，其余结果全部淘汰
+    cache.put("task-3", write_result(tmp_path, "task-3", 1200), now=5)
+    assert len(cache) == 1 and cache.total_bytes == 1200
+
+
+def test_missing_files_are_dropped(tmp_path, cache):
+    state = write_result(tmp_path, "task-0", 100)
+    cache.put("task-0", state)
+    os.remove(state['result']['filename'])
+    assert cache.get("task-0") is None
+    assert len(cache) == 0 and cache.total_bytes == 0
+
+
+def test_result_files_include_archive_members():
+    state = {'result': {'filename': 'a.zip', 'filenames': ['a-0.wav', 'a-1.wav']}}
+    assert result_files(state) == ['a.zip', 'a-0.wav', 'a-1.wav']
+    assert result_files({'info': 'pending'}) == []
+    assert load_result_cache(None) is None and load_result_cache({"enabled": False}) is None
@@ -0,0 +1,39 @@
+import subprocess
+import sys
+import time
+
+from speakers.server import runner_pool
+from speakers.server.runner_pool import RunnerPool, WorkerPoolConfig, worker_name
+
+
+def start_proc(code: str):
+    def start(worker_index: int):
+        return subprocess.Popen([sys.executable, "-c", code])
+    return start
+
+
+def test_worker_pool_config():
+    workers = WorkerPoolConfig.from_config({"num_workers": 3, "devices": ["0", "1"], "max_retries": 1})
+    assert workers.num_workers == 3 and workers.max_retries == 1
+    assert [workers.device(i) for i in range(3)] == ["0", "1", "0"]
+    assert WorkerPoolConfig.from_config(None).device(0) is None
+
+
+def test_restarts_each_worker_independently():
+    pool = RunnerPool(lambda worker_index: start_proc("import time; time.sleep(30)" if worker_index == 0
+                                                      else "import sys; sys.exit(1)")(worker_index), 2)
+    pool.start()
+    try:
+        healthy, crashing = pool.procs
+        crashing.wait()
+        crashed = worker_name(1, crashing.pid)
+        now = time.time()
+        assert pool.poll(now) == [crashed]
+        # 刚启动就退出，按退避延迟重启，健康的 worker 不受影响
+        assert pool.procs[0] is healthy and pool.procs[1] is None
+        assert pool.poll(now + runner_pool.RESTART_DELAY_MIN) == []
+        assert pool.procs[1] is not None and pool.procs[1].pid != crashing.pid
+        assert worker_name(0, healthy.pid) in pool.workers()
+    finally:
+        pool.kill()
+    assert healthy.wait(5) is not None
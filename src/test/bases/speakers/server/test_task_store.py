@@ -0,0 +1,179 @@
+import statistics
+import time
+
+import pytest
+
+from speakers.server.bootstrap.task_store import (FINISHED, QUEUED, RUNNING, MemoryTaskStore, SqliteTaskStore,
+                                                  load_task_store)
+from speakers.server.model.flow_data import PayLoad, RunnerParameter
+
+
+def make_payload(i: int, created_at: float = None) -> PayLoad:
+    created_at = float(i) if created_at is None else created_at
+    return PayLoad(parameter=RunnerParameter(task_name="edge_voice_task"),
+                   payload={"edge": {"text": f"你好 {i}", "tts_speaker": 0, "rate": "+0%", "volume": "+0%"}},
+                   created_at=created_at, requested_at=created_at)
+
+
+def make_state(task_id: str) -> dict:
+    return {'task_id': task_id, 'info': 'pending', 'finished': False}
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def store(request, tmp_path):
+    if request.param == "memory":
+        store = MemoryTaskStore()
+    else:
+        store = SqliteTaskStore(str(tmp_path / "tasks.db"))
+    yield store
+    store.close()
+
+
+def test_lifecycle(store):
+    for i in range(3):
+        store.add(f"task-{i}", make_payload(i), make_state(f"task-{i}"))
+    # 重复提交返回已有状态
+    assert store.add("task-0", make_payload(9), {'info': 'other'})['info'] == 'pending'
+    assert len(store) == 3 and store.count(QUEUED) == 3
+
+    task_id, payload = store.pop_queued()
+    assert task_id == "task-0" and payload.payload["edge"]["text"] == "你好 0"
+    assert store.running() == ["task-0"] and store.count(QUEUED) == 2
+
+    state = store.update_state("task-0", info='dispatch', finished=False)
+    assert state['info'] == 'dispatch' and store.count(RUNNING) == 1
+    state = store.update_state("task-0", info='finished', finished=True, result={'filename': 'a.wav'})
+    assert state['result'] == {'filename': 'a.wav'}
+    assert store.get_state("task-0") == state
+    assert store.count(RUNNING) == 0 and store.count(FINISHED) == 1
+    assert store.update_state("missing", info='x') is None
+    assert "task-1" in store and "missing" not in store
+
+    store.remove("task-1")
+    assert store.pop_queued()[0] == "task-2"
+    assert store.pop_queued() is None
+
+
+def test_expire(store):
+    for i in range(4):
+        store.add(f"task-{i}", make_payload(i, created_at=100.0 + i), make_state(f"task-{i}"))
+    store.pop_queued()
+    store.pop_queued()
+    store.update_state("task-0", finished=True)
+    store.update_state("task-1", finished=True)
+
+    # 已完成任务按 created_at 过期，执行中与排队任务不受影响
+    assert store.expire(now=100.5 + 1800, finished_timeout=1800) == ["task-0"]
+    assert store.expire(now=100.5 + 1800, finished_timeout=1800) == []
+    assert store.expire(now=200.0, finished_timeout=1800, queued_timeout=97.5) == ["task-2"]
+    assert len(store) == 2 and store.get_state("task-3") is not None
+
+
+def test_lease_expiry_requeues_within_retry_budget(store):
+    store.add("task-0", make_payload(0), make_state("task-0"))
+    store.add("task-1", make_payload(1), make_state("task-1"))
+    assert store.pop_queued(worker="w0", lease_seconds=10)[0] == "task-0"
+    assert store.owner("task-0") == "w0"
+    now = time.time()
+    assert store.expire_leases(now, max_retries=1) == ([], [])
+
+    # 心跳续约只对持有租约的 worker 生效
+    assert not store.renew_lease("task-0", "w1", 10)
+    assert store.renew_lease("task-0", "w0", 10)
+
+    # 租约到期后重新排队，排在 task-1 之前
+    assert store.expire_leases(now + 20, max_retries=1) == (["task-0"], [])
+    assert store.owner("task-0") is None and not store.renew_lease("task-0", "w0", 10)
+    assert store.get_state("task-0")['info'] == 'pending'
+    assert store.pop_queued(worker="w1", lease_seconds=10)[0] == "task-0"
+
+    # 第二次过期超过重试次数，标记为失败
+    assert store.expire_leases(now + 40, max_retries=1) == ([], ["task-0"])
+    state = store.get_state("task-0")
+    assert state['info'] == 'error' and state['finished']
+    assert store.count(RUNNING) == 0 and store.pop_queued()[0] == "task-1"
+
+
+def test_crashed_worker_releases_its_leases(store):
+    for i in range(3):
+        store.add(f"task-{i}", make_payload(i), make_state(f"task-{i}"))
+    store.pop_queued(worker="w0", lease_seconds=60)
+    store.pop_queued(worker="w1", lease_seconds=60)
+    # 不设置租约时长的任务不会按时间过期，只在 worker 退出时回收
+    store.pop_queued(worker="w0")
+    assert store.expire_leases(time.time() + 30, max_retries=2) == ([], [])
+    assert store.expire_leases(time.time() + 3600, max_retries=2) == (["task-0", "task-1"], [])
+    store.pop_queued(worker="w0", lease_seconds=60)
+    store.pop_queued(worker="w1", lease_seconds=60)
+
+    requeued, failed = store.expire_leases(time.time(), max_retries=2, worker="w0")
+    assert sorted(requeued) == ["task-0", "task-2"] and failed == []
+    assert store.running() == ["task-1"]
+    assert store.update_state("task-1", finished=True)['finished']
+    assert store.owner("task-1") is None
+
+
+def test_sqlite_survives_restart(tmp_path):
+    path = str(tmp_path / "tasks.db")
+    store = SqliteTaskStore(path)
+    for i in range(4):
+        store.add(f"task-{i}", make_payload(i), make_state(f"task-{i}"))
+    store.pop_queued()
+    store.pop_queued()
+    store.update_state("task-1", info='finished', finished=True, result={'filename': 'b.wav'})
+    store.close()
+
+    store = load_task_store({"type": "sqlite", "path": path})
+    # 执行中的 task-0 重新排队，并且仍排在最前
+    assert store.running() == []
+    assert store.count(QUEUED) == 3
+    assert store.get_state("task-1")['result'] == {'filename': 'b.wav'}
+    assert [store.pop_queued()[0] for _ in range(3)] == ["task-0", "task-2", "task-3"]
+    store.close()
+
+
+def test_load_task_store_rejects_unknown_type():
+    assert isinstance(load_task_store(None), MemoryTaskStore)
+    with pytest.raises(ValueError):
+        load_task_store({"type": "redis"})
+
+
+def median_latency(fn, ids) -> float:
+    latencies = []
+    for i in ids:
+        start = time.perf_counter()
+        fn(i)
+        latencies.append(time.perf_counter() - start)
+    return statistics.median(latencies)
+
+
+def test_latency_flat_at_100k_tasks(store):
+    """
+    提交与查询的延迟不随保留的任务数增长：比较只有 1k 个任务时与保留 100k 个任务时的中位延迟
+    """
+    total, window = 100000, 1000
+    payloads = [make_payload(i) for i in range(total)]
+
+    def submit(i):
+        store.add(f"task-{i}", payloads[i], make_state(f"task-{i}"))
+
+    def lookup(i):
+        assert store.get_state(f"task-{i}") is not None
+
+    submit_small = median_latency(submit, range(window))
+    lookup_small = median_latency(lookup, range(0, window, 10))
+    for i in range(window, total - window):
+        submit(i)
+    submit_large = median_latency(submit, range(total - window, total))
+    lookup_large = median_latency(lookup, range(0, total, 100))
+    assert len(store) == total
+
+    assert submit_large < 3 * submit_small + 20e-6
+    assert lookup_large < 3 * lookup_small + 20e-6
+
+    # 调度循环每秒的过期检查与 web_runner 领取任务都走索引，不遍历全部任务
+    start = time.perf_counter()
+    assert store.expire(now=0, finished_timeout=1800) == []
+    assert store.count(RUNNING) == 0
+    assert store.pop_queued()[0] == "task-0"
+    assert time.perf_counter() - start < 0.05
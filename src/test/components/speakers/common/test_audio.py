@@ -0,0 +1,83 @@
+import json
+
+import numpy as np
+import pytest
+from pydantic import BaseModel, Field
+
+from speakers.common.audio import AudioBuffer
+
+
+class AudioData(BaseModel):
+    """
+    与 RvcProcessorData 的 audio_samples 字段配置相同
+    """
+    sample_rate: int = Field(default=0)
+    audio_samples: AudioBuffer = Field(default_factory=AudioBuffer)
+
+    class Config:
+        json_encoders = {
+            AudioBuffer: AudioBuffer.to_payload
+        }
+
+
+def samples(n: int = 1600) -> np.ndarray:
+    return np.sin(np.arange(n, dtype=np.float32) / 10)
+
+
+def test_validator_accepts_list_array_and_buffer():
+    audio = samples()
+    buffer = AudioBuffer.from_numpy(audio)
+    # float32 数组与 AudioBuffer 不拷贝
+    assert AudioData(audio_samples=buffer).audio_samples is buffer
+    assert AudioData(audio_samples=audio).audio_samples.array is audio
+
+    from_list = AudioData(audio_samples=audio.tolist()).audio_samples
+    assert from_list.array.dtype == np.float32 and np.array_equal(from_list.array, audio)
+    from_float64 = AudioData(audio_samples=audio.astype(np.float64)).audio_samples
+    assert from_float64.array.dtype == np.float32 and np.allclose(from_float64.array, audio)
+
+    assert len(AudioData().audio_samples) == 0
+    with pytest.raises(ValueError):
+        AudioData(audio_samples="samples")
+
+
+def test_payload_round_trip_through_json():
+    audio = samples()
+    data = AudioData(sample_rate=16000, audio_samples=audio)
+    payload = json.loads(data.json())['audio_samples']
+    assert payload['shape'] == [1600] and payload['dtype'] == 'float32' and 'data' in payload
+
+    restored = AudioData.parse_raw(data.json())
+    assert restored.sample_rate == 16000
+    assert np.array_equal(restored.audio_samples.array, audio) and not restored.audio_samples.shared
+
+    # 其他 dtype 与多维形状原样还原
+    stereo = np.arange(12, dtype=np.int16).reshape(6, 2)
+    restored = AudioBuffer.validate(AudioBuffer(stereo).to_payload())
+    assert restored.array.dtype == np.int16 and np.array_equal(restored.array, stereo)
+
+
+def test_share_round_trip_and_release():
+    audio = samples()
+    shared = AudioBuffer.from_numpy(audio).share()
+    assert shared.shared and shared.share() is shared
+    payload = shared.to_payload()
+    # 共享内存上的缓冲区只传递句柄
+    assert 'data' not in payload and payload['shm_name']
+
+    attached = AudioData.parse_obj({'audio_samples': payload}).audio_samples
+    assert attached.shared and np.array_equal(attached.array, audio)
+    # 两端映射同一块内存
+    shared.array[0] = 42.0
+    assert attached.array[0] == 42.0
+
+    # 挂载方释放映射后保留一份拷贝
+    attached.close()
+    assert not attached.shared and attached.array[0] == 42.0 and attached.array.base is None
+    attached.close()
+
+    # 创建方销毁共享内存段后，句柄无法再挂载
+    shared.close(unlink=True)
+    assert not shared.shared and np.array_equal(shared.array[1:], audio[1:])
+    with pytest.raises(FileNotFoundError):
+        AudioBuffer.from_shared_memory(payload['shm_name'], payload['shape'])
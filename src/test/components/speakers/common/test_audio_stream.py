@@ -0,0 +1,38 @@
+import numpy as np
+import pytest
+from scipy.io import wavfile
+
+from speakers.common.audio_stream import STREAMING_SIZE, StreamingWavWriter, split_sentences, wav_header
+
+
+def test_split_sentences():
+    assert split_sentences("你好。今天天气很好！我们去公园吧？") == ["你好。", "今天天气很好！", "我们去公园吧？"]
+    assert split_sentences("Hello there. It costs 3.14 dollars!\nBye") == ["Hello there.", "It costs 3.14 dollars!",
+                                                                           "Bye"]
+    # 只有标点的片段并入前一句
+    assert split_sentences("真的吗？！好。") == ["真的吗？！", "好。"]
+    assert split_sentences("没有标点") == ["没有标点"]
+    assert split_sentences("") == [""]
+
+
+def test_streaming_writer(tmp_path):
+    path = str(tmp_path / "task.stream.wav")
+    first = (np.sin(np.arange(1600) / 10) * 10000).astype(np.int16)
+    second = np.linspace(-0.5, 0.5, 800, dtype=np.float32)
+    writer = StreamingWavWriter(path, 16000)
+    writer.write(16000, first)
+    # 写入过程中文件头为流式头，已写入的数据可以立即读到
+    with open(path, "rb") as f:
+        data = f.read()
+    assert data[:44] == wav_header(16000, STREAMING_SIZE)
+    assert np.array_equal(np.frombuffer(data[44:], dtype=np.int16), first)
+
+    writer.write(16000, second)
+    with pytest.raises(ValueError):
+        writer.write(22050, second)
+    writer.close()
+
+    sample_rate, audio = wavfile.read(path)
+    assert sample_rate == 16000 and writer.segments == 2
+    assert np.array_equal(audio[:1600], first)
+    assert np.array_equal(audio[1600:], (second * 32767).astype(np.int16))
@@ -0,0 +1,35 @@
+import numpy as np
+
+from speakers.common import cache as cache_module
+from speakers.common.cache import LRUCache
+
+
+def test_lru_eviction_by_bytes():
+    evicted = []
+    lru = LRUCache(max_bytes=32, on_evict=lambda key, value: evicted.append(key))
+    lru.put("a", np.zeros(2))
+    lru.put("b", np.zeros(2))
+    lru.get("a")
+    lru.put("c", np.zeros(2))
+    assert evicted == ["b"]
+    assert lru.keys() == ["a", "c"]
+    assert lru.nbytes == 32
+
+
+def test_ttl_expiry(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(cache_module.time, "monotonic", lambda: now[0])
+    lru = LRUCache(ttl=10)
+    lru.put("a", np.zeros(2))
+    now[0] += 5
+    lru.put("b", np.zeros(2))
+    assert lru.get("a") is not None
+    now[0] += 6
+    assert lru.get("a") is None
+    assert lru.peek("b") is not None
+    now[0] += 5
+    assert lru.purge_expired() == 1
+    stats = lru.stats
+    assert stats['items'] == 0
+    assert stats['bytes'] == 0
+    assert stats['expirations'] == 2
@@ -0,0 +1,70 @@
+import torch
+from torch import nn
+
+from speakers.common.inference_optimizer import InferenceOptimizer, fold_weight_norm
+from speakers.rvc.infer_pack.models import SynthesizerTrnMs768NSFsid
+
+# 缩小通道数的 v2 40k 模型配置
+CONFIG = [65, 32, 64, 64, 256, 2, 2, 3, 0, "1", [3, 7, 11], [[1, 3, 5], [1, 3, 5], [1, 3, 5]],
+          [10, 10, 2, 2], 64, [16, 16, 4, 4], 2, 64, 40000]
+
+
+def make_net_g():
+    torch.manual_seed(0)
+    return SynthesizerTrnMs768NSFsid(*CONFIG, is_half=False).eval()
+
+
+def probe(model):
+    frames = 20
+    generator = torch.Generator().manual_seed(1)
+    phone = torch.rand(1, frames, 768, generator=generator)
+    pitchf = torch.full((1, frames), 180.0)
+    pitch = torch.full((1, frames), 60, dtype=torch.long)
+    return model.infer(phone, torch.LongTensor([frames]), pitch, pitchf, torch.LongTensor([0]))[0]
+
+
+def run(model):
+    with torch.random.fork_rng(), torch.no_grad():
+        torch.manual_seed(0)
+        return probe(model)
+
+
+def test_fold_weight_norm_keeps_outputs():
+    net_g = make_net_g()
+    reference = run(net_g)
+
+    optimized = InferenceOptimizer(drop=("enc_q",), verify=True, atol=1e-4)(net_g, example_fn=probe)
+
+    assert optimized is net_g
+    assert not hasattr(net_g, "enc_q")
+    assert not any(name.endswith(("weight_g", "weight_v")) for name, _ in net_g.named_parameters())
+    assert torch.allclose(run(net_g), reference, atol=1e-5)
+
+
+def test_fold_weight_norm_parametrizations():
+    conv = nn.utils.parametrizations.weight_norm(nn.Conv1d(4, 4, 3))
+    legacy = nn.utils.weight_norm(nn.Conv1d(4, 4, 3))
+    model = nn.Sequential(conv, legacy)
+    x = torch.randn(1, 4, 16)
+    with torch.no_grad():
+        reference = model(x)
+
+    assert fold_weight_norm(model) == 2
+    assert fold_weight_norm(model) == 0
+    assert [name for name, _ in model.named_parameters()] == ["0.bias", "0.weight", "1.bias", "1.weight"]
+    with torch.no_grad():
+        assert torch.allclose(model(x), reference, atol=1e-6)
+
+
+def test_verify_failure_keeps_original():
+    model = nn.Sequential(nn.utils.weight_norm(nn.Linear(4, 4)))
+    x = torch.randn(2, 4)
+
+    def broken(m):
+        # 折叠之后输出会变化，校验不通过
+        return m(x) + (0 if hasattr(m[0], "weight_g") else 1)
+
+    optimized = InferenceOptimizer(verify=True)(model, example_fn=broken)
+
+    assert optimized is not model
+    assert hasattr(optimized[0], "weight_g")
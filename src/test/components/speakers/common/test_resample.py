@@ -0,0 +1,50 @@
+import numpy as np
+import pytest
+
+from speakers.common.resample import StreamResampler, get_kernel, resample
+
+
+@pytest.mark.parametrize("orig_sr,target_sr", [(22050, 16000), (24000, 16000), (40000, 48000)])
+def test_sine_accuracy(orig_sr, target_sr):
+    audio = np.sin(2 * np.pi * 1000 * np.arange(orig_sr) / orig_sr).astype(np.float32)
+    errors = {}
+    for quality in ("fast", "default", "best"):
+        output = resample(audio, orig_sr, target_sr, quality)
+        reference = np.sin(2 * np.pi * 1000 * np.arange(output.shape[0]) / target_sr)
+        assert output.dtype == np.float32
+        assert output.shape[0] == target_sr
+        errors[quality] = np.abs(output - reference)[target_sr // 50: -target_sr // 50].max()
+    assert errors["best"] < errors["default"] < errors["fast"] < 1e-2
+    assert errors["default"] < 1e-4
+
+
+def test_kernel_cache():
+    get_kernel.cache_clear()
+    audio = np.zeros(22050, dtype=np.float32)
+    resample(audio, 22050, 16000)
+    resample(audio, 22050, 16000)
+    info = get_kernel.cache_info()
+    assert info.misses == 1 and info.hits == 1
+    assert resample(audio, 16000, 16000) is audio
+    with pytest.raises(ValueError):
+        resample(audio, 22050, 16000, quality="ultra")
+
+
+def test_batch_matches_single():
+    audio = np.random.default_rng(0).standard_normal((3, 4800)).astype(np.float32)
+    batch = resample(audio, 24000, 16000)
+    assert batch.shape == (3, 3200)
+    for row, output in zip(audio, batch):
+        assert np.allclose(resample(row, 24000, 16000), output, atol=1e-6)
+
+
+@pytest.mark.parametrize("orig_sr,target_sr,block", [(22050, 16000, 1000), (40000, 48000, 4097), (16000, 40000, 160)])
+def test_stream_matches_batch(orig_sr, target_sr, block):
+    audio = np.random.default_rng(1).standard_normal(orig_sr).astype(np.float32)
+    resampler = StreamResampler(orig_sr, target_sr)
+    outputs = [resampler.push(audio[i: i + block]) for i in range(0, audio.shape[0], block)]
+    outputs.append(resampler.flush())
+    assert np.allclose(np.concatenate(outputs), resample(audio, orig_sr, target_sr), atol=1e-5)
+    # flush 之后可以继续使用
+    assert np.allclose(np.concatenate([resampler.push(audio), resampler.flush()]),
+                       resample(audio, orig_sr, target_sr), atol=1e-5)
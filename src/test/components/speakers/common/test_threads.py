@@ -0,0 +1,80 @@
+import torch
+from omegaconf import OmegaConf
+
+from speakers.common.threads import THREAD_ENV_VARS, ThreadBudget, parse_cpus, worker_cpus
+
+
+def test_parse_cpus():
+    assert parse_cpus("0-3, 8,10-11") == [0, 1, 2, 3, 8, 10, 11]
+    assert parse_cpus([2, "3"]) == [2, 3]
+
+
+def test_worker_cpus_do_not_overlap():
+    cpus = list(range(16))
+    assigned = [worker_cpus(i, 4, cpus) for i in range(4)]
+    assert sorted(sum(assigned, [])) == cpus
+    # 超出核数时从头循环
+    assert worker_cpus(4, 4, cpus) == [0, 1, 2, 3]
+    assert worker_cpus(0, 32, [0, 1]) == [0, 1]
+
+
+def test_from_config():
+    cfg = OmegaConf.create({"num_threads": 2, "interop_threads": 0, "affinity": "",
+                            "stages": {"hubert": 1, "synthesizer": 0}})
+    budget = ThreadBudget.from_config(cfg)
+    assert budget.affinity is None
+    assert budget.threads_for("hubert") == 1
+    assert budget.threads_for("synthesizer") == 2
+    assert budget.threads_for("f0") == 2
+    assert ThreadBudget.from_config(None).threads_for("hubert") == 0
+
+
+def test_stage_switches_threads_and_records_stats(monkeypatch):
+    # apply 会写入线程数环境变量，测试结束后还原
+    for name in THREAD_ENV_VARS:
+        monkeypatch.setenv(name, "0")
+        monkeypatch.delenv(name)
+    previous = torch.get_num_threads()
+    budget = ThreadBudget(num_threads=1, stages={"hubert": 2})
+    try:
+        budget.apply()
+        with budget.stage("hubert"):
+            assert torch.get_num_threads() == 2
+            # 嵌套的阶段不切换线程，也不单独统计
+            with budget.stage("index"):
+                assert torch.get_num_threads() == 2
+            sum(i * i for i in range(100000))
+        assert torch.get_num_threads() == 1
+        with budget.stage("synthesizer"):
+            pass
+
+        stats = budget.stats
+        assert set(stats) == {"hubert", "synthesizer"}
+        assert stats["hubert"]["calls"] == 1 and stats["hubert"]["threads"] == 2
+        assert stats["hubert"]["wall_seconds"] > 0 and stats["hubert"]["cpu_seconds"] > 0
+        budget.reset_stats()
+        assert budget.stats == {}
+    finally:
+        torch.set_num_threads(previous)
+
+
+def test_stage_restores_threads_without_process_budget():
+    import faiss
+
+    previous = torch.get_num_threads()
+    previous_faiss = faiss.omp_get_max_threads()
+    target = 2 if previous != 2 else 3
+    # num_threads 为 0：进程线程数由库决定，阶段结束后恢复进入前的值
+    budget = ThreadBudget(num_threads=0, stages={"hubert": target})
+    try:
+        with budget.stage("hubert"):
+            assert torch.get_num_threads() == target
+            assert faiss.omp_get_max_threads() == target
+        assert torch.get_num_threads() == previous
+        assert faiss.omp_get_max_threads() == previous_faiss
+        # 未配置的阶段不修改线程数
+        with budget.stage("synthesizer"):
+            assert torch.get_num_threads() == previous
+    finally:
+        torch.set_num_threads(previous)
+        faiss.omp_set_num_threads(previous_faiss)
@@ -0,0 +1,48 @@
+import pytest
+import torch
+from torch import nn
+
+from speakers.rvc.infer_pack.models import SynthesizerTrnMs768NSFsid
+
+TGT_SR = 40000
+# 缩小的 v2 合成器，帧率与采样率和 40k 模型相同
+CONFIG = [1025, 32, 192, 192, 768, 2, 6, 3, 0, "1", [3, 7, 11], [[1, 3, 5], [1, 3, 5], [1, 3, 5]],
+          [10, 10, 2, 2], 64, [16, 16, 4, 4], 1, 64, TGT_SR]
+
+
+class StubHubert(nn.Module):
+    """
+    与 hubert 卷积特征提取器帧率相同的随机网络，记录 extract_features 的调用次数
+    """
+
+    def __init__(self):
+        super().__init__()
+        layers, channels = [], 1
+        for kernel_size, stride in ((10, 5), (3, 2), (3, 2), (3, 2), (3, 2), (2, 2), (2, 2)):
+            layers.append(nn.Conv1d(channels, 32, kernel_size, stride))
+            channels = 32
+        self.convs = nn.ModuleList(layers)
+        self.proj = nn.Linear(32, 768)
+        self.final_proj = nn.Linear(768, 256)
+        self.calls = 0
+
+    def extract_features(self, source, padding_mask=None, output_layer=12):
+        self.calls += 1
+        x = source.unsqueeze(1)
+        for conv in self.convs:
+            x = torch.tanh(conv(x))
+        return self.proj(x.transpose(1, 2)), None
+
+
+@pytest.fixture
+def models(monkeypatch):
+    """
+    (StubHubert, 合成器)，关闭合成器的随机噪声，不同推理路径的输出可以逐点比较
+    """
+    monkeypatch.setattr(torch, "randn_like", lambda t, *args, **kwargs: torch.zeros_like(t))
+    torch.manual_seed(0)
+    net_g = SynthesizerTrnMs768NSFsid(*CONFIG, is_half=False)
+    del net_g.enc_q
+    monkeypatch.setattr(torch, "rand", lambda *size, **kwargs: torch.zeros(*size, dtype=kwargs.get("dtype"),
+                                                                            device=kwargs.get("device")))
+    return StubHubert().eval(), net_g.eval()
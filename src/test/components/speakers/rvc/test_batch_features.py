@@ -0,0 +1,81 @@
+import numpy as np
+import torch
+from torch import nn
+
+from speakers.rvc.feature_cache import HubertFeatureCache
+from speakers.rvc.quantization import reference_clip
+from speakers.rvc.vc_infer_pipeline import VC
+
+
+class GroupNormHubert(nn.Module):
+    """
+    与 hubert_base 的卷积特征提取器结构相同：第一层卷积后对整个时间轴做 GroupNorm，
+    padding_mask 不作用于这一层，补零会改变归一化的统计量
+    """
+
+    def __init__(self):
+        super().__init__()
+        layers, channels = [], 1
+        for kernel_size, stride in ((10, 5), (3, 2), (3, 2), (3, 2), (3, 2), (2, 2), (2, 2)):
+            layers.append(nn.Conv1d(channels, 32, kernel_size, stride, bias=False))
+            channels = 32
+        self.convs = nn.ModuleList(layers)
+        self.norm = nn.GroupNorm(32, 32, affine=True)
+        self.proj = nn.Linear(32, 768)
+        self.final_proj = nn.Linear(768, 256)
+
+    def extract_features(self, source, padding_mask=None, output_layer=12):
+        x = source.unsqueeze(1)
+        for i, conv in enumerate(self.convs):
+            x = conv(x)
+            if i == 0:
+                x = self.norm(x)
+            x = nn.functional.gelu(x)
+        return self.proj(x.transpose(1, 2)), None
+
+
+def sequential_features(hubert, audio: np.ndarray) -> np.ndarray:
+    """
+    逐段路径(VC.vc)的 hubert 输入与输出
+    """
+    with torch.no_grad():
+        source = torch.from_numpy(audio).float().view(1, -1)
+        logits = hubert.extract_features(source, torch.zeros(source.shape, dtype=torch.bool), 12)
+    return logits[0][0].numpy()
+
+
+def test_batched_features_match_sequential():
+    torch.manual_seed(0)
+    hubert = GroupNormHubert().eval()
+    vc = VC(40000, 1, 6, 38, 41, False, "cpu", batch_size=4)
+    clip = reference_clip(16000, 1.0)
+    audios = [clip[:12000], clip[:16000], 0.5 * clip[4000:16000], clip[2000:10000]]
+
+    batched = vc.extract_features_batch(hubert, audios, "v2")
+
+    for audio, feats in zip(audios, batched):
+        assert np.allclose(feats.numpy(), sequential_features(hubert, audio), atol=1e-6)
+
+    # 对照：补零到最长段后一起归一化，较短段的特征发生变化
+    padded = torch.zeros(2, 16000)
+    padded[0, :12000] = torch.from_numpy(audios[0])
+    padded[1] = torch.from_numpy(audios[1])
+    with torch.no_grad():
+        naive = hubert.extract_features(padded)[0][0, : batched[0].shape[0]].numpy()
+    assert not np.allclose(naive, batched[0].numpy(), atol=1e-5)
+
+
+def test_batched_cache_entries_are_valid_for_sequential_path():
+    torch.manual_seed(0)
+    hubert = GroupNormHubert().eval()
+    cache = HubertFeatureCache()
+    vc = VC(40000, 1, 6, 38, 41, False, "cpu", batch_size=4, feature_cache=cache)
+    clip = reference_clip(16000, 1.0)
+    segments = [(clip[:12000], 0, None), (clip[:16000], 0, None), (clip[3000:15000], 0, None)]
+    keys = [cache.key("audio", "v2", i, segment[0].shape[0]) for i, segment in enumerate(segments)]
+
+    vc.segment_features(hubert, segments, "v2", keys)
+
+    # 批量路径写入的缓存与逐段路径计算的特征一致
+    for (audio, _, _), key in zip(segments, keys):
+        assert np.allclose(cache.get(key), sequential_features(hubert, audio), atol=1e-6)
@@ -0,0 +1,66 @@
+import faiss
+import numpy as np
+import pytest
+
+from speakers.rvc.compact_index import IndexVectors, blend, convert_index, is_compact, sample_queries
+from speakers.rvc.index_cache import FeatureIndexCache
+
+
+def make_flat_index(path, n=4000, d=64):
+    # 聚类结构的特征，接近 hubert 特征在索引中的分布
+    rng = np.random.default_rng(0)
+    centers = rng.standard_normal((40, d)).astype(np.float32)
+    vectors = centers[rng.integers(0, 40, n)] + 0.3 * rng.standard_normal((n, d)).astype(np.float32)
+    index = faiss.index_factory(d, "IVF16,Flat")
+    index.train(vectors)
+    index.add(vectors)
+    index.nprobe = 4
+    faiss.write_index(index, str(path))
+    return index, vectors
+
+
+@pytest.fixture
+def converted(tmp_path):
+    file_index = tmp_path / "added_IVF16_Flat.index"
+    reference, vectors = make_flat_index(file_index)
+    reports = convert_index(str(file_index), ["ivfpq", "ivf_fp16", "hnsw"], n_queries=200, pq_nbits=6)
+    return str(file_index), reference, vectors, {report['kind']: report for report in reports}
+
+
+def test_convert_reports_trade_offs(converted):
+    _, _, _, reports = converted
+    for kind, report in reports.items():
+        assert report['bytes'] < report['reference_bytes']
+        assert report['query_ms'] > 0
+    # float16 存储几乎不损失检索质量，PQ 内存最小
+    assert reports['ivf_fp16']['recall'] > 0.95 and reports['ivf_fp16']['blend_error'] < 1e-3
+    assert reports['hnsw']['recall'] > 0.9
+    assert reports['ivfpq']['bytes'] < reports['ivf_fp16']['bytes']
+    assert reports['ivf_fp16']['blend_error'] < reports['ivfpq']['blend_error'] < 0.5
+
+
+def test_index_vectors_lookup(converted):
+    _, _, vectors, reports = converted
+    index = faiss.read_index(reports['ivf_fp16']['output'])
+    assert is_compact(index)
+    lookup = IndexVectors(index)
+    ix = np.array([[0, 5, -1], [7, 7, 3]])
+    rows = lookup[ix]
+    assert rows.shape == (2, 3, vectors.shape[1]) and rows.dtype == np.float32
+    assert np.allclose(rows[1, 0], vectors[7], atol=1e-2)
+    assert np.allclose(rows[0, 2], rows[0, 0])
+
+
+def test_index_cache_loads_compact_index(converted):
+    file_index, reference, vectors, reports = converted
+    cache = FeatureIndexCache()
+    flat_index, big_npy = cache.get(file_index)
+    assert isinstance(big_npy, np.ndarray) and not is_compact(flat_index)
+    flat_bytes = cache.stats['bytes']
+    index, lookup = cache.get(reports['ivf_fp16']['output'])
+    assert isinstance(lookup, IndexVectors)
+    # float16 编码且不再常驻 big_npy，约为原来的四分之一
+    assert cache.stats['bytes'] - flat_bytes < flat_bytes / 3
+
+    queries = sample_queries(vectors, 50)
+    assert np.allclose(blend(index, lookup, queries), blend(flat_index, big_npy, queries), atol=1e-2)
@@ -0,0 +1,37 @@
+import numpy as np
+
+from speakers.rvc.f0_cache import F0Cache
+from speakers.rvc.vc_infer_pipeline import VC
+
+
+def make_audio(seconds=2, sr=16000):
+    t = np.arange(sr * seconds) / sr
+    return (0.3 * np.sin(2 * np.pi * 220 * t)).astype(np.float64)
+
+
+def test_pitch_shift_reuses_extraction():
+    f0_cache = F0Cache()
+    vc = VC(40000, 1, 2, 6, 7, False, "cpu", f0_cache=f0_cache)
+    x = make_audio()
+    p_len = x.shape[0] // vc.window
+
+    _, f0 = vc.get_f0("checksum", x, p_len, 0, "pm", 3)
+    _, f0_shift = vc.get_f0("checksum", x, p_len, 12, "pm", 3)
+    np.testing.assert_allclose(f0_shift, f0 * 2)
+
+    stats = f0_cache.stats
+    assert stats['misses'] == 1
+    assert stats['hits'] == 1
+
+    _, f0_uncached = VC(40000, 1, 2, 6, 7, False, "cpu").get_f0("checksum", x, p_len, 0, "pm", 3)
+    np.testing.assert_array_equal(f0, f0_uncached)
+
+
+def test_byte_cap():
+    f0_cache = F0Cache(max_bytes=1024 * 8)
+    for i in range(4):
+        f0_cache.put(F0Cache.key(str(i), "rmvpe", 16000), np.zeros(512))
+    stats = f0_cache.stats
+    assert stats['items'] == 2
+    assert stats['evictions'] == 2
+    assert not f0_cache.get(F0Cache.key("3", "rmvpe", 16000)).flags.writeable
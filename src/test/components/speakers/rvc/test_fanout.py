@@ -0,0 +1,91 @@
+import numpy as np
+import pytest
+
+from speakers.common.resample import resample
+from speakers.rvc.quantization import reference_clip
+from speakers.rvc.vc_infer_pipeline import VC
+
+from .conftest import TGT_SR
+
+
+def test_render_matches_pipeline(models):
+    hubert, net_g = models
+    vc = VC(TGT_SR, 1, 6, 38, 41, False, "cpu")
+    audio = reference_clip(16000, 1.5)
+
+    expected = []
+    for f0_up_key in (0, 5):
+        expected.append(vc.pipeline(hubert, net_g, 0, audio, "", [0, 0, 0], f0_up_key, "pm", "", 0, 1, 3,
+                                    TGT_SR, 0, 1, "v2", 0.33))
+
+    hubert.calls = 0
+    times = [0, 0, 0]
+    frontend = vc.frontend(hubert, audio, "", times, "pm", 3, ["v2"])
+    calls = hubert.calls
+    rendered = [vc.render(frontend, net_g, 0, times, f0_up_key, "", 0, 1, TGT_SR, 0, 1, "v2", 0.33)
+                for f0_up_key in (0, 5)]
+
+    # hubert 只在 frontend 中执行
+    assert hubert.calls == calls > 0
+    for output, reference in zip(rendered, expected):
+        assert np.array_equal(output, reference)
+    assert not np.array_equal(rendered[0], rendered[1])
+
+
+def test_render_rejects_missing_version(models):
+    hubert, net_g = models
+    vc = VC(TGT_SR, 1, 6, 38, 41, False, "cpu")
+    frontend = vc.frontend(hubert, reference_clip(16000, 0.5), "", [0, 0, 0], "pm", 3, ["v1"])
+    with pytest.raises(ValueError):
+        vc.render(frontend, net_g, 0, [0, 0, 0], 0, "", 0, 1, TGT_SR, 0, 1, "v2", 0.33)
+
+
+@pytest.mark.parametrize("protect", [0.33, 0.5])
+def test_sweep_matches_render(models, protect):
+    hubert, net_g = models
+    vc = VC(TGT_SR, 1, 6, 38, 41, False, "cpu", sweep_batch_size=2)
+    frontend = vc.frontend(hubert, reference_clip(16000, 1.5), "", [0, 0, 0], "pm", 3, ["v2"])
+    keys = [-12, 0, 5, 12, 3]
+
+    swept = vc.sweep(frontend, net_g, 0, [0, 0, 0], keys, "", 0, 1, TGT_SR, 0, 1, "v2", protect)
+
+    assert len(swept) == len(keys)
+    for f0_up_key, output in zip(keys, swept):
+        reference = vc.render(frontend, net_g, 0, [0, 0, 0], f0_up_key, "", 0, 1, TGT_SR, 0, 1, "v2", protect)
+        assert np.array_equal(output, reference)
+
+
+@pytest.mark.parametrize("input_sr", [16000, 24000])
+def test_vc_multi_matches_render(models, input_sr):
+    processor = pytest.importorskip("speakers.processors.rvc_speakers_processor")
+    hubert, net_g = models
+    vc = VC(TGT_SR, 1, 6, 38, 41, False, "cpu")
+    model = {'vc': vc, 'net_g': net_g, 'version': 'v2', 'if_f0': 1, 'target_sr': TGT_SR,
+             'metadata': {'speaker_id': 0, 'feat_index': ''}}
+    # 只使用 vc_multi 依赖的属性，不加载 hubert 与音色 checkpoint
+    speakers = processor.RVCSpeakers.__new__(processor.RVCSpeakers)
+    speakers.hubert_model = hubert
+    speakers.model_manager = {0: model}
+    speakers.in_hf_space = False
+    speakers._rvc_options = {'resample_quality': 'default'}
+    targets = [processor.RvcVoiceTarget(model_index=0, f0_up_key=0),
+               processor.RvcVoiceTarget(model_index=0, f0_up_key=7, protect=0.5),
+               processor.RvcVoiceTarget(model_index=0, f0_up_key=0, resample_sr=16000)]
+    audio = reference_clip(16000, 1.0)
+    input_audio = (16000, audio)
+    if input_sr != 16000:
+        # int16 输入在 _load_input_audio 中转换为 float32 并重采样到 16k
+        pcm = (reference_clip(input_sr, 1.0) * 32767).astype(np.int16)
+        input_audio = (input_sr, pcm)
+        audio = resample((pcm / 32767).astype(np.float32), input_sr, 16000, "default")
+
+    outputs = speakers.vc_multi(input_audio, targets, "pm", 3)
+
+    frontend = vc.frontend(hubert, audio, "", [0, 0, 0], "pm", 3, ["v2"])
+    assert [out_sr for out_sr, _ in outputs] == [TGT_SR, TGT_SR, 16000]
+    for target, (_, output) in zip(targets, outputs):
+        reference = vc.render(frontend, net_g, 0, [0, 0, 0], target.f0_up_key, "", 0, 1, TGT_SR,
+                              target.resample_sr, target.rms_mix_rate, "v2", target.protect)
+        assert np.array_equal(output, reference)
+    with pytest.raises(RuntimeError):
+        speakers.vc_multi((16000, audio), [], "pm", 3)
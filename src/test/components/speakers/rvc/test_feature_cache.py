@@ -0,0 +1,99 @@
+import os
+import time
+
+import numpy as np
+import torch
+
+from speakers.rvc.feature_cache import HubertFeatureCache, hubert_identity
+
+
+def make_feats(seed):
+    return np.random.default_rng(seed).standard_normal((50, 768)).astype(np.float32)
+
+
+def test_memory_hit_and_miss():
+    cache = HubertFeatureCache()
+    key = cache.key("checksum", "v2", 0, 16000)
+    assert cache.get(key) is None
+    cache.put(key, make_feats(0))
+    np.testing.assert_array_equal(cache.get(key), make_feats(0))
+    assert cache.get(cache.key("checksum", "v1", 0, 16000)) is None
+    stats = cache.stats
+    assert stats['hits'] == 1
+    assert stats['misses'] == 2
+
+
+def test_spill_to_disk(tmp_path):
+    feats_bytes = make_feats(0).nbytes
+    cache = HubertFeatureCache(max_bytes=feats_bytes, spill_dir=str(tmp_path))
+    keys = [cache.key("checksum", "v2", start, 16000) for start in (0, 16000)]
+    cache.put(keys[0], make_feats(0))
+    cache.put(keys[1], make_feats(1))
+    assert cache.stats['spills'] == 1
+    assert len(list(tmp_path.glob("*.npy"))) == 1
+
+    np.testing.assert_array_equal(cache.get(keys[0]), make_feats(0))
+    np.testing.assert_array_equal(cache.get(keys[1]), make_feats(1))
+    stats = cache.stats
+    assert stats['disk_hits'] == 2
+    assert stats['hit_rate'] == 1.0
+    # 读回内存的特征删除文件，目录中只有当前被淘汰的一段
+    assert len(list(tmp_path.glob("*.npy"))) == 1
+    assert stats['spill_bytes'] == sum(path.stat().st_size for path in tmp_path.glob("*.npy"))
+
+
+def test_spill_dir_is_capped(tmp_path):
+    feats_bytes = make_feats(0).nbytes
+    file_bytes = feats_bytes + 128
+    cache = HubertFeatureCache(max_bytes=feats_bytes, spill_dir=str(tmp_path), spill_max_bytes=3 * file_bytes)
+    keys = [cache.key("checksum", "v2", i, 16000) for i in range(6)]
+    for i, key in enumerate(keys):
+        cache.put(key, make_feats(i))
+        # 保证修改时间有先后
+        time.sleep(0.01)
+
+    stats = cache.stats
+    assert stats['spills'] == 5 and stats['spill_evictions'] == 2
+    assert len(list(tmp_path.glob("*.npy"))) == 3 and stats['spill_bytes'] <= 3 * file_bytes
+    # 最旧的文件被删除，较新的仍可读回
+    assert cache.get(keys[0]) is None and cache.get(keys[1]) is None
+    np.testing.assert_array_equal(cache.get(keys[2]), make_feats(2))
+
+    # 重启后已有文件计入上限
+    restarted = HubertFeatureCache(spill_dir=str(tmp_path), spill_max_bytes=file_bytes)
+    assert len(list(tmp_path.glob("*.npy"))) == 1
+    assert restarted.stats['spill_bytes'] == sum(path.stat().st_size for path in tmp_path.glob("*.npy"))
+
+
+def test_key_includes_hubert_identity(tmp_path):
+    checkpoint = tmp_path / "hubert_base.pt"
+    checkpoint.write_bytes(b"\0" * 16)
+    model = torch.nn.Sequential(torch.nn.Linear(4, 4))
+    fp32 = hubert_identity(model, str(checkpoint))
+    assert fp32[1] == "torch.float32" and fp32[2] is False
+
+    fp16 = hubert_identity(model.half(), str(checkpoint))
+    quantized = hubert_identity(torch.ao.quantization.quantize_dynamic(model.float(), {torch.nn.Linear},
+                                                                       dtype=torch.qint8), str(checkpoint))
+    assert quantized[2] is True
+    os.utime(checkpoint, ns=(0, 0))
+    replaced = hubert_identity(model, str(checkpoint))
+    identities = {fp32, fp16, quantized, replaced}
+    assert len(identities) == 4
+
+    # 不同 hubert 的缓存共享落盘目录时互不命中
+    feats_bytes = make_feats(0).nbytes
+    caches = [HubertFeatureCache(max_bytes=feats_bytes, spill_dir=str(tmp_path / "spill"), model_id=identity)
+              for identity in (fp32, fp16)]
+    for cache in caches:
+        assert cache.key("checksum", "v2", 0, 16000)[:3] == cache.model_id
+    caches[0].put(caches[0].key("checksum", "v2", 0, 16000), make_feats(0))
+    caches[0].put(caches[0].key("checksum", "v2", 1, 16000), make_feats(1))
+    assert caches[1].get(caches[1].key("checksum", "v2", 0, 16000)) is None
+    np.testing.assert_array_equal(caches[0].get(caches[0].key("checksum", "v2", 0, 16000)), make_feats(0))
+
+
+def test_from_config_disabled():
+    assert HubertFeatureCache.from_config(None) is None
+    assert HubertFeatureCache.from_config({"enabled": False}) is None
+    assert HubertFeatureCache.from_config({"enabled": True, "max_bytes": 1024}) is not None
@@ -0,0 +1,96 @@
+import os
+
+import faiss
+import numpy as np
+
+from speakers.rvc.index_cache import FeatureIndexCache
+
+
+def make_index(path, n=1000, d=32, seed=0) -> str:
+    vectors = np.random.default_rng(seed).standard_normal((n, d)).astype(np.float32)
+    index = faiss.IndexFlatL2(d)
+    index.add(vectors)
+    faiss.write_index(index, str(path))
+    return str(path)
+
+
+def test_lru_eviction_by_max_bytes(tmp_path):
+    files = [make_index(tmp_path / f"{i}.index", seed=i) for i in range(3)]
+    # 每个索引约 256 KB(索引与 big_npy 各 128 KB)，上限只能容纳两个
+    cache = FeatureIndexCache(max_bytes=600 * 1024)
+    cache.get(files[0])
+    cache.get(files[1])
+    # 访问 0 后 1 成为最久未使用的索引
+    cache.get(files[0])
+    evicted = cache._cache.peek(files[1])
+    cache.get(files[2])
+
+    stats = cache.stats
+    assert stats['items'] == 2 and stats['evictions'] == 1
+    assert stats['bytes'] <= 600 * 1024
+    assert files[1] not in cache._cache and files[0] in cache._cache and files[2] in cache._cache
+    # 淘汰回调释放了被淘汰索引的 big_npy
+    assert evicted.big_npy is None and evicted.index is None
+
+    # 再次访问时重新加载
+    index, big_npy = cache.get(files[1])
+    assert index.ntotal == 1000 and big_npy.shape == (1000, 32)
+
+
+def test_evict_and_clear_release_big_npy(tmp_path):
+    file_index = make_index(tmp_path / "a.index")
+    cache = FeatureIndexCache()
+    index, big_npy = cache.get(file_index)
+    feature_index = cache._cache.peek(file_index)
+    cache.evict(file_index)
+    assert feature_index.big_npy is None and len(cache._cache) == 0
+    # 调用方已取得的引用不受影响
+    assert big_npy.shape == (1000, 32) and index.ntotal == 1000
+
+    cache.get(file_index)
+    feature_index = cache._cache.peek(file_index)
+    cache.clear()
+    assert feature_index.big_npy is None and len(cache._cache) == 0
+
+
+def test_mmap_writes_npy_once_and_reuses_it(tmp_path):
+    file_index = make_index(tmp_path / "a.index")
+    mmap_dir = tmp_path / "mmap"
+    cache = FeatureIndexCache(mmap=True, mmap_dir=str(mmap_dir))
+    _, big_npy = cache.get(file_index)
+    expected = faiss.read_index(file_index).reconstruct_n(0, 1000)
+    assert isinstance(big_npy, np.memmap) and np.array_equal(big_npy, expected)
+    # mmap 模式下 big_npy 不计入常驻内存，只有 Flat 索引本身
+    assert cache.stats['bytes'] == expected.nbytes
+
+    npy_files = os.listdir(mmap_dir)
+    assert len(npy_files) == 1 and npy_files[0].startswith("a.index.") and npy_files[0].endswith(".npy")
+    npy_path = os.path.join(mmap_dir, npy_files[0])
+    mtime = os.stat(npy_path).st_mtime_ns
+
+    # 新的缓存(如进程重启)直接 mmap 打开已落盘的 .npy
+    _, reloaded = FeatureIndexCache(mmap=True, mmap_dir=str(mmap_dir)).get(file_index)
+    assert os.listdir(mmap_dir) == npy_files and os.stat(npy_path).st_mtime_ns == mtime
+    assert os.path.samefile(reloaded.filename, npy_path) and np.array_equal(reloaded, expected)
+
+    # 未指定 mmap_dir 时写在索引文件旁
+    FeatureIndexCache(mmap=True).get(file_index)
+    assert len([name for name in os.listdir(tmp_path) if name.endswith(".npy")]) == 1
+
+
+def test_entry_released_after_lookup_is_reloaded(tmp_path, monkeypatch):
+    file_index = make_index(tmp_path / "a.index")
+    cache = FeatureIndexCache()
+    cache.get(file_index)
+    lookup = cache._cache.get
+
+    def evicted_after_lookup(key, default=None):
+        # 模拟其他线程在 _cache.get 返回之后淘汰并释放了这个条目
+        feature_index = lookup(key, default)
+        cache.evict(key)
+        return feature_index
+
+    monkeypatch.setattr(cache._cache, "get", evicted_after_lookup)
+    index, big_npy = cache.get(file_index)
+    assert index is not None and index.ntotal == 1000 and big_npy.shape == (1000, 32)
+    assert cache._cache.peek(file_index).big_npy is big_npy
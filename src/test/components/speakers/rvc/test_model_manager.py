@@ -0,0 +1,53 @@
+import torch
+
+from speakers.rvc.model_manager import VoiceModel, VoiceModelManager
+
+
+def make_manager(**kwargs):
+    loaded = []
+
+    def loader(voice: VoiceModel):
+        loaded.append(voice.name)
+        return dict(name=voice.name, metadata=voice.metadata, net_g=torch.nn.Linear(16, 16))
+
+    manager = VoiceModelManager(loader=loader, **kwargs)
+    for name in ("a", "b", "c"):
+        manager.register(VoiceModel(name=name, path=name, torch_file=f"{name}.pth", metadata={}))
+    return manager, loaded
+
+
+def test_lazy_load_and_hits():
+    manager, loaded = make_manager()
+    assert loaded == []
+    assert manager.get(1)['name'] == "b"
+    assert manager.get(1)['name'] == "b"
+    assert loaded == ["b"]
+    stats = manager.stats
+    assert stats['registered'] == 3
+    assert stats['resident'] == 1
+    assert stats['loads'] == 1
+    assert stats['hits'] == 1
+
+
+def test_lru_eviction_by_count():
+    evicted = []
+    manager, loaded = make_manager(max_models=2, on_evict=lambda voice, model: evicted.append(voice.name))
+    manager.get(0)
+    manager.get(1)
+    manager.get(0)
+    manager.get(2)
+    assert evicted == ["b"]
+    assert manager.is_resident(0) and manager.is_resident(2)
+    manager.get(1)
+    assert loaded == ["a", "b", "c", "b"]
+    assert manager.stats['evictions'] == 2
+
+
+def test_lru_eviction_by_bytes_and_prefetch():
+    linear_bytes = (16 * 16 + 16) * 4
+    manager, loaded = make_manager(max_bytes=linear_bytes * 2)
+    manager.prefetch(["c", 0])
+    assert loaded == ["c", "a"]
+    manager.get(1)
+    assert not manager.is_resident(2)
+    assert manager.stats['bytes'] == linear_bytes * 2
@@ -0,0 +1,41 @@
+import numpy as np
+import pytest
+import torch
+
+from speakers.rvc.infer_pack.models import SynthesizerTrnMs768NSFsid
+from speakers.rvc.onnx_backend import OnnxSynthesizer, export_onnx
+
+from .conftest import CONFIG
+
+
+@pytest.fixture(scope="module")
+def synthesizers(tmp_path_factory):
+    tmp_path = tmp_path_factory.mktemp("onnx")
+    torch.manual_seed(0)
+    net_g = SynthesizerTrnMs768NSFsid(*CONFIG, is_half=False)
+    del net_g.enc_q
+    net_g.eval()
+    torch_file = str(tmp_path / "voice.pth")
+    torch.save({"weight": net_g.state_dict(), "config": list(CONFIG), "f0": 1, "version": "v2"}, torch_file)
+    onnx_file = export_onnx(torch_file, str(tmp_path / "voice.onnx"))
+    return net_g, OnnxSynthesizer(onnx_file)
+
+
+@pytest.mark.parametrize("frames", [60, 250])
+def test_onnx_matches_torch(synthesizers, monkeypatch, frames):
+    net_g, ort_net_g = synthesizers
+    # 关闭两边的隐变量采样噪声，onnx 图内 SineGen 的噪声幅度很小，在容差范围内
+    monkeypatch.setattr(torch, "randn_like", lambda t, *args, **kwargs: torch.zeros_like(t))
+    monkeypatch.setattr(np.random, "randn", lambda *shape: np.zeros(shape))
+
+    torch.manual_seed(1)
+    phone = torch.rand(2, frames, 768)
+    lengths = torch.LongTensor([frames, frames - 10])
+    pitch = torch.randint(1, 255, (2, frames))
+    pitchf = torch.rand(2, frames) * 300 + 100
+    sid = torch.LongTensor([0, 0])
+    with torch.no_grad():
+        expected = net_g.infer(phone, lengths, pitch, pitchf, sid)[0]
+    actual = ort_net_g.infer(phone, lengths, pitch, pitchf, sid)[0]
+    assert actual.shape == expected.shape == (2, 1, frames * 400)
+    assert (actual - expected).abs().max().item() < 1e-2
@@ -0,0 +1,49 @@
+import numpy as np
+import pytest
+
+from speakers.rvc.parallel_f0 import ParallelF0Extractor, chunk_frames, harvest_f0, pm_f0
+
+SR = 16000
+
+
+def make_audio(seconds, extra=0):
+    n = SR * seconds + extra
+    t = np.arange(n) / SR
+    f0 = 200 + 50 * np.sin(2 * np.pi * 0.5 * t)
+    voiced = np.sin(2 * np.pi * 0.3 * t) > -0.5
+    noise = 0.01 * np.random.default_rng(0).standard_normal(n)
+    return 0.3 * np.sin(2 * np.pi * np.cumsum(f0) / SR) * voiced + noise
+
+
+@pytest.fixture(scope="module")
+def extractor():
+    extractor = ParallelF0Extractor(workers=2, chunk_seconds=2, overlap_seconds=0.5)
+    yield extractor
+    extractor.shutdown()
+
+
+def test_chunk_frames_cover_all():
+    chunks = list(chunk_frames(1050, 200, 30))
+    assert [(start, end) for start, end, _, _ in chunks][-1] == (1000, 1050)
+    assert sum(end - start for start, end, _, _ in chunks) == 1050
+    assert chunks[1] == (200, 400, 170, 430)
+
+
+@pytest.mark.parametrize("extra", [0, 123, 1000])
+def test_pm_matches_single_pass(extractor, extra):
+    x = make_audio(8, extra)
+    expected = pm_f0(x, SR, 0.01, 50, 1100)
+    actual = extractor.pm(x, SR, 0.01, 50, 1100)
+    assert actual.shape == expected.shape
+    np.testing.assert_allclose(actual, expected, atol=0.1)
+
+
+def test_harvest_matches_single_pass(extractor):
+    x = make_audio(8)
+    expected = harvest_f0(x, SR, 1100, 50, 10)
+    actual = extractor.harvest(x, SR, 1100, 50, 10)
+    assert actual.shape == expected.shape
+    # harvest 的清浊判断对音频长度敏感，只要求绝大多数帧一致
+    voiced = (expected > 0) & (actual > 0)
+    assert np.mean((expected > 0) == (actual > 0)) > 0.9
+    assert np.median(np.abs(actual[voiced] - expected[voiced])) < 1
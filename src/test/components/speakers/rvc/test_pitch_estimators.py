@@ -0,0 +1,87 @@
+import threading
+import time
+
+import pytest
+
+from speakers.rvc.pitch_estimators import PitchEstimatorRegistry, pitch_estimators
+
+
+class CountingLoader:
+
+    def __init__(self, delay: float = 0.0):
+        self.calls = []
+        self.delay = delay
+        self._lock = threading.Lock()
+
+    def __call__(self, model_path, is_half, device):
+        with self._lock:
+            self.calls.append((model_path, is_half, device))
+        time.sleep(self.delay)
+        return object()
+
+
+def test_same_key_reuses_estimator():
+    loader = CountingLoader()
+    registry = PitchEstimatorRegistry()
+    registry.register_loader("rmvpe", loader)
+
+    first = registry.get("rmvpe", model_path="rmvpe.pt", is_half=False, device="cpu")
+    assert registry.get("rmvpe", model_path="rmvpe.pt", is_half=False, device="cpu") is first
+    # is_half 与设备不同的是另一个模型
+    assert registry.get("rmvpe", model_path="rmvpe.pt", is_half=True, device="cpu") is not first
+    assert registry.get("rmvpe", model_path="rmvpe.pt", is_half=False, device="cuda:0") is not first
+    assert len(loader.calls) == 3
+    assert len(registry.memory_footprint()) == 3
+
+    with pytest.raises(ValueError):
+        registry.get("harvest")
+    with pytest.raises(KeyError):
+        registry.register_loader("rmvpe", loader)
+
+
+def test_preload_then_get_hits_the_preloaded_estimator():
+    rmvpe, crepe = CountingLoader(), CountingLoader()
+    registry = PitchEstimatorRegistry()
+    registry.register_loader("rmvpe", rmvpe)
+    registry.register_loader("crepe", crepe, uses_half=False)
+
+    # 与 RVCSpeakers 启动阶段的预加载参数相同
+    registry.preload(["rmvpe", "crepe"], model_paths={"rmvpe": "rmvpe.pt", "crepe": "full"},
+                     is_half=True, device="cpu")
+    assert len(rmvpe.calls) == 1 and len(crepe.calls) == 1
+
+    # 与 VC.get_f0 的参数相同
+    registry.get("rmvpe", model_path="rmvpe.pt", is_half=True, device="cpu")
+    registry.get("crepe", model_path="full", is_half=True, device="cpu")
+    # crepe 不使用 is_half，键中不含 is_half
+    registry.get("crepe", model_path="full", device="cpu")
+    assert len(rmvpe.calls) == 1 and len(crepe.calls) == 1
+
+
+def test_shared_registry_crepe_key_ignores_is_half():
+    assert (pitch_estimators.key("crepe", "full", True, "cpu")
+            == pitch_estimators.key("crepe", "full", False, "cpu"))
+    assert (pitch_estimators.key("rmvpe", "rmvpe.pt", True, "cpu")
+            != pitch_estimators.key("rmvpe", "rmvpe.pt", False, "cpu"))
+
+
+def test_concurrent_get_loads_once_per_key():
+    loader = CountingLoader(delay=0.2)
+    registry = PitchEstimatorRegistry()
+    registry.register_loader("rmvpe", loader)
+    start = threading.Barrier(8)
+    results = [None] * 8
+
+    def worker(i):
+        start.wait()
+        results[i] = registry.get("rmvpe", model_path=f"rmvpe-{i % 2}.pt", device="cpu")
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert sorted(call[0] for call in loader.calls) == ["rmvpe-0.pt", "rmvpe-1.pt"]
+    assert all(results[i] is results[i % 2] for i in range(8))
+    assert results[0] is not results[1]
@@ -0,0 +1,77 @@
+import numpy as np
+import pytest
+import torch
+import torch.nn.functional as F
+
+from speakers.common.resample import resample
+from speakers.rvc.postprocess import PostProcess, frame_rms, interpolate_frames
+from speakers.rvc.vc_infer_pipeline import change_rms
+
+
+def reference_postprocess(audio_opt, audio, tgt_sr, resample_sr, rms_mix_rate):
+    # 融合前的实现：change_rms、resample、峰值归一化逐步分配整段副本
+    if rms_mix_rate != 1:
+        audio_opt = change_rms(audio, 16000, audio_opt, tgt_sr, rms_mix_rate)
+    if resample_sr >= 16000 and tgt_sr != resample_sr:
+        audio_opt = resample(audio_opt, tgt_sr, resample_sr)
+    audio_max = np.abs(audio_opt).max() / 0.99
+    max_int16 = 32768
+    if audio_max > 1:
+        max_int16 /= audio_max
+    return (audio_opt * max_int16).astype(np.int16)
+
+
+def make_audio(seconds=7.3):
+    rng = np.random.default_rng(0)
+    envelope = 0.5 + 0.4 * np.sin(np.arange(int(16000 * seconds)) / 16000)
+    audio = (0.3 * envelope * rng.standard_normal(envelope.shape[0])).astype(np.float32)
+    audio_opt = (0.6 * rng.standard_normal(int(40000 * seconds))).astype(np.float32)
+    return audio_opt, audio
+
+
+@pytest.mark.parametrize("rms_mix_rate,resample_sr", [(1, 0), (0.25, 0), (0.5, 48000), (1, 32000)])
+def test_matches_reference(rms_mix_rate, resample_sr):
+    audio_opt, audio = make_audio()
+    expected = reference_postprocess(audio_opt.copy(), audio, 40000, resample_sr, rms_mix_rate)
+    actual = PostProcess(40000, resample_sr, rms_mix_rate, chunk_size=10000)(audio_opt.copy(), audio)
+    assert actual.dtype == np.int16 and actual.shape == expected.shape
+    assert np.abs(actual.astype(np.int32) - expected).max() <= 1
+
+
+def test_frame_helpers_match_librosa_and_torch():
+    import librosa
+
+    audio_opt, _ = make_audio(3.1)
+    np.testing.assert_allclose(frame_rms(audio_opt, 40000, 20000),
+                               librosa.feature.rms(y=audio_opt, frame_length=40000, hop_length=20000)[0],
+                               rtol=1e-5)
+    frames = np.random.default_rng(1).random(9).astype(np.float32)
+    expected = F.interpolate(torch.from_numpy(frames)[None, None], size=50000, mode="linear")[0, 0].numpy()
+    actual = np.concatenate([interpolate_frames(frames, 50000, start, min(50000, start + 7000))
+                             for start in range(0, 50000, 7000)])
+    np.testing.assert_allclose(actual, expected, atol=1e-6)
+
+
+def test_read_only_input():
+    audio_opt, audio = make_audio(1)
+    audio_opt.flags.writeable = False
+    output = PostProcess(40000, 0, 0.5)(audio_opt, audio)
+    assert output.shape == audio_opt.shape
+
+
+def test_streaming_chunks():
+    audio_opt, audio = make_audio(4)
+    post = PostProcess(40000, 48000, 1)
+    chunks = [post.push(audio_opt[i: i + 8000], audio[i * 2 // 5: (i + 8000) * 2 // 5])
+              for i in range(0, audio_opt.shape[0], 8000)]
+    chunks.append(post.flush())
+    np.testing.assert_allclose(np.concatenate(chunks), resample(audio_opt, 40000, 48000), atol=1e-5)
+
+    # 包络融合：输入音量恒定时，输出收敛到 rms1^(1-rate) * rms2^rate
+    post = PostProcess(40000, 0, 0)
+    loud = np.full(40000 * 3, 0.5, dtype=np.float32)
+    quiet = np.full(16000 * 3, 0.1, dtype=np.float32)
+    output = np.concatenate([post.push(loud[i: i + 4000], quiet[i * 2 // 5: (i + 4000) * 2 // 5])
+                             for i in range(0, loud.shape[0], 4000)])
+    assert output.shape == loud.shape
+    np.testing.assert_allclose(output[-4000:], 0.1, rtol=1e-4)
@@ -0,0 +1,170 @@
+import numpy as np
+import pytest
+import torch
+from torch import nn
+
+from speakers.rvc import quantization
+from speakers.rvc.quantization import (QuantizedModelCache, mel_distance, quantizable_linears, quantize_module,
+                                       reference_clip, relative_error)
+
+
+def make_model():
+    torch.manual_seed(0)
+    return nn.Sequential(nn.Linear(64, 256), nn.ReLU(), nn.Linear(256, 64)).eval()
+
+
+def output_error(model, quantized):
+    x = torch.randn(8, 64, generator=torch.Generator().manual_seed(1))
+    with torch.no_grad():
+        return relative_error(model(x), quantized(x))
+
+
+@pytest.fixture
+def source_file(tmp_path):
+    path = tmp_path / "model.pt"
+    path.write_bytes(b"checkpoint")
+    return str(path)
+
+
+def test_quantize_and_load_from_cache(tmp_path, source_file, monkeypatch):
+    cache = QuantizedModelCache(str(tmp_path / "cache"))
+    quantized = cache.quantize(make_model(), source_file, "model", output_error, max_error=0.05)
+    assert isinstance(quantized[0], torch.ao.nn.quantized.dynamic.Linear)
+    assert output_error(make_model(), quantized) < 0.05
+    assert len(list((tmp_path / "cache").glob("*.int8.pt"))) == 1
+
+    def fail(module):
+        raise AssertionError("should load from cache")
+
+    monkeypatch.setattr(quantization, "quantize_module", fail)
+    cached = cache.quantize(make_model(), source_file, "model", output_error, max_error=0.05)
+    x = torch.randn(4, 64)
+    with torch.no_grad():
+        torch.testing.assert_close(cached(x), quantized(x))
+
+
+def test_rejected_by_accuracy_guard(tmp_path, source_file):
+    cache = QuantizedModelCache(str(tmp_path / "cache"))
+    assert cache.quantize(make_model(), source_file, "model", output_error, max_error=0.0) is None
+    assert list((tmp_path / "cache").glob("*.int8.pt")) == []
+
+
+class FairseqStyleAttention(nn.Module):
+    """
+    与 fairseq 0.12.2 MultiheadAttention.forward 的 eager 路径相同：
+    把 q_proj、k_proj、v_proj 的权重与偏置作为张量传给 F.multi_head_attention_forward
+    """
+
+    def __init__(self, embed_dim: int, num_heads: int):
+        super().__init__()
+        self.embed_dim = embed_dim
+        self.num_heads = num_heads
+        self.k_proj = nn.Linear(embed_dim, embed_dim)
+        self.v_proj = nn.Linear(embed_dim, embed_dim)
+        self.q_proj = nn.Linear(embed_dim, embed_dim)
+        self.out_proj = nn.Linear(embed_dim, embed_dim)
+
+    def forward(self, query):
+        return nn.functional.multi_head_attention_forward(
+            query, query, query, self.embed_dim, self.num_heads,
+            torch.empty([0]),
+            torch.cat((self.q_proj.bias, self.k_proj.bias, self.v_proj.bias)),
+            None, None, False, 0.0,
+            self.out_proj.weight, self.out_proj.bias,
+            False,
+            use_separate_proj_weight=True,
+            q_proj_weight=self.q_proj.weight,
+            k_proj_weight=self.k_proj.weight,
+            v_proj_weight=self.v_proj.weight,
+        )[0]
+
+
+class TransformerLayer(nn.Module):
+
+    def __init__(self, attention: nn.Module, embed_dim: int = 64):
+        super().__init__()
+        self.self_attn = attention
+        self.fc1 = nn.Linear(embed_dim, 128)
+        self.fc2 = nn.Linear(128, embed_dim)
+
+    def forward(self, x):
+        x = x + self.self_attn(x)
+        return x + self.fc2(torch.relu(self.fc1(x)))
+
+
+class AttentionHubert(nn.Module):
+    """
+    hubert 的结构：post_extract_proj、带自注意力的 Transformer 层、final_proj
+    """
+
+    def __init__(self, attention_cls=FairseqStyleAttention):
+        super().__init__()
+        torch.manual_seed(0)
+        self.post_extract_proj = nn.Linear(32, 64)
+        self.layers = nn.ModuleList([TransformerLayer(attention_cls(64, 4)) for _ in range(2)])
+        self.final_proj = nn.Linear(64, 16)
+
+    def forward(self, x):
+        # [时间, 批, 特征]，与 fairseq 的注意力输入相同
+        x = self.post_extract_proj(x)
+        for layer in self.layers:
+            x = layer(x)
+        return self.final_proj(x)
+
+
+def attention_error(model, quantized):
+    x = torch.randn(20, 2, 32, generator=torch.Generator().manual_seed(1))
+    with torch.no_grad():
+        return relative_error(model(x), quantized(x))
+
+
+def test_attention_projections_are_not_quantized():
+    quantized = quantize_module(AttentionHubert().eval())
+    assert quantizable_linears(AttentionHubert()) == ["post_extract_proj", "layers.0.fc1", "layers.0.fc2",
+                                                      "layers.1.fc1", "layers.1.fc2", "final_proj"]
+    dynamic_linear = torch.ao.nn.quantized.dynamic.Linear
+    assert isinstance(quantized.final_proj, dynamic_linear) and isinstance(quantized.layers[0].fc1, dynamic_linear)
+    for name in ("q_proj", "k_proj", "v_proj", "out_proj"):
+        assert type(getattr(quantized.layers[1].self_attn, name)) is nn.Linear
+    assert attention_error(AttentionHubert().eval(), quantized) < 0.05
+
+
+def test_quantize_and_load_attention_model(tmp_path, source_file):
+    cache = QuantizedModelCache(str(tmp_path / "cache"))
+    quantized = cache.quantize(AttentionHubert().eval(), source_file, "hubert", attention_error, max_error=0.05)
+    cached = cache.quantize(AttentionHubert().eval(), source_file, "hubert", attention_error, max_error=0.05)
+    x = torch.randn(10, 1, 32)
+    with torch.no_grad():
+        torch.testing.assert_close(cached(x), quantized(x))
+
+
+def test_real_fairseq_attention(tmp_path, source_file):
+    multihead_attention = pytest.importorskip("fairseq.modules.multihead_attention")
+
+    def attention_cls(embed_dim, num_heads):
+        attention = multihead_attention.MultiheadAttention(embed_dim, num_heads, self_attention=True)
+        attention.forward = lambda x, forward=attention.forward: forward(x, x, x, need_weights=False)[0]
+        return attention
+
+    model = AttentionHubert(attention_cls).eval()
+    quantized = QuantizedModelCache(str(tmp_path / "cache")).quantize(model, source_file, "hubert",
+                                                                      attention_error, max_error=0.05)
+    assert quantized is not None and type(quantized.layers[0].self_attn.q_proj) is nn.Linear
+
+
+def test_guard_error_keeps_fp32(tmp_path, source_file):
+    def broken(model, quantized):
+        raise TypeError("expected Tensor as element 0 in argument 0, but got method")
+
+    model = make_model()
+    cache = QuantizedModelCache(str(tmp_path / "cache"))
+    assert cache.quantize(model, source_file, "model", broken, max_error=0.05) is None
+    assert type(model[0]) is nn.Linear
+    assert list((tmp_path / "cache").glob("*.int8.pt")) == []
+
+
+def test_mel_distance():
+    clip = reference_clip()
+    assert mel_distance(clip, clip, sr=16000) == 0
+    noisy = clip + 0.01 * np.random.default_rng(0).standard_normal(clip.shape[0]).astype(np.float32)
+    assert mel_distance(clip, noisy, sr=16000) > 0
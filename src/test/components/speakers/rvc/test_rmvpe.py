@@ -0,0 +1,60 @@
+import numpy as np
+import torch
+
+from speakers.rvc.lib.rmvpe import RMVPE
+
+
+def reference_to_local_average_cents(cents_mapping, salience, thred=0.05):
+    center = np.argmax(salience, axis=1)
+    salience = np.pad(salience, ((0, 0), (4, 4)))
+    center += 4
+    todo_salience = []
+    todo_cents_mapping = []
+    starts = center - 4
+    ends = center + 5
+    for idx in range(salience.shape[0]):
+        todo_salience.append(salience[:, starts[idx]: ends[idx]][idx])
+        todo_cents_mapping.append(cents_mapping[starts[idx]: ends[idx]])
+    todo_salience = np.array(todo_salience)
+    todo_cents_mapping = np.array(todo_cents_mapping)
+    product_sum = np.sum(todo_salience * todo_cents_mapping, 1)
+    weight_sum = np.sum(todo_salience, 1)
+    devided = product_sum / weight_sum
+    maxx = np.max(salience, axis=1)
+    devided[maxx <= thred] = 0
+    return devided
+
+
+def make_decoder():
+    # 只测试解码，不加载模型权重
+    rmvpe = RMVPE.__new__(RMVPE)
+    rmvpe.cents_mapping = np.pad(20 * np.arange(360) + 1997.3794084376191, (4, 4))
+    rmvpe.cents_mapping_torch = torch.from_numpy(rmvpe.cents_mapping).float()
+    return rmvpe
+
+
+def make_salience(n_frames=1000, seed=0):
+    rng = np.random.default_rng(seed)
+    salience = rng.random((n_frames, 360)).astype(np.float32) * 0.02
+    # 覆盖边界 bin 与低于阈值的静音帧
+    salience[0, 0] = 0.9
+    salience[1, 359] = 0.9
+    salience[2:, :][np.arange(n_frames - 2), rng.integers(0, 360, n_frames - 2)] = 0.8
+    salience[10:20] = 0.01
+    return salience
+
+
+def test_vectorised_decode_matches_reference():
+    rmvpe = make_decoder()
+    salience = make_salience()
+    for thred in (0.03, 0.05):
+        expected = reference_to_local_average_cents(rmvpe.cents_mapping, salience, thred=thred)
+        np.testing.assert_array_equal(rmvpe.to_local_average_cents(salience, thred=thred), expected)
+
+
+def test_torch_decode_matches_reference():
+    rmvpe = make_decoder()
+    salience = make_salience(seed=1)
+    expected = rmvpe.decode(salience, thred=0.03)
+    actual = rmvpe.decode_torch(torch.from_numpy(salience), thred=0.03)
+    np.testing.assert_allclose(actual, expected, rtol=1e-5, atol=1e-3)
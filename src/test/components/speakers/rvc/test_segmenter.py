@@ -0,0 +1,37 @@
+import numpy as np
+
+from speakers.rvc.segmenter import Segmenter
+
+SR = 16000
+WINDOW = 160
+
+
+def reference_opt_ts(audio, t_query, t_center, t_max):
+    audio_pad = np.pad(audio, (WINDOW // 2, WINDOW // 2), mode="reflect")
+    opt_ts = []
+    if audio_pad.shape[0] > t_max:
+        audio_sum = np.zeros_like(audio)
+        for i in range(WINDOW):
+            audio_sum += audio_pad[i: i - WINDOW]
+        for t in range(t_center, audio.shape[0], t_center):
+            query = np.abs(audio_sum[t - t_query: t + t_query])
+            opt_ts.append(t - t_query + np.where(query == query.min())[0][0])
+    return opt_ts
+
+
+def test_sum_strategy_matches_reference():
+    rng = np.random.default_rng(0)
+    args = (SR * 2, SR * 8, SR * 9)
+    for seconds in (5, 20, 33):
+        n = SR * seconds
+        audio = rng.standard_normal(n) * np.abs(np.sin(np.arange(n) / SR * 3)) * 0.1
+        assert Segmenter(WINDOW, *args)(audio) == reference_opt_ts(audio, *args)
+
+
+def test_strategies_cut_inside_query_window():
+    rng = np.random.default_rng(1)
+    audio = rng.standard_normal(SR * 30) * 0.1
+    audio[SR * 9: SR * 10] *= 1e-4
+    for strategy in ("energy", "vad"):
+        opt_ts = Segmenter(WINDOW, SR * 2, SR * 8, SR * 9, strategy=strategy)(audio)
+        assert SR * 9 <= opt_ts[0] < SR * 10
@@ -0,0 +1,79 @@
+import numpy as np
+import pytest
+
+from speakers.rvc.quantization import reference_clip
+from speakers.rvc.streaming import StreamingVC, crossfade_curves
+from speakers.rvc.vc_infer_pipeline import VC
+
+from .conftest import TGT_SR
+
+
+def snr(reference, test):
+    return 10 * np.log10(np.sum(reference ** 2) / (np.sum((reference - test) ** 2) + 1e-12))
+
+
+def test_crossfade_curves_sum_to_one():
+    fade_in, fade_out = crossfade_curves(400)
+    assert np.allclose(fade_in + fade_out, 1)
+    assert fade_in[0] < 0.01 and fade_in[-1] > 0.99
+
+
+def test_streaming_matches_offline(models):
+    hubert, net_g = models
+    vc = VC(TGT_SR, 1, 6, 38, 41, False, "cpu")
+    audio = np.concatenate([reference_clip(16000, 1.5), np.zeros(1600, np.float32),
+                            0.5 * reference_clip(16000, 1.5)])
+    offline = vc.pipeline(hubert, net_g, 0, audio, "", [0, 0, 0], 0, "pm", "", 0, 1, 3,
+                          TGT_SR, 0, 1, "v2", 0.33).astype(np.float32) / 32768
+
+    stream = StreamingVC(vc, hubert, net_g, 0, 1, "v2", f0_method="pm", block_seconds=0.3)
+    assert stream.latency_seconds == pytest.approx(0.4)
+    outputs = []
+    for i in range(0, audio.shape[0], 1000):
+        outputs.append(stream.push(audio[i: i + 1000]))
+    # 首个块在输入满 block 之后立即输出，前瞻部分暂存
+    first = next(i for i, output in enumerate(outputs) if output.shape[0] > 0)
+    assert (first + 1) * 1000 >= stream.block > first * 1000
+    assert outputs[first].shape[0] == stream.tgt_samples(stream.block - stream.crossfade)
+    stats = stream.stats
+    outputs.append(stream.flush())
+    streamed = np.concatenate(outputs)
+
+    assert streamed.shape[0] == stream.tgt_samples(audio.shape[0])
+    assert stats['blocks'] == audio.shape[0] // stream.block
+    assert 0 < stats['first_block_seconds'] and stats['mean_block_seconds'] <= stats['max_block_seconds']
+
+    # 合成器的注意力编码器看到的上下文不同，输出不会与离线完全一致；块边界处的误差不应明显大于整体
+    n = min(offline.shape[0], streamed.shape[0])
+    offline, streamed = offline[:n], streamed[:n]
+    overall = snr(offline, streamed)
+    assert overall > 8
+    block, crossfade = stream.tgt_samples(stream.block), stream.tgt_samples(stream.crossfade)
+    for k in range(1, audio.shape[0] // stream.block):
+        boundary = slice(k * block - crossfade, k * block)
+        if np.sum(offline[boundary] ** 2) > 0:
+            assert snr(offline[boundary], streamed[boundary]) > overall - 6
+
+
+def test_flush_resets_session(models):
+    hubert, net_g = models
+    vc = VC(TGT_SR, 1, 6, 38, 41, False, "cpu")
+    stream = StreamingVC(vc, hubert, net_g, 0, 1, "v2", f0_method="pm", block_seconds=0.2)
+    audio = reference_clip(16000, 0.5)
+
+    first = np.concatenate([stream.push(audio), stream.flush()])
+    second = np.concatenate([stream.push(audio), stream.flush()])
+
+    assert first.shape[0] == stream.tgt_samples(audio.shape[0])
+    assert np.allclose(first, second, atol=1e-5)
+
+
+def test_resamples_input(models):
+    hubert, net_g = models
+    vc = VC(TGT_SR, 1, 6, 38, 41, False, "cpu")
+    stream = StreamingVC(vc, hubert, net_g, 0, 1, "v2", f0_method="pm", block_seconds=0.2, input_sr=22050)
+    audio = reference_clip(22050, 0.5)
+
+    output = np.concatenate([stream.push(audio[:5000]), stream.push(audio[5000:]), stream.flush()])
+
+    assert output.shape[0] == stream.tgt_samples(8000)
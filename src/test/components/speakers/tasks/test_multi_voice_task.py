@@ -0,0 +1,89 @@
+import asyncio
+import os
+import zipfile
+
+import numpy as np
+from scipy.io import wavfile
+
+from speakers.common.registry import registry
+from speakers.server.model.flow_data import PayLoad
+from speakers.tasks.multi_voice_task import MultiVoiceTask
+
+TARGETS = [{"model_index": 0, "f0_up_key": 0}, {"model_index": 1, "f0_up_key": 12, "resample_sr": 16000}]
+
+
+class EdgeProcessor:
+
+    def match(self, data) -> bool:
+        return True
+
+    def __call__(self, data):
+        return np.sin(np.arange(24000, dtype=np.float32) / 10), 24000
+
+
+class MultiVoiceProcessor:
+    """
+    按目标返回不同采样率与长度的音频，代替 RVCSpeakers.vc_multi
+    """
+
+    def __init__(self):
+        self.data = None
+
+    def match(self, data) -> bool:
+        return True
+
+    def __call__(self, data):
+        self.data = data
+        return [(target.resample_sr or 40000, np.full(4000 * (i + 1), 0.1 * (i + 1), dtype=np.float32))
+                for i, target in enumerate(data.targets)]
+
+
+def make_runner():
+    payload = PayLoad(parameter={"task_name": "multi_voice_task"},
+                      payload={"edge": {"text": "你好", "tts_speaker": 2, "rate": "+0%", "volume": "+0%"},
+                               "rvc": {"f0_method": "rmvpe", "filter_radius": 3, "targets": TARGETS}})
+    return MultiVoiceTask.prepare(payload)
+
+
+def test_dispatch_saves_one_wav_per_target_and_zip(tmp_path, monkeypatch):
+    monkeypatch.setitem(registry.mapping["paths"], "tmp_root", str(tmp_path))
+    os.makedirs(tmp_path / "result")
+    rvc = MultiVoiceProcessor()
+    task = MultiVoiceTask(preprocess_dict={"EDGE": EdgeProcessor(), "RVC": rvc})
+    events = []
+
+    async def hook(task_id, runner_stat, state, finished=False, result={}):
+        events.append((state, result))
+
+    task.add_progress_hook(hook)
+    runner = make_runner()
+    asyncio.run(task.dispatch(runner))
+
+    # edge-tts 的输出以 NumPy 缓冲区传给 rvc
+    assert rvc.data.sample_rate == 24000 and len(rvc.data.audio_samples) == 24000
+    assert [state for state, _ in events] == ["dispatch_multi_voice_task", "finished", "save_write"]
+    result = events[-1][1]
+    assert result["filename"] == str(tmp_path / "result" / f"{runner.task_id}.zip")
+    assert result["filenames"] == [str(tmp_path / "result" / f"{runner.task_id}-{i}.wav") for i in range(2)]
+
+    with zipfile.ZipFile(result["filename"]) as zf:
+        assert zf.namelist() == [f"{runner.task_id}-0.wav", f"{runner.task_id}-1.wav"]
+        assert all(info.compress_type == zipfile.ZIP_STORED for info in zf.infolist())
+    # 每个目标一个 wav，与 targets 顺序一致
+    for i, (filename, sample_rate) in enumerate(zip(result["filenames"], (40000, 16000))):
+        sr, audio = wavfile.read(filename)
+        assert sr == sample_rate and audio.shape[0] == 4000 * (i + 1)
+
+
+def test_dispatch_reports_error(tmp_path, monkeypatch):
+    monkeypatch.setitem(registry.mapping["paths"], "tmp_root", str(tmp_path))
+    task = MultiVoiceTask(preprocess_dict={"EDGE": EdgeProcessor()})
+    events = []
+
+    async def hook(task_id, runner_stat, state, finished=False, result={}):
+        events.append((state, finished))
+
+    task.add_progress_hook(hook)
+    asyncio.run(task.dispatch(make_runner()))
+    assert events[-1] == ("error", True)
+    assert not os.path.exists(tmp_path / "result")
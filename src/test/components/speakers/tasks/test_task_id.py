@@ -0,0 +1,52 @@
+import pytest
+
+from speakers.server.model.flow_data import PayLoad
+from speakers.tasks.bark_voice_task import BarkVoiceTask
+from speakers.tasks.edge_voice_task import EdgeVoiceTask
+from speakers.tasks.vits_voice_task import VitsVoiceTask
+
+RVC = {"model_index": 0, "f0_up_key": 2, "f0_method": "rmvpe", "index_rate": 0.75, "filter_radius": 3,
+       "rms_mix_rate": 1, "resample_sr": 0, "protect": 0.33, "f0_file": None}
+
+TASKS = {
+    "edge_voice_task": (EdgeVoiceTask, {"edge": {"text": "你好，世界。", "tts_speaker": 2,
+                                                 "rate": "+0%", "volume": "+0%"}}),
+    "vits_voice_task": (VitsVoiceTask, {"vits": {"text": "你好，世界。", "language": 1, "speaker_id": 0,
+                                                 "noise_scale": 0.5, "speed": 1, "noise_scale_w": 1}}),
+    "bark_voice_task": (BarkVoiceTask, {"bark": {"text": "你好，世界。", "speaker_history_prompt": "zh_speaker_2",
+                                                 "text_temp": 0.7, "waveform_temp": 0.7}}),
+}
+
+
+def make_payload(task_name: str, **rvc) -> PayLoad:
+    _, payload = TASKS[task_name]
+    return PayLoad(parameter={"task_name": task_name}, payload={**payload, "rvc": {**RVC, **rvc}})
+
+
+@pytest.mark.parametrize("task_name", sorted(TASKS))
+def test_task_id_is_stable_across_json_round_trip(task_name):
+    task = TASKS[task_name][0]
+    payload = make_payload(task_name)
+    task_id = task.prepare(payload).task_id
+
+    assert task.prepare(make_payload(task_name)).task_id == task_id
+    # server 收到的请求体与 web_runner 从 task-internal 取回的任务都经过 JSON 序列化
+    assert task.prepare(PayLoad.parse_raw(payload.json())).task_id == task_id
+    # 请求时间不属于合成参数
+    assert task.prepare(PayLoad.parse_raw(payload.copy(update={"requested_at": 1.0}).json())).task_id == task_id
+
+
+@pytest.mark.parametrize("task_name", sorted(TASKS))
+@pytest.mark.parametrize("param, value", [("f0_method", "harvest"), ("index_rate", 0.5), ("protect", 0.5),
+                                          ("f0_up_key", -12)])
+def test_task_id_changes_with_rvc_params(task_name, param, value):
+    task = TASKS[task_name][0]
+    task_id = task.prepare(make_payload(task_name)).task_id
+    changed = task.prepare(make_payload(task_name, **{param: value})).task_id
+    assert changed != task_id
+    assert changed.split("-")[0] == task_id.split("-")[0]
+
+
+def test_task_id_differs_between_tasks():
+    task_ids = {task.prepare(make_payload(task_name)).task_id for task_name, (task, _) in TASKS.items()}
+    assert len(task_ids) == len(TASKS)